@@ -40,18 +40,12 @@ STYLE_CONFIG = {
 
 def fetch_enhanced_data(client_name: str) -> Dict:
     """既存のデータに加え、最新の支援記録と感情ログを取得"""
-    data = fetch_client_data(client_name, template="full_view")
-    
     if HAS_NEO4J:
-        # 最新の支援記録（感情ログ付き）を5件取得
-        data["supportLogs"] = run_query("""
-            MATCH (c:Client {name: $name})<-[:ABOUT]-(log:SupportLog)
-            RETURN log.situation as situation, log.action as action, 
-                   log.emotion as emotion, log.triggerTag as triggerTag,
-                   log.date as date, log.context as context
-            ORDER BY log.date DESC LIMIT 5
-        """, {"name": client_name})
+        # 最新の支援記録（感情ログ付き）5件もクライアントカードの同じクエリで取得
+        data = fetch_client_data(client_name, template="full_view", extra_sections=("recentLogs",))
+        data["supportLogs"] = data.pop("recentLogs", [])
     else:
+        data = fetch_client_data(client_name, template="full_view")
         data["supportLogs"] = [
             {"situation": "デモ：散歩", "emotion": "Joy", "triggerTag": "Leisure", "date": "2026-03-30"},
             {"situation": "デモ：作業変更", "emotion": "Anger", "triggerTag": "Work", "date": "2026-03-30"}
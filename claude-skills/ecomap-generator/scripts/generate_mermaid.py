@@ -13,6 +13,10 @@ from pathlib import Path
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
 
+# クライアントカードのクエリはリポジトリの lib と共有する
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+from lib.client_card import fetch_client_card, fetch_materialized_card
+
 
 # =============================================================================
 # Neo4j接続設定
@@ -247,82 +251,49 @@ class MermaidEcomapGenerator:
 # Neo4jからデータ取得
 # =============================================================================
 
-def fetch_client_data(client_name: str, template: str = "full_view") -> Dict:
-    """Neo4jからクライアントデータを取得"""
-    if not HAS_NEO4J:
-        return get_sample_data(client_name)
-
-    data = {
-        "client": {"name": client_name},
-        "ngActions": [],
-        "carePreferences": [],
-        "keyPersons": [],
-        "guardians": [],
-        "certificates": [],
-        "hospitals": [],
-        "conditions": [],
-    }
-
-    # 基本情報
-    client_result = run_query("""
-        MATCH (c:Client {name: $name})
-        RETURN c.name as name, c.dob as dob, c.bloodType as bloodType
-    """, {"name": client_name})
-
-    if not client_result:
-        print(f"警告: クライアント '{client_name}' が見つかりません", file=sys.stderr)
-        return get_sample_data(client_name)
-
-    data["client"] = client_result[0]
-
-    # 禁忌事項
-    data["ngActions"] = run_query("""
-        MATCH (c:Client {name: $name})-[:PROHIBITED|MUST_AVOID]->(ng:NgAction)
-        RETURN ng.action as action, ng.reason as reason, ng.riskLevel as riskLevel
-        ORDER BY CASE ng.riskLevel
-            WHEN 'LifeThreatening' THEN 1
-            WHEN 'Panic' THEN 2
-            ELSE 3 END
-    """, {"name": client_name})
+# テンプレートごとに描画するセクション（generate_mermaid_ecomap の分岐と対応）
+TEMPLATE_SECTIONS = {
+    "full_view": ("ngActions", "carePreferences", "keyPersons", "guardians",
+                  "certificates", "hospitals", "conditions"),
+    "emergency": ("ngActions", "carePreferences", "keyPersons", "guardians", "hospitals"),
+    "handover": ("ngActions", "carePreferences", "keyPersons", "guardians",
+                 "certificates", "hospitals", "conditions"),
+    "support_meeting": ("carePreferences", "keyPersons", "certificates"),
+}
 
-    # 推奨ケア
-    data["carePreferences"] = run_query("""
-        MATCH (c:Client {name: $name})-[:PREFERS|REQUIRES]->(cp:CarePreference)
-        RETURN cp.category as category, cp.instruction as instruction, cp.priority as priority
-    """, {"name": client_name})
+# マテリアライズドカードを使わず、常にライブで取得するテンプレート。
+# Skill / MCP からの直接の書き込みは Client.cardJson を更新しないため、カードが古い場合がある。
+# 緊急時の禁忌事項・連絡先は SOS 通知と同じく、古い情報を出さないことを優先する
+LIVE_TEMPLATES = ("emergency",)
 
-    # キーパーソン
-    data["keyPersons"] = run_query("""
-        MATCH (c:Client {name: $name})-[r:EMERGENCY_CONTACT|HAS_KEY_PERSON]->(kp:KeyPerson)
-        RETURN kp.name as name, kp.relationship as relationship, kp.phone as phone,
-               coalesce(r.rank, r.priority) as priority
-        ORDER BY coalesce(r.rank, r.priority, 99)
-    """, {"name": client_name})
 
-    # 後見人
-    data["guardians"] = run_query("""
-        MATCH (c:Client {name: $name})-[:HAS_GUARDIAN|HAS_LEGAL_REP]->(g:Guardian)
-        RETURN g.name as name, g.type as type, g.phone as phone
-    """, {"name": client_name})
-
-    # 手帳
-    data["certificates"] = run_query("""
-        MATCH (c:Client {name: $name})-[:HAS_CERTIFICATE]->(cert:Certificate)
-        RETURN cert.type as type, cert.grade as grade
-    """, {"name": client_name})
+def fetch_client_data(client_name: str, template: str = "full_view", extra_sections: tuple = ()) -> Dict:
+    """
+    Neo4jからクライアントデータを取得
 
-    # 医療機関
-    data["hospitals"] = run_query("""
-        MATCH (c:Client {name: $name})-[:TREATED_AT]->(h:Hospital)
-        RETURN h.name as name, h.specialty as specialty
-    """, {"name": client_name})
+    lib/client_card.py のマテリアライズドカード（Client.cardJson）から
+    テンプレートに必要なセクションを取り出す。カード未作成のクライアントと
+    LIVE_TEMPLATES（emergency）は CALL {} サブクエリによる単一クエリ（CLIENT_CARD_QUERY）でライブに取得する。
+    """
+    if not HAS_NEO4J:
+        return get_sample_data(client_name)
 
-    # 特性
-    data["conditions"] = run_query("""
-        MATCH (c:Client {name: $name})-[:HAS_CONDITION]->(cond:Condition)
-        RETURN cond.name as name
-    """, {"name": client_name})
+    sections = TEMPLATE_SECTIONS.get(template, TEMPLATE_SECTIONS["full_view"]) + tuple(extra_sections)
+    if template in LIVE_TEMPLATES:
+        card = fetch_client_card(run_query, client_name, sections)
+    else:
+        card = fetch_materialized_card(run_query, client_name, sections)
+    if card is None:
+        print(f"警告: クライアント '{client_name}' が見つかりません", file=sys.stderr)
+        return get_sample_data(client_name)
 
+    # テンプレートで使わないセクションも空リストとして揃えておく
+    data = {"client": {k: card["client"][k] for k in ("name", "dob", "bloodType")}}
+    for section in TEMPLATE_SECTIONS["full_view"] + tuple(extra_sections):
+        data[section] = card[section]
+    # キーパーソンの順位は従来どおり priority としても参照できるようにする
+    for kp in data.get("keyPersons", []):
+        kp["priority"] = kp["rank"]
     return data
 
 
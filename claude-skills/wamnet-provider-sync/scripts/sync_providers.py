@@ -17,7 +17,7 @@ import os
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 # Neo4j接続用
 try:
@@ -28,6 +28,27 @@ except ImportError:
     print("必要なパッケージをインストールしてください: pip install neo4j python-dotenv")
     sys.exit(1)
 
+# 大量読み取りのストリーミングはリポジトリの lib と共有する
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+from lib.db_runtime import stream_query
+
+# 差分判定に使う項目（既存データはこの項目だけを読み出す）
+COMPARE_FIELDS = ["name", "address", "city", "phone", "capacity", "serviceType"]
+
+
+class ExistingProvider(NamedTuple):
+    """差分判定用の既存 ServiceProvider（ノード全体の dict より小さい）"""
+    name: Optional[str]
+    address: Optional[str]
+    city: Optional[str]
+    phone: Optional[str]
+    capacity: Optional[int]
+    serviceType: Optional[str]
+
+    def get(self, field: str, default=None):
+        value = getattr(self, field, None)
+        return default if value is None else value
+
 
 class WAMNetSyncError(Exception):
     """WAM NET同期エラー"""
@@ -209,41 +230,37 @@ class ServiceProviderSync:
         except ValueError:
             return None
 
-    def get_existing_providers(self, prefecture: str = "") -> Dict[str, Dict]:
+    def get_existing_providers(self, prefecture: str = "") -> Dict[str, ExistingProvider]:
         """
         既存のServiceProviderを取得
-        
+
+        全件を読み出すため、差分判定に使う項目だけを 1 件ずつストリーミングで受け取る
+        （ノード全体を dict で保持すると事業所数に比例してメモリが増える）。
+
         Args:
             prefecture: 都道府県でフィルタ（空の場合は全件）
-        
+
         Returns:
-            providerId → プロパティのDict
+            providerId → ExistingProvider のDict
         """
-        with self.driver.session() as session:
-            if prefecture:
-                query = """
-                MATCH (sp:ServiceProvider)
-                WHERE sp.prefecture CONTAINS $prefecture
-                RETURN sp
-                """
-                result = session.run(query, prefecture=prefecture)
-            else:
-                query = "MATCH (sp:ServiceProvider) RETURN sp"
-                result = session.run(query)
-            
-            existing = {}
-            for record in result:
-                node = record["sp"]
-                provider_id = node.get("providerId")
-                if provider_id:
-                    existing[provider_id] = dict(node)
-            
-            return existing
+        columns = ", ".join(f"sp.{field} AS {field}" for field in COMPARE_FIELDS)
+        query = f"""
+        MATCH (sp:ServiceProvider)
+        WHERE sp.providerId IS NOT NULL
+          AND ($prefecture = '' OR sp.prefecture CONTAINS $prefecture)
+        RETURN sp.providerId AS providerId, {columns}
+        """
+        existing = {}
+        for provider_id, *values in stream_query(
+            self.driver, query, {"prefecture": prefecture}, row_type=tuple
+        ):
+            existing[provider_id] = ExistingProvider(*values)
+        return existing
 
     def detect_changes(
         self, 
         new_providers: List[Dict], 
-        existing_providers: Dict[str, Dict]
+        existing_providers: Dict[str, ExistingProvider]
     ) -> Tuple[List[Dict], List[Dict], List[str]]:
         """
         差分を検出
@@ -302,19 +319,17 @@ class ServiceProviderSync:
         
         return to_add, to_update, list(closed_ids)
 
-    def _is_modified(self, new: Dict, existing: Dict) -> bool:
+    def _is_modified(self, new: Dict, existing: ExistingProvider) -> bool:
         """変更があるか判定"""
-        compare_fields = ["name", "address", "city", "phone", "capacity", "serviceType"]
-        for field in compare_fields:
+        for field in COMPARE_FIELDS:
             if str(new.get(field, "")) != str(existing.get(field, "")):
                 return True
         return False
 
-    def _get_diff(self, new: Dict, existing: Dict) -> List[str]:
+    def _get_diff(self, new: Dict, existing: ExistingProvider) -> List[str]:
         """変更点を取得"""
         diffs = []
-        compare_fields = ["name", "address", "city", "phone", "capacity", "serviceType"]
-        for field in compare_fields:
+        for field in COMPARE_FIELDS:
             new_val = str(new.get(field, ""))
             old_val = str(existing.get(field, ""))
             if new_val != old_val:
@@ -573,4 +588,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    from lib.workload import workload
+
+    # 緊急照会の間は一時停止する低優先度のレーンで実行する
+    with workload("batch"):
+        main()
@@ -22,7 +22,9 @@ Claude Desktop を使わなくても、スマホやPCから直接操作できる
 import os
 import sys
 import json
+import asyncio
 import tempfile
+from contextlib import asynccontextmanager
 from datetime import date, datetime
 from pathlib import Path
 
@@ -37,12 +39,38 @@ from dotenv import load_dotenv
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 load_dotenv(Path(__file__).resolve().parent.parent / ".env")
 
-from lib.db_operations import run_query, register_to_database
+from lib.async_db_operations import async_run_query, async_register_to_database_compat, close_async_driver
+from lib.audit_sink import get_audit_sink, get_audit_sink_stats
+from lib.client_card import CLIENT_CARD_QUERY, card_from_rows, card_params
+from lib.db_runtime import DatabaseAccessError, get_query_stats
+from lib.deadline import DeadlineExceeded, current_deadline, deadline, within
+from lib.embedding import get_embedding_dispatcher_stats
+from lib.embedding_cache import get_embedding_cache_stats
+from lib.query_cache import async_cached_query, get_cache_stats
+from lib.schema_bootstrap import bootstrap_schema_on_startup
+from lib.workload import get_workload_stats
+
+# リクエストごとの処理時間の予算・秒（lib/deadline.py）
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+VOICE_UPLOAD_DEADLINE_SECONDS = float(os.getenv("VOICE_UPLOAD_DEADLINE_SECONDS", "120"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # MERGE キー・テンプレートの起点・ベクトル検索に必要なインデックスと制約を用意する
+    # （作成だけして ONLINE は待たない。待つのは scripts/bootstrap_schema.py）
+    await asyncio.to_thread(bootstrap_schema_on_startup)
+    yield
+    # バッファ中の監査ログを書き込んでから終了する
+    await asyncio.to_thread(get_audit_sink().close)
+    await close_async_driver()
+
 
 app = FastAPI(
     title="nest-support 現場UI",
     description="支援記録入力・ダッシュボード・音声録音",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -52,6 +80,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_deadline(request, call_next):
+    """リクエストごとに予算を設定する（DB・Gemini の呼び出しは残り時間をタイムアウトにする）"""
+    budget = VOICE_UPLOAD_DEADLINE_SECONDS if request.url.path == "/api/voice/upload" else REQUEST_DEADLINE_SECONDS
+    with deadline(budget):
+        return await call_next(request)
+
+
+@app.exception_handler(DatabaseAccessError)
+async def database_error_handler(request, exc: DatabaseAccessError):
+    return JSONResponse(status_code=503, content={"detail": "データベースに接続できません"})
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request, exc: DeadlineExceeded):
+    # どの段階で予算を使い切ったかを返す
+    return JSONResponse(
+        status_code=504,
+        content={"detail": "処理が時間内に終わりませんでした", "stage": exc.stage, "timings": exc.report},
+    )
+
+
 # 静的ファイル配信
 STATIC_DIR = Path(__file__).parent / "static"
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
@@ -84,7 +134,7 @@ async def voice_page():
 
 @app.get("/api/clients")
 async def api_clients():
-    rows = run_query("MATCH (c:Client) RETURN c.name AS name ORDER BY c.name")
+    rows = await async_run_query("MATCH (c:Client) RETURN c.name AS name ORDER BY c.name")
     return [r["name"] for r in rows]
 
 
@@ -126,7 +176,8 @@ async def api_create_support_log(data: SupportLogInput):
             {"source_temp_id": "log1", "target_temp_id": "c1", "type": "ABOUT", "properties": {}},
         ],
     }
-    result = register_to_database(graph, user_name=f"field-ui:{data.supporterName}")
+    # 同期版の lib.db_operations.register_to_database と同じ契約（count / types、監査ログの形式）
+    result = await async_register_to_database_compat(graph, user_name=f"field-ui:{data.supporterName}")
     return result
 
 
@@ -137,10 +188,11 @@ async def api_create_support_log(data: SupportLogInput):
 @app.get("/api/dashboard/summary")
 async def api_dashboard_summary():
     """全クライアントの感情サマリー"""
-    rows = run_query("""
-        MATCH (c:Client)<-[:ABOUT]-(log:SupportLog)
+    rows = await async_run_query("""
+        MATCH (log:SupportLog)
         WHERE log.date >= date() - duration({days: 7})
           AND log.emotion IS NOT NULL
+        MATCH (log)-[:ABOUT]->(c:Client)
         WITH c.name AS clientName,
              count(log) AS totalLogs,
              count(CASE WHEN log.emotion IN ['Anger','Sadness','Fear','Disgust','Anxiety'] THEN 1 END) AS negativeLogs
@@ -166,7 +218,8 @@ async def api_dashboard_alerts(client_name: str):
     """特定クライアントのインサイト分析"""
     try:
         from lib.insight_engine import generate_risk_assessment
-        result = generate_risk_assessment(client_name)
+        # insight_engine は同期ドライバーを使うためワーカースレッドで実行
+        result = await asyncio.to_thread(generate_risk_assessment, client_name)
         return JSONResponse(content=json.loads(json.dumps(result, default=str)))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -175,22 +228,35 @@ async def api_dashboard_alerts(client_name: str):
 @app.get("/api/dashboard/recent-logs/{client_name}")
 async def api_recent_logs(client_name: str):
     """直近の支援記録"""
-    rows = run_query("""
-        MATCH (c:Client {name: $name})<-[:ABOUT]-(log:SupportLog)
-        OPTIONAL MATCH (s:Supporter)-[:LOGGED]->(log)
-        RETURN log.date AS date, log.situation AS situation,
-               log.action AS action, log.emotion AS emotion,
-               log.triggerTag AS triggerTag, log.effectiveness AS effectiveness,
-               log.context AS context, s.name AS supporter
-        ORDER BY log.date DESC
-        LIMIT 20
-    """, {"name": client_name})
+    params = card_params(client_name, ["recentLogs"], log_limit=20)
+    rows = await async_cached_query(
+        CLIENT_CARD_QUERY, params, lambda: async_run_query(CLIENT_CARD_QUERY, params), client=client_name
+    )
+    card = card_from_rows(rows)
+    logs = card["recentLogs"] if card else []
     return [
         {k: str(v) if v is not None else "" for k, v in r.items()}
-        for r in rows
+        for r in logs
     ]
 
 
+# =============================================================================
+# API: 運用メトリクス
+# =============================================================================
+
+@app.get("/api/metrics")
+async def api_metrics():
+    """クエリ結果・Embedding のキャッシュ、Embedding API の流量、クエリ実行（リトライ・プール待ち）、ワークロードレーン、監査ログバッファの統計"""
+    return {
+        "query_cache": get_cache_stats(),
+        "embedding_cache": get_embedding_cache_stats(),
+        "embedding_api": get_embedding_dispatcher_stats(),
+        "queries": get_query_stats(),
+        "workloads": get_workload_stats(),
+        "audit_sink": get_audit_sink_stats(),
+    }
+
+
 # =============================================================================
 # API: 音声アップロード → 構造化 → 登録
 # =============================================================================
@@ -212,31 +278,36 @@ async def api_voice_upload(
     try:
         # Step 1: 文字起こし
         from lib.embedding import transcribe_audio
-        transcript = transcribe_audio(tmp_path)
+        transcript = await within("transcribe", asyncio.to_thread(transcribe_audio, tmp_path))
         if not transcript:
             raise HTTPException(status_code=422, detail="音声の文字起こしに失敗しました")
 
         # Step 2: 構造化
         from scripts.multi_importer import structurize_with_gemini
-        graph_data = structurize_with_gemini(
+        graph_data = await within("structurize", asyncio.to_thread(
+            structurize_with_gemini,
             text=transcript,
             client_name=clientName,
             supporter_name=supporterName or None,
             source_file=audio.filename or "voice_recording",
-        )
+        ))
         if not graph_data:
             raise HTTPException(status_code=422, detail="テキストの構造化に失敗しました")
 
-        # Step 3: 登録
-        result = register_to_database(
+        # Step 3: 登録。予算に従うのは書き込みトランザクションだけで、コミット後の後始末は打ち切らない
+        # （残り時間が少なければ Embedding 付与は後回しになり、deferred に入る）
+        result = await async_register_to_database_compat(
             graph_data,
             user_name=f"voice-ui:{supporterName or 'anonymous'}",
         )
+        timings = current_deadline().report()
 
         return {
             "status": result.get("status", "unknown"),
             "transcript": transcript[:500],
-            "nodes_registered": result.get("count", result.get("registered_count", 0)),
+            "nodes_registered": result.get("count", 0),
+            "deferred": timings["deferred"],
+            "timings": timings,
         }
     finally:
         os.unlink(tmp_path)
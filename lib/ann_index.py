@@ -0,0 +1,571 @@
+"""
+ローカルの近似最近傍（ANN）索引（IVF-flat、メモリマップ）
+
+セマンティック検索はすべて Neo4j の db.index.vector.queryNodes を通っていた。
+ベクトルインデックスの再構築中・Neo4j に繋がらないとき・オフラインの分析では検索の手段がなかった。
+Neo4j から書き出したベクトルで、プロセス内で検索できる索引を作る。
+
+- IVF-flat: ベクトルを球面 k-means の nlist 個のクラスタ（転置リスト）に分け、検索時はクエリに近い
+  nprobe 個のリストの中だけを正確な内積で比べる。リストは行番号の並べ替えで表し、ベクトルは動かさない
+- 保存形式（索引ごとのディレクトリ）:
+    vectors.npy    正規化済みの float32 ベクトル（容量 × 次元。余りの行は未使用）
+    lists.npy      行ごとのリスト番号（int32。削除済み・未使用の行は -1）
+    centroids.npy  リストの中心（nlist × 次元）
+    meta.json      elementId・ハッシュ・表示用の属性（payload）・クライアント・モデルなど
+  索引の置き場所の直下の generation.json には、索引を作った現行の Embedding の世代（版・モデル・次元数）を書く。
+  .npy はメモリマップで開くため、読み込みは一瞬で、ページは検索で触れた分だけ読まれる
+- 追加・削除は差分で行う（追加は末尾の行に書き、容量が足りなければ倍に広げる。削除は行を -1 にする）。
+  削除済みの行が 1/4 を超えたら保存時に詰め直す。中心は作り直さないので、分布が大きく変わったら rebuild
+- クライアントで絞り込む検索は、そのクライアントの行だけを正確に比べる（1 人分は多くても数千件）
+
+Neo4j からの書き出し・差分の同期は sync_index（scripts/build_ann_index.py）。
+検索関数の切り替えは lib/embedding.py の VECTOR_SEARCH_BACKEND を参照。
+
+環境変数:
+  ANN_INDEX_DIR  索引の保存先（デフォルト: ~/.cache/nest-support/ann）
+  ANN_NPROBE     検索で調べるリスト数（デフォルト: 8）
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from lib.similarity import normalize_rows, to_matrix, top_k
+
+DEFAULT_INDEX_DIR = Path.home() / ".cache" / "nest-support" / "ann"
+DEFAULT_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+
+# k-means の学習に使う行数の上限（リストあたり）
+_TRAIN_ROWS_PER_LIST = 64
+# 削除済みの行がこの割合を超えたら保存時に詰め直す
+_COMPACT_RATIO = 0.25
+
+
+def _log(message: str, level: str = "INFO"):
+    sys.stderr.write(f"[AnnIndex:{level}] {message}\n")
+    sys.stderr.flush()
+
+
+def default_nlist(count: int) -> int:
+    return max(1, min(4096, int(np.sqrt(count))))
+
+
+def train_centroids(matrix: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """正規化済みの行列から球面 k-means で nlist 個の中心を求める（学習は標本の行だけで行う）"""
+    rng = np.random.default_rng(seed)
+    nlist = max(1, min(nlist, len(matrix)))
+    sample = matrix
+    if len(matrix) > nlist * _TRAIN_ROWS_PER_LIST:
+        sample = matrix[np.sort(rng.choice(len(matrix), nlist * _TRAIN_ROWS_PER_LIST, replace=False))]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = top_k(sample, centroids, 1)[0][:, 0]
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = ~sums.any(axis=1)
+        # 空になったリストは標本の別の行で置き直す
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    IVF-flat の索引
+
+    ids・payloads・hashes・clients は行ごとの値（削除済みの行は None）。
+    payload は検索結果に添える表示用の属性（Neo4j の検索結果と同じ列を作るため）。
+    """
+
+    def __init__(self, path: Path, centroids: np.ndarray, vectors: np.ndarray, lists: np.ndarray, meta: dict):
+        self.path = Path(path)
+        self.centroids = centroids
+        self.vectors = vectors
+        self.lists = lists
+        self.meta = meta
+        self.ids: list = meta.pop("ids")
+        self.hashes: list = meta.pop("hashes")
+        self.payloads: list = meta.pop("payloads")
+        self.clients: list = meta.pop("clients")
+        self._rows = {element_id: row for row, element_id in enumerate(self.ids) if element_id is not None}
+        self._client_rows: dict[str, list[int]] = {}
+        for row, names in enumerate(self.clients):
+            for name in names or ():
+                self._client_rows.setdefault(name, []).append(row)
+        self._inverted: Optional[tuple[np.ndarray, np.ndarray]] = None
+
+    # -------------------------------------------------------------------------
+    # 作成・読み込み・保存
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def build(
+        cls,
+        path: str | Path,
+        ids: list[str],
+        vectors,
+        payloads: Optional[list[dict]] = None,
+        hashes: Optional[list] = None,
+        clients: Optional[list[list[str]]] = None,
+        nlist: Optional[int] = None,
+        iterations: int = 10,
+        **meta,
+    ) -> "IVFIndex":
+        """ベクトルから中心を学習して索引を作る（path に保存するのは save() のとき）"""
+        matrix = to_matrix(vectors, meta.get("dimensions"))
+        if len(matrix) == 0:
+            raise ValueError("索引にするベクトルがありません")
+        centroids = train_centroids(matrix, nlist or default_nlist(len(matrix)), iterations)
+        index = cls(
+            path, centroids, matrix[:0], np.zeros(0, dtype=np.int32),
+            {**meta, "dimensions": matrix.shape[1], "ids": [], "hashes": [], "payloads": [], "clients": []},
+        )
+        index._append(ids, matrix, payloads, hashes, clients)
+        index.meta["built_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        return index
+
+    @classmethod
+    def open(cls, path: str | Path, writable: bool = False) -> "IVFIndex":
+        """保存された索引をメモリマップで開く（writable=False なら読み取り専用）"""
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        mode = "r+" if writable else "r"
+        count = meta["rows"]
+        vectors = np.load(path / "vectors.npy", mmap_mode=mode)
+        lists = np.load(path / "lists.npy", mmap_mode=mode)
+        centroids = np.load(path / "centroids.npy")
+        index = cls(path, centroids, vectors, lists, meta)
+        index._capacity_vectors, index._capacity_lists = vectors, lists
+        index.vectors, index.lists = vectors[:count], lists[:count]
+        return index
+
+    def save(self) -> None:
+        """ディレクトリに書き出す（meta.json を最後に置き換えるので、読み手は古いか新しいかのどちらかを見る）"""
+        if self.deleted > len(self.ids) * _COMPACT_RATIO:
+            self.compact()
+        self.path.mkdir(parents=True, exist_ok=True)
+        count = len(self.ids)
+        self._write_array("vectors.npy", self.vectors, count)
+        self._write_array("lists.npy", self.lists, count)
+        np.save(self.path / "centroids.npy", self.centroids)
+        meta = {
+            **self.meta,
+            "rows": count,
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "ids": self.ids,
+            "hashes": self.hashes,
+            "payloads": self.payloads,
+            "clients": self.clients,
+        }
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path / "meta.json")
+
+    def _write_array(self, name: str, rows: np.ndarray, count: int) -> None:
+        target = self.path / name
+        existing = getattr(self, "_capacity_" + name.split(".")[0], None)
+        if isinstance(existing, np.memmap) and existing.mode == "r+" and len(existing) >= count \
+                and Path(existing.filename).resolve() == target.resolve():
+            existing.flush()  # 同じファイルに書き足した分（_append が書き込み済み）
+            return
+        # 容量を倍に広げた新しいファイルに書いて置き換える（読み手は古いファイルを開いたまま読める）
+        capacity = max(count * 2, 1024)
+        tmp = self.path / (name + ".tmp")
+        array = np.lib.format.open_memmap(tmp, mode="w+", dtype=rows.dtype, shape=(capacity,) + rows.shape[1:])
+        array[:count] = rows[:count]
+        if rows.dtype == np.int32:
+            array[count:] = -1
+        array.flush()
+        del array
+        os.replace(tmp, target)
+        reopened = np.load(target, mmap_mode="r+")
+        setattr(self, "_capacity_" + name.split(".")[0], reopened)
+        if name == "vectors.npy":
+            self.vectors = reopened[:count]
+        else:
+            self.lists = reopened[:count]
+
+    # -------------------------------------------------------------------------
+    # 追加・削除
+    # -------------------------------------------------------------------------
+
+    def add(
+        self,
+        ids: list[str],
+        vectors,
+        payloads: Optional[list[dict]] = None,
+        hashes: Optional[list] = None,
+        clients: Optional[list[list[str]]] = None,
+    ) -> int:
+        """行を追加する（同じ elementId の行があれば置き換える）。追加した行数を返す"""
+        self.remove([element_id for element_id in ids if element_id in self._rows])
+        return self._append(ids, to_matrix(vectors, self.meta["dimensions"]), payloads, hashes, clients)
+
+    def _append(self, ids, matrix, payloads, hashes, clients) -> int:
+        if len(ids) != len(matrix):
+            raise ValueError(f"elementId とベクトルの件数が一致しません: {len(ids)} vs {len(matrix)}")
+        if len(matrix) == 0:
+            return 0
+        if matrix.shape[1] != self.meta["dimensions"]:
+            raise ValueError(f"ベクトル次元が不一致: {matrix.shape[1]} vs {self.meta['dimensions']}")
+        start = len(self.ids)
+        assign = top_k(matrix, self.centroids, 1)[0][:, 0].astype(np.int32)
+
+        capacity_vectors = getattr(self, "_capacity_vectors", None)
+        capacity_lists = getattr(self, "_capacity_lists", None)
+        end = start + len(matrix)
+        if capacity_vectors is not None and capacity_vectors.mode == "r+" and len(capacity_vectors) >= end:
+            # メモリマップの空き行に書く
+            capacity_vectors[start:end] = matrix
+            capacity_lists[start:end] = assign
+            self.vectors, self.lists = capacity_vectors[:end], capacity_lists[:end]
+        else:
+            self.vectors = np.concatenate([np.asarray(self.vectors), matrix])
+            self.lists = np.concatenate([np.asarray(self.lists), assign])
+            self._capacity_vectors = self._capacity_lists = None
+
+        for offset, element_id in enumerate(ids):
+            self._rows[element_id] = start + offset
+        names = clients or [[] for _ in ids]
+        for offset, client_names in enumerate(names):
+            for name in client_names or ():
+                self._client_rows.setdefault(name, []).append(start + offset)
+        self.ids.extend(ids)
+        self.hashes.extend(hashes or [None] * len(ids))
+        self.payloads.extend(payloads or [{} for _ in ids])
+        self.clients.extend(names)
+        self._inverted = None
+        return len(ids)
+
+    def remove(self, ids: Iterable[str]) -> int:
+        """行を削除済みにする。削除した行数を返す"""
+        removed = 0
+        for element_id in ids:
+            row = self._rows.pop(element_id, None)
+            if row is None:
+                continue
+            if not isinstance(self.lists, np.memmap) or self.lists.mode == "r+":
+                self.lists[row] = -1
+            else:
+                self.lists = np.array(self.lists)
+                self.lists[row] = -1
+                self._capacity_lists = None
+            for name in self.clients[row] or ():
+                self._client_rows[name].remove(row)
+            self.ids[row] = self.hashes[row] = self.payloads[row] = self.clients[row] = None
+            removed += 1
+        if removed:
+            self._inverted = None
+        return removed
+
+    def compact(self) -> None:
+        """削除済みの行を詰める（行番号が変わる）"""
+        alive = np.flatnonzero(np.asarray(self.lists) >= 0)
+        vectors = np.array(self.vectors[alive])
+        lists = np.array(self.lists[alive])
+        meta = {
+            **self.meta,
+            "ids": [self.ids[r] for r in alive],
+            "hashes": [self.hashes[r] for r in alive],
+            "payloads": [self.payloads[r] for r in alive],
+            "clients": [self.clients[r] for r in alive],
+        }
+        self.__init__(self.path, self.centroids, vectors, lists, meta)
+        self._capacity_vectors = self._capacity_lists = None
+
+    # -------------------------------------------------------------------------
+    # 検索
+    # -------------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def deleted(self) -> int:
+        return len(self.ids) - len(self._rows)
+
+    def __contains__(self, element_id: str) -> bool:
+        return element_id in self._rows
+
+    def _lists_order(self) -> tuple[np.ndarray, np.ndarray]:
+        """転置リスト（リスト番号順に並べた行番号と、リストごとの境界）"""
+        if self._inverted is None:
+            lists = np.asarray(self.lists)
+            order = np.argsort(lists, kind="stable")
+            bounds = np.searchsorted(lists[order], np.arange(len(self.centroids) + 1))
+            self._inverted = (order, bounds)
+        return self._inverted
+
+    def search(
+        self, query, k: int = 10, nprobe: int = DEFAULT_NPROBE, client: Optional[str] = None,
+    ) -> list[tuple[str, float, dict]]:
+        """
+        クエリに近い行を (elementId, 類似度, payload) の類似度の降順で最大 k 件返す
+
+        client を渡すと、そのクライアントに紐づく行だけを正確に比べる。
+        """
+        q = to_matrix([query], self.meta["dimensions"])
+        if q.shape[1] != self.meta["dimensions"]:
+            raise ValueError(f"ベクトル次元が不一致: {q.shape[1]} vs {self.meta['dimensions']}")
+        if client is not None:
+            rows = np.array(self._client_rows.get(client, []), dtype=np.int64)
+        else:
+            probe = top_k(q, self.centroids, nprobe)[0][0]
+            order, bounds = self._lists_order()
+            rows = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probe]) if len(probe) else order[:0]
+        if rows.size == 0:
+            return []
+        sims = np.asarray(self.vectors[rows]) @ q[0]
+        if len(rows) > k:
+            keep = np.argpartition(-sims, k - 1)[:k]
+            rows, sims = rows[keep], sims[keep]
+        order = np.argsort(-sims, kind="stable")
+        return [(self.ids[rows[i]], float(sims[i]), self.payloads[rows[i]]) for i in order]
+
+    def vector(self, element_id: str) -> Optional[np.ndarray]:
+        row = self._rows.get(element_id)
+        return None if row is None else np.array(self.vectors[row])
+
+    def clients_of(self, element_id: str) -> list[str]:
+        row = self._rows.get(element_id)
+        return [] if row is None else list(self.clients[row] or [])
+
+    def find(self, key: str, value) -> Optional[str]:
+        """payload[key] が value の行の elementId（Client の name からの引き当てなど）"""
+        for row in self._rows.values():
+            if self.payloads[row].get(key) == value:
+                return self.ids[row]
+        return None
+
+    def rows(self, client: Optional[str] = None) -> tuple[list[str], list[dict], np.ndarray]:
+        """生きている行（client を渡すとそのクライアントの行）の elementId・payload・正規化済みベクトル"""
+        rows = sorted(self._client_rows.get(client, [])) if client is not None else sorted(self._rows.values())
+        return (
+            [self.ids[r] for r in rows],
+            [self.payloads[r] for r in rows],
+            np.array(self.vectors[np.array(rows, dtype=np.int64)]) if rows else np.zeros(
+                (0, self.meta["dimensions"]), dtype=np.float32),
+        )
+
+
+# =============================================================================
+# 索引の置き場所とプロセス内のキャッシュ
+# =============================================================================
+
+def index_dir() -> Path:
+    return Path(os.getenv("ANN_INDEX_DIR", str(DEFAULT_INDEX_DIR))).expanduser()
+
+
+_open_indexes: dict[str, tuple[float, IVFIndex]] = {}
+_open_lock = threading.Lock()
+
+
+def get_local_index(name: str) -> Optional[IVFIndex]:
+    """
+    ANN_INDEX_DIR/<name> の索引を読み取り専用で開く（ない場合は None）
+
+    開いた索引はプロセス内で使い回し、meta.json が書き換えられていたら開き直す。
+    name は世代ごとのインデックス名（support_log_embedding_v2 など）。
+    """
+    path = index_dir() / name
+    try:
+        mtime = (path / "meta.json").stat().st_mtime
+    except FileNotFoundError:
+        return None
+    with _open_lock:
+        cached = _open_indexes.get(name)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, IVFIndex.open(path))
+            _open_indexes[name] = cached
+        return cached[1]
+
+
+# 索引を作った現行の世代（ANN_INDEX_DIR/generation.json）。Neo4j に繋がらないときの検索はこの世代で行う
+GENERATION_FILE = "generation.json"
+
+
+def save_local_generation(generation, directory: str | Path | None = None) -> None:
+    """現行の世代の版・モデル・次元数を索引の置き場所に書く（sync_index が現行の世代を同期したとき）"""
+    root = Path(directory).expanduser() if directory else index_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = root / f"{GENERATION_FILE}.tmp"
+    tmp.write_text(json.dumps({
+        "version": generation.version,
+        "model": generation.model,
+        "dimensions": generation.dimensions,
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, root / GENERATION_FILE)
+
+
+def load_local_generation(directory: str | Path | None = None):
+    """save_local_generation で書いた世代（EmbeddingGeneration。ない場合は None）"""
+    from lib.embedding_generations import EmbeddingGeneration
+
+    root = Path(directory).expanduser() if directory else index_dir()
+    try:
+        data = json.loads((root / GENERATION_FILE).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    return EmbeddingGeneration(int(data["version"]), data["model"], int(data["dimensions"]))
+
+
+# =============================================================================
+# Neo4j からの書き出し・同期
+# =============================================================================
+
+# インデックスごとに、クライアント（clients）と表示用の属性（payload）を集める句。
+# payload は lib.embedding の検索関数が Neo4j の検索結果と同じ列を作るのに使う
+EXPORT_SPECS = {
+    "support_log_embedding": (
+        """
+        OPTIONAL MATCH (s:Supporter)-[:LOGGED]->(n)
+        OPTIONAL MATCH (n)-[:ABOUT]->(c:Client)
+        WITH n, head(collect(DISTINCT s.name)) AS supporter, collect(DISTINCT c.name) AS clients
+        """,
+        "{date: toString(n.date), supporter: supporter, situation: n.situation, action: n.action,"
+        " effectiveness: n.effectiveness, note: n.note}",
+    ),
+    "ng_action_embedding": (
+        """
+        OPTIONAL MATCH (c:Client)-[:MUST_AVOID]->(n)
+        WITH n, collect(DISTINCT c.name) AS clients
+        """,
+        "{action: n.action, reason: n.reason, riskLevel: n.riskLevel}",
+    ),
+    "care_preference_embedding": (
+        """
+        OPTIONAL MATCH (c:Client)-[:REQUIRES]->(n)
+        WITH n, collect(DISTINCT c.name) AS clients
+        """,
+        "{category: n.category, instruction: n.instruction, priority: n.priority}",
+    ),
+    "client_summary_embedding": (
+        """
+        OPTIONAL MATCH (n)-[:HAS_CONDITION]->(con:Condition)
+        WITH n, [n.name] AS clients, collect(DISTINCT con.name) AS conditions
+        """,
+        "{name: n.name, dob: toString(n.dob), conditions: conditions}",
+    ),
+    "meeting_record_embedding": (
+        """
+        OPTIONAL MATCH (s:Supporter)-[:RECORDED]->(n)
+        OPTIONAL MATCH (n)-[:ABOUT]->(c:Client)
+        WITH n, head(collect(DISTINCT s.name)) AS supporter, collect(DISTINCT c.name) AS clients
+        """,
+        "{date: toString(n.date), title: n.title, duration: n.duration, filePath: n.filePath,"
+        " supporter: supporter, note: n.note, transcript: left(n.transcript, 100)}",
+    ),
+}
+EXPORT_SPECS["meeting_record_text_embedding"] = EXPORT_SPECS["meeting_record_embedding"]
+
+
+def _export_queries(base_index: str) -> tuple[str, str]:
+    from lib.embedding import VECTOR_INDEXES
+
+    label = VECTOR_INDEXES[base_index]["label"]
+    collect_clause, payload = EXPORT_SPECS[base_index]
+    ids_query = f"MATCH (n:{label}) WHERE n[$vp] IS NOT NULL RETURN elementId(n) AS id, n[$hp] AS hash"
+    rows_query = f"""
+        MATCH (n:{label}) WHERE n[$vp] IS NOT NULL AND ($ids IS NULL OR elementId(n) IN $ids)
+        {collect_clause}
+        RETURN elementId(n) AS id, n[$vp] AS vector, n[$hp] AS hash, {payload} AS payload,
+               [name IN clients WHERE name IS NOT NULL] AS clients
+    """
+    return ids_query, rows_query
+
+
+def sync_index(
+    base_index: str,
+    generation=None,
+    rebuild: bool = False,
+    nlist: Optional[int] = None,
+    directory: str | Path | None = None,
+    run_query=None,
+    iter_query=None,
+    chunk_size: int = 1000,
+) -> dict:
+    """
+    Neo4j のベクトルからローカル索引を作る・差分で更新する
+
+    索引がなければ（または rebuild=True、モデル・次元数が変わったとき）全件を書き出して作る。
+    あれば elementId とテキストのハッシュだけを読み、新しい・ハッシュが変わったノードを追加し、
+    Neo4j から消えた（ベクトルがなくなった）ノードを削除する。
+    現行の世代の索引なら、その世代を generation.json に書く（Neo4j なしの検索で使う世代）。
+
+    Returns:
+        {"index": 索引名, "mode": "build" / "update", "added": int, "removed": int, "total": int}
+    """
+    from lib.embedding_generations import get_generation_state
+    from lib.embedding_texts import hash_property
+
+    if run_query is None or iter_query is None:
+        from lib import db_new_operations
+        run_query = run_query or db_new_operations.run_query
+        iter_query = iter_query or db_new_operations.iter_query
+
+    from lib.embedding import VECTOR_INDEXES
+
+    active = get_generation_state().active
+    generation = generation or active
+    if generation == active:
+        save_local_generation(generation, directory)
+    name = generation.index_for(base_index)
+    path = Path(directory).expanduser() / name if directory else index_dir() / name
+    vector_prop = generation.property_for(VECTOR_INDEXES[base_index]["property"])
+    params = {"vp": vector_prop, "hp": hash_property(vector_prop)}
+    ids_query, rows_query = _export_queries(base_index)
+
+    index = None
+    if not rebuild and (path / "meta.json").exists():
+        index = IVFIndex.open(path, writable=True)
+        if (index.meta.get("model"), index.meta.get("dimensions")) != (generation.model, generation.dimensions):
+            _log(f"{name}: モデル・次元数が変わったため作り直します", "WARN")
+            index = None
+
+    if index is None:
+        ids, vectors, payloads, hashes, clients = [], [], [], [], []
+        for row in iter_query(rows_query, {**params, "ids": None}):
+            ids.append(row["id"])
+            vectors.append(np.asarray(row["vector"], dtype=np.float32))
+            payloads.append(row["payload"])
+            hashes.append(row["hash"])
+            clients.append(row["clients"])
+        if not ids:
+            _log(f"{name}: ベクトルを持つノードがないため索引を作りません", "WARN")
+            return {"index": name, "mode": "build", "added": 0, "removed": 0, "total": 0}
+        index = IVFIndex.build(
+            path, ids, vectors, payloads, hashes, clients, nlist=nlist,
+            model=generation.model, version=generation.version, index=name,
+        )
+        index.save()
+        _log(f"{name}: {len(index)} 件で索引を作りました（リスト {len(index.centroids)} 個）")
+        return {"index": name, "mode": "build", "added": len(index), "removed": 0, "total": len(index)}
+
+    current = {row["id"]: row["hash"] for row in iter_query(ids_query, params)}
+    gone = [element_id for element_id in list(index._rows) if element_id not in current]
+    changed = [
+        element_id for element_id, digest in current.items()
+        if element_id not in index or index.hashes[index._rows[element_id]] != digest
+    ]
+    removed = index.remove(gone)
+    added = 0
+    for start in range(0, len(changed), chunk_size):
+        rows = run_query(rows_query, {**params, "ids": changed[start:start + chunk_size]})
+        added += index.add(
+            [row["id"] for row in rows],
+            [row["vector"] for row in rows],
+            [row["payload"] for row in rows],
+            [row["hash"] for row in rows],
+            [row["clients"] for row in rows],
+        )
+    if added or removed:
+        index.save()
+    _log(f"{name}: 追加・更新 {added} 件、削除 {removed} 件（計 {len(index)} 件）")
+    return {"index": name, "mode": "update", "added": added, "removed": removed, "total": len(index)}
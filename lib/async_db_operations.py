@@ -0,0 +1,308 @@
+"""
+親なき後支援データベース - 非同期データベース操作モジュール
+
+FastAPI の async エンドポイント（field-ui / SOS API）から使う、
+lib.db_new_operations の非同期版。
+
+- neo4j.AsyncGraphDatabase のドライバーをプロセス内で共有（コネクションプールのサイズは環境変数で調整）
+- クエリ・検索手順・登録計画は同期版と共有し、Cypher を二重管理しない
+- 同期版の run_query を async 関数から呼ぶとイベントループ全体が止まるため、
+  サーバー側ではこちらを使う
+
+コネクションプール・リトライの設定は lib.db_runtime の環境変数を参照。
+"""
+
+import asyncio
+import os
+import sys
+from typing import Optional
+
+from dotenv import load_dotenv
+from neo4j import AsyncGraphDatabase
+
+from lib.db_runtime import (
+    DatabaseAccessError,
+    async_execute_query,
+    async_execute_transaction,
+    driver_config_from_env,
+)
+from lib.client_card import MATERIALIZED_CARD_QUERY, async_fetch_materialized_card, async_materialize_card
+from lib.client_index import get_client_index
+from lib.deadline import DeadlineExceeded, stage, without_deadline
+from lib.query_cache import async_cached_query, invalidate_client
+from lib.support_log_chain import async_update_support_log_chain, support_log_ids
+from lib.db_new_operations import (
+    CLIENT_DETAIL_SECTIONS,
+    MERGE_KEYS,
+    _attach_embeddings,
+    _audit_entry,
+    _format_client_detail,
+    _resolve_client_steps,
+    _try_attach_client_summary_embedding,
+)
+
+load_dotenv()
+
+
+def log(message: str, level: str = "INFO"):
+    """ログ出力（標準エラー出力）"""
+    sys.stderr.write(f"[AsyncDB:{level}] {message}\n")
+    sys.stderr.flush()
+
+
+# --- Neo4j 接続 ---
+_async_driver = None
+_driver_lock = asyncio.Lock()
+
+
+async def get_async_driver():
+    """非同期 Neo4j ドライバーを取得（シングルトン）"""
+    global _async_driver
+    if _async_driver is not None:
+        return _async_driver
+
+    async with _driver_lock:
+        if _async_driver is None:
+            uri = os.getenv("NEO4J_URI")
+            user = os.getenv("NEO4J_USERNAME")
+            pwd = os.getenv("NEO4J_PASSWORD", "")
+            if not uri or not user:
+                log("NEO4J_URI または NEO4J_USERNAME が未設定です", "ERROR")
+                return None
+            config = driver_config_from_env()
+            driver = AsyncGraphDatabase.driver(uri, auth=(user, pwd), **config)
+            try:
+                await driver.verify_connectivity()
+                log(f"Neo4j接続成功 (async, pool={config['max_connection_pool_size']}): {uri}")
+            except Exception as e:
+                log(f"Neo4j接続失敗: {e}", "ERROR")
+                await driver.close()
+                return None
+            _async_driver = driver
+    return _async_driver
+
+
+async def close_async_driver():
+    """ドライバーを閉じる（FastAPI の shutdown / lifespan から呼ぶ）"""
+    global _async_driver
+    if _async_driver is not None:
+        await _async_driver.close()
+        _async_driver = None
+
+
+async def async_run_query(query, params=None, write: bool | None = None) -> list[dict]:
+    """
+    Cypherクエリ実行ヘルパー（run_query の非同期版）。
+    失敗時は DatabaseAccessError のサブクラスを送出する。
+    """
+    try:
+        return await async_execute_query(await get_async_driver(), query, params, write=write)
+    except DatabaseAccessError as e:
+        log(str(e), "ERROR")
+        raise
+
+
+async def async_run_in_transaction(work, write: bool = True):
+    """
+    管理トランザクション内で await work(tx) を実行する（run_in_transaction の非同期版）。
+    失敗時はロールバックした上で例外を送出する。
+    """
+    try:
+        return await async_execute_transaction(await get_async_driver(), work, write=write)
+    except DatabaseAccessError as e:
+        log(str(e), "ERROR")
+        raise
+
+
+# =============================================================================
+# 取得系
+# =============================================================================
+
+async def async_resolve_client(
+    identifier: str, use_cache: bool = True, use_index: bool = True
+) -> Optional[dict]:
+    """
+    様々な識別子からクライアント情報を解決（resolve_client の非同期版）
+
+    Args:
+        use_cache: False ならクエリ結果キャッシュを使わない（SOS など安全性が重要な読み取り用）
+        use_index: False ならインメモリの識別子索引を使わない
+    """
+    include_partial = True
+    if use_index:
+        index = get_client_index()
+        try:
+            await index.async_ensure_fresh(async_run_query)
+            found = index.lookup(identifier)
+            if found:
+                return found
+            include_partial = False
+        except DatabaseAccessError as e:
+            log(f"クライアント索引を利用できないためクエリで解決します: {e}", "WARN")
+
+    for query, params in _resolve_client_steps(identifier, include_partial=include_partial):
+        result = await async_cached_query(
+            query, params, lambda: async_run_query(query, params), use_cache=use_cache
+        )
+        if result:
+            return result[0]
+    return None
+
+
+async def async_get_display_name(identifier: str, fallback: str = "不明", use_cache: bool = True) -> str:
+    """識別子から表示用の名前を取得"""
+    client = await async_resolve_client(identifier, use_cache=use_cache)
+    if client:
+        return client.get('name') or client.get('displayCode') or fallback
+    return fallback
+
+
+async def async_get_client_detail(client_name: str, use_cache: bool = True) -> dict:
+    """クライアント詳細情報を取得（get_client_detail の非同期版。マテリアライズドカードを優先し、禁忌事項・キーパーソンはライブ）"""
+    params = {"name": client_name, "sections": list(CLIENT_DETAIL_SECTIONS)}
+    try:
+        card = await async_cached_query(
+            MATERIALIZED_CARD_QUERY, params,
+            lambda: async_fetch_materialized_card(async_run_query, client_name, CLIENT_DETAIL_SECTIONS),
+            client=client_name, use_cache=use_cache,
+        )
+    except Exception as e:
+        log(f"クライアント詳細取得エラー ({client_name}): {e}", "WARN")
+        card = None
+    return _format_client_detail(card)
+
+
+# =============================================================================
+# 登録系
+# =============================================================================
+
+async def async_refresh_client_card(client_name: Optional[str]) -> Optional[dict]:
+    """refresh_client_card の非同期版（ベストエフォート）"""
+    if not client_name or client_name == "Unknown":
+        return None
+    try:
+        with without_deadline():  # コミット済みの登録の後始末なので、リクエストの予算切れで打ち切らない
+            return await async_run_in_transaction(lambda tx: async_materialize_card(tx, client_name))
+    except DatabaseAccessError as e:
+        log(f"クライアントカード更新エラー ({client_name}): {e}", "WARN")
+        return None
+
+
+async def async_register_to_database(extracted_graph: dict, user_name: str = "system") -> dict:
+    """
+    register_to_database の非同期版（1 トランザクション・UNWIND 一括登録）。
+
+    ノード・リレーション・監査ログの書き込みと時系列チェーンへの差し込みは非同期ドライバーの
+    1 トランザクションで行い、事後処理（Embedding 付与）は Gemini API 呼び出しを含むため
+    同期版の関数をワーカースレッドで実行する。
+
+    グラフの書き込みトランザクションだけがリクエストのデッドラインに従う（超えればロールバックして
+    DeadlineExceeded）。コミット後の後始末は打ち切らず、後回しにした処理は Deadline.deferred に残る。
+
+    Returns:
+        {"status", "client_name", "registered_count", "registered_types"}
+    """
+    if 'client' in extracted_graph and 'nodes' not in extracted_graph:
+        log("旧形式(ツリー型)のデータが渡されました。エラーを防ぐため登録をスキップします。", "WARN")
+        return {"status": "error", "message": "旧形式のJSON構造はサポートされていません。"}
+
+    def audit_entry(node: dict, client_name: str) -> Optional[dict]:
+        return _audit_entry(node["label"], node["properties"], node["action"], user_name, client_name)
+
+    result = await _async_register_graph(extracted_graph, "skip", audit_entry)
+    if result["status"] != "success":
+        return result
+    return {
+        "status": "success",
+        "client_name": result["client_name"],
+        "registered_count": len(result["registered"]),
+        "registered_types": list(set(result["registered"])),
+    }
+
+
+async def async_register_to_database_compat(extracted_graph: dict, user_name: str = "system") -> dict:
+    """
+    lib.db_operations.register_to_database（一括登録）と同じ契約の非同期版。
+
+    field-ui の登録 API は同期版の lib.db_operations を使っていたため、同じ結果になるようにする。
+    - MERGE キーが欠けたノードもスキップせずに作成する
+    - 監査ログの形式は lib.db_operations._audit_entry（SupportLog は感情・トリガー、文脈）
+    - 戻り値は {"status", "client_name", "count", "types"}
+    書き込み・事後処理・デッドラインの扱いは async_register_to_database と同じ。
+    """
+    if 'nodes' not in extracted_graph:
+        log("無効なグラフ形式です。'nodes' キーが必要です。", "ERROR")
+        return {"status": "error", "message": "Invalid graph format"}
+
+    from lib.db_operations import _audit_entry as compat_audit_entry
+
+    def audit_entry(node: dict, client_name: str) -> Optional[dict]:
+        return compat_audit_entry(user_name, node["label"], node["properties"], node["action"], client_name)
+
+    result = await _async_register_graph(extracted_graph, "create", audit_entry)
+    if result["status"] != "success":
+        return result
+    return {
+        "status": "success",
+        "client_name": result["client_name"],
+        "count": len(result["registered"]),
+        "types": list(set(result["registered"])),
+    }
+
+
+async def _async_register_graph(extracted_graph: dict, missing_merge_key: str, audit_entry) -> dict:
+    """
+    検証済みのグラフを 1 トランザクションで登録し、コミット後の事後処理まで行う。
+
+    Returns:
+        {"status": "success", "client_name", "registered": 登録したノードのラベルのリスト}
+        または {"status": "error", "message"}
+    """
+    from lib.graph_writer import execute_graph_write_async, plan_graph_write
+    from lib.schema_validator import validate_and_normalize_graph
+
+    extracted_graph, validation_warnings = validate_and_normalize_graph(extracted_graph)
+    if validation_warnings:
+        log(f"スキーマ検証警告 ({len(validation_warnings)}件): {'; '.join(validation_warnings[:3])}", "WARN")
+
+    plan = plan_graph_write(extracted_graph, MERGE_KEYS, missing_merge_key=missing_merge_key)
+    for warning in plan.warnings:
+        log(warning, "WARN")
+    client_name = plan.client_name
+
+    async def chain_support_logs(tx, written) -> None:
+        # 新しい SupportLog は登録と同じトランザクションで時系列チェーンに差し込む（同期版の _chain_support_logs と同じ）
+        if client_name == "Unknown" or not any(n["label"] == "SupportLog" for n in written.registered):
+            return
+        await async_update_support_log_chain(
+            tx, [client_name], support_log_ids(extracted_graph.get("nodes", []), written.temp_id_map)
+        )
+
+    try:
+        with stage("register"):
+            result = await async_run_in_transaction(
+                lambda tx: execute_graph_write_async(
+                    tx, plan, lambda node: audit_entry(node, client_name), chain_support_logs,
+                )
+            )
+    except DeadlineExceeded:
+        # 予算切れで打ち切ったトランザクションはロールバック済み。どの段階かは呼び出し側で報告する
+        raise
+    except Exception as e:
+        log(f"バッチ登録エラー（トランザクションはロールバック済み）: {e}", "ERROR")
+        return {"status": "error", "message": f"登録に失敗しました: {e}"}
+
+    # ここから先はコミット済み。カード更新はデッドラインの外で行い、
+    # Embedding 付与は残り時間がなければ後回しにする（予算切れでも成功として返す）
+    registered_items = [n["label"] for n in result.registered]
+    await async_refresh_client_card(client_name)
+    invalidate_client(client_name if client_name != "Unknown" else None)
+
+    # 事後処理（ブロッキング処理はワーカースレッドへ）
+    await asyncio.to_thread(
+        _attach_embeddings, result.temp_id_map, extracted_graph.get("nodes", []), registered_items
+    )
+    await asyncio.to_thread(_try_attach_client_summary_embedding, registered_items, client_name)
+
+    log(f"汎用グラフ登録完了 (async): {client_name} - 項目数: {len(registered_items)}")
+    return {"status": "success", "client_name": client_name, "registered": registered_items}
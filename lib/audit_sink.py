@@ -0,0 +1,236 @@
+"""
+監査ログ（AuditLog）のバッファリング書き込み
+
+create_audit_log() は登録したノードごとに呼ばれ、1 件ずつ CREATE + Client 検索の
+往復が発生していた。AuditSink はエントリをメモリに溜め、
+max_batch 件たまるか flush_interval_ms 経過したらバックグラウンドスレッドから
+UNWIND 1 文（lib/graph_writer.py AUDIT_LOG_BATCH_QUERY）でまとめて書き込む。
+
+- 記録時刻はキュー投入時に付与するため、書き込みが遅れても timestamp は変わらない
+- キューが max_queue 件を超えたエントリは破棄し、dropped として数える
+- 書き込みに失敗したバッチはキューの先頭に戻し、次回の flush で再試行する
+- プロセス終了時（atexit）と close() で残りをすべて書き込む
+- 一括登録（graph_writer.execute_graph_write）の監査ログはデータと同じトランザクションで
+  書き込まれるため、このシンクは通らない
+
+環境変数:
+  AUDIT_SINK_ENABLED            "false" で無効化し、1 件ずつ同期で書き込む（デフォルト: true）
+  AUDIT_SINK_MAX_BATCH          1 回の書き込みの最大件数（デフォルト: 100）
+  AUDIT_SINK_FLUSH_INTERVAL_MS  最大の待ち時間・ミリ秒（デフォルト: 200）
+  AUDIT_SINK_MAX_QUEUE          キューの上限件数（デフォルト: 10000）
+"""
+
+import atexit
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+
+def _log(message: str, level: str = "INFO"):
+    sys.stderr.write(f"[AuditSink:{level}] {message}\n")
+    sys.stderr.flush()
+
+
+class AuditSink:
+    """監査ログエントリのバッファ（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        writer: Callable[[list[dict]], None],
+        max_batch: int = 100,
+        flush_interval_ms: float = 200.0,
+        max_queue: int = 10000,
+        enabled: bool = True,
+    ):
+        """
+        Args:
+            writer: エントリのリストを 1 トランザクションで書き込む関数。失敗時は例外を送出する
+            max_batch: 1 回の書き込みの最大件数
+            flush_interval_ms: エントリがキューに入ってから書き込むまでの最大待ち時間
+            max_queue: キューの上限件数（超えた分は破棄）
+            enabled: False なら submit() のたびに同期で書き込む
+        """
+        self.writer = writer
+        self.max_batch = max_batch
+        self.flush_interval_ms = flush_interval_ms
+        self.max_queue = max_queue
+        self.enabled = enabled
+        self._queue: deque[dict] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._submitted = 0
+        self._written = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._failures = 0
+        self._flush_ms_total = 0.0
+        self._flush_ms_max = 0.0
+        self._flush_ms_last = 0.0
+
+    # --- 投入 ---
+
+    def submit(self, entry: dict) -> dict:
+        """
+        エントリをキューに入れる（{user, action, targetType, targetName, details, clientName}）。
+
+        Returns:
+            記録時刻を付与したエントリ
+        """
+        entry = {**entry, "timestamp": entry.get("timestamp") or datetime.now(timezone.utc)}
+        if not self.enabled or self._closed:
+            self.writer([entry])
+            with self._lock:
+                self._submitted += 1
+                self._written += 1
+            return entry
+
+        with self._lock:
+            self._submitted += 1
+            if len(self._queue) >= self.max_queue:
+                self._dropped += 1
+                if self._dropped == 1 or self._dropped % 1000 == 0:
+                    _log(f"キューが上限 ({self.max_queue} 件) に達したため破棄 (累計 {self._dropped} 件)", "WARN")
+                return entry
+            self._queue.append(entry)
+            if len(self._queue) >= self.max_batch:
+                self._wakeup.notify()
+        self._ensure_thread()
+        return entry
+
+    # --- 書き込み ---
+
+    def flush(self) -> int:
+        """キューが空になるまで同期で書き込み、書き込んだ件数を返す"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+                if not batch:
+                    return written
+                if not self._write(batch):
+                    return written
+                written += len(batch)
+
+    def _write(self, batch: list[dict]) -> bool:
+        started = time.perf_counter()
+        try:
+            self.writer(batch)
+        except Exception as e:
+            with self._lock:
+                self._failures += 1
+                # 先頭に戻して次回再試行（上限を超えた分は破棄）
+                room = max(self.max_queue - len(self._queue), 0)
+                self._dropped += len(batch) - min(room, len(batch))
+                self._queue.extendleft(reversed(batch[:room]))
+            _log(f"監査ログ {len(batch)} 件の書き込みに失敗（再試行します）: {e}", "WARN")
+            return False
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._written += len(batch)
+            self._flushes += 1
+            self._flush_ms_total += elapsed
+            self._flush_ms_max = max(self._flush_ms_max, elapsed)
+            self._flush_ms_last = elapsed
+        return True
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None or self._closed:
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self) -> None:
+        interval = self.flush_interval_ms / 1000
+        while True:
+            with self._lock:
+                if not self._closed and len(self._queue) < self.max_batch:
+                    self._wakeup.wait(interval)
+                if self._closed:
+                    return
+            self.flush()
+            if self.pending() >= self.max_batch:
+                # 書き込み失敗で戻ったエントリは間隔を空けて再試行
+                time.sleep(interval)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """バックグラウンドスレッドを止め、残りのエントリを書き込む"""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            self.flush()
+            if self.pending():
+                time.sleep(min(self.flush_interval_ms / 1000, 0.5))
+        if self.pending():
+            _log(f"終了時に監査ログ {self.pending()} 件を書き込めませんでした", "ERROR")
+
+    # --- 統計 ---
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "queue_depth": len(self._queue),
+                "max_queue": self.max_queue,
+                "submitted": self._submitted,
+                "written": self._written,
+                "dropped": self._dropped,
+                "flushes": self._flushes,
+                "failures": self._failures,
+                "flush_ms_last": round(self._flush_ms_last, 2),
+                "flush_ms_avg": round(self._flush_ms_total / self._flushes, 2) if self._flushes else 0.0,
+                "flush_ms_max": round(self._flush_ms_max, 2),
+            }
+
+
+# =============================================================================
+# プロセス共有のインスタンス
+# =============================================================================
+
+def _write_audit_entries(entries: list[dict]) -> None:
+    from lib.db_new_operations import run_query
+    from lib.graph_writer import AUDIT_LOG_BATCH_QUERY
+
+    run_query(AUDIT_LOG_BATCH_QUERY, {"entries": entries}, write=True)
+
+
+_sink = AuditSink(
+    _write_audit_entries,
+    max_batch=int(os.getenv("AUDIT_SINK_MAX_BATCH", "100")),
+    flush_interval_ms=float(os.getenv("AUDIT_SINK_FLUSH_INTERVAL_MS", "200")),
+    max_queue=int(os.getenv("AUDIT_SINK_MAX_QUEUE", "10000")),
+    enabled=os.getenv("AUDIT_SINK_ENABLED", "true").lower() == "true",
+)
+
+
+def get_audit_sink() -> AuditSink:
+    return _sink
+
+
+def flush_audit_logs() -> int:
+    """未書き込みの監査ログを書き込む（監査ログを読む前・終了時に呼ぶ）"""
+    return _sink.flush()
+
+
+def get_audit_sink_stats() -> dict:
+    return _sink.stats()
@@ -0,0 +1,436 @@
+"""
+再開可能な Embedding バックフィル（キーセットのカーソルとチェックポイント）
+
+以前の scripts/backfill_embeddings.py は `WHERE n.embedding IS NULL LIMIT $batch_size` を
+毎回先頭から実行していた。テキストが空のノードや埋め込みに失敗し続けるノードは
+embedding が付かないまま次のバッチにも現れるため、ループが終わらなかった。
+途中で落ちると、どこまで進んだかも分からなかった。
+
+- 範囲ごとに未付与のノードの elementId を 1 回の走査で順に読み出し（iter_query でストリーミング）、
+  batch_size 件ずつ elementId を指定して（ID シーク）行を取り寄せて処理する。
+  失敗したノードもカーソルが通り過ぎるので、同じ実行の中で再び取得しない
+- バッチごとにチェックポイント（JSON）をアトミックに保存する。落ちた後はカーソルの位置から再開する
+- テキストが空・埋め込みに失敗したノードはチェックポイントに記録して飛ばす
+- workers > 1 なら elementId の範囲を重ならないように分け、範囲ごとに並行して進める
+  （Gemini の流量制限はプロセス共有のディスパッチャーが受け持つ）
+- 進捗に処理速度と残り時間の見込み（ETA）を出す
+
+書き込み（write_vectors）の失敗は DB 側の障害とみなしてカーソルを進めずに送出する。
+そのバッチは再開時にもう一度処理される。
+
+計算量: 対象ラベルの走査と並べ替えは範囲ごとに 1 回（再開時は残りの範囲について 1 回）で、
+バッチごとの取り寄せは ID シーク（全体で O(n log n)。以前のようにページごとにラベル全体を走査しない）。
+読み出した elementId は範囲の分だけメモリに持つ。埋め込み（Gemini の呼び出し）の間も読み取りの
+ストリームを開いたままにすると、接続とバッチレーンの枠を長時間ふさぐため、ID だけを先に読み切る。
+
+stale=True の BackfillSpec は、付与済みのノードを同じ順に走査し、
+保存されたハッシュ（embeddingHash など、lib.embedding_texts）が現在のテキストのハッシュと
+異なるノードだけを埋め込み直す（テキストの変更・構築ルールの版の更新に追随する増分の再埋め込み）。
+
+BackfillSpec は Embedding の世代（lib/embedding_generations.py）ごとに作る（label_specs）。
+モデルの移行では、シャドウの世代の spec でシャドウ側のプロパティを埋める。
+"""
+
+import contextvars
+import functools
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+from lib.embedding_generations import EmbeddingGeneration
+from lib.embedding_texts import CLIENT_SUMMARY_VERSION, EMBEDDING_TEXT_BUILDERS, content_hash, hash_property
+
+# チェックポイントに記録する失敗の理由
+EMPTY_TEXT = "empty_text"
+EMBEDDING_FAILED = "embedding_failed"
+
+DEFAULT_CHECKPOINT_DIR = Path.home() / ".cache" / "nest-support" / "backfill"
+
+
+def _log(message: str, level: str = "INFO"):
+    sys.stderr.write(f"[Backfill:{level}] {message}\n")
+    sys.stderr.flush()
+
+
+@dataclass
+class BackfillSpec:
+    """
+    バックフィルの対象
+
+    match は対象ノードを n として束縛する MATCH 句、returns はテキストの構築に使う列。
+    text_fn は 1 行（dict）から埋め込むテキストを作り、空文字列なら飛ばす。
+    hash_fn はテキストのハッシュを作り、ベクトルと並べて保存する。
+    stale=True なら付与済みのノードのうち、保存されたハッシュが現在のものと異なるノードだけを対象にする。
+    property は世代ごとのプロパティ名で、model・dimensions はその世代のもの（省略時は現行の世代）。
+    embed_fn(texts, task_type) を渡すとテキストの埋め込みの代わりに使う（音声ファイルのパスを渡す場合など）。
+    """
+    name: str
+    match: str
+    returns: str
+    text_fn: Callable[[dict], str]
+    property: str = "embedding"
+    task_type: str = "RETRIEVAL_DOCUMENT"
+    params: dict = field(default_factory=dict)
+    hash_fn: Optional[Callable[[str], str]] = None
+    stale: bool = False
+    model: Optional[str] = None
+    dimensions: Optional[int] = None
+    embed_fn: Optional[Callable[[list[str], str], list]] = None
+
+    def pending(self) -> str:
+        return f"{self.match} WHERE n.{self.property} IS {'NOT NULL' if self.stale else 'NULL'}"
+
+    def batch_query(self) -> str:
+        # elementId(n) IN $ids は ID シークになる（ラベル全体を走査しない）
+        return f"""
+        {self.pending()}
+          AND elementId(n) IN $ids
+        RETURN elementId(n) AS id, n.{hash_property(self.property)} AS storedHash, {self.returns}
+        ORDER BY id
+        """
+
+    def count_query(self) -> str:
+        return f"{self.pending()} RETURN count(n) AS total"
+
+    def ids_query(self) -> str:
+        return f"""
+        {self.pending()}
+          AND elementId(n) > $after
+          AND ($until IS NULL OR elementId(n) <= $until)
+        RETURN elementId(n) AS id ORDER BY id
+        """
+
+    def checkpoint_name(self) -> str:
+        name = f"{self.name}-stale" if self.stale else self.name
+        if not self.params:
+            return f"{name}.json"
+        digest = hashlib.sha1(json.dumps(self.params, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+        return f"{name}-{digest[:8]}.json"
+
+
+class Checkpoint:
+    """バックフィルの進捗（範囲ごとのカーソル・件数・失敗したノード）を JSON ファイルに保存する"""
+
+    def __init__(self, path: str | Path, state: Optional[dict] = None):
+        self.path = Path(path)
+        self.state = state or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Checkpoint":
+        path = Path(path)
+        if path.exists():
+            return cls(path, json.loads(path.read_text(encoding="utf-8")))
+        return cls(path)
+
+    @property
+    def resumable(self) -> bool:
+        return bool(self.state.get("ranges")) and not self.state.get("completed")
+
+    def start(self, spec: BackfillSpec, ranges: list[dict], total: int) -> None:
+        self.state = {
+            "name": spec.name,
+            "property": spec.property,
+            "params": spec.params,
+            "total": total,
+            "processed": 0,
+            "success": 0,
+            "unchanged": 0,
+            "failed": {},
+            "ranges": ranges,
+            "completed": False,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.save()
+
+    def record_batch(
+        self, index: int, cursor: str, processed: int, success: int, failed: dict, unchanged: int = 0,
+    ) -> None:
+        with self._lock:
+            self.state["ranges"][index]["after"] = cursor
+            self.state["processed"] += processed
+            self.state["success"] += success
+            self.state["unchanged"] = self.state.get("unchanged", 0) + unchanged
+            self.state["failed"].update(failed)
+            self._save_locked()
+
+    def finish_range(self, index: int) -> None:
+        with self._lock:
+            self.state["ranges"][index]["done"] = True
+            self.state["completed"] = all(r["done"] for r in self.state["ranges"])
+            self._save_locked()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self) -> None:
+        # 書きかけのファイルを残さない（一時ファイルに書いてから置き換える）
+        self.state["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}時間{seconds % 3600 // 60:02d}分"
+    if seconds >= 60:
+        return f"{seconds // 60}分{seconds % 60:02d}秒"
+    return f"{seconds}秒"
+
+
+def plan_ranges(spec: BackfillSpec, total: int, workers: int, iter_query) -> list[dict]:
+    """未付与のノードを elementId の順に workers 個の重ならない範囲に分ける（境界の ID だけを保持する）"""
+    ranges = [{"after": "", "until": None, "done": False}]
+    if workers <= 1 or total <= workers:
+        return ranges
+    size = total / workers
+    bounds = []
+    params = {**spec.params, "after": "", "until": None}
+    for position, (element_id,) in enumerate(iter_query(spec.ids_query(), params, row_type=tuple), start=1):
+        if len(bounds) < workers - 1 and position >= size * (len(bounds) + 1):
+            bounds.append(element_id)
+    edges = [""] + bounds
+    return [
+        {"after": edges[i], "until": edges[i + 1] if i + 1 < len(edges) else None, "done": False}
+        for i in range(len(edges))
+    ]
+
+
+class Backfill:
+    """BackfillSpec の対象にベクトルを付与する（チェックポイントから再開できる）"""
+
+    def __init__(
+        self,
+        spec: BackfillSpec,
+        checkpoint: Checkpoint,
+        batch_size: int = 50,
+        workers: int = 1,
+        run_query=None,
+        iter_query=None,
+        embed_fn=None,
+        write_fn=None,
+    ):
+        if run_query is None or iter_query is None:
+            from lib import db_new_operations
+            run_query = run_query or db_new_operations.run_query
+            iter_query = iter_query or db_new_operations.iter_query
+
+        self.spec = spec
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.run_query = run_query
+        self.iter_query = iter_query
+        self.embed_fn = embed_fn or spec.embed_fn or functools.partial(
+            _embed_texts, model=spec.model, dimensions=spec.dimensions,
+        )
+        self.write_fn = write_fn or _write_vectors
+        self._started = 0.0
+        self._processed_at_start = 0
+
+    def run(self) -> dict:
+        spec = self.spec
+        if self.checkpoint.resumable:
+            state = self.checkpoint.state
+            done = sum(1 for r in state["ranges"] if r["done"])
+            _log(f"{spec.name}: チェックポイントから再開します"
+                 f"（{state['processed']}/{state['total']} 件処理済み、範囲 {done}/{len(state['ranges'])} 完了）")
+        else:
+            total = self.run_query(spec.count_query(), spec.params)[0]["total"]
+            self.checkpoint.start(spec, plan_ranges(spec, total, self.workers, self.iter_query), total)
+            _log(f"{spec.name}: 未付与 {total} 件を {len(self.checkpoint.state['ranges'])} 範囲で処理します")
+
+        self._started = time.monotonic()
+        self._processed_at_start = self.checkpoint.state["processed"]
+        pending = [i for i, r in enumerate(self.checkpoint.state["ranges"]) if not r["done"]]
+        if len(pending) == 1 or self.workers == 1:
+            for index in pending:
+                self._run_range(index)
+        elif pending:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+                # ワークロードクラス・デッドラインをワーカーに引き継ぐ
+                futures = [pool.submit(contextvars.copy_context().run, self._run_range, i) for i in pending]
+                errors = [f.exception() for f in futures if f.exception() is not None]
+            if errors:
+                raise errors[0]
+        return self.summary()
+
+    def _run_range(self, index: int) -> None:
+        spec = self.spec
+        bounds = self.checkpoint.state["ranges"][index]
+        # 範囲の残りの elementId を 1 回の走査で読み切る（カーソルの位置から。モジュールの docstring を参照）
+        ids = [
+            element_id for (element_id,) in self.iter_query(
+                spec.ids_query(), {**spec.params, "after": bounds["after"], "until": bounds["until"]}, row_type=tuple,
+            )
+        ]
+        query = spec.batch_query()
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            # 読み出した後に対象外になった・削除されたノードは返らない
+            rows = self.run_query(query, {**spec.params, "ids": batch})
+
+            failed = {}
+            targets = []
+            unchanged = 0
+            for row in rows:
+                text = spec.text_fn(row)
+                if not text:
+                    failed[row["id"]] = EMPTY_TEXT
+                    continue
+                digest = spec.hash_fn(text) if spec.hash_fn else None
+                if spec.stale and digest == row.get("storedHash"):
+                    unchanged += 1
+                    continue
+                targets.append((row["id"], text, digest))
+
+            success = 0
+            if targets:
+                vectors = self.embed_fn([text for _, text, _ in targets], spec.task_type)
+                for (element_id, _, _), vector in zip(targets, vectors):
+                    if vector is None:
+                        failed[element_id] = EMBEDDING_FAILED
+                # 書き込みの失敗は送出する（カーソルを進めないので、再開時にこのバッチをやり直す）
+                success = self.write_fn(
+                    (element_id, spec.property, vector, digest)
+                    for (element_id, _, digest), vector in zip(targets, vectors)
+                )
+
+            self.checkpoint.record_batch(index, batch[-1], len(rows), success, failed, unchanged)
+            self._report_progress()
+        self.checkpoint.finish_range(index)
+
+    def _report_progress(self) -> None:
+        state = self.checkpoint.state
+        processed, total = state["processed"], state["total"]
+        elapsed = time.monotonic() - self._started
+        rate = (processed - self._processed_at_start) / elapsed if elapsed > 0 else 0.0
+        eta = format_duration((total - processed) / rate) if rate > 0 and total > processed else "-"
+        pct = processed / total * 100 if total else 100.0
+        unchanged = f" 変更なし {state.get('unchanged', 0)}" if self.spec.stale else ""
+        _log(f"{self.spec.name}: {processed}/{total} ({pct:.1f}%) 成功 {state['success']}{unchanged}"
+             f" 失敗 {len(state['failed'])}  {rate:.1f} 件/秒  残り約 {eta}")
+
+    def summary(self) -> dict:
+        state = self.checkpoint.state
+        return {
+            "processed": state["processed"],
+            "success": state["success"],
+            "unchanged": state.get("unchanged", 0),
+            "failed": len(state["failed"]),
+            "completed": state["completed"],
+            "checkpoint": str(self.checkpoint.path),
+        }
+
+
+def _embed_texts(texts: list[str], task_type: str, model: Optional[str], dimensions: Optional[int]) -> list:
+    from lib.embedding import embed_texts_batch
+    return embed_texts_batch(texts, task_type=task_type, dimensions=dimensions, model=model)
+
+
+def _embed_audio_files(paths: list[str], task_type: str, model: str, dimensions: int) -> list:
+    from lib.embedding import embed_audio
+    return [embed_audio(path, dimensions=dimensions, model=model) if os.path.exists(path) else None for path in paths]
+
+
+def _meeting_record_text(row: dict) -> str:
+    # register_meeting_record と同じく、文字起こしとメモを改行でつなぐ
+    return "\n".join(part for part in (row.get("transcript"), row.get("note")) if part)
+
+
+def label_specs(
+    generation: EmbeddingGeneration,
+    client_name: Optional[str] = None,
+    stale: bool = False,
+) -> dict[str, BackfillSpec]:
+    """
+    generation のプロパティを埋めるラベルごとの BackfillSpec
+
+    テキストは lib.embedding_texts の構築ルールで作る。client_name を渡すと SupportLog をそのクライアントに絞る。
+    MeetingRecord は文字起こし・メモ（textEmbedding）、MeetingRecordAudio は音声ファイル（embedding）を埋め込む。
+    世代 1 以外の spec 名には "-v<版>" を付け、チェックポイントを世代ごとに分ける。
+    """
+    from lib.embedding import build_client_summary_text
+
+    suffix = "" if generation.version == 1 else f"-v{generation.version}"
+    common = dict(stale=stale, model=generation.model, dimensions=generation.dimensions)
+
+    specs = {}
+    for label, builder in EMBEDDING_TEXT_BUILDERS.items():
+        specs[label] = BackfillSpec(
+            name=label + suffix,
+            match=f"MATCH (n:{label})",
+            returns=builder.projection(),
+            text_fn=builder.build,
+            hash_fn=builder.hash,
+            property=generation.property_for(builder.property),
+            **common,
+        )
+    if client_name:
+        specs["SupportLog"].match = "MATCH (:Client {name: $client_name})<-[:ABOUT]-(n:SupportLog)"
+        specs["SupportLog"].params = {"client_name": client_name}
+    specs["Client"] = BackfillSpec(
+        name="Client" + suffix,
+        match="MATCH (n:Client)",
+        returns="n.name AS name",
+        text_fn=lambda row: build_client_summary_text(row["name"]) or "",
+        hash_fn=lambda text: content_hash(CLIENT_SUMMARY_VERSION, text),
+        property=generation.property_for("summaryEmbedding"),
+        task_type="CLUSTERING",
+        **common,
+    )
+    specs["MeetingRecord"] = BackfillSpec(
+        name="MeetingRecord" + suffix,
+        match="MATCH (n:MeetingRecord)",
+        returns="n.transcript AS transcript, n.note AS note",
+        text_fn=_meeting_record_text,
+        property=generation.property_for("textEmbedding"),
+        **common,
+    )
+    specs["MeetingRecordAudio"] = BackfillSpec(
+        name="MeetingRecordAudio" + suffix,
+        match="MATCH (n:MeetingRecord)",
+        returns="n.filePath AS filePath",
+        text_fn=lambda row: row.get("filePath") or "",
+        property=generation.property_for("embedding"),
+        embed_fn=functools.partial(_embed_audio_files, model=generation.model, dimensions=generation.dimensions),
+        **common,
+    )
+    return specs
+
+
+def _write_vectors(rows) -> int:
+    from lib.embedding import write_vectors
+    return write_vectors(rows)
+
+
+def run_backfill(
+    spec: BackfillSpec,
+    batch_size: int = 50,
+    workers: int = 1,
+    checkpoint_dir: str | Path | None = None,
+    restart: bool = False,
+) -> dict:
+    """
+    spec の対象をバックフィルする。チェックポイントが残っていればその位置から再開する。
+
+    Args:
+        checkpoint_dir: チェックポイントの保存先（省略時は BACKFILL_CHECKPOINT_DIR または
+                        ~/.cache/nest-support/backfill）
+        restart: 残っているチェックポイントを捨てて最初からやり直す
+    """
+    directory = Path(checkpoint_dir or os.getenv("BACKFILL_CHECKPOINT_DIR", str(DEFAULT_CHECKPOINT_DIR)))
+    path = directory.expanduser() / spec.checkpoint_name()
+    checkpoint = Checkpoint(path) if restart else Checkpoint.load(path)
+    return Backfill(spec, checkpoint, batch_size=batch_size, workers=workers).run()
@@ -0,0 +1,367 @@
+"""
+クライアントカード（単一ラウンドトリップの詳細プロジェクション）
+
+展開カード・エコマップ（HTML / Mermaid / SVG）・訪問準備ブリーフィングが必要とする
+クライアント情報を、CALL {} サブクエリを並べた 1 本の Cypher でまとめて取得する。
+以前はセクションごとに別クエリ（展開カード 5 本、エコマップ 8 本）を発行し、
+そのたびにセッションを開いていた。
+
+- 取得するセクションは $sections パラメータで選ぶ。選ばれなかったセクションの
+  サブクエリは先頭の WHERE で打ち切られ、空リストを返す（集約のみのサブクエリは
+  入力が 0 行でも 1 行を返すため、外側の行は消えない）
+- クエリ文字列は常に同じなので、サーバー側の実行計画キャッシュが効く
+- 読み取り時は新旧リレーション名を [:NEW|OLD] で両方辿る（後方互換）
+
+このモジュールはドライバーに依存しない。実行関数（run_query / async_run_query）を
+呼び出し側から渡すため、lib 外のスキルスクリプトからも利用できる。
+
+マテリアライズドカード:
+  全セクションのカードを JSON 化して Client ノードの cardJson プロパティに保存し、
+  読み取り側はプロパティ 1 つを取得するだけで済ませる。登録系の関数
+  （register_to_database / register_many / register_support_log など）が
+  書き込みのたびに該当クライアントのカードを再計算する。
+  - 登録経路を通らない書き込み（MCP からの直接 Cypher など）は反映されないため、
+    scripts/check_client_cards.py で実データとの差分を検査・再構築する
+  - 安全に関わるセクション（LIVE_SECTIONS: 禁忌事項・キーパーソン）はカードに頼らず、
+    カードの読み取りと同じクエリでライブに取得して差し替える（Skill からの書き込みで古くなっていても出さない）
+  - cardVersion がこのモジュールの CARD_VERSION と異なる（古い形式の）カードは使わず、
+    ライブのプロジェクションにフォールバックする
+  - 安全性が重要な読み取り（SOS 通知）はマテリアライズドカードを使わない
+"""
+
+import json
+from datetime import date
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+# セクション名 → カードのキー
+CARD_SECTIONS = (
+    "conditions",
+    "certificates",
+    "ngActions",
+    "carePreferences",
+    "keyPersons",
+    "guardians",
+    "hospitals",
+    "recentLogs",
+)
+
+CLIENT_CARD_QUERY = """
+MATCH (c:Client {name: $name})
+CALL {
+    WITH c
+    WITH c WHERE 'conditions' IN $sections
+    MATCH (c)-[:HAS_CONDITION]->(con:Condition)
+    RETURN collect(DISTINCT {name: con.name, status: con.status}) AS conditions
+}
+CALL {
+    WITH c
+    WITH c WHERE 'certificates' IN $sections
+    MATCH (c)-[:HAS_CERTIFICATE]->(cert:Certificate)
+    RETURN collect({
+        type: cert.type, grade: cert.grade, nextRenewalDate: cert.nextRenewalDate,
+        daysLeft: CASE WHEN cert.nextRenewalDate IS NULL THEN null
+                       ELSE duration.inDays(date(), cert.nextRenewalDate).days END
+    }) AS certificates
+}
+CALL {
+    WITH c
+    WITH c WHERE 'ngActions' IN $sections
+    MATCH (c)-[:MUST_AVOID|PROHIBITED]->(ng:NgAction)
+    OPTIONAL MATCH (ng)-[:IN_CONTEXT|RELATES_TO]->(ngCon:Condition)
+    WITH ng, head(collect(DISTINCT ngCon.name)) AS context
+    ORDER BY CASE ng.riskLevel
+        WHEN 'LifeThreatening' THEN 1
+        WHEN 'Panic' THEN 2
+        WHEN 'Discomfort' THEN 3
+        ELSE 4 END
+    RETURN collect({
+        action: ng.action, reason: ng.reason, riskLevel: ng.riskLevel, context: context
+    }) AS ngActions
+}
+CALL {
+    WITH c
+    WITH c WHERE 'carePreferences' IN $sections
+    MATCH (c)-[:REQUIRES|PREFERS]->(cp:CarePreference)
+    WITH DISTINCT cp
+    ORDER BY CASE cp.priority WHEN 'High' THEN 1 WHEN 'Medium' THEN 2 WHEN 'Low' THEN 3 ELSE 4 END
+    RETURN collect({
+        category: cp.category, instruction: cp.instruction, priority: cp.priority
+    }) AS carePreferences
+}
+CALL {
+    WITH c
+    WITH c WHERE 'keyPersons' IN $sections
+    MATCH (c)-[r:HAS_KEY_PERSON|EMERGENCY_CONTACT]->(kp:KeyPerson)
+    WITH kp, min(coalesce(r.rank, r.priority)) AS rank
+    ORDER BY coalesce(rank, 99)
+    RETURN collect({
+        name: kp.name, relationship: kp.relationship, phone: kp.phone,
+        role: kp.role, rank: rank
+    }) AS keyPersons
+}
+CALL {
+    WITH c
+    WITH c WHERE 'guardians' IN $sections
+    MATCH (c)-[:HAS_LEGAL_REP|HAS_GUARDIAN]->(g:Guardian)
+    WITH DISTINCT g
+    RETURN collect({name: g.name, type: g.type, phone: g.phone}) AS guardians
+}
+CALL {
+    WITH c
+    WITH c WHERE 'hospitals' IN $sections
+    MATCH (c)-[:TREATED_AT]->(h:Hospital)
+    WITH DISTINCT h
+    RETURN collect({
+        name: h.name, specialty: h.specialty, phone: h.phone, doctor: h.doctor
+    }) AS hospitals
+}
+CALL {
+    WITH c
+    WITH c WHERE 'recentLogs' IN $sections
+    MATCH (c)<-[:ABOUT]-(log:SupportLog)
+    WITH log ORDER BY log.date DESC
+    LIMIT $logLimit
+    OPTIONAL MATCH (s:Supporter)-[:LOGGED]->(log)
+    WITH log, head(collect(s.name)) AS supporter
+    ORDER BY log.date DESC
+    RETURN collect({
+        date: log.date, situation: log.situation, action: log.action,
+        effectiveness: log.effectiveness, emotion: log.emotion,
+        triggerTag: log.triggerTag, context: log.context, note: log.note,
+        supporter: supporter
+    }) AS recentLogs
+}
+RETURN c.name AS name, c.dob AS dob, c.bloodType AS bloodType,
+       c.kana AS kana, c.clientId AS clientId, c.displayCode AS displayCode,
+       conditions, certificates, ngActions, carePreferences,
+       keyPersons, guardians, hospitals, recentLogs"""
+
+_CLIENT_FIELDS = ("name", "dob", "bloodType", "kana", "clientId", "displayCode")
+
+
+def card_params(client_name: str, sections: Optional[Iterable[str]] = None, log_limit: int = 5) -> dict:
+    """
+    CLIENT_CARD_QUERY のパラメータを組み立てる。
+
+    Args:
+        client_name: クライアント名
+        sections: 取得するセクション（None なら全セクション）
+        log_limit: recentLogs の最大件数
+    """
+    selected = list(CARD_SECTIONS) if sections is None else list(sections)
+    unknown = [s for s in selected if s not in CARD_SECTIONS]
+    if unknown:
+        raise ValueError(f"未知のセクション: {', '.join(unknown)}")
+    return {"name": client_name, "sections": selected, "logLimit": log_limit}
+
+
+def card_from_rows(rows: list[dict]) -> Optional[dict]:
+    """
+    クエリ結果をカード形式に整形する（クライアントが存在しなければ None）。
+
+    Returns:
+        {"client": {name, dob, ...}, "conditions": [...], ..., "recentLogs": [...]}
+    """
+    if not rows:
+        return None
+    row = rows[0]
+    card = {"client": {k: row.get(k) for k in _CLIENT_FIELDS}}
+    for section in CARD_SECTIONS:
+        card[section] = row.get(section) or []
+    return card
+
+
+def fetch_client_card(
+    run_query: Callable[[str, dict], list[dict]],
+    client_name: str,
+    sections: Optional[Iterable[str]] = None,
+    log_limit: int = 5,
+) -> Optional[dict]:
+    """クライアントカードを 1 回のクエリで取得する"""
+    return card_from_rows(run_query(CLIENT_CARD_QUERY, card_params(client_name, sections, log_limit)))
+
+
+async def async_fetch_client_card(
+    async_run_query: Callable[[str, dict], Awaitable[list[dict]]],
+    client_name: str,
+    sections: Optional[Iterable[str]] = None,
+    log_limit: int = 5,
+) -> Optional[dict]:
+    """fetch_client_card の非同期版"""
+    params = card_params(client_name, sections, log_limit)
+    return card_from_rows(await async_run_query(CLIENT_CARD_QUERY, params))
+
+
+# =============================================================================
+# マテリアライズドカード
+# =============================================================================
+
+# カードの形式を変えたら上げる（古い形式のカードはライブ取得にフォールバックし、再構築対象になる）
+CARD_VERSION = 1
+CARD_LOG_LIMIT = 5
+
+# マテリアライズドカードを使う読み取りでも、常にライブで取得するセクション
+LIVE_SECTIONS = ("ngActions", "keyPersons")
+
+# 保存されたカードと、$sections（LIVE_SECTIONS のうち必要なもの）のライブの結果を 1 回で取得する
+MATERIALIZED_CARD_QUERY = CLIENT_CARD_QUERY + """,
+       c.cardJson AS cardJson, c.cardVersion AS cardVersion
+"""
+
+# 再計算の前にクライアントノードの書き込みロックを取り、同じクライアントの再計算を直列化する
+LOCK_CLIENT_QUERY = """
+MATCH (c:Client {name: $name})
+SET c.cardUpdatedAt = datetime()
+RETURN count(c) AS found
+"""
+
+STORE_CARD_QUERY = """
+MATCH (c:Client {name: $name})
+SET c.cardJson = $cardJson, c.cardVersion = $cardVersion, c.cardUpdatedAt = datetime()
+"""
+
+
+def _json_default(value: Any) -> str:
+    # neo4j.time.Date / DateTime は iso_format()、標準の date / datetime は isoformat()
+    if hasattr(value, "iso_format"):
+        return value.iso_format()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def card_to_json(card: dict) -> str:
+    """カードを保存用の JSON 文字列に変換（日付は ISO 形式、時間で変わる daysLeft は除く）"""
+    stored = dict(card)
+    stored["certificates"] = [
+        {k: v for k, v in cert.items() if k != "daysLeft"} for cert in card.get("certificates", [])
+    ]
+    return json.dumps(stored, ensure_ascii=False, sort_keys=True, default=_json_default)
+
+
+def _days_left(renewal: Any, today: date) -> Optional[int]:
+    # 移行されずに残った非 ISO 形式の文字列（和暦など）は計算しない
+    try:
+        return (date.fromisoformat(str(renewal)[:10]) - today).days if renewal else None
+    except ValueError:
+        return None
+
+
+def card_from_json(text: str, today: Optional[date] = None) -> dict:
+    """保存された JSON からカードを復元（daysLeft は読み取り時点で計算し直す）"""
+    card = json.loads(text)
+    today = today or date.today()
+    for cert in card.get("certificates", []):
+        cert["daysLeft"] = _days_left(cert.get("nextRenewalDate"), today)
+    for section in CARD_SECTIONS:
+        card.setdefault(section, [])
+    return card
+
+
+def _select_sections(card: dict, sections: Optional[Iterable[str]]) -> dict:
+    if sections is None:
+        return card
+    selected = set(card_params("", sections)["sections"])
+    return {k: (v if k == "client" or k in selected else []) for k, v in card.items()}
+
+
+def materialize_card(tx, client_name: str) -> Optional[dict]:
+    """
+    トランザクション内でカードを再計算して Client ノードに保存する（書き込みトランザクションで呼ぶ）。
+
+    Returns:
+        保存したカード（クライアントが存在しなければ None）
+    """
+    found = tx.run(LOCK_CLIENT_QUERY, {"name": client_name}).data()
+    if not found or not found[0]["found"]:
+        return None
+    rows = tx.run(CLIENT_CARD_QUERY, card_params(client_name, log_limit=CARD_LOG_LIMIT)).data()
+    card = card_from_rows(rows)
+    if card is not None:
+        tx.run(STORE_CARD_QUERY, {"name": client_name, "cardJson": card_to_json(card),
+                                  "cardVersion": CARD_VERSION}).consume()
+    return card
+
+
+async def async_materialize_card(tx, client_name: str) -> Optional[dict]:
+    """materialize_card の非同期版"""
+    found = await (await tx.run(LOCK_CLIENT_QUERY, {"name": client_name})).data()
+    if not found or not found[0]["found"]:
+        return None
+    result = await tx.run(CLIENT_CARD_QUERY, card_params(client_name, log_limit=CARD_LOG_LIMIT))
+    card = card_from_rows(await result.data())
+    if card is not None:
+        result = await tx.run(STORE_CARD_QUERY, {"name": client_name, "cardJson": card_to_json(card),
+                                                 "cardVersion": CARD_VERSION})
+        await result.consume()
+    return card
+
+
+def _live_sections(sections: Optional[Iterable[str]]) -> list[str]:
+    selected = CARD_SECTIONS if sections is None else set(card_params("", sections)["sections"])
+    return [s for s in LIVE_SECTIONS if s in selected]
+
+
+def _materialized_params(client_name: str, sections: Optional[Iterable[str]]) -> dict:
+    return card_params(client_name, _live_sections(sections), log_limit=CARD_LOG_LIMIT)
+
+
+def _materialized_or_none(rows: list[dict], sections: Optional[Iterable[str]]) -> tuple[bool, Optional[dict]]:
+    """(クライアントが存在するか, LIVE_SECTIONS をライブの結果で差し替えたマテリアライズドカード) を返す"""
+    if not rows:
+        return False, None
+    row = rows[0]
+    if not (row.get("cardJson") and row.get("cardVersion") == CARD_VERSION):
+        return True, None
+    card = card_from_json(row["cardJson"])
+    for section in _live_sections(sections):
+        card[section] = row.get(section) or []
+    return True, card
+
+
+def fetch_materialized_card(
+    run_query: Callable[[str, dict], list[dict]],
+    client_name: str,
+    sections: Optional[Iterable[str]] = None,
+) -> Optional[dict]:
+    """
+    マテリアライズドカードを取得する。未作成・古い形式ならライブのプロジェクションで取得する。
+
+    LIVE_SECTIONS（禁忌事項・キーパーソン）は同じクエリでライブに取得した結果を使う。
+    recentLogs は最新 CARD_LOG_LIMIT 件まで。
+    """
+    rows = run_query(MATERIALIZED_CARD_QUERY, _materialized_params(client_name, sections))
+    exists, card = _materialized_or_none(rows, sections)
+    if not exists:
+        return None
+    if card is None:
+        return fetch_client_card(run_query, client_name, sections, log_limit=CARD_LOG_LIMIT)
+    return _select_sections(card, sections)
+
+
+async def async_fetch_materialized_card(
+    async_run_query: Callable[[str, dict], Awaitable[list[dict]]],
+    client_name: str,
+    sections: Optional[Iterable[str]] = None,
+) -> Optional[dict]:
+    """fetch_materialized_card の非同期版"""
+    rows = await async_run_query(MATERIALIZED_CARD_QUERY, _materialized_params(client_name, sections))
+    exists, card = _materialized_or_none(rows, sections)
+    if not exists:
+        return None
+    if card is None:
+        return await async_fetch_client_card(async_run_query, client_name, sections, log_limit=CARD_LOG_LIMIT)
+    return _select_sections(card, sections)
+
+
+def compare_cards(materialized: Optional[dict], live: Optional[dict]) -> list[str]:
+    """
+    マテリアライズドカードとライブのカードを比較し、食い違うセクション名を返す（一致なら空リスト）。
+
+    日付の表現の違い（neo4j.time.Date と ISO 文字列）は JSON 化して吸収する。
+    """
+    if materialized is None or live is None:
+        return [] if materialized is live else ["client"]
+    a = json.loads(card_to_json(materialized))
+    b = json.loads(card_to_json(live))
+    return [key for key in ("client",) + CARD_SECTIONS if a.get(key) != b.get(key)]
@@ -0,0 +1,353 @@
+"""
+クライアント識別子のインメモリ索引
+
+resolve_client の部分一致検索（name / kana / aliases に対する双方向 CONTAINS）は
+インデックスが効かず、クライアント数に比例して遅くなる。
+全クライアントの識別子をプロセス内に保持し、マイクロ秒単位で解決する。
+
+索引の対象:
+- clientId, displayCode（完全一致）
+- name, kana, aliases と、その正規化形
+  （NFKC・小文字化・空白除去、カタカナ→ひらがな、pykakasi によるひらがな読み・ヘボン式ローマ字）
+
+検索の優先順位（resolve_client の Cypher と同じ順序）:
+  clientId → displayCode → 完全一致 → 部分一致（前方一致 → 部分文字列 → 識別子が名前を含む）
+部分文字列は文字 n-gram（1-gram / 2-gram）の転置索引で候補を絞り込んでから検証する。
+
+更新:
+- 初回の検索時に全クライアントを読み込む（遅延ロード）
+- 同一プロセスでの書き込み（query_cache.invalidate_client）を受けて、該当クライアントだけ差分更新
+- 別プロセスでの変更に備え、一定間隔（CLIENT_INDEX_REFRESH_SECONDS、デフォルト 300 秒）で全体を再読み込み
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Awaitable, Callable, Optional
+
+from lib.query_cache import add_invalidation_listener
+
+try:
+    import pykakasi
+    _kakasi = pykakasi.kakasi()
+except ImportError:  # 読み仮名・ローマ字の索引は省略（表記そのものでの検索は可能）
+    _kakasi = None
+
+
+# 全件読み込み・差分更新で使う RETURN 句（resolve_client と同じ形のレコードを返す）
+CLIENT_RECORD_RETURN = """
+    OPTIONAL MATCH (c)-[:HAS_IDENTITY]->(i:Identity)
+    RETURN c.clientId as clientId, c.displayCode as displayCode,
+           c.bloodType as bloodType, c.kana as kana, c.aliases as aliases,
+           COALESCE(i.name, c.name) as name, COALESCE(i.dob, c.dob) as dob
+"""
+LOAD_ALL_QUERY = "MATCH (c:Client)" + CLIENT_RECORD_RETURN
+LOAD_BY_NAMES_QUERY = """
+    MATCH (c:Client)
+    OPTIONAL MATCH (c)-[:HAS_IDENTITY]->(i0:Identity)
+    WITH c, i0 WHERE c.name IN $names OR i0.name IN $names
+""" + CLIENT_RECORD_RETURN
+
+# フィールドの優先度（小さいほど優先）
+_FIELD_NAME, _FIELD_KANA, _FIELD_ALIAS, _FIELD_READING = 0, 1, 2, 3
+
+_HONORIFICS = ("さん", "くん", "ちゃん", "様", "氏", "殿",
+               "san", "-san", "chan", "-chan", "kun", "-kun", "sama", "-sama")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_term(text: str) -> str:
+    """NFKC・小文字化・空白除去"""
+    return _SPACES.sub("", unicodedata.normalize("NFKC", text or "")).lower()
+
+
+def katakana_to_hiragana(text: str) -> str:
+    return "".join(chr(ord(ch) - 0x60) if "ァ" <= ch <= "ヶ" else ch for ch in text)
+
+
+def strip_honorific(text: str) -> str:
+    """敬称を除去（normalize_identifier と同じ敬称。ローマ字表記は大文字小文字を区別しない）"""
+    for suffix in _HONORIFICS:
+        if text.lower().endswith(suffix) and len(text) > len(suffix):
+            return text[:-len(suffix)].strip()
+    return text
+
+
+@lru_cache(maxsize=65536)
+def reading_forms(text: str) -> frozenset[str]:
+    """
+    pykakasi によるひらがな読み・ヘボン式ローマ字。
+    変換が重いため、定期的な全件再読み込みでは前回の結果を再利用する。
+    """
+    if _kakasi is None or not text:
+        return frozenset()
+    parts = _kakasi.convert(text)
+    return frozenset({normalize_term("".join(p["hira"] for p in parts)),
+                      normalize_term("".join(p["hepburn"] for p in parts))} - {""})
+
+
+def _ngrams(text: str) -> set[str]:
+    if len(text) == 1:
+        return {text}
+    return {text[i:i + 2] for i in range(len(text) - 1)} | set(text)
+
+
+class ClientIndex:
+    """クライアント識別子の索引（スレッドセーフ）"""
+
+    def __init__(self, refresh_seconds: float = 300.0):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._records: dict[str, dict] = {}           # key → resolve_client 形式のレコード
+        self._by_client_id: dict[str, str] = {}
+        self._by_display_code: dict[str, str] = {}
+        self._exact: dict[str, dict[str, int]] = {}   # 正規化形 → {key: フィールド優先度}
+        self._grams: dict[str, set[str]] = {}         # n-gram → 正規化形
+        self._terms_by_key: dict[str, set[str]] = {}
+        self._loaded_at: Optional[float] = None
+        self._dirty: set[str] = set()
+        self._reloading = False
+
+    # --- 構築 ---
+
+    @staticmethod
+    def _record_key(record: dict) -> str:
+        return record.get("clientId") or f"name:{record.get('name')}"
+
+    def _terms_for(self, record: dict) -> dict[str, int]:
+        terms: dict[str, int] = {}
+
+        def add(text, priority):
+            if not text:
+                return
+            for form in (normalize_term(text), katakana_to_hiragana(normalize_term(text))):
+                if form and priority < terms.get(form, 99):
+                    terms[form] = priority
+
+        add(record.get("name"), _FIELD_NAME)
+        add(record.get("kana"), _FIELD_KANA)
+        for alias in record.get("aliases") or []:
+            add(alias, _FIELD_ALIAS)
+        for text in [record.get("name"), record.get("kana"), *(record.get("aliases") or [])]:
+            for form in reading_forms(text or ""):
+                if _FIELD_READING < terms.get(form, 99):
+                    terms[form] = _FIELD_READING
+        return terms
+
+    def _remove_key(self, key: str) -> None:
+        record = self._records.pop(key, None)
+        if record is None:
+            return
+        if record.get("clientId"):
+            self._by_client_id.pop(record["clientId"], None)
+        if record.get("displayCode"):
+            self._by_display_code.pop(record["displayCode"], None)
+        for term in self._terms_by_key.pop(key, set()):
+            owners = self._exact.get(term)
+            if owners is None:
+                continue
+            owners.pop(key, None)
+            if not owners:
+                del self._exact[term]
+                for gram in _ngrams(term):
+                    bucket = self._grams.get(gram)
+                    if bucket is not None:
+                        bucket.discard(term)
+                        if not bucket:
+                            del self._grams[gram]
+
+    def upsert(self, record: dict) -> None:
+        """レコードを追加・置換"""
+        key = self._record_key(record)
+        with self._lock:
+            self._remove_key(key)
+            self._records[key] = dict(record)
+            if record.get("clientId"):
+                self._by_client_id[record["clientId"]] = key
+            if record.get("displayCode"):
+                self._by_display_code[record["displayCode"]] = key
+            terms = self._terms_for(record)
+            self._terms_by_key[key] = set(terms)
+            for term, priority in terms.items():
+                if term not in self._exact:
+                    self._exact[term] = {}
+                    for gram in _ngrams(term):
+                        self._grams.setdefault(gram, set()).add(term)
+                self._exact[term][key] = priority
+
+    def remove_name(self, name: str) -> None:
+        with self._lock:
+            for key in [k for k, r in self._records.items() if r.get("name") == name]:
+                self._remove_key(key)
+
+    def replace_all(self, records: list[dict]) -> None:
+        """全件を読み込み直す（構築中も旧索引で検索できるよう、別インスタンスで構築して差し替える）"""
+        fresh = ClientIndex(self.refresh_seconds)
+        for record in records:
+            fresh.upsert(record)
+        with self._lock:
+            self._records = fresh._records
+            self._by_client_id = fresh._by_client_id
+            self._by_display_code = fresh._by_display_code
+            self._exact = fresh._exact
+            self._grams = fresh._grams
+            self._terms_by_key = fresh._terms_by_key
+            self._loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    # --- 更新管理 ---
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def mark_dirty(self, client_name: Optional[str]) -> None:
+        if client_name:
+            with self._lock:
+                self._dirty.add(client_name)
+
+    def _needs_full_reload(self) -> bool:
+        return (self._loaded_at is None
+                or (self.refresh_seconds and time.monotonic() - self._loaded_at > self.refresh_seconds))
+
+    def _take_dirty(self) -> list[str]:
+        with self._lock:
+            names, self._dirty = sorted(self._dirty), set()
+        return names
+
+    def _apply_refresh(self, names: list[str], records: list[dict]) -> None:
+        with self._lock:
+            for name in names:
+                self.remove_name(name)
+            for record in records:
+                self.upsert(record)
+
+    def ensure_fresh(self, run_query: Callable[[str, dict], list[dict]]) -> None:
+        """未ロードなら全件読み込み、書き込み済みのクライアントがあれば差分更新"""
+        if self._needs_full_reload():
+            self.replace_all(run_query(LOAD_ALL_QUERY, {}))
+            return
+        names = self._take_dirty()
+        if names:
+            self._apply_refresh(names, run_query(LOAD_BY_NAMES_QUERY, {"names": names}))
+
+    async def async_ensure_fresh(self, run_query: Callable[[str, dict], Awaitable[list[dict]]]) -> None:
+        """
+        ensure_fresh の非同期版。
+        索引の構築（読み仮名変換を含む）はワーカースレッドで行い、イベントループを止めない。
+        ロード済みの索引を再読み込みしている間、他のリクエストは旧索引で検索する。
+        """
+        if self._needs_full_reload():
+            if self._reloading and self.is_loaded:
+                return
+            self._reloading = True
+            try:
+                records = await run_query(LOAD_ALL_QUERY, {})
+                await asyncio.to_thread(self.replace_all, records)
+            finally:
+                self._reloading = False
+            return
+        names = self._take_dirty()
+        if names:
+            self._apply_refresh(names, await run_query(LOAD_BY_NAMES_QUERY, {"names": names}))
+
+    # --- 検索 ---
+
+    def lookup(self, identifier: str) -> Optional[dict]:
+        """識別子からクライアントを解決（見つからなければ None）"""
+        if not identifier:
+            return None
+        raw = identifier.strip()
+        clean = strip_honorific(raw)
+        with self._lock:
+            for candidate in (raw, clean):
+                if candidate.startswith("c-") and candidate in self._by_client_id:
+                    return dict(self._records[self._by_client_id[candidate]])
+                if candidate.startswith("A-") and candidate in self._by_display_code:
+                    return dict(self._records[self._by_display_code[candidate]])
+
+            queries = []
+            for text in (raw, clean):
+                q = normalize_term(text)
+                for form in (q, katakana_to_hiragana(q)):
+                    if form and form not in queries:
+                        queries.append(form)
+
+            # 完全一致
+            best = None
+            for q in queries:
+                for key, priority in self._exact.get(q, {}).items():
+                    rank = (priority, key)
+                    if best is None or rank < best:
+                        best = rank
+            if best:
+                return dict(self._records[best[1]])
+
+            # 部分一致: 前方一致 → 部分文字列 → 識別子が名前を含む
+            q = normalize_term(clean)
+            best = None
+            for form in {q, katakana_to_hiragana(q)}:
+                for term in self._substring_candidates(form):
+                    kind = 0 if term.startswith(form) else 1
+                    for key, priority in self._exact[term].items():
+                        rank = (kind, priority, len(term), key)
+                        if best is None or rank < best:
+                            best = rank
+                for term in self._contained_terms(form):
+                    for key, priority in self._exact[term].items():
+                        rank = (2, priority, -len(term), key)
+                        if best is None or rank < best:
+                            best = rank
+            return dict(self._records[best[3]]) if best else None
+
+    def _substring_candidates(self, q: str) -> set[str]:
+        """q を部分文字列として含む正規化形（n-gram の積集合で絞り込み → 検証）"""
+        if not q:
+            return set()
+        buckets = sorted((self._grams.get(g, set()) for g in _ngrams(q)), key=len)
+        if not buckets or not buckets[0]:
+            return set()
+        candidates = set(buckets[0])
+        for bucket in buckets[1:]:
+            candidates &= bucket
+            if not candidates:
+                return set()
+        return {t for t in candidates if q in t}
+
+    def _contained_terms(self, q: str) -> set[str]:
+        """q に含まれる 2 文字以上の正規化形（「山田健太さんの件で」→「山田健太」）"""
+        found = set()
+        for i in range(len(q)):
+            for j in range(i + 2, len(q) + 1):
+                if q[i:j] in self._exact:
+                    found.add(q[i:j])
+        return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "clients": len(self._records),
+                "terms": len(self._exact),
+                "grams": len(self._grams),
+                "loaded": self.is_loaded,
+                "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+                "dirty": len(self._dirty),
+            }
+
+
+# =============================================================================
+# プロセス共有のインスタンス
+# =============================================================================
+
+_index = ClientIndex(refresh_seconds=float(os.getenv("CLIENT_INDEX_REFRESH_SECONDS", "300")))
+add_invalidation_listener(_index.mark_dirty)
+
+
+def get_client_index() -> ClientIndex:
+    return _index
@@ -14,11 +14,32 @@ Gemini 2.0 Flash などの LLM からの抽出グラフデータ (nodes, relatio
 
 import os
 import sys
+import time
 from datetime import date
 from typing import Optional
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
 
+from lib.audit_sink import flush_audit_logs, get_audit_sink
+from lib.client_card import MATERIALIZED_CARD_QUERY, fetch_materialized_card, materialize_card
+from lib.deadline import DeadlineExceeded, defer, defer_if_short, without_deadline
+from lib.db_runtime import (
+    DEFAULT_FETCH_SIZE,
+    DatabaseAccessError,
+    driver_config_from_env,
+    execute_query,
+    execute_transaction,
+    stream_query,
+)
+from lib.embedding_texts import EMBEDDING_TEXT_BUILDERS, build_text, text_hash
+from lib.query_cache import cached_query, invalidate_client
+from lib.support_log_chain import (
+    splice_support_logs,
+    support_log_ids,
+    support_log_ids_by_client,
+    update_support_log_chain,
+)
+
 load_dotenv()
 
 # 仮名化スキーマが有効かどうか（マイグレーション後に True に設定）
@@ -73,7 +94,7 @@ def get_driver():
             log("NEO4J_URI または NEO4J_USERNAME が未設定です", "ERROR")
             return None
         try:
-            _driver = GraphDatabase.driver(uri, auth=(user, pwd))
+            _driver = GraphDatabase.driver(uri, auth=(user, pwd), **driver_config_from_env())
             _driver.verify_connectivity()
             log(f"Neo4j接続成功: {uri}")
         except Exception as e:
@@ -94,19 +115,51 @@ def is_db_available() -> bool:
         return False
 
 
-def run_query(query, params=None):
-    """Cypherクエリ実行ヘルパー"""
+def run_query(query, params=None, write: bool | None = None):
+    """
+    Cypherクエリ実行ヘルパー
+
+    読み取り／書き込みを判定して管理トランザクションで実行する（一時的障害は自動リトライ）。
+    失敗時は空リストではなく DatabaseAccessError のサブクラスを送出する。
+
+    Args:
+        write: 書き込みクエリかどうか。None なら Cypher から自動判定
+    """
     try:
-        driver = get_driver()
-        if driver is None:
-            log("ドライバー未初期化のためクエリをスキップ", "WARN")
-            return []
-        with driver.session() as session:
-            result = session.run(query, params or {})
-            return [record.data() for record in result]
-    except Exception as e:
-        log(f"クエリ実行エラー: {e}", "ERROR")
-        return []
+        return execute_query(get_driver(), query, params, write=write)
+    except DatabaseAccessError as e:
+        log(str(e), "ERROR")
+        raise
+
+
+def iter_query(query, params=None, fetch_size: int = DEFAULT_FETCH_SIZE, row_type=dict):
+    """
+    読み取りクエリの結果を 1 件ずつ返す（run_query のストリーミング版）
+
+    全件をリストに溜めないため、全ノードの走査やエクスポートでもメモリが件数に比例しない。
+    row_type に tuple や NamedTuple のクラスを渡すと dict より小さい行で受け取れる。
+    詳細は lib.db_runtime.stream_query を参照。
+    """
+    try:
+        yield from stream_query(get_driver(), query, params, fetch_size=fetch_size, row_type=row_type)
+    except DatabaseAccessError as e:
+        log(str(e), "ERROR")
+        raise
+
+
+def run_in_transaction(work, write: bool = True):
+    """
+    管理トランザクション内で work(tx) を実行する。
+
+    一時的な障害（リーダー切り替え等）はドライバーが自動リトライする。
+    run_query と同じくワークロードのレーンの枠・クエリタイムアウトに従う（lib.db_runtime.execute_transaction）。
+    失敗時はロールバックした上で例外を送出する（run_query と異なり握りつぶさない）。
+    """
+    try:
+        return execute_transaction(get_driver(), work, write=write)
+    except DatabaseAccessError as e:
+        log(str(e), "ERROR")
+        raise
 
 
 # =============================================================================
@@ -121,35 +174,23 @@ def create_audit_log(
     details: str = "",
     client_name: Optional[str] = None
 ) -> dict:
-    """監査ログを作成"""
-    result = run_query("""
-        CREATE (al:AuditLog {
-            timestamp: datetime(),
-            user: $user_name,
-            action: $action,
-            targetType: $target_type,
-            targetName: $target_name,
-            details: $details,
-            clientName: $client_name
-        })
-        WITH al
-        OPTIONAL MATCH (c:Client {name: $client_name})
-        WHERE $client_name <> ''
-        FOREACH (_ IN CASE WHEN c IS NOT NULL THEN [1] ELSE [] END |
-            CREATE (al)-[:AUDIT_FOR]->(c)
-        )
-        RETURN al.timestamp as timestamp, al.action as action
-    """, {
-        "user_name": user_name,
+    """
+    監査ログを作成。
+
+    エントリは lib/audit_sink.py のバッファに入り、バックグラウンドでまとめて書き込まれる
+    （AUDIT_SINK_ENABLED=false なら同期で書き込む）。
+    """
+    entry = get_audit_sink().submit({
+        "user": user_name,
         "action": action,
-        "target_type": target_type,
-        "target_name": target_name,
+        "targetType": target_type,
+        "targetName": target_name,
         "details": details,
-        "client_name": client_name or ""
+        "clientName": client_name or "",
     })
 
     log(f"監査ログ記録: {user_name} - {action} - {target_type}:{target_name}")
-    return result[0] if result else {}
+    return {"timestamp": entry["timestamp"], "action": action}
 
 
 def get_audit_logs(
@@ -158,10 +199,11 @@ def get_audit_logs(
     action: Optional[str] = None,
     limit: int = 50
 ) -> list:
-    """監査ログを取得"""
+    """監査ログを取得（client_name は resolve_client_name で解決した氏名と完全一致で絞り込む）"""
+    flush_audit_logs()
     results = run_query("""
         MATCH (al:AuditLog)
-        WHERE ($client_name = '' OR al.clientName CONTAINS $client_name)
+        WHERE ($client_name = '' OR al.clientName = $client_name)
           AND ($user_name = '' OR al.user CONTAINS $user_name)
           AND ($action = '' OR al.action = $action)
         RETURN al.timestamp as 日時,
@@ -174,7 +216,7 @@ def get_audit_logs(
         ORDER BY al.timestamp DESC
         LIMIT $limit
     """, {
-        "client_name": client_name or "",
+        "client_name": resolve_client_name(client_name) if client_name else "",
         "user_name": user_name or "",
         "action": action or "",
         "limit": limit
@@ -184,9 +226,9 @@ def get_audit_logs(
 
 def get_client_change_history(client_name: str, limit: int = 20) -> list:
     """特定クライアントに関する変更履歴を取得"""
+    flush_audit_logs()
     results = run_query("""
-        MATCH (al:AuditLog)
-        WHERE al.clientName CONTAINS $client_name
+        MATCH (al:AuditLog {clientName: $client_name})
         RETURN al.timestamp as 日時,
                al.user as 操作者,
                al.action as 操作,
@@ -195,7 +237,7 @@ def get_client_change_history(client_name: str, limit: int = 20) -> list:
                al.details as 詳細
         ORDER BY al.timestamp DESC
         LIMIT $limit
-    """, {"client_name": client_name, "limit": limit})
+    """, {"client_name": resolve_client_name(client_name), "limit": limit})
     return _mask_output(results)
 
 
@@ -218,7 +260,11 @@ MERGE_KEYS = {
     "Certificate": ["type"]
 }
 
-def register_to_database(extracted_graph: dict, user_name: str = "system") -> dict:
+def register_to_database(
+    extracted_graph: dict,
+    user_name: str = "system",
+    batched: bool = True,
+) -> dict:
     """
     LLMが抽出したフラットなグラフ構造(nodes, relationships)を読み込み、
     適切な登録処理にルーティングする。
@@ -226,6 +272,8 @@ def register_to_database(extracted_graph: dict, user_name: str = "system") -> di
     Args:
         extracted_graph: AI構造化されたグラフデータ (nodes, relationships を含むdict)
         user_name: 登録を行うユーザー名（デフォルト: "system"）
+        batched: True なら 1 トランザクション・UNWIND 一括登録（途中失敗時は全体をロールバック）。
+            False なら従来のノード/リレーション単位の逐次登録。
 
     Returns:
         登録結果のサマリー
@@ -241,6 +289,110 @@ def register_to_database(extracted_graph: dict, user_name: str = "system") -> di
     if validation_warnings:
         log(f"スキーマ検証警告 ({len(validation_warnings)}件): {'; '.join(validation_warnings[:3])}", "WARN")
 
+    # ---------------------------------------------------------
+    # 1-2. ノード・リレーションシップの登録
+    # ---------------------------------------------------------
+    if batched:
+        try:
+            temp_id_map, registered_items, client_name_context = _register_graph_batched(
+                extracted_graph, user_name
+            )
+        except Exception as e:
+            log(f"バッチ登録エラー（トランザクションはロールバック済み）: {e}", "ERROR")
+            return {"status": "error", "message": f"登録に失敗しました: {e}"}
+    else:
+        temp_id_map, registered_items, client_name_context = _register_graph_per_query(
+            extracted_graph, user_name
+        )
+
+    # マテリアライズドカードの再計算 → キャッシュ無効化（このクライアントの読み取り結果を次回から再取得させる）
+    refresh_client_card(client_name_context)
+    invalidate_client(client_name_context if client_name_context != "Unknown" else None)
+
+    # ---------------------------------------------------------
+    # 3. 時系列チェーンの自動構築（一括登録は登録と同じトランザクションで差し込み済み）
+    # ---------------------------------------------------------
+    if not batched and "SupportLog" in registered_items and client_name_context != "Unknown":
+        _rebuild_support_log_chain(
+            client_name_context, support_log_ids(extracted_graph.get("nodes", []), temp_id_map)
+        )
+
+    # ---------------------------------------------------------
+    # 4. Embedding自動付与（ベストエフォート）
+    # ---------------------------------------------------------
+    _attach_embeddings(
+        temp_id_map=temp_id_map,
+        nodes=extracted_graph.get("nodes", []),
+        registered_items=registered_items,
+    )
+
+    # ---------------------------------------------------------
+    # 5. Client summaryEmbedding 自動付与（ベストエフォート）
+    # ---------------------------------------------------------
+    _try_attach_client_summary_embedding(registered_items, client_name_context)
+
+    log(f"汎用グラフ登録完了: {client_name_context} - 項目数: {len(registered_items)}")
+
+    return {
+        "status": "success",
+        "client_name": client_name_context,
+        "registered_count": len(registered_items),
+        "registered_types": list(set(registered_items))
+    }
+
+
+def _audit_entry(
+    label: str, props: dict, action_type: str, user_name: str, client_name: str
+) -> Optional[dict]:
+    """ビジネスロジックのフック: 重要なノードに対する監査ログエントリを生成"""
+    if label == "NgAction":
+        return {
+            "user": user_name, "action": "CREATE", "targetType": "NgAction",
+            "targetName": props.get('action', ''),
+            "details": f"リスクレベル: {props.get('riskLevel', 'Panic')}, 理由: {props.get('reason', '')}",
+            "clientName": client_name or "",
+        }
+    if label == "SupportLog":
+        return {
+            "user": user_name, "action": "CREATE", "targetType": "SupportLog",
+            "targetName": f"{props.get('situation', '')} - {props.get('action', '')}",
+            "details": f"効果: {props.get('effectiveness', '')}",
+            "clientName": client_name or "",
+        }
+    if label == "Client":
+        return {
+            "user": user_name, "action": action_type, "targetType": "Client",
+            "targetName": props.get('name', ''), "details": "基本情報登録/更新",
+            "clientName": client_name or "",
+        }
+    return None
+
+
+def _register_graph_batched(extracted_graph: dict, user_name: str) -> tuple[dict, list, str]:
+    """ノード・リレーション・監査ログ・時系列チェーンへの差し込みを 1 トランザクションで UNWIND 一括登録"""
+    from lib.graph_writer import plan_graph_write, write_graph
+
+    plan = plan_graph_write(extracted_graph, MERGE_KEYS, missing_merge_key="skip")
+    for warning in plan.warnings:
+        log(warning, "WARN")
+
+    client_name_context = plan.client_name
+    result = write_graph(
+        run_in_transaction,
+        plan,
+        audit_entry_builder=lambda n: _audit_entry(
+            n["label"], n["properties"], n["action"], user_name, client_name_context
+        ),
+        after_write=lambda tx, written: _chain_support_logs(
+            tx, client_name_context, extracted_graph.get("nodes", []), written
+        ),
+    )
+    registered_items = [n["label"] for n in result.registered]
+    return result.temp_id_map, registered_items, client_name_context
+
+
+def _register_graph_per_query(extracted_graph: dict, user_name: str) -> tuple[dict, list, str]:
+    """従来方式: ノード・リレーション・監査ログごとに個別のクエリで登録"""
     temp_id_map = {}
     registered_items = []
     client_name_context = "Unknown"
@@ -301,25 +453,12 @@ def register_to_database(extracted_graph: dict, user_name: str = "system") -> di
             registered_items.append(label)
 
             # --- ビジネスロジックのフック（重要な監査ログの記録） ---
-            if label == "NgAction":
+            entry = _audit_entry(label, props, action_type, user_name, client_name_context)
+            if entry:
                 create_audit_log(
-                    user_name=user_name, action="CREATE", target_type="NgAction",
-                    target_name=props.get('action', ''),
-                    details=f"リスクレベル: {props.get('riskLevel', 'Panic')}, 理由: {props.get('reason', '')}",
-                    client_name=client_name_context
-                )
-            elif label == "SupportLog":
-                create_audit_log(
-                    user_name=user_name, action="CREATE", target_type="SupportLog",
-                    target_name=f"{props.get('situation', '')} - {props.get('action', '')}",
-                    details=f"効果: {props.get('effectiveness', '')}",
-                    client_name=client_name_context
-                )
-            elif label == "Client":
-                create_audit_log(
-                    user_name=user_name, action=action_type, target_type="Client",
-                    target_name=props.get('name', ''), details="基本情報登録/更新",
-                    client_name=client_name_context
+                    user_name=entry["user"], action=entry["action"],
+                    target_type=entry["targetType"], target_name=entry["targetName"],
+                    details=entry["details"], client_name=entry["clientName"],
                 )
 
     # ---------------------------------------------------------
@@ -348,57 +487,199 @@ def register_to_database(extracted_graph: dict, user_name: str = "system") -> di
                 "rel_props": rel_props
             })
 
+    return temp_id_map, registered_items, client_name_context
+
+# =============================================================================
+# 複数グラフの一括登録（移行・過去記録インポート用）
+# =============================================================================
+
+def register_many(
+    graphs: list[dict],
+    user_name: str = "system",
+    chunk_size: int = 200,
+    embed_batch_size: int = 100,
+) -> dict:
+    """
+    複数のグラフをまとめて登録する。
+
+    register_to_database() をループで呼ぶ代わりに使う。
+    - 全グラフを先に Guardian Layer で検証・正規化
+    - MERGE キーが同じノード（同一 Client / Supporter 等）はグラフ間で集約
+    - chunk_size 件ごとに 1 トランザクションで UNWIND 登録
+      （チャンクが失敗した場合はグラフ単位で再試行し、不正なグラフだけを error にする）
+    - 時系列チェーン構築と summaryEmbedding はクライアントごとに 1 回だけ実行
+    - Embedding は embed_batch_size 件ずつまとめて生成
+
+    Args:
+        graphs: register_to_database() と同じ形式のグラフのリスト
+        user_name: 登録を行うユーザー名
+        chunk_size: 1 トランザクションあたりのグラフ数
+        embed_batch_size: 1 回の Embedding API 呼び出しあたりのテキスト数
+
+    Returns:
+        {"status", "total", "succeeded", "failed", "elapsed_sec", "graphs_per_sec",
+         "results": [{"index", "status", "client_name", "registered_count", "registered_types"}, ...]}
+    """
+    from lib.schema_validator import validate_and_normalize_graph
+
+    started = time.perf_counter()
+    results: list[dict] = [None] * len(graphs)
+    valid: list[tuple[int, dict]] = []
+
     # ---------------------------------------------------------
-    # 3. 事後処理フック（時系列チェーンの自動構築）
+    # 1. ストリーム全体の検証・正規化
     # ---------------------------------------------------------
-    if "SupportLog" in registered_items and client_name_context != "Unknown":
-        _rebuild_support_log_chain(client_name_context)
+    warning_count = 0
+    for index, graph in enumerate(graphs):
+        if 'client' in graph and 'nodes' not in graph:
+            results[index] = {"index": index, "status": "error",
+                              "message": "旧形式のJSON構造はサポートされていません。"}
+            continue
+        normalized, warnings = validate_and_normalize_graph(graph)
+        warning_count += len(warnings)
+        valid.append((index, normalized))
+    if warning_count:
+        log(f"スキーマ検証警告: 計 {warning_count} 件 ({len(graphs)} グラフ)", "WARN")
 
     # ---------------------------------------------------------
-    # 4. Embedding自動付与（ベストエフォート）
+    # 2. チャンク単位のトランザクション登録
     # ---------------------------------------------------------
-    _attach_embeddings(
-        temp_id_map=temp_id_map,
-        nodes=extracted_graph.get("nodes", []),
-        registered_items=registered_items,
-    )
+    written: list[tuple[dict, dict]] = []  # (統合グラフ, temp_id_map)
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        try:
+            written.append(_register_chunk(chunk, user_name, results))
+        except Exception as e:
+            log(f"チャンク登録失敗 ({len(chunk)} グラフ、ロールバック済み) → グラフ単位で再試行: {e}", "WARN")
+            for item in chunk:
+                try:
+                    written.append(_register_chunk([item], user_name, results))
+                except Exception as item_error:
+                    index = item[0]
+                    results[index] = {"index": index, "status": "error", "message": str(item_error)}
 
     # ---------------------------------------------------------
-    # 5. Client summaryEmbedding 自動付与（ベストエフォート）
+    # 3. 事後処理（クライアントごとに 1 回。時系列チェーンは各チャンクのトランザクションで差し込み済み）
     # ---------------------------------------------------------
-    _try_attach_client_summary_embedding(registered_items, client_name_context)
-
-    log(f"汎用グラフ登録完了: {client_name_context} - 項目数: {len(registered_items)}")
+    summary_clients = set()
+    client_related = {"Client", "Condition", "NgAction", "CarePreference"}
+    written_clients = sorted({
+        r["client_name"] for r in results
+        if r and r["status"] == "success" and r["client_name"] != "Unknown"
+    })
+    for client_name in written_clients:
+        refresh_client_card(client_name)
+    if written and not written_clients:
+        invalidate_client(None)  # クライアントに紐づかないグラフだけを書いた（全体の世代のみ進める）
+    for r in results:
+        if not r or r["status"] != "success" or r["client_name"] == "Unknown":
+            continue
+        invalidate_client(r["client_name"])
+        if client_related & set(r["registered_types"]):
+            summary_clients.add(r["client_name"])
+
+    embed_nodes = []
+    for merged_graph, temp_id_map in written:
+        embed_nodes.extend(
+            (n, temp_id_map) for n in merged_graph["nodes"]
+            if n.get("label") in EMBEDDING_TEXT_BUILDERS and n.get("temp_id") in temp_id_map
+        )
+    for start in range(0, len(embed_nodes), embed_batch_size):
+        batch = embed_nodes[start:start + embed_batch_size]
+        temp_id_map = {}
+        for node, id_map in batch:
+            temp_id_map[node["temp_id"]] = id_map[node["temp_id"]]
+        nodes = [node for node, _ in batch]
+        _attach_embeddings(temp_id_map=temp_id_map, nodes=nodes,
+                           registered_items=[n["label"] for n in nodes])
+
+    for client_name in sorted(summary_clients):
+        _try_attach_client_summary_embedding(["Client"], client_name)
+
+    elapsed = time.perf_counter() - started
+    succeeded = sum(1 for r in results if r and r["status"] == "success")
+    failed = len(graphs) - succeeded
+    graphs_per_sec = len(graphs) / elapsed if elapsed > 0 else 0.0
+    log(f"一括登録完了: {succeeded}/{len(graphs)} 成功, {elapsed:.1f}秒 ({graphs_per_sec:.1f} graphs/sec)")
 
     return {
-        "status": "success",
-        "client_name": client_name_context,
-        "registered_count": len(registered_items),
-        "registered_types": list(set(registered_items))
+        "status": "success" if failed == 0 else ("error" if succeeded == 0 else "partial"),
+        "total": len(graphs),
+        "succeeded": succeeded,
+        "failed": failed,
+        "elapsed_sec": round(elapsed, 3),
+        "graphs_per_sec": round(graphs_per_sec, 2),
+        "results": results,
     }
 
+
+def _register_chunk(
+    chunk: list[tuple[int, dict]], user_name: str, results: list
+) -> tuple[dict, dict]:
+    """チャンク内のグラフを統合し、1 トランザクションで登録して results を埋める"""
+    from lib.graph_writer import merge_graphs, plan_graph_write, write_graph
+
+    client_names = {}
+    for index, graph in chunk:
+        client_names[index] = next(
+            (n.get("properties", {}).get("name", "Unknown")
+             for n in graph.get("nodes", []) if n.get("label") == "Client"),
+            "Unknown",
+        )
+
+    merged_graph, occurrences = merge_graphs(chunk, MERGE_KEYS)
+    plan = plan_graph_write(merged_graph, MERGE_KEYS, missing_merge_key="skip")
+
+    # 監査ログは集約前の (グラフ, ノード) ごとに記録する
+    occurrences_by_temp_id: dict[str, list[dict]] = {}
+    for occ in occurrences:
+        occurrences_by_temp_id.setdefault(occ["temp_id"], []).append(occ)
+
+    def audit_entries(node: dict) -> list[dict]:
+        entries = []
+        for occ in occurrences_by_temp_id.get(node["temp_id"], []):
+            entry = _audit_entry(occ["label"], occ["properties"], node["action"],
+                                 user_name, client_names[occ["graph"]])
+            if entry:
+                entries.append(entry)
+        return entries
+
+    def chain_support_logs(tx, written):
+        # SupportLog を登録したクライアントごとに、同じトランザクションでチェーンに差し込む
+        chain_clients = {
+            client_names[occ["graph"]] for occ in occurrences
+            if occ["label"] == "SupportLog" and occ["temp_id"] in written.temp_id_map
+        } - {"Unknown"}
+        log_ids = support_log_ids_by_client(merged_graph, written.temp_id_map)
+        for client_name in sorted(chain_clients):
+            update_support_log_chain(tx, [client_name], log_ids.get(client_name, []))
+
+    result = write_graph(run_in_transaction, plan, audit_entry_builder=audit_entries,
+                         after_write=chain_support_logs)
+
+    registered: dict[int, list[str]] = {index: [] for index, _ in chunk}
+    for occ in occurrences:
+        if occ["temp_id"] in result.temp_id_map:
+            registered[occ["graph"]].append(occ["label"])
+    for index, labels in registered.items():
+        results[index] = {
+            "index": index,
+            "status": "success",
+            "client_name": client_names[index],
+            "registered_count": len(labels),
+            "registered_types": list(set(labels)),
+        }
+    return merged_graph, result.temp_id_map
+
+
 # =============================================================================
 # Embedding自動付与（ベストエフォート）
+# テキストの構築ルールは lib.embedding_texts の EMBEDDING_TEXT_BUILDERS に一本化している
 # =============================================================================
 
-# embeddingを生成する対象ノードラベルと、テキスト表現の構築ルール
-_EMBEDDING_TEXT_BUILDERS = {
-    "SupportLog": lambda p: "。".join(filter(None, [
-        f"状況: {p['situation']}" if p.get("situation") else None,
-        f"対応: {p['action']}" if p.get("action") else None,
-        f"メモ: {p['note']}" if p.get("note") else None,
-        f"効果: {p['effectiveness']}" if p.get("effectiveness") else None,
-    ])),
-    "NgAction": lambda p: "。".join(filter(None, [
-        f"禁忌: {p['action']}" if p.get("action") else None,
-        f"理由: {p['reason']}" if p.get("reason") else None,
-        f"リスク: {p['riskLevel']}" if p.get("riskLevel") else None,
-    ])),
-    "CarePreference": lambda p: "。".join(filter(None, [
-        f"カテゴリ: {p['category']}" if p.get("category") else None,
-        f"指示: {p['instruction']}" if p.get("instruction") else None,
-    ])),
-}
+# リクエストのデッドライン（lib/deadline.py）の残りがこれ未満なら、登録時の Embedding 付与を後回しにする
+# （未付与のノードは scripts/backfill_embeddings.py が補う）
+EMBEDDING_DEFER_SECONDS = 5.0
 
 
 def _attach_embeddings(
@@ -409,6 +690,7 @@ def _attach_embeddings(
     """
     register_to_database() で登録されたノードにembeddingを一括付与する。
     GEMINI_API_KEY 未設定やAPI障害時は静かにスキップ。
+    リクエストの残り時間が少なければ付与せずに後回しにする。
     """
     # embedding対象のノードを抽出
     targets = []
@@ -416,46 +698,43 @@ def _attach_embeddings(
         label = node.get("label")
         temp_id = node.get("temp_id")
         props = node.get("properties", {})
-        if label not in _EMBEDDING_TEXT_BUILDERS:
+        if label not in EMBEDDING_TEXT_BUILDERS:
             continue
         element_id = temp_id_map.get(temp_id)
         if not element_id:
             continue
-        text = _EMBEDDING_TEXT_BUILDERS[label](props)
+        text = build_text(label, props)
         if text:
-            targets.append({"element_id": element_id, "text": text})
+            targets.append({"element_id": element_id, "text": text, "hash": text_hash(label, text)})
 
     if not targets:
         return
+    if defer_if_short("embedding", EMBEDDING_DEFER_SECONDS):
+        log(f"残り時間が少ないため {len(targets)} ノードのembedding付与を後回しにします", "WARN")
+        return
 
     try:
-        from lib.embedding import embed_texts_batch
+        from lib.embedding import embed_and_write
     except ImportError:
         log("lib.embedding が利用できないためembedding付与をスキップ", "WARN")
         return
 
     try:
-        texts = [t["text"] for t in targets]
-        embeddings = embed_texts_batch(texts)
-
         success = 0
-        for target, emb in zip(targets, embeddings):
-            if emb is None:
-                continue
-            try:
-                run_query(
-                    """
-                    MATCH (n) WHERE elementId(n) = $id
-                    CALL db.create.setNodeVectorProperty(n, 'embedding', $embedding)
-                    """,
-                    {"id": target["element_id"], "embedding": emb},
-                )
-                success += 1
-            except Exception as e:
-                log(f"embedding付与失敗 (node {target['element_id']}): {e}", "WARN")
+        try:
+            success = embed_and_write(
+                (target["element_id"], "embedding", target["text"], target["hash"]) for target in targets
+            )
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            log(f"embedding書き込み失敗 ({len(targets)} ノード): {e}", "WARN")
 
         if success > 0:
             log(f"Embedding自動付与: {success}/{len(targets)} ノード")
+    except DeadlineExceeded:
+        defer("embedding")
+        log("予算内に終わらなかったためembedding付与を後回しにします", "WARN")
     except Exception as e:
         log(f"Embedding一括生成スキップ: {e}", "WARN")
 
@@ -471,11 +750,17 @@ def _try_attach_client_summary_embedding(
     client_related = {"Client", "Condition", "NgAction", "CarePreference"}
     if not any(item in client_related for item in registered_items):
         return
+    if defer_if_short("summary_embedding", EMBEDDING_DEFER_SECONDS):
+        log(f"残り時間が少ないため {client_name} の summaryEmbedding 付与を後回しにします", "WARN")
+        return
 
     try:
         from lib.embedding import embed_client_summary
 
         embed_client_summary(client_name)
+    except DeadlineExceeded:
+        defer("summary_embedding")
+        log("予算内に終わらなかったため summaryEmbedding 付与を後回しにします", "WARN")
     except Exception as e:
         log(f"Client summaryEmbedding 自動付与スキップ: {e}", "WARN")
 
@@ -485,50 +770,69 @@ def _attach_support_log_embedding(log_data: dict, element_id: str | None = None)
     register_support_log() で登録されたSupportLogにembeddingを付与する。
     elementId で直接特定するため、同一日・同一状況の重複ログがあっても安全。
     """
-    text = _EMBEDDING_TEXT_BUILDERS["SupportLog"](log_data)
+    text = build_text("SupportLog", log_data)
     if not text or not element_id:
         return
 
     try:
-        from lib.embedding import embed_text
+        from lib.embedding import embed_and_write
     except ImportError:
         return
 
     try:
-        embedding = embed_text(text)
-        if embedding is None:
-            return
-        run_query(
-            """
-            MATCH (n) WHERE elementId(n) = $id
-            CALL db.create.setNodeVectorProperty(n, 'embedding', $embedding)
-            """,
-            {"id": element_id, "embedding": embedding},
-        )
-        log("SupportLog embedding自動付与完了")
+        if embed_and_write([(element_id, "embedding", text, text_hash("SupportLog", text))]):
+            log("SupportLog embedding自動付与完了")
     except Exception as e:
         log(f"SupportLog embedding付与スキップ: {e}", "WARN")
 
 
-def _rebuild_support_log_chain(client_name: str):
+def refresh_client_card(client_name: Optional[str]) -> Optional[dict]:
+    """
+    クライアントのマテリアライズドカード（Client.cardJson）を再計算する。
+
+    登録系の関数から書き込み直後・キャッシュ無効化の前に呼ぶ（無効化の後だと、
+    再計算前の古いカードが新しい世代でキャッシュされうる）。
+    失敗しても登録自体は成功しているため、警告ログのみ出して続行する（ベストエフォート）。
+    """
+    if not client_name or client_name == "Unknown":
+        return None
+    try:
+        with without_deadline():  # コミット済みの登録の後始末なので、リクエストの予算切れで打ち切らない
+            return run_in_transaction(lambda tx: materialize_card(tx, client_name))
+    except DatabaseAccessError as e:
+        log(f"クライアントカード更新エラー ({client_name}): {e}", "WARN")
+        return None
+
+
+def _chain_support_logs(tx, client_name: str, nodes: list[dict], written) -> None:
+    """
+    登録したグラフの新しい SupportLog を、登録と同じトランザクションで時系列チェーンに差し込む
+    （register_support_log と同じ。失敗すれば登録ごとロールバックされる）
     """
-    特定クライアントのSupportLog間にFOLLOWSリレーションを自動構築する。
+    if client_name == "Unknown" or not any(n["label"] == "SupportLog" for n in written.registered):
+        return
+    update_support_log_chain(tx, [client_name], support_log_ids(nodes, written.temp_id_map))
+
+
+def _rebuild_support_log_chain(client_name: str, log_ids: Optional[list[str]] = None):
+    """
+    特定クライアントのSupportLog間のFOLLOWSリレーション（時系列チェーン）を更新する。
     （AIがリレーションの抽出を漏らした場合でも、時系列チェーンを担保するフェイルセーフ）
+    一括登録は _chain_support_logs で登録と同じトランザクションに含める。こちらは逐次登録（batched=False）の後で使う。
+
+    log_ids（今回登録したログの elementId）があれば既存チェーンへの差し込みで済ませ、
+    無い場合や件数が多い場合はクライアント全体を再構築する（lib/support_log_chain.py）。
+    登録自体は完了しているため、失敗してもログに残すだけで例外は送出しない。
     """
-    run_query("""
-        MATCH (log:SupportLog)-[:ABOUT]->(c:Client {name: $client_name})
-        WITH log, c ORDER BY log.date DESC
-        // 最新のものを除く過去のログと、その直前のログを結びつける
-        MATCH (current:SupportLog)-[:ABOUT]->(c)
-        OPTIONAL MATCH (prev:SupportLog)-[:ABOUT]->(c)
-        WHERE prev <> current AND prev.date <= current.date
-          AND NOT (current)-[:FOLLOWS]->()
-        WITH current, prev ORDER BY prev.date DESC
-        // collectの先頭（直近の過去）だけを取得してFOLLOWSで繋ぐ
-        WITH current, collect(prev)[0] AS immediate_prev
-        WHERE immediate_prev IS NOT NULL
-        MERGE (current)-[:FOLLOWS]->(immediate_prev)
-    """, {"client_name": client_name})
+    try:
+        with without_deadline():
+            _update_support_log_chain([client_name], log_ids or [])
+    except DatabaseAccessError as e:
+        log(f"時系列チェーン構築スキップ ({client_name}): {e}", "WARN")
+
+
+def _update_support_log_chain(client_names: list[str], log_ids: list[str]) -> str:
+    return run_in_transaction(lambda tx: update_support_log_chain(tx, client_names, log_ids))
 
 
 def register_support_log(log_data: dict, client_name: str) -> dict:
@@ -538,7 +842,7 @@ def register_support_log(log_data: dict, client_name: str) -> dict:
     """
     run_query("MERGE (s:Supporter {name: $supporter})", {"supporter": log_data['supporter']})
 
-    result = run_query("""
+    query = """
         MATCH (c:Client {name: $client_name})
         MATCH (s:Supporter {name: $supporter})
 
@@ -555,16 +859,9 @@ def register_support_log(log_data: dict, client_name: str) -> dict:
 
         CREATE (s)-[:LOGGED]->(log)-[:ABOUT]->(c)
 
-        WITH log, c
-        OPTIONAL MATCH (prevLog:SupportLog)-[:ABOUT]->(c)
-        WHERE prevLog <> log AND prevLog.date <= log.date
-        WITH log, prevLog ORDER BY prevLog.date DESC LIMIT 1
-        FOREACH (_ IN CASE WHEN prevLog IS NOT NULL THEN [1] ELSE [] END |
-            CREATE (log)-[:FOLLOWS]->(prevLog)
-        )
-
         RETURN log.date as date, log.situation as situation, elementId(log) as elementId
-    """, {
+    """
+    params = {
         "client_name": client_name,
         "supporter": log_data['supporter'],
         "date": log_data['date'],
@@ -575,9 +872,20 @@ def register_support_log(log_data: dict, client_name: str) -> dict:
         "type": log_data.get('type', '日常記録'),
         "duration": log_data.get('duration'),
         "nextAction": log_data.get('nextAction')
-    })
+    }
+
+    def work(tx):
+        # 作成と同じトランザクションで時系列チェーンに差し込む（遡り入力でも前後のリンクを張り替える）
+        rows = tx.run(query, params).data()
+        if rows:
+            splice_support_logs(tx, [rows[0]["elementId"]])
+        return rows
+
+    result = run_in_transaction(work)
 
     if result:
+        refresh_client_card(client_name)
+        invalidate_client(client_name)
         # Embedding自動付与（ベストエフォート）
         _attach_support_log_embedding(log_data, element_id=result[0].get("elementId"))
         return {"status": "success", "message": f"支援記録を登録: {log_data['situation']}", "data": result[0]}
@@ -642,12 +950,12 @@ def discover_care_patterns(client_name: str, min_frequency: int = 3):
 
 
 def search_support_logs(keyword: str, client_name: str = None, limit: int = 20) -> list:
-    """全文検索で支援記録を検索"""
+    """全文検索で支援記録を検索（client_name は resolve_client_name で解決した氏名と完全一致で絞り込む）"""
     results = run_query("""
         CALL db.index.fulltext.queryNodes('idx_supportlog_fulltext', $keyword)
         YIELD node, score
         MATCH (s:Supporter)-[:LOGGED]->(node)-[:ABOUT]->(c:Client)
-        WHERE $client_name = '' OR c.name CONTAINS $client_name
+        WHERE $client_name = '' OR c.name = $client_name
         RETURN node.date as 日付,
                s.name as 支援者,
                c.name as クライアント,
@@ -657,7 +965,11 @@ def search_support_logs(keyword: str, client_name: str = None, limit: int = 20)
                score as スコア
         ORDER BY score DESC
         LIMIT $limit
-    """, {"keyword": keyword, "client_name": client_name or "", "limit": limit})
+    """, {
+        "keyword": keyword,
+        "client_name": resolve_client_name(client_name) if client_name else "",
+        "limit": limit,
+    })
     return _mask_output(results)
 
 
@@ -691,58 +1003,85 @@ def normalize_identifier(text: str) -> str:
     return normalized
 
 
-def resolve_client(identifier: str) -> Optional[dict]:
-    """様々な識別子からクライアント情報を解決"""
+_CLIENT_RESOLVE_RETURN = """
+        OPTIONAL MATCH (c)-[:HAS_IDENTITY]->(i:Identity)
+        RETURN c.clientId as clientId, c.displayCode as displayCode,
+               c.bloodType as bloodType, c.kana as kana, c.aliases as aliases,
+               COALESCE(i.name, c.name) as name, COALESCE(i.dob, c.dob) as dob
+"""
+
+
+def _resolve_client_steps(identifier: str, include_partial: bool = True) -> list[tuple[str, dict]]:
+    """
+    resolve_client の検索手順（先頭から順に試し、最初にヒットした結果を採用）。
+    同期版・非同期版 (lib.async_db_operations) で共有する。
+
+    Args:
+        include_partial: False なら部分一致（全件走査）の手順を含めない
+    """
     clean_identifier = normalize_identifier(identifier)
+    steps = []
 
     # clientId で検索
     if clean_identifier.startswith("c-"):
-        result = run_query("""
-            MATCH (c:Client {clientId: $id})
-            OPTIONAL MATCH (c)-[:HAS_IDENTITY]->(i:Identity)
-            RETURN c.clientId as clientId, c.displayCode as displayCode,
-                   c.bloodType as bloodType, c.kana as kana, c.aliases as aliases,
-                   COALESCE(i.name, c.name) as name, COALESCE(i.dob, c.dob) as dob
-        """, {"id": clean_identifier})
-        if result: return result[0]
+        steps.append(("MATCH (c:Client {clientId: $id})" + _CLIENT_RESOLVE_RETURN,
+                      {"id": clean_identifier}))
 
     # displayCode で検索
     if clean_identifier.startswith("A-"):
-        result = run_query("""
-            MATCH (c:Client {displayCode: $code})
-            OPTIONAL MATCH (c)-[:HAS_IDENTITY]->(i:Identity)
-            RETURN c.clientId as clientId, c.displayCode as displayCode,
-                   c.bloodType as bloodType, c.kana as kana, c.aliases as aliases,
-                   COALESCE(i.name, c.name) as name, COALESCE(i.dob, c.dob) as dob
-        """, {"code": clean_identifier})
-        if result: return result[0]
+        steps.append(("MATCH (c:Client {displayCode: $code})" + _CLIENT_RESOLVE_RETURN,
+                      {"code": clean_identifier}))
 
     # 氏名またはふりがな、または通称で検索（完全一致）
-    result = run_query("""
+    steps.append(("""
         MATCH (c:Client)
         WHERE c.name IN [$raw, $clean] OR c.kana IN [$raw, $clean]
            OR ANY(alias IN COALESCE(c.aliases, []) WHERE alias IN [$raw, $clean])
-        OPTIONAL MATCH (c)-[:HAS_IDENTITY]->(i:Identity)
-        RETURN c.clientId as clientId, c.displayCode as displayCode,
-               c.bloodType as bloodType, c.kana as kana, c.aliases as aliases,
-               COALESCE(i.name, c.name) as name, COALESCE(i.dob, c.dob) as dob
-        LIMIT 1
-    """, {"raw": identifier, "clean": clean_identifier})
-    if result: return result[0]
+    """ + _CLIENT_RESOLVE_RETURN + "LIMIT 1", {"raw": identifier, "clean": clean_identifier}))
+
+    if not include_partial:
+        return steps
 
     # 部分一致検索（フォールバック）
-    result = run_query("""
+    steps.append(("""
         MATCH (c:Client)
         WHERE (c.name CONTAINS $clean OR $clean CONTAINS c.name)
            OR (c.kana IS NOT NULL AND (c.kana CONTAINS $clean OR $clean CONTAINS c.kana))
            OR ANY(alias IN COALESCE(c.aliases, []) WHERE alias CONTAINS $clean OR $clean CONTAINS alias)
-        OPTIONAL MATCH (c)-[:HAS_IDENTITY]->(i:Identity)
-        RETURN c.clientId as clientId, c.displayCode as displayCode,
-               c.bloodType as bloodType, c.kana as kana, c.aliases as aliases,
-               COALESCE(i.name, c.name) as name, COALESCE(i.dob, c.dob) as dob
-        LIMIT 1
-    """, {"clean": clean_identifier})
-    return result[0] if result else None
+    """ + _CLIENT_RESOLVE_RETURN + "LIMIT 1", {"clean": clean_identifier}))
+
+    return steps
+
+
+def resolve_client(identifier: str, use_cache: bool = True, use_index: bool = True) -> Optional[dict]:
+    """
+    様々な識別子からクライアント情報を解決
+
+    まずインメモリの識別子索引 (lib.client_index) を引き、見つからなければ
+    別プロセスで登録された直後のクライアントに備えて完全一致のクエリで確認する。
+    （部分一致の全件走査は索引で代替するため実行しない）
+
+    Args:
+        use_cache: False ならクエリ結果キャッシュを使わず常に DB を参照する
+        use_index: False なら索引を使わず従来の 4 段階のクエリで解決する
+    """
+    include_partial = True
+    if use_index:
+        from lib.client_index import get_client_index
+        index = get_client_index()
+        try:
+            index.ensure_fresh(run_query)
+            found = index.lookup(identifier)
+            if found:
+                return found
+            include_partial = False
+        except DatabaseAccessError as e:
+            log(f"クライアント索引を利用できないためクエリで解決します: {e}", "WARN")
+
+    for query, params in _resolve_client_steps(identifier, include_partial=include_partial):
+        result = cached_query(query, params, lambda: run_query(query, params), use_cache=use_cache)
+        if result: return result[0]
+    return None
 
 
 def get_clients_list_extended(include_pii: bool = True) -> list:
@@ -770,6 +1109,20 @@ def get_client_by_identifier(identifier: str) -> Optional[str]:
     return None
 
 
+def resolve_client_name(identifier: str) -> str:
+    """
+    テンプレートの $clientName に渡す完全一致の氏名を返す。
+
+    識別子（clientId / displayCode / 氏名 / ふりがな / 通称 / 部分一致）の解決は索引で 1 回だけ行い、
+    テンプレート側は MATCH (c:Client {name: $clientName}) の等価検索（一意性制約によるインデックスシーク）で書く。
+    c.name CONTAINS $clientName は全件走査になるうえ、別人に部分一致するおそれがある。
+    解決できない場合は入力をそのまま返す（該当なしになる）。
+    """
+    client = resolve_client(identifier)
+    if client: return client.get('name') or identifier
+    return identifier
+
+
 def match_client_clause(identifier: str) -> tuple[str, dict]:
     """クライアントをマッチするための Cypher 句を生成"""
     client = resolve_client(identifier)
@@ -859,72 +1212,55 @@ def get_upcoming_renewals(days_ahead: int = 90, limit: int = 10) -> list:
         return []
 
 
-def get_client_detail(client_name: str) -> dict:
-    """クライアント詳細情報を一括取得（展開カード用）"""
-    try:
-        basic = run_query("""
-            MATCH (c:Client {name: $name})
-            OPTIONAL MATCH (c)-[:HAS_CONDITION]->(con:Condition)
-            OPTIONAL MATCH (c)-[:HAS_CERTIFICATE]->(cert:Certificate)
-            RETURN c.name as name, c.dob as dob, c.bloodType as bloodType,
-                   collect(DISTINCT con.name) as conditions,
-                   collect(DISTINCT {
-                       type: cert.type, grade: cert.grade,
-                       renewal: cert.nextRenewalDate
-                   }) as certificates
-        """, {"name": client_name})
-    except Exception as e:
-        log(f"基本情報取得エラー ({client_name}): {e}", "WARN")
-        basic = []
+# 展開カードで使うセクション（lib/client_card.py のクライアントカードから取り出す）
+CLIENT_DETAIL_SECTIONS = ("conditions", "certificates", "ngActions", "carePreferences", "keyPersons", "recentLogs")
 
-    try:
-        ng_actions = run_query("""
-            MATCH (c:Client {name: $name})-[:MUST_AVOID]->(ng:NgAction)
-            RETURN ng.action as action, ng.reason as reason, ng.riskLevel as risk
-        """, {"name": client_name})
-    except Exception as e:
-        log(f"禁忌事項取得エラー ({client_name}): {e}", "WARN")
-        ng_actions = []
 
-    try:
-        care_prefs = run_query("""
-            MATCH (c:Client {name: $name})-[:REQUIRES]->(cp:CarePreference)
-            RETURN cp.category as category, cp.instruction as instruction
-            ORDER BY cp.priority DESC
-            LIMIT 5
-        """, {"name": client_name})
-    except Exception as e:
-        log(f"ケア情報取得エラー ({client_name}): {e}", "WARN")
-        care_prefs = []
+def _format_client_detail(card: Optional[dict]) -> dict:
+    """クライアントカードを展開カード用の dict に整形"""
+    if not card:
+        return {'basic': {}, 'ng_actions': [], 'care_prefs': [], 'key_persons': [], 'recent_logs': []}
+    client = card["client"]
+    basic = {
+        'name': client["name"], 'dob': client["dob"], 'bloodType': client["bloodType"],
+        'conditions': [con["name"] for con in card["conditions"]],
+        'certificates': [
+            {'type': cert["type"], 'grade': cert["grade"], 'renewal': cert["nextRenewalDate"]}
+            for cert in card["certificates"]
+        ],
+    }
+    return {
+        'basic': _mask_output([basic])[0],
+        'ng_actions': [
+            {'action': ng["action"], 'reason': ng["reason"], 'risk': ng["riskLevel"]}
+            for ng in card["ngActions"]
+        ],
+        'care_prefs': [
+            {'category': cp["category"], 'instruction': cp["instruction"]}
+            for cp in card["carePreferences"][:5]
+        ],
+        'key_persons': _mask_output([
+            {'name': kp["name"], 'phone': kp["phone"], 'relationship': kp["relationship"], 'rank': kp["rank"]}
+            for kp in card["keyPersons"][:3]
+        ]),
+        'recent_logs': _mask_output([
+            {'date': lg["date"], 'situation': lg["situation"],
+             'effectiveness': lg["effectiveness"], 'supporter': lg["supporter"]}
+            for lg in card["recentLogs"]
+        ]),
+    }
 
-    try:
-        key_persons = run_query("""
-            MATCH (c:Client {name: $name})-[r:HAS_KEY_PERSON]->(kp:KeyPerson)
-            RETURN kp.name as name, kp.phone as phone,
-                   kp.relationship as relationship, r.rank as rank
-            ORDER BY r.rank ASC
-            LIMIT 3
-        """, {"name": client_name})
-    except Exception as e:
-        log(f"緊急連絡先取得エラー ({client_name}): {e}", "WARN")
-        key_persons = []
 
+def get_client_detail(client_name: str, use_cache: bool = True) -> dict:
+    """クライアント詳細情報を取得（展開カード用。マテリアライズドカードがあれば 1 回のクエリで済み、禁忌事項・キーパーソンはライブ）"""
+    params = {"name": client_name, "sections": list(CLIENT_DETAIL_SECTIONS)}
     try:
-        recent_logs = run_query("""
-            MATCH (s:Supporter)-[:LOGGED]->(log:SupportLog)-[:ABOUT]->(c:Client {name: $name})
-            RETURN log.date as date, log.situation as situation,
-                   log.effectiveness as effectiveness, s.name as supporter
-            ORDER BY log.date DESC
-            LIMIT 5
-        """, {"name": client_name})
+        card = cached_query(
+            MATERIALIZED_CARD_QUERY, params,
+            lambda: fetch_materialized_card(run_query, client_name, CLIENT_DETAIL_SECTIONS),
+            client=client_name, use_cache=use_cache,
+        )
     except Exception as e:
-        log(f"支援記録取得エラー ({client_name}): {e}", "WARN")
-        recent_logs = []
-
-    return {
-        'basic': _mask_output(basic)[0] if basic else {},
-        'ng_actions': ng_actions,
-        'care_prefs': care_prefs,
-        'key_persons': _mask_output(key_persons),
-        'recent_logs': _mask_output(recent_logs)
-    }
+        log(f"クライアント詳細取得エラー ({client_name}): {e}", "WARN")
+        card = None
+    return _format_client_detail(card)
@@ -13,6 +13,13 @@ from typing import Optional
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
 
+from lib.audit_sink import get_audit_sink
+from lib.client_card import materialize_card
+from lib.db_runtime import DatabaseAccessError, driver_config_from_env, execute_query, execute_transaction
+from lib.embedding_texts import EMBEDDING_TEXT_BUILDERS, build_text, text_hash
+from lib.query_cache import invalidate_client
+from lib.support_log_chain import support_log_ids, update_support_log_chain
+
 load_dotenv()
 
 # 仮名化スキーマ設定
@@ -53,23 +60,28 @@ def get_driver():
             log("Neo4j環境変数が未設定です", "ERROR")
             return None
         try:
-            _driver = GraphDatabase.driver(uri, auth=(user, pwd))
+            _driver = GraphDatabase.driver(uri, auth=(user, pwd), **driver_config_from_env())
             _driver.verify_connectivity()
         except Exception as e:
             log(f"Neo4j接続失敗: {e}", "ERROR")
             _driver = None
     return _driver
 
-def run_query(query, params=None):
+def run_query(query, params=None, write=None):
+    """管理トランザクションで実行（自動リトライ）。失敗時は DatabaseAccessError を送出"""
+    try:
+        return execute_query(get_driver(), query, params, write=write)
+    except DatabaseAccessError as e:
+        log(str(e), "ERROR")
+        raise
+
+def run_in_transaction(work, write: bool = True):
+    """管理トランザクション内で work(tx) を実行（レーンの枠を取って実行。失敗時はロールバックして例外を送出）"""
     try:
-        driver = get_driver()
-        if driver is None: return []
-        with driver.session() as session:
-            result = session.run(query, params or {})
-            return [record.data() for record in result]
-    except Exception as e:
-        log(f"クエリ実行エラー: {e}", "ERROR")
-        return []
+        return execute_transaction(get_driver(), work, write=write)
+    except DatabaseAccessError as e:
+        log(str(e), "ERROR")
+        raise
 
 # =============================================================================
 # 登録エンジン構成
@@ -90,36 +102,17 @@ MERGE_KEYS = {
     "Certificate": ["type"]
 }
 
-# Embedding生成用のテキスト構築ルール（感情・タグ・文脈を包含）
-_EMBEDDING_TEXT_BUILDERS = {
-    "SupportLog": lambda p: "。".join(filter(None, [
-        f"感情: {p.get('emotion')}" if p.get("emotion") else None,
-        f"きっかけ: {p.get('triggerTag')}" if p.get("triggerTag") else None,
-        f"状況: {p.get('situation')}" if p.get("situation") else None,
-        f"対応: {p.get('action')}" if p.get("action") else None,
-        f"文脈: {p.get('context')}" if p.get("context") else None,
-        f"メモ: {p.get('note')}" if p.get("note") else None,
-        f"効果: {p.get('effectiveness')}" if p.get("effectiveness") else None,
-    ])),
-    "NgAction": lambda p: "。".join(filter(None, [
-        f"禁忌: {p.get('action')}" if p.get('action') else None,
-        f"理由: {p.get('reason')}" if p.get('reason') else None,
-        f"リスク: {p.get('riskLevel')}" if p.get('riskLevel') else None,
-    ])),
-    "CarePreference": lambda p: "。".join(filter(None, [
-        f"カテゴリ: {p.get('category')}" if p.get('category') else None,
-        f"指示: {p.get('instruction')}" if p.get('instruction') else None,
-    ])),
-}
+# Embedding生成用のテキスト構築ルールは lib.embedding_texts（感情・タグ・文脈を包含）
 
 # =============================================================================
 # 汎用グラフ登録メイン関数
 # =============================================================================
 
-def register_to_database(extracted_graph: dict, user_name: str = "system") -> dict:
+def register_to_database(extracted_graph: dict, user_name: str = "system", batched: bool = True) -> dict:
     """
     LLMが抽出したグラフ構造を検証・登録し、監査ログとEmbeddingを付与する。
     Guardian Layer: スキーマバリデーション（camelCase変換・ラベル検証・廃止リレーション修正）を自動適用。
+    batched=True（デフォルト）ではノード・リレーション・監査ログを 1 トランザクションで UNWIND 登録する。
     """
     if 'nodes' not in extracted_graph:
         log("無効なグラフ形式です。'nodes' キーが必要です。", "ERROR")
@@ -131,6 +124,52 @@ def register_to_database(extracted_graph: dict, user_name: str = "system") -> di
     if validation_warnings:
         log(f"スキーマ検証警告 ({len(validation_warnings)}件): {'; '.join(validation_warnings[:3])}", "WARN")
 
+    # 1-2. ノード・リレーションシップの処理
+    if batched:
+        try:
+            temp_id_map, registered_labels, client_name_context = _register_batched(extracted_graph, user_name)
+        except Exception as e:
+            log(f"バッチ登録エラー（ロールバック済み）: {e}", "ERROR")
+            return {"status": "error", "message": f"登録に失敗しました: {e}"}
+    else:
+        temp_id_map, registered_labels, client_name_context = _register_per_query(extracted_graph, user_name)
+
+    # マテリアライズドカードの再計算 → クエリ結果キャッシュの無効化（promote_to_care_preference 等の経由も含む）
+    _refresh_client_card(client_name_context)
+    invalidate_client(client_name_context if client_name_context != "Unknown" else None)
+
+    # 3. 事後処理 (チェーン構築・Embedding)。一括登録のチェーンは登録と同じトランザクションで差し込み済み
+    if not batched and "SupportLog" in registered_labels:
+        _rebuild_support_log_chain(client_name_context, support_log_ids(extracted_graph.get("nodes", []), temp_id_map))
+    
+    _attach_embeddings_batch(temp_id_map, extracted_graph.get("nodes", []))
+    _try_attach_client_summary(client_name_context, registered_labels)
+
+    return {
+        "status": "success",
+        "client_name": client_name_context,
+        "count": len(registered_labels),
+        "types": list(set(registered_labels))
+    }
+
+def _register_batched(extracted_graph, user_name):
+    """1 トランザクション内で UNWIND 一括登録（ノード → リレーション → 監査ログ → 時系列チェーンへの差し込み）"""
+    from lib.graph_writer import plan_graph_write, write_graph
+    plan = plan_graph_write(extracted_graph, MERGE_KEYS, missing_merge_key="create")
+    for w in plan.warnings: log(w, "WARN")
+    client = plan.client_name
+
+    def chain_support_logs(tx, written):
+        if any(n["label"] == "SupportLog" for n in written.registered):
+            update_support_log_chain(tx, [client], support_log_ids(extracted_graph.get("nodes", []), written.temp_id_map))
+
+    result = write_graph(run_in_transaction, plan,
+                         audit_entry_builder=lambda n: _audit_entry(user_name, n["label"], n["properties"], n["action"], client),
+                         after_write=chain_support_logs)
+    return result.temp_id_map, [n["label"] for n in result.registered], client
+
+def _register_per_query(extracted_graph, user_name):
+    """従来方式: ノード・リレーション・監査ログごとに個別クエリで登録"""
     temp_id_map = {}
     registered_labels = []
     client_name_context = "Unknown"
@@ -184,78 +223,63 @@ def register_to_database(extracted_graph: dict, user_name: str = "system") -> di
                 SET r += $props
             """, {"sid": source_id, "tid": target_id, "props": rel.get("properties", {})})
 
-    # 3. 事後処理 (チェーン構築・Embedding)
-    if "SupportLog" in registered_labels:
-        _rebuild_support_log_chain(client_name_context)
-    
-    _attach_embeddings_batch(temp_id_map, extracted_graph.get("nodes", []))
-    _try_attach_client_summary(client_name_context, registered_labels)
-
-    return {
-        "status": "success",
-        "client_name": client_name_context,
-        "count": len(registered_labels),
-        "types": list(set(registered_labels))
-    }
+    return temp_id_map, registered_labels, client_name_context
 
 # =============================================================================
 # 内部ユーティリティ
 # =============================================================================
 
-def _audit_node_creation(user, label, props, action, client):
-    """特定のラベルに対して重要な監査ログを生成"""
+def _audit_entry(user, label, props, action, client):
+    """特定のラベルに対して重要な監査ログエントリを生成（対象外は None）"""
     if label == "NgAction":
-        create_audit_log(user, action, label, props.get('action', ''), 
-                         f"Risk: {props.get('riskLevel')}", client)
+        name, details = props.get('action', ''), f"Risk: {props.get('riskLevel')}"
     elif label == "SupportLog":
-        create_audit_log(user, action, label, 
-                         f"{props.get('emotion', '不明')}-{props.get('triggerTag', '不明')}", 
-                         f"Context: {props.get('context', '')}", client)
+        name = f"{props.get('emotion', '不明')}-{props.get('triggerTag', '不明')}"
+        details = f"Context: {props.get('context', '')}"
     elif label == "Client":
-        create_audit_log(user, action, label, props.get('name', ''), "Basic Info", client)
+        name, details = props.get('name', ''), "Basic Info"
+    else:
+        return None
+    return {"user": user, "action": action, "targetType": label, "targetName": name,
+            "details": details, "clientName": client or ""}
+
+def _audit_node_creation(user, label, props, action, client):
+    """特定のラベルに対して重要な監査ログを生成"""
+    entry = _audit_entry(user, label, props, action, client)
+    if entry:
+        create_audit_log(user, action, label, entry["targetName"], entry["details"], client)
 
 def create_audit_log(user, action, target_type, target_name, details="", client_name=None):
-    run_query("""
-        CREATE (al:AuditLog {
-            timestamp: datetime(), user: $user, action: $action,
-            targetType: $type, targetName: $name, details: $details, clientName: $client
-        })
-        WITH al OPTIONAL MATCH (c:Client {name: $client})
-        WHERE $client IS NOT NULL AND $client <> ''
-        FOREACH (_ IN CASE WHEN c IS NOT NULL THEN [1] ELSE [] END | CREATE (al)-[:AUDIT_FOR]->(c))
-    """, {"user": user, "action": action, "type": target_type, "name": target_name, 
-          "details": details, "client": client_name or ""})
-
-def _rebuild_support_log_chain(client_name):
-    run_query("""
-        MATCH (log:SupportLog)-[:ABOUT]->(c:Client {name: $name})
-        WITH log ORDER BY log.date DESC
-        MATCH (current:SupportLog)-[:ABOUT]->(c:Client {name: $name})
-        WHERE NOT (current)-[:FOLLOWS]->()
-        OPTIONAL MATCH (prev:SupportLog)-[:ABOUT]->(c)
-        WHERE prev <> current AND prev.date <= current.date
-        WITH current, prev ORDER BY prev.date DESC
-        WITH current, collect(prev)[0] AS imm_prev
-        WHERE imm_prev IS NOT NULL
-        MERGE (current)-[:FOLLOWS]->(imm_prev)
-    """, {"name": client_name})
+    get_audit_sink().submit({"user": user, "action": action, "targetType": target_type, "targetName": target_name,
+                             "details": details, "clientName": client_name or ""})
+
+def _refresh_client_card(client_name):
+    if not client_name or client_name == "Unknown":
+        return
+    try:
+        run_in_transaction(lambda tx: materialize_card(tx, client_name))
+    except DatabaseAccessError as e:
+        log(f"クライアントカード更新スキップ ({client_name}): {e}", "WARN")
+
+def _rebuild_support_log_chain(client_name, log_ids=None):
+    try:
+        run_in_transaction(lambda tx: update_support_log_chain(tx, [client_name], log_ids or []))
+    except DatabaseAccessError as e:
+        log(f"時系列チェーン構築スキップ ({client_name}): {e}", "WARN")
 
 def _attach_embeddings_batch(temp_id_map, nodes):
     targets = []
     for node in nodes:
         label = node.get("label")
-        if label in _EMBEDDING_TEXT_BUILDERS:
+        if label in EMBEDDING_TEXT_BUILDERS:
             eid = temp_id_map.get(node.get("temp_id"))
-            text = _EMBEDDING_TEXT_BUILDERS[label](node.get("properties", {}))
-            if eid and text: targets.append({"id": eid, "text": text})
+            text = build_text(label, node.get("properties", {}))
+            if eid and text: targets.append({"id": eid, "text": text, "hash": text_hash(label, text)})
     
     if not targets: return
     try:
-        from lib.embedding import embed_texts_batch
-        embeddings = embed_texts_batch([t["text"] for t in targets])
-        for t, emb in zip(targets, embeddings):
-            if emb: run_query("MATCH (n) WHERE elementId(n) = $id CALL db.create.setNodeVectorProperty(n, 'embedding', $emb)",
-                             {"id": t["id"], "emb": emb})
+        from lib.embedding import embed_and_write
+        embed_and_write(((t["id"], "embedding", t["text"], t["hash"]) for t in targets), run_query=run_query)
     except Exception as e: log(f"Embedding付与失敗: {e}", "WARN")
 
 def _try_attach_client_summary(name, labels):
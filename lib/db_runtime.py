@@ -0,0 +1,557 @@
+"""
+Neo4j クエリ実行ランタイム
+
+db_operations / db_new_operations / async_db_operations の run_query・run_in_transaction が共通で使う実行層。
+
+- 管理トランザクション (execute_read / execute_write) で実行し、読み取りと書き込みをルーティング
+- 一時的な障害（リーダー切り替え・デッドロック等）はドライバーのリトライ
+  （ジッター付き指数バックオフ）に任せ、コネクションプールの取得タイムアウトはここで再試行
+- 失敗時は空リストを返さず、型付き例外を送出する
+  （「DB障害」と「該当なし」を呼び出し側で区別できるようにする）
+- 呼び出しごとのリトライ回数・プール待ち時間を記録
+- 大量の読み取り・エクスポート用に、結果を溜めずに 1 件ずつ返す stream_query
+- 呼び出し元のワークロードクラス（lib/workload.py）のレーンで枠を取ってから実行し、
+  クラスごとのクエリタイムアウトを適用（緊急照会がバッチ処理の負荷で待たされないようにする）
+- リクエストのデッドライン（lib/deadline.py）があれば、残り時間を枠の待ち時間・クエリタイムアウトの上限にする
+
+環境変数:
+  NEO4J_MAX_CONNECTION_POOL_SIZE        プールの最大接続数（デフォルト: 50）
+  NEO4J_CONNECTION_ACQUISITION_TIMEOUT  接続取得の待ち時間・秒（デフォルト: 30）
+  NEO4J_MAX_CONNECTION_LIFETIME         接続の最大寿命・秒（デフォルト: 3600）
+  NEO4J_MAX_TRANSACTION_RETRY_TIME      一時的障害のリトライを続ける最大時間・秒（デフォルト: 15）
+  NEO4J_POOL_TIMEOUT_RETRIES            プール取得タイムアウト時の再試行回数（デフォルト: 2）
+"""
+
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Iterator
+
+from neo4j import READ_ACCESS, Query, unit_of_work
+from neo4j.exceptions import (
+    ClientError,
+    ConnectionAcquisitionTimeoutError,
+    DriverError,
+    Neo4jError,
+    ServiceUnavailable,
+    SessionExpired,
+    TransientError,
+)
+
+from lib.deadline import DeadlineExceeded, exceeded_error, timeout_for
+from lib.workload import current_workload, get_governor
+
+
+def _log(message: str, level: str = "INFO"):
+    sys.stderr.write(f"[DB_Runtime:{level}] {message}\n")
+    sys.stderr.flush()
+
+
+# =============================================================================
+# 例外
+# =============================================================================
+
+class DatabaseAccessError(Exception):
+    """Neo4j へのアクセス失敗（基底クラス）"""
+
+
+class DatabaseUnavailableError(DatabaseAccessError):
+    """接続できない・リトライしても一時的障害が解消しない"""
+
+
+class PoolTimeoutError(DatabaseUnavailableError):
+    """コネクションプールから接続を取得できなかった"""
+
+
+class QueryExecutionError(DatabaseAccessError):
+    """Cypher の構文・制約違反などリトライしても成功しないエラー"""
+
+
+def _translate_error(e: Exception) -> DatabaseAccessError | DeadlineExceeded:
+    if isinstance(e, DeadlineExceeded):
+        return e
+    # リクエストの予算切れによるタイムアウト・枠待ちの打ち切りは DeadlineExceeded として返す
+    exceeded = exceeded_error("Neo4j")
+    if exceeded is not None:
+        return exceeded
+    if isinstance(e, DatabaseAccessError):
+        return e
+    if isinstance(e, ConnectionAcquisitionTimeoutError):
+        return PoolTimeoutError(f"コネクションプールの取得がタイムアウトしました: {e}")
+    if isinstance(e, (ServiceUnavailable, SessionExpired, TransientError)):
+        return DatabaseUnavailableError(f"Neo4j に接続できません: {e}")
+    if isinstance(e, ClientError):
+        return QueryExecutionError(f"クエリ実行エラー: {e}")
+    if isinstance(e, (Neo4jError, DriverError)):
+        return DatabaseUnavailableError(f"Neo4j エラー: {e}")
+    return QueryExecutionError(f"クエリ実行エラー: {e}")
+
+
+# =============================================================================
+# ドライバー設定
+# =============================================================================
+
+def driver_config_from_env() -> dict:
+    """GraphDatabase.driver / AsyncGraphDatabase.driver に渡すプール設定"""
+    return {
+        "max_connection_pool_size": int(os.getenv("NEO4J_MAX_CONNECTION_POOL_SIZE", "50")),
+        "connection_acquisition_timeout": float(os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "30")),
+        "max_connection_lifetime": float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+        "max_transaction_retry_time": float(os.getenv("NEO4J_MAX_TRANSACTION_RETRY_TIME", "15")),
+    }
+
+
+def _pool_timeout_retries() -> int:
+    return int(os.getenv("NEO4J_POOL_TIMEOUT_RETRIES", "2"))
+
+
+def _backoff_seconds(attempt: int, base: float = 0.2, cap: float = 2.0) -> float:
+    """フルジッター付き指数バックオフ"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# =============================================================================
+# 書き込み判定
+# =============================================================================
+
+_WRITE_CLAUSE = re.compile(
+    r"\b(CREATE|MERGE|SET|DELETE|REMOVE|DROP|FOREACH|LOAD\s+CSV)\b"
+    r"|\bCALL\s+db\.create\."
+    r"|\bCALL\s+apoc\.(create|merge|refactor|periodic)\.",
+    re.IGNORECASE,
+)
+_STRING_OR_COMMENT = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|//[^\n]*|/\*.*?\*/", re.DOTALL)
+_IN_TRANSACTIONS = re.compile(r"\bIN\s+(\d+\s+)?(CONCURRENT\s+)?TRANSACTIONS\b", re.IGNORECASE)
+
+
+def is_write_query(query: str) -> bool:
+    """文字列リテラル・コメントを除いた Cypher に書き込み句が含まれるか"""
+    return bool(_WRITE_CLAUSE.search(_STRING_OR_COMMENT.sub("''", query)))
+
+
+def _requires_auto_commit(query: str) -> bool:
+    """CALL { ... } IN TRANSACTIONS は管理トランザクション内で実行できない"""
+    return bool(_IN_TRANSACTIONS.search(_STRING_OR_COMMENT.sub("''", query)))
+
+
+# =============================================================================
+# 計測
+# =============================================================================
+
+@dataclass
+class CallStats:
+    """run_query 1 回分の計測値"""
+    mode: str                 # "read" / "write" / "auto"
+    workload: str = "interactive"
+    retries: int = 0          # 一時的障害・プール待ちによる再実行回数
+    lane_wait_ms: float = 0.0  # ワークロードのレーンの空き待ち
+    pool_wait_ms: float = 0.0  # セッション開始からトランザクション関数が呼ばれるまで
+    elapsed_ms: float = 0.0
+    error: str | None = None
+
+
+@dataclass
+class QueryStats:
+    """プロセス内の累積値"""
+    calls: int = 0
+    reads: int = 0
+    writes: int = 0
+    failures: int = 0
+    retries: int = 0
+    pool_wait_ms_total: float = 0.0
+    pool_wait_ms_max: float = 0.0
+    recent: deque = field(default_factory=lambda: deque(maxlen=200))
+
+
+_stats = QueryStats()
+_stats_lock = threading.Lock()
+
+
+def _record(call: CallStats) -> None:
+    with _stats_lock:
+        _stats.calls += 1
+        if call.mode == "write":
+            _stats.writes += 1
+        else:
+            _stats.reads += 1
+        if call.error:
+            _stats.failures += 1
+        _stats.retries += call.retries
+        _stats.pool_wait_ms_total += call.pool_wait_ms
+        _stats.pool_wait_ms_max = max(_stats.pool_wait_ms_max, call.pool_wait_ms)
+        _stats.recent.append(call)
+    if call.retries:
+        _log(f"{call.mode} クエリを {call.retries} 回リトライ "
+             f"(プール待ち {call.pool_wait_ms:.0f}ms, 計 {call.elapsed_ms:.0f}ms)", "WARN")
+
+
+def get_query_stats(recent: int = 0) -> dict:
+    """
+    累積の計測値を返す。
+
+    Args:
+        recent: 直近の呼び出しごとの計測値も含める件数（0 なら含めない）
+    """
+    with _stats_lock:
+        stats = {k: v for k, v in asdict(_stats).items() if k != "recent"}
+        stats["pool_wait_ms_avg"] = (_stats.pool_wait_ms_total / _stats.calls) if _stats.calls else 0.0
+        if recent:
+            stats["recent"] = [asdict(c) for c in list(_stats.recent)[-recent:]]
+    return stats
+
+
+def reset_query_stats() -> None:
+    global _stats
+    with _stats_lock:
+        _stats = QueryStats()
+
+
+# =============================================================================
+# 実行
+# =============================================================================
+
+class _Lane:
+    """呼び出し元のワークロードクラスのレーンの枠（with / async with で取得・返却）"""
+
+    def __init__(self, call: CallStats):
+        self.governor = get_governor()
+        self.name = call.workload = current_workload()
+        self.config = self.governor.configs[self.name]
+        self.call = call
+
+    def _acquired(self, ok: bool, started: float) -> None:
+        self.call.lane_wait_ms = (time.perf_counter() - started) * 1000
+        if not ok:
+            raise PoolTimeoutError(
+                f"{self.name} レーンの空きを {self.config.wait_seconds:.0f} 秒待てませんでした"
+                f"（同時実行 {self.config.slots}）"
+            )
+
+    def _wait_seconds(self) -> float:
+        return timeout_for("Neo4j", self.config.wait_seconds)
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self._acquired(self.governor.acquire(self.name, self._wait_seconds()), started)
+        return self
+
+    def __exit__(self, *exc):
+        self.governor.release(self.name)
+        return False
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        self._acquired(await self.governor.async_acquire(self.name, self._wait_seconds()), started)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.governor.release(self.name)
+        return False
+
+    def _timeout(self) -> float | None:
+        # レーンのタイムアウトとデッドラインの残り時間の短い方
+        return timeout_for("Neo4j", self.config.query_timeout)
+
+    def query(self, query: str):
+        """自動コミット・ストリーミング用（レーンのタイムアウトを付けた Query）"""
+        timeout = self._timeout()
+        return Query(query, timeout=timeout) if timeout else query
+
+    def work(self, work):
+        """管理トランザクションのトランザクション関数にレーンのタイムアウトを付ける"""
+        timeout = self._timeout()
+        return unit_of_work(timeout=timeout)(work) if timeout else work
+
+
+def execute_query(driver, query: str, params: dict | None = None, write: bool | None = None) -> list[dict]:
+    """
+    管理トランザクションで Cypher を実行し、レコードを dict のリストで返す。
+
+    Args:
+        driver: neo4j.Driver（None なら DatabaseUnavailableError）
+        write: 書き込みかどうか。None なら is_write_query() で自動判定
+
+    Raises:
+        DatabaseUnavailableError / PoolTimeoutError / QueryExecutionError
+        DeadlineExceeded: リクエストの予算を使い切った（lib/deadline.py）
+    """
+    if driver is None:
+        raise DatabaseUnavailableError("Neo4jドライバーが初期化されていません")
+
+    params = params or {}
+    auto_commit = _requires_auto_commit(query)
+    if write is None:
+        write = is_write_query(query)
+    call = CallStats(mode="auto" if auto_commit else ("write" if write else "read"))
+    started = time.perf_counter()
+    attempts = 0
+
+    def work(tx):
+        nonlocal attempts
+        if attempts == 0:
+            call.pool_wait_ms = (time.perf_counter() - session_started) * 1000
+        attempts += 1
+        return tx.run(query, params).data()
+
+    pool_retries = 0
+    try:
+        with _Lane(call) as lane:
+            while True:
+                session_started = time.perf_counter()
+                attempts = 0
+                try:
+                    with driver.session() as session:
+                        if auto_commit:
+                            records = session.run(lane.query(query), params).data()
+                            call.pool_wait_ms = (time.perf_counter() - session_started) * 1000
+                        elif write:
+                            records = session.execute_write(lane.work(work))
+                        else:
+                            records = session.execute_read(lane.work(work))
+                    break
+                except ConnectionAcquisitionTimeoutError:
+                    if pool_retries >= _pool_timeout_retries():
+                        raise
+                    time.sleep(_backoff_seconds(pool_retries))
+                    pool_retries += 1
+                finally:
+                    call.retries = pool_retries + max(0, attempts - 1)
+    except Exception as e:
+        error = _translate_error(e)
+        call.error = type(error).__name__
+        raise error from e
+    finally:
+        call.elapsed_ms = (time.perf_counter() - started) * 1000
+        _record(call)
+    return records
+
+
+def execute_transaction(driver, work: Callable, write: bool = True):
+    """
+    管理トランザクション内で work(tx) を実行し、その戻り値を返す（run_in_transaction の実行層）。
+
+    execute_query と同じく、ワークロードのレーンの枠を取ってから実行し、レーンのクエリタイムアウト・
+    デッドラインの残り時間を適用する。接続取得のタイムアウトは再試行し、失敗は型付き例外にする。
+
+    Raises:
+        DatabaseUnavailableError / PoolTimeoutError / QueryExecutionError / DeadlineExceeded
+    """
+    if driver is None:
+        raise DatabaseUnavailableError("Neo4jドライバーが初期化されていません")
+
+    call = CallStats(mode="write" if write else "read")
+    started = time.perf_counter()
+    attempts = 0
+
+    def counted(tx):
+        nonlocal attempts
+        if attempts == 0:
+            call.pool_wait_ms = (time.perf_counter() - session_started) * 1000
+        attempts += 1
+        return work(tx)
+
+    pool_retries = 0
+    try:
+        with _Lane(call) as lane:
+            while True:
+                session_started = time.perf_counter()
+                attempts = 0
+                try:
+                    with driver.session() as session:
+                        if write:
+                            return session.execute_write(lane.work(counted))
+                        return session.execute_read(lane.work(counted))
+                except ConnectionAcquisitionTimeoutError:
+                    if pool_retries >= _pool_timeout_retries():
+                        raise
+                    time.sleep(_backoff_seconds(pool_retries))
+                    pool_retries += 1
+                finally:
+                    call.retries = pool_retries + max(0, attempts - 1)
+    except Exception as e:
+        error = _translate_error(e)
+        call.error = type(error).__name__
+        raise error from e
+    finally:
+        call.elapsed_ms = (time.perf_counter() - started) * 1000
+        _record(call)
+
+
+DEFAULT_FETCH_SIZE = 1000
+
+
+def _row_converter(row_type) -> Callable[[Any], Any]:
+    if row_type is dict:
+        return lambda record: record.data()
+    if row_type is tuple:
+        return tuple
+    return lambda record: row_type(*record.values())
+
+
+def stream_query(
+    driver,
+    query: str,
+    params: dict | None = None,
+    fetch_size: int = DEFAULT_FETCH_SIZE,
+    row_type=dict,
+) -> Iterator:
+    """
+    読み取りクエリの結果を 1 件ずつ返すジェネレーター（大量の読み取り・エクスポート用）。
+
+    execute_query は全レコードを dict のリストに溜めるため、件数に比例してメモリを使う。
+    こちらはサーバーから fetch_size 件ずつ取り寄せながら返すので、消費側が溜めない限りメモリは一定。
+
+    Args:
+        fetch_size: 1 回の取り寄せ件数
+        row_type: dict（デフォルト）/ tuple / NamedTuple のクラス（RETURN の列順にフィールドを割り当てる）
+
+    管理トランザクションと違い、途中の一時的障害では再実行しない（返した行が重複するため）。
+    接続取得のタイムアウトのみ、最初の行を返す前に再試行する。
+
+    Raises:
+        ValueError: 書き込みクエリ（run_query を使う）
+        DatabaseUnavailableError / PoolTimeoutError / QueryExecutionError / DeadlineExceeded
+    """
+    if driver is None:
+        raise DatabaseUnavailableError("Neo4jドライバーが初期化されていません")
+    if is_write_query(query) or _requires_auto_commit(query):
+        raise ValueError("stream_query は読み取り専用です（書き込みは run_query を使用）")
+
+    convert = _row_converter(row_type)
+    call = CallStats(mode="read")
+    started = time.perf_counter()
+    session = None
+    pool_retries = 0
+    try:
+        # 反復が終わる（または消費側が打ち切る）までレーンの枠を保持する
+        with _Lane(call) as lane:
+            while True:
+                session_started = time.perf_counter()
+                session = driver.session(default_access_mode=READ_ACCESS, fetch_size=fetch_size)
+                try:
+                    result = session.run(lane.query(query), params or {})
+                    break
+                except ConnectionAcquisitionTimeoutError:
+                    session.close()
+                    session = None
+                    if pool_retries >= _pool_timeout_retries():
+                        raise
+                    time.sleep(_backoff_seconds(pool_retries))
+                    pool_retries += 1
+            call.pool_wait_ms = (time.perf_counter() - session_started) * 1000
+            call.retries = pool_retries
+            for record in result:
+                yield convert(record)
+    except Exception as e:
+        error = _translate_error(e)
+        call.error = type(error).__name__
+        raise error from e
+    finally:
+        if session is not None:
+            session.close()
+        call.elapsed_ms = (time.perf_counter() - started) * 1000
+        _record(call)
+
+
+async def async_execute_query(driver, query: str, params: dict | None = None, write: bool | None = None) -> list[dict]:
+    """execute_query の非同期版（driver は neo4j.AsyncDriver）"""
+    if driver is None:
+        raise DatabaseUnavailableError("Neo4jドライバーが初期化されていません")
+
+    params = params or {}
+    auto_commit = _requires_auto_commit(query)
+    if write is None:
+        write = is_write_query(query)
+    call = CallStats(mode="auto" if auto_commit else ("write" if write else "read"))
+    started = time.perf_counter()
+    attempts = 0
+
+    async def work(tx):
+        nonlocal attempts
+        if attempts == 0:
+            call.pool_wait_ms = (time.perf_counter() - session_started) * 1000
+        attempts += 1
+        result = await tx.run(query, params)
+        return await result.data()
+
+    pool_retries = 0
+    try:
+        async with _Lane(call) as lane:
+            while True:
+                session_started = time.perf_counter()
+                attempts = 0
+                try:
+                    async with driver.session() as session:
+                        if auto_commit:
+                            result = await session.run(lane.query(query), params)
+                            records = await result.data()
+                            call.pool_wait_ms = (time.perf_counter() - session_started) * 1000
+                        elif write:
+                            records = await session.execute_write(lane.work(work))
+                        else:
+                            records = await session.execute_read(lane.work(work))
+                    break
+                except ConnectionAcquisitionTimeoutError:
+                    if pool_retries >= _pool_timeout_retries():
+                        raise
+                    await asyncio.sleep(_backoff_seconds(pool_retries))
+                    pool_retries += 1
+                finally:
+                    call.retries = pool_retries + max(0, attempts - 1)
+    except Exception as e:
+        error = _translate_error(e)
+        call.error = type(error).__name__
+        raise error from e
+    finally:
+        call.elapsed_ms = (time.perf_counter() - started) * 1000
+        _record(call)
+    return records
+
+
+async def async_execute_transaction(driver, work: Callable, write: bool = True):
+    """execute_transaction の非同期版（driver は neo4j.AsyncDriver、work は await work(tx)）"""
+    if driver is None:
+        raise DatabaseUnavailableError("Neo4jドライバーが初期化されていません")
+
+    call = CallStats(mode="write" if write else "read")
+    started = time.perf_counter()
+    attempts = 0
+
+    async def counted(tx):
+        nonlocal attempts
+        if attempts == 0:
+            call.pool_wait_ms = (time.perf_counter() - session_started) * 1000
+        attempts += 1
+        return await work(tx)
+
+    pool_retries = 0
+    try:
+        async with _Lane(call) as lane:
+            while True:
+                session_started = time.perf_counter()
+                attempts = 0
+                try:
+                    async with driver.session() as session:
+                        if write:
+                            return await session.execute_write(lane.work(counted))
+                        return await session.execute_read(lane.work(counted))
+                except ConnectionAcquisitionTimeoutError:
+                    if pool_retries >= _pool_timeout_retries():
+                        raise
+                    await asyncio.sleep(_backoff_seconds(pool_retries))
+                    pool_retries += 1
+                finally:
+                    call.retries = pool_retries + max(0, attempts - 1)
+    except Exception as e:
+        error = _translate_error(e)
+        call.error = type(error).__name__
+        raise error from e
+    finally:
+        call.elapsed_ms = (time.perf_counter() - started) * 1000
+        _record(call)
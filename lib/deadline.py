@@ -0,0 +1,201 @@
+"""
+リクエスト単位の処理時間の予算（デッドライン）
+
+field-ui の音声アップロードは、1 リクエストの中で次の処理を順に行う。
+  Gemini の文字起こし → 構造化 → Neo4j への登録 → Embedding 付与
+どこにもタイムアウトがないため、Gemini が応答しなければリクエストも返らない。
+
+FastAPI のミドルウェアがリクエストごとに一度 deadline() で予算を設定する。
+DB（lib/db_runtime.py）と Gemini の呼び出し（lib/embedding.py, scripts/multi_importer.py）は、
+残り時間をタイムアウトとして使う。残りがなければ呼び出さずに DeadlineExceeded を送出する。
+後回しにできる処理（Embedding 付与など）は、残りが少なければ defer_if_short() で見送る。
+見送った分は scripts/backfill_embeddings.py が後で補う。
+コミット後に必ず行う後始末（カードの再計算など）は without_deadline() の中で実行し、打ち切らない。
+
+各段階を stage() / within() で囲むと所要時間が記録される。
+予算を超えたときは、どの段階で使い切ったかを DeadlineExceeded.report で応答に含められる。
+
+ContextVar で保持するため、asyncio.to_thread のワーカースレッドにも引き継がれる。
+デッドラインが設定されていない呼び出し（バッチ・MCP など）の動作は変わらない。
+"""
+
+import asyncio
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """リクエストの処理時間の予算を使い切った"""
+
+    def __init__(self, operation: str, deadline: "Deadline"):
+        self.operation = operation
+        self.deadline = deadline
+        self.stage = deadline.current_stage or operation
+        deadline.exceeded_stage = deadline.exceeded_stage or self.stage
+        super().__init__(
+            f"処理時間の予算 {deadline.budget:.0f} 秒を超えました（段階: {self.stage}, 処理: {operation}）"
+        )
+
+    @property
+    def report(self) -> dict:
+        # 送出後に閉じた段階の所要時間も含めるため、参照時に集計する
+        return self.deadline.report()
+
+
+@dataclass
+class Deadline:
+    budget: float                                    # 予算・秒
+    started: float = field(default_factory=time.monotonic)
+    stages: list[dict] = field(default_factory=list)
+    deferred: list[str] = field(default_factory=list)
+    current_stage: Optional[str] = None
+    exceeded_stage: Optional[str] = None
+
+    def remaining(self) -> float:
+        return max(0.0, self.started + self.budget - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def report(self) -> dict:
+        """段階ごとの所要時間（応答・ログ用）"""
+        return {
+            "budget_ms": round(self.budget * 1000),
+            "elapsed_ms": round((time.monotonic() - self.started) * 1000),
+            "stages": list(self.stages),
+            "deferred": list(self.deferred),
+            "exceeded_stage": self.exceeded_stage,
+        }
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    ブロック内の処理に予算を設定する。
+
+    既に外側のデッドラインがある場合は、残り時間より長くはならない。
+    """
+    outer = _current.get()
+    if outer is not None:
+        seconds = min(seconds, outer.remaining())
+    d = Deadline(budget=seconds)
+    token = _current.set(d)
+    try:
+        yield d
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def without_deadline():
+    """
+    ブロック内ではデッドラインを外す（コミット後のカード更新・チェーン差し込みなど）。
+
+    コミット済みの書き込みの後始末を予算切れで打ち切ると、保存済みなのに失敗として返り、
+    再試行で二重登録になる。ブロック内の DB 呼び出しにはレーンのクエリタイムアウトだけが掛かる。
+    """
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def exceeded_error(operation: str) -> Optional[DeadlineExceeded]:
+    """予算を使い切っていれば DeadlineExceeded を返す（例外の変換用）"""
+    d = _current.get()
+    if d is not None and d.expired():
+        return DeadlineExceeded(operation, d)
+    return None
+
+
+def check(operation: str) -> None:
+    """予算を使い切っていれば DeadlineExceeded を送出する"""
+    error = exceeded_error(operation)
+    if error is not None:
+        raise error
+
+
+def timeout_for(operation: str, default: Optional[float] = None) -> Optional[float]:
+    """
+    呼び出しに使うタイムアウト・秒を返す。
+
+    デッドラインがなければ default（None は無制限）、あれば default と残り時間の短い方。
+    既に使い切っていれば DeadlineExceeded を送出する。
+    """
+    d = _current.get()
+    if d is None:
+        return default
+    check(operation)
+    remaining = d.remaining()
+    return remaining if default is None else min(default, remaining)
+
+
+def defer(name: str) -> None:
+    """予算内に行えず後回しにした処理を記録する"""
+    d = _current.get()
+    if d is not None and name not in d.deferred:
+        d.deferred.append(name)
+
+
+def defer_if_short(name: str, min_seconds: float) -> bool:
+    """残り時間が min_seconds 未満なら、後回しにしたことを記録して True を返す"""
+    d = _current.get()
+    if d is None or d.remaining() >= min_seconds:
+        return False
+    defer(name)
+    return True
+
+
+@contextmanager
+def stage(name: str):
+    """ブロックを 1 つの段階として所要時間を記録する（デッドラインがなければ何もしない）"""
+    d = _current.get()
+    if d is None:
+        yield
+        return
+    outer, d.current_stage = d.current_stage, name
+    started = time.monotonic()
+    status = "ok"
+    try:
+        yield
+    except DeadlineExceeded:
+        status = "exceeded"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        d.stages.append({"stage": name, "ms": round((time.monotonic() - started) * 1000), "status": status})
+        d.current_stage = outer
+
+
+async def within(name: str, awaitable):
+    """
+    awaitable を 1 つの段階として、残り時間内に完了しなければ打ち切る。
+
+    asyncio.to_thread のスレッド自体は止められないため、スレッド側の呼び出しにも
+    timeout_for() でタイムアウトを渡しておくこと。
+    """
+    with stage(name):
+        try:
+            timeout = timeout_for(name)
+        except DeadlineExceeded:
+            if inspect.iscoroutine(awaitable):
+                awaitable.close()
+            raise
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceeded(name, _current.get()) from e
@@ -8,12 +8,33 @@ Dependencies:
     neo4j >= 6.0.3          (既存依存)
 """
 
+import functools
 import os
 import sys
+import threading
 from typing import Optional
 
 from dotenv import load_dotenv
 
+from lib.deadline import DeadlineExceeded, check, timeout_for
+from lib.embedding_cache import cache_key, get_embedding_cache
+from lib.embedding_dispatcher import EmbeddingDispatcher, dispatcher_from_env
+from lib.embedding_texts import (
+    CLIENT_SUMMARY_VERSION,
+    EMBEDDING_TEXT_BUILDERS,
+    build_text,
+    content_hash,
+    hash_property,
+    text_hash,
+)
+from lib.embedding_generations import (
+    EmbeddingGeneration,
+    GenerationState,
+    active_generation,
+    base_property,
+    get_generation_state,
+)
+
 load_dotenv()
 
 
@@ -22,6 +43,8 @@ load_dotenv()
 # =============================================================================
 
 # Gemini Embedding 2 モデル名（Public Preview）
+# EMBEDDING_MODEL・DEFAULT_DIMENSIONS は世代 1 の値。移行後は Neo4j に保存された現行の世代
+# （lib/embedding_generations.py）のモデル・次元数を使う
 EMBEDDING_MODEL = "gemini-embedding-2-preview"
 
 # デフォルト出力次元数
@@ -30,7 +53,8 @@ EMBEDDING_MODEL = "gemini-embedding-2-preview"
 # 3072: 最大精度
 DEFAULT_DIMENSIONS = 768
 
-# Neo4j ベクトルインデックス定義
+# Neo4j ベクトルインデックス定義（世代 1 の名前。他の世代のインデックス名・プロパティ名・次元数は
+# embedding_generations.vector_index_definitions が読み替える）
 VECTOR_INDEXES = {
     "support_log_embedding": {
         "label": "SupportLog",
@@ -106,6 +130,27 @@ def get_genai_client():
     return _genai_client
 
 
+def gemini_http_options(operation: str):
+    """
+    リクエストのデッドライン（lib/deadline.py）の残り時間を Gemini 呼び出しのタイムアウトにする。
+    デッドラインがなければ None（SDK の既定）。使い切っていれば DeadlineExceeded を送出する。
+    """
+    timeout = timeout_for(operation)
+    if timeout is None:
+        return None
+    from google.genai import types
+    return types.HttpOptions(timeout=max(1, int(timeout * 1000)))  # ミリ秒
+
+
+def resolve_generation(model: Optional[str], dimensions: Optional[int]) -> tuple[str, int]:
+    """省略されたモデル・次元数を現行の世代（lib/embedding_generations.py）で補う"""
+    if model is None or dimensions is None:
+        active = active_generation()
+        model = model or active.model
+        dimensions = dimensions or active.dimensions
+    return model, dimensions
+
+
 # =============================================================================
 # Embedding 生成
 # =============================================================================
@@ -113,7 +158,8 @@ def get_genai_client():
 def embed_text(
     text: str,
     task_type: str = "RETRIEVAL_DOCUMENT",
-    dimensions: int = DEFAULT_DIMENSIONS,
+    dimensions: Optional[int] = None,
+    model: Optional[str] = None,
 ) -> Optional[list[float]]:
     """
     テキストからembeddingベクトルを生成
@@ -125,48 +171,67 @@ def embed_text(
             - "RETRIEVAL_QUERY": 検索クエリ時
             - "SEMANTIC_SIMILARITY": 類似度比較
             - "CLUSTERING": クラスタリング
-        dimensions: 出力次元数 (768, 1536, 3072)
+        dimensions: 出力次元数 (768, 1536, 3072)。省略時は現行の世代（lib/embedding_generations.py）
+        model: モデル名。省略時は現行の世代
 
     Returns:
         float のリスト（embeddingベクトル）、失敗時は None
+        （同じ入力の結果は lib/embedding_cache.py のキャッシュから返す）
     """
+    model, dimensions = resolve_generation(model, dimensions)
+    cache = get_embedding_cache()
+    key = cache_key(model, task_type, dimensions, text)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    if cache.cache_only:
+        log(f"キャッシュにないため embedding を生成しません（cache-only）: {len(text)}文字", "WARN")
+        return None
+
     client = get_genai_client()
     if client is None:
         return None
 
     from google.genai import types
 
+    http_options = gemini_http_options("embed_text")
     try:
         response = client.models.embed_content(
-            model=EMBEDDING_MODEL,
+            model=model,
             contents=text,
             config=types.EmbedContentConfig(
                 task_type=task_type,
                 output_dimensionality=dimensions,
+                http_options=http_options,
             ),
         )
-        values = response.embeddings[0].values
+        values = list(response.embeddings[0].values)
+        cache.put(key, values)
         log(f"テキストembedding生成完了: {len(values)}次元, {len(text)}文字")
-        return list(values)
+        return values
     except Exception as e:
+        check("embed_text")  # タイムアウトがデッドラインによるものなら DeadlineExceeded
         log(f"テキストembedding生成エラー: {e}", "ERROR")
         return None
 
 
 def embed_image(
     image_path: str,
-    dimensions: int = DEFAULT_DIMENSIONS,
+    dimensions: Optional[int] = None,
+    model: Optional[str] = None,
 ) -> Optional[list[float]]:
     """
     画像ファイルからembeddingベクトルを生成
 
     Args:
         image_path: 画像ファイルパス（PNG, JPEG, WebP, HEIC）
-        dimensions: 出力次元数
+        dimensions: 出力次元数（省略時は現行の世代）
+        model: モデル名（省略時は現行の世代）
 
     Returns:
         float のリスト（embeddingベクトル）、失敗時は None
     """
+    model, dimensions = resolve_generation(model, dimensions)
     client = get_genai_client()
     if client is None:
         return None
@@ -183,7 +248,7 @@ def embed_image(
             image_bytes = f.read()
 
         response = client.models.embed_content(
-            model=EMBEDDING_MODEL,
+            model=model,
             contents=[
                 types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
             ],
@@ -202,7 +267,8 @@ def embed_image(
 def embed_multimodal(
     text: str,
     image_path: str,
-    dimensions: int = DEFAULT_DIMENSIONS,
+    dimensions: Optional[int] = None,
+    model: Optional[str] = None,
 ) -> Optional[list[float]]:
     """
     テキスト＋画像のマルチモーダルembeddingを生成
@@ -211,11 +277,13 @@ def embed_multimodal(
     Args:
         text: テキスト説明
         image_path: 画像ファイルパス
-        dimensions: 出力次元数
+        dimensions: 出力次元数（省略時は現行の世代）
+        model: モデル名（省略時は現行の世代）
 
     Returns:
         float のリスト（統合embeddingベクトル）、失敗時は None
     """
+    model, dimensions = resolve_generation(model, dimensions)
     client = get_genai_client()
     if client is None:
         return None
@@ -232,7 +300,7 @@ def embed_multimodal(
             image_bytes = f.read()
 
         response = client.models.embed_content(
-            model=EMBEDDING_MODEL,
+            model=model,
             contents=[
                 text,
                 types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
@@ -251,18 +319,21 @@ def embed_multimodal(
 
 def embed_audio(
     audio_path: str,
-    dimensions: int = DEFAULT_DIMENSIONS,
+    dimensions: Optional[int] = None,
+    model: Optional[str] = None,
 ) -> Optional[list[float]]:
     """
     音声ファイルからembeddingベクトルを生成（文字起こし不要）
 
     Args:
         audio_path: 音声ファイルパス（MP3, WAV 等。最大80秒）
-        dimensions: 出力次元数
+        dimensions: 出力次元数（省略時は現行の世代）
+        model: モデル名（省略時は現行の世代）
 
     Returns:
         float のリスト（embeddingベクトル）、失敗時は None
     """
+    model, dimensions = resolve_generation(model, dimensions)
     client = get_genai_client()
     if client is None:
         return None
@@ -283,7 +354,7 @@ def embed_audio(
             audio_bytes = f.read()
 
         response = client.models.embed_content(
-            model=EMBEDDING_MODEL,
+            model=model,
             contents=[
                 types.Part.from_bytes(data=audio_bytes, mime_type=mime_type),
             ],
@@ -325,6 +396,7 @@ def transcribe_audio(
         ext = os.path.splitext(audio_path)[1].lower()
         mime_type = _AUDIO_MIME_TYPES.get(ext, "audio/mpeg")
 
+    http_options = gemini_http_options("transcribe_audio")
     try:
         with open(audio_path, "rb") as f:
             audio_bytes = f.read()
@@ -335,11 +407,13 @@ def transcribe_audio(
                 types.Part.from_bytes(data=audio_bytes, mime_type=mime_type),
                 instruction,
             ],
+            config=types.GenerateContentConfig(http_options=http_options),
         )
         text = response.text
         log(f"音声文字起こし完了: {len(text)}文字, {audio_path}")
         return text
     except Exception as e:
+        check("transcribe_audio")
         log(f"音声文字起こしエラー: {e}", "ERROR")
         return None
 
@@ -361,7 +435,8 @@ def _get_audio_duration(path: str) -> float:
 def embed_texts_batch(
     texts: list[str],
     task_type: str = "RETRIEVAL_DOCUMENT",
-    dimensions: int = DEFAULT_DIMENSIONS,
+    dimensions: Optional[int] = None,
+    model: Optional[str] = None,
 ) -> list[Optional[list[float]]]:
     """
     複数テキストのembeddingを一括生成
@@ -369,32 +444,76 @@ def embed_texts_batch(
     Args:
         texts: テキストのリスト
         task_type: タスクタイプ
-        dimensions: 出力次元数
+        dimensions: 出力次元数（省略時は現行の世代）
+        model: モデル名（省略時は現行の世代）
 
     Returns:
         embeddingベクトルのリスト（各要素は float リストまたは None）
-    """
-    client = get_genai_client()
-    if client is None:
-        return [None] * len(texts)
 
+    キャッシュにあるテキストと、バッチ内で重複するテキストは API に送らない。
+    残りは lib/embedding_dispatcher.py がチャンクに分け、流量を制限して送る
+    （失敗したチャンクの分だけが None になる）。
+    """
+    model, dimensions = resolve_generation(model, dimensions)
+    cache = get_embedding_cache()
+    keys = [cache_key(model, task_type, dimensions, text) for text in texts]
+    found = cache.get_many(keys)
+    # キャッシュにない入力（重複は 1 回だけ送る）
+    pending = {key: text for key, text in zip(keys, texts) if key not in found}
+    if not pending:
+        return [found[key] for key in keys]
+    if cache.cache_only:
+        log(f"キャッシュにない {len(pending)} 件の embedding を生成しません（cache-only）", "WARN")
+        return [found.get(key) for key in keys]
+
+    if get_genai_client() is None:
+        return [found.get(key) for key in keys]
+
+    vectors = get_embedding_dispatcher(model).embed(list(pending.values()), task_type, dimensions)
+    generated = {key: vector for key, vector in zip(pending, vectors) if vector is not None}
+    cache.put_many(generated)
+    found.update(generated)
+    failed = len(pending) - len(generated)
+    log(f"バッチembedding生成完了: {len(generated)}件生成, {len(texts) - len(pending)}件キャッシュ"
+        + (f", {failed}件失敗" if failed else "") + f", {dimensions}次元")
+    return [found.get(key) for key in keys]
+
+
+def _embed_content_batch(texts: list[str], task_type: str, dimensions: int, model: str) -> list[list[float]]:
+    """1 回の embed_content 呼び出し（ディスパッチャーが再送を判断するため、失敗時は例外を送出する）"""
     from google.genai import types
 
-    try:
-        response = client.models.embed_content(
-            model=EMBEDDING_MODEL,
-            contents=texts,
-            config=types.EmbedContentConfig(
-                task_type=task_type,
-                output_dimensionality=dimensions,
-            ),
-        )
-        results = [list(emb.values) for emb in response.embeddings]
-        log(f"バッチembedding生成完了: {len(results)}件, {dimensions}次元")
-        return results
-    except Exception as e:
-        log(f"バッチembedding生成エラー: {e}", "ERROR")
-        return [None] * len(texts)
+    response = get_genai_client().models.embed_content(
+        model=model,
+        contents=texts,
+        config=types.EmbedContentConfig(
+            task_type=task_type,
+            output_dimensionality=dimensions,
+            http_options=gemini_http_options("embed_texts_batch"),
+        ),
+    )
+    return [list(emb.values) for emb in response.embeddings]
+
+
+_dispatchers: dict[str, EmbeddingDispatcher] = {}
+_dispatchers_lock = threading.Lock()
+
+
+def get_embedding_dispatcher(model: Optional[str] = None) -> EmbeddingDispatcher:
+    """
+    embed_texts_batch が使うディスパッチャー（流量制限をプロセス内で共有する）
+
+    API の流量制限はモデルごとなので、モデルごとに 1 つ持つ（移行中は現行とシャドウの 2 つ）。
+    """
+    model = model or active_generation().model
+    with _dispatchers_lock:
+        if model not in _dispatchers:
+            _dispatchers[model] = dispatcher_from_env(functools.partial(_embed_content_batch, model=model))
+        return _dispatchers[model]
+
+
+def get_embedding_dispatcher_stats() -> dict:
+    return get_embedding_dispatcher().stats()
 
 
 # =============================================================================
@@ -429,6 +548,7 @@ def ocr_with_gemini(
         else:
             mime_type = "image/png"
 
+    http_options = gemini_http_options("ocr_with_gemini")
     try:
         with open(file_path, "rb") as f:
             file_bytes = f.read()
@@ -439,25 +559,27 @@ def ocr_with_gemini(
                 instruction,
                 types.Part.from_bytes(data=file_bytes, mime_type=mime_type),
             ],
+            config=types.GenerateContentConfig(http_options=http_options),
         )
         text = response.text
         log(f"OCR完了: {len(text)}文字抽出, {file_path}")
         return text
     except Exception as e:
+        check("ocr_with_gemini")
         log(f"OCRエラー: {e}", "ERROR")
         return None
 
 
 def ocr_and_embed(
     file_path: str,
-    dimensions: int = DEFAULT_DIMENSIONS,
+    dimensions: Optional[int] = None,
 ) -> Optional[dict]:
     """
     スキャンPDF/手書き画像からテキスト抽出 → embedding生成の一括パイプライン
 
     Args:
         file_path: PDF または画像ファイルのパス
-        dimensions: 出力次元数
+        dimensions: 出力次元数（省略時は現行の世代）
 
     Returns:
         {"text": str, "embedding": list[float]} または None
@@ -484,28 +606,136 @@ def _run_query(query: str, params: dict = None) -> list:
     return run_query(query, params)
 
 
-def ensure_vector_indexes() -> dict:
+# ベクトルを書き込めるプロパティ（VECTOR_INDEXES のいずれか。世代の接尾辞を除いた名前）
+VECTOR_PROPERTIES = frozenset(config["property"] for config in VECTOR_INDEXES.values())
+
+# 1 トランザクションで書き込むベクトル数（768 次元で約 3MB のパラメータ）
+VECTOR_WRITE_CHUNK_SIZE = 500
+
+WRITE_VECTORS_QUERY = """
+UNWIND $rows AS row
+MATCH (n) WHERE elementId(n) = row.id
+CALL db.create.setNodeVectorProperty(n, row.property, row.vector)
+SET n += row.props
+RETURN count(n) AS written
+"""
+
+
+def write_vectors(rows, chunk_size: int = VECTOR_WRITE_CHUNK_SIZE, run_query=None) -> int:
+    """
+    (elementId, プロパティ名, ベクトル[, テキストのハッシュ]) の組をまとめて書き込む
+
+    ノードごとに setNodeVectorProperty を 1 文ずつ送ると、1 万件のバックフィルで 1 万往復になる。
+    chunk_size 件ずつ UNWIND にまとめ、チャンクごとに 1 トランザクション・1 往復で書き込む。
+    ベクトルが None の組は飛ばす。rows はジェネレーターでもよい（チャンク単位でしか溜めない）。
+    ハッシュ（lib.embedding_texts）を渡すと、ベクトルと同じトランザクションで embeddingHash なども更新する。
+
+    プロパティ名は世代ごとの名前（embedding / embeddingV2 など。lib/embedding_generations.py）。
+
+    Args:
+        run_query: run_query(query, params) 互換の関数（省略時は _run_query）
+
+    Returns:
+        書き込んだノード数（見つからなかった elementId は数えない）
+
+    Raises:
+        ValueError: ベクトルインデックスのないプロパティ
+        DatabaseAccessError: 書き込みに失敗したチャンクがあった（それ以前のチャンクはコミット済み）
+    """
+    run_query = run_query or _run_query
+    written = 0
+    chunk = []
+
+    def flush():
+        nonlocal written
+        result = run_query(WRITE_VECTORS_QUERY, {"rows": chunk})
+        written += result[0]["written"] if result else 0
+        chunk.clear()
+
+    for element_id, prop, vector, *digest in rows:
+        if base_property(prop) not in VECTOR_PROPERTIES:
+            raise ValueError(f"ベクトルインデックスのないプロパティ: {prop}（{', '.join(sorted(VECTOR_PROPERTIES))}）")
+        if vector is None:
+            continue
+        props = {hash_property(prop): digest[0]} if digest and digest[0] else {}
+        chunk.append({"id": element_id, "property": prop, "vector": vector, "props": props})
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return written
+
+
+def _resolve_client_name(identifier: str) -> str:
+    """クライアントの識別子を完全一致の氏名に解決する（Client.name のインデックスで引くため）"""
+    from lib.db_new_operations import resolve_client_name
+    return resolve_client_name(identifier)
+
+
+def embed_and_write(items, task_type: str = "RETRIEVAL_DOCUMENT", run_query=None) -> int:
+    """
+    (elementId, ベースのプロパティ名, テキスト, テキストのハッシュ) の組を、書き込み対象のすべての世代で
+    埋め込んで write_vectors で書き込む
+
+    Embedding 付与の入口。モデルの移行中（lib/embedding_generations.py）は現行とシャドウ
+    （切り替え後は退役した世代）の両方に書き込み、新しく登録されたノードがどちらの世代にも揃うようにする。
+    現行以外の世代への書き込みが失敗しても登録は止めず、警告だけ出す（移行のバックフィルで補われる）。
+
+    Returns:
+        現行の世代で書き込んだノード数
+    """
+    items = [item for item in items if item[2]]
+    if not items:
+        return 0
+    texts = [text for _, _, text, _ in items]
+    written = 0
+    for i, generation in enumerate(get_generation_state().generations()):
+        try:
+            vectors = embed_texts_batch(texts, task_type, dimensions=generation.dimensions, model=generation.model)
+            count = write_vectors(
+                ((element_id, generation.property_for(prop), vector, digest)
+                 for (element_id, prop, _, digest), vector in zip(items, vectors)),
+                run_query=run_query,
+            )
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if i == 0:
+                raise
+            log(f"世代 {generation} の Embedding 書き込みに失敗（移行のバックフィルで補います）: {e}", "WARN")
+            continue
+        if i == 0:
+            written = count
+    return written
+
+
+def ensure_vector_indexes(state: Optional[GenerationState] = None, run_query=None) -> dict:
     """
     必要なベクトルインデックスをすべて作成する（冪等操作）
 
+    現行・シャドウ・退役のすべての世代の分を作る（lib/embedding_generations.py）。
+
     Returns:
         {"created": [...], "skipped": [...], "errors": [...]}
     """
+    from lib.embedding_generations import vector_index_definitions
+
+    run_query = run_query or _run_query
     result = {"created": [], "skipped": [], "errors": []}
 
     # 既存インデックスの確認
-    existing = _run_query("SHOW VECTOR INDEXES")
+    existing = run_query("SHOW VECTOR INDEXES")
     existing_names = {idx.get("name") for idx in existing}
 
-    for index_name, config in VECTOR_INDEXES.items():
+    for index_name, config in vector_index_definitions(state or get_generation_state(refresh=True)).items():
         if index_name in existing_names:
             result["skipped"].append(index_name)
             continue
 
         try:
             # CREATE VECTOR INDEX はパラメータ化できないため文字列構築
-            # ただし全値がこのモジュールの定数から来るためインジェクションリスクなし
-            _run_query(f"""
+            # ただし全値がこのモジュールの定数と世代の版から来るためインジェクションリスクなし
+            run_query(f"""
                 CREATE VECTOR INDEX `{index_name}` IF NOT EXISTS
                 FOR (n:{config['label']}) ON (n.{config['property']})
                 OPTIONS {{
@@ -538,7 +768,7 @@ def set_node_embedding(
     match_props: dict,
     text_for_embedding: str,
     embedding_property: str = "embedding",
-    dimensions: int = DEFAULT_DIMENSIONS,
+    text_digest: Optional[str] = None,
 ) -> bool:
     """
     既存ノードにembeddingを付与
@@ -547,16 +777,12 @@ def set_node_embedding(
         label: ノードラベル (例: "SupportLog")
         match_props: ノードを特定するプロパティ (例: {"date": "2026-03-09", "situation": "食事"})
         text_for_embedding: embedding化するテキスト
-        embedding_property: embedding を格納するプロパティ名
-        dimensions: 出力次元数
+        embedding_property: embedding を格納するプロパティ名（世代の接尾辞なし。世代ごとの名前に読み替える）
+        text_digest: ベクトルと並べて保存するテキストのハッシュ（lib.embedding_texts）
 
     Returns:
-        成功なら True
+        現行の世代で付与できたら True
     """
-    embedding = embed_text(text_for_embedding, dimensions=dimensions)
-    if embedding is None:
-        return False
-
     # match条件を動的に構築（プロパティキーのバリデーション付き）
     import re
     safe_keys = [k for k in match_props if re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', k)]
@@ -566,22 +792,30 @@ def set_node_embedding(
 
     match_clause = ", ".join([f"{k}: $match_{k}" for k in safe_keys])
     params = {f"match_{k}": match_props[k] for k in safe_keys}
-    params["embedding"] = embedding
 
-    result = _run_query(
-        f"""
-        MATCH (n:{label} {{{match_clause}}})
-        CALL db.create.setNodeVectorProperty(n, '{embedding_property}', $embedding)
-        RETURN elementId(n) AS id
-        """,
-        params,
-    )
-    if result:
-        log(f"ノードembedding付与完了: {label} {match_props}")
-        return True
-    else:
-        log(f"ノードが見つかりません: {label} {match_props}", "WARN")
-        return False
+    for i, generation in enumerate(get_generation_state().generations()):
+        embedding = embed_text(text_for_embedding, dimensions=generation.dimensions, model=generation.model)
+        if embedding is None:
+            if i == 0:
+                return False
+            continue
+        prop = generation.property_for(embedding_property)
+        params["embedding"] = embedding
+        params["props"] = {hash_property(prop): text_digest} if text_digest else {}
+        result = _run_query(
+            f"""
+            MATCH (n:{label} {{{match_clause}}})
+            CALL db.create.setNodeVectorProperty(n, '{prop}', $embedding)
+            SET n += $props
+            RETURN elementId(n) AS id
+            """,
+            params,
+        )
+        if not result:
+            log(f"ノードが見つかりません: {label} {match_props}", "WARN")
+            return False
+    log(f"ノードembedding付与完了: {label} {match_props}")
+    return True
 
 
 def embed_support_log(log_data: dict) -> bool:
@@ -594,18 +828,7 @@ def embed_support_log(log_data: dict) -> bool:
     Returns:
         成功なら True
     """
-    # SupportLog のテキスト表現を構築
-    parts = []
-    if log_data.get("situation"):
-        parts.append(f"状況: {log_data['situation']}")
-    if log_data.get("action"):
-        parts.append(f"対応: {log_data['action']}")
-    if log_data.get("note"):
-        parts.append(f"メモ: {log_data['note']}")
-    if log_data.get("effectiveness"):
-        parts.append(f"効果: {log_data['effectiveness']}")
-
-    text = "。".join(parts)
+    text = build_text("SupportLog", log_data)
     if not text:
         log("SupportLog テキストが空のためスキップ", "WARN")
         return False
@@ -616,51 +839,132 @@ def embed_support_log(log_data: dict) -> bool:
     if log_data.get("situation"):
         match_props["situation"] = log_data["situation"]
 
-    return set_node_embedding("SupportLog", match_props, text)
+    return set_node_embedding("SupportLog", match_props, text, text_digest=text_hash("SupportLog", text))
 
 
 # =============================================================================
 # セマンティック検索
 # =============================================================================
 
+def embed_query(query_text: str, generation: EmbeddingGeneration) -> Optional[list[float]]:
+    """検索クエリを generation のモデル・次元数で埋め込む（検索するインデックスと揃えるため）"""
+    return embed_text(
+        query_text,
+        task_type="RETRIEVAL_QUERY",
+        dimensions=generation.dimensions,
+        model=generation.model,
+    )
+
+
+# 検索に使うベクトル索引（VECTOR_SEARCH_BACKEND）
+#   neo4j: Neo4j のベクトルインデックス（デフォルト）
+#   local: ローカルの ANN 索引（lib/ann_index.py。scripts/build_ann_index.py で作る）
+#   auto:  Neo4j で検索し、失敗したらローカルの索引で検索する
+VECTOR_SEARCH_BACKENDS = ("neo4j", "local", "auto")
+
+
+def vector_search_backend() -> str:
+    """VECTOR_SEARCH_BACKEND の値（不正な値は ValueError）"""
+    backend = os.getenv("VECTOR_SEARCH_BACKEND", "neo4j").strip().lower()
+    if backend not in VECTOR_SEARCH_BACKENDS:
+        raise ValueError(f"VECTOR_SEARCH_BACKEND が不正です: {backend}（{', '.join(VECTOR_SEARCH_BACKENDS)}）")
+    return backend
+
+
+def search_generation() -> EmbeddingGeneration:
+    """
+    検索に使う世代（クエリの埋め込みのモデル・次元数と、引くインデックス名を決める）
+
+    VECTOR_SEARCH_BACKEND=local では Neo4j に問い合わせず、ローカルの索引を作った世代
+    （lib/ann_index.py の generation.json）を使う。ない場合は現行の世代。
+    """
+    if vector_search_backend() == "local":
+        from lib.ann_index import load_local_generation
+
+        local = load_local_generation()
+        if local is not None:
+            return local
+    return active_generation()
+
+
+def _search_with_backend(index_name: str, generation: EmbeddingGeneration, neo4j_search, local_search) -> list:
+    """
+    VECTOR_SEARCH_BACKEND に応じて neo4j_search() か local_search(索引) で検索する
+
+    auto で Neo4j の検索が失敗し、ローカルの索引もなければ Neo4j の例外をそのまま送出する。
+    """
+    from lib.ann_index import get_local_index
+
+    backend = vector_search_backend()
+    if backend != "local":
+        try:
+            return neo4j_search()
+        except Exception as e:
+            if backend == "neo4j" or isinstance(e, DeadlineExceeded):
+                raise
+            error = e
+    name = generation.index_for(index_name)
+    index = get_local_index(name)
+    if index is None:
+        if backend == "auto":
+            raise error
+        log(f"ローカルの索引がありません: {name}（scripts/build_ann_index.py で作成）", "WARN")
+        return []
+    if backend == "auto":
+        log(f"Neo4j のベクトル検索に失敗したため、ローカルの索引で検索します: {error}", "WARN")
+    return local_search(index)
+
+
+def _local_client_name(identifier: str) -> str:
+    """ローカル検索用のクライアント名（Neo4j に繋がらなければ識別子をそのまま使う）"""
+    try:
+        return _resolve_client_name(identifier)
+    except Exception:
+        return identifier
+
+
 def semantic_search(
     query_text: str,
     index_name: str = "support_log_embedding",
     top_k: int = 10,
-    dimensions: int = DEFAULT_DIMENSIONS,
 ) -> list[dict]:
     """
     テキストクエリによるセマンティック検索
 
     Args:
         query_text: 検索クエリテキスト
-        index_name: 検索対象のベクトルインデックス名
+        index_name: 検索対象のベクトルインデックス名（VECTOR_INDEXES の名前。現行の世代のインデックスを引く）
         top_k: 返す結果の最大数
-        dimensions: クエリembeddingの次元数
 
     Returns:
         [{"node": {...}, "score": float}, ...] スコア降順
+        （ローカルの索引では node は書き出した属性と elementId）
     """
-    query_embedding = embed_text(
-        query_text,
-        task_type="RETRIEVAL_QUERY",
-        dimensions=dimensions,
-    )
+    generation = search_generation()
+    query_embedding = embed_query(query_text, generation)
     if query_embedding is None:
         return []
 
-    results = _run_query(
-        """
-        CALL db.index.vector.queryNodes($index_name, $top_k, $query_embedding)
-        YIELD node, score
-        RETURN node, score
-        ORDER BY score DESC
-        """,
-        {
-            "index_name": index_name,
-            "top_k": top_k,
-            "query_embedding": query_embedding,
-        },
+    results = _search_with_backend(
+        index_name,
+        generation,
+        lambda: _run_query(
+            """
+            CALL db.index.vector.queryNodes($index_name, $top_k, $query_embedding)
+            YIELD node, score
+            RETURN node, score
+            ORDER BY score DESC
+            """,
+            {
+                "index_name": generation.index_for(index_name),
+                "top_k": top_k,
+                "query_embedding": query_embedding,
+            },
+        ),
+        lambda index: [
+            {"node": {**payload, "elementId": element_id}, "score": score}
+            for element_id, score, payload in index.search(query_embedding, top_k)
+        ],
     )
     log(f"セマンティック検索完了: '{query_text}' → {len(results)}件")
     return results
@@ -682,41 +986,38 @@ def search_support_logs_semantic(
     Returns:
         支援記録のリスト（スコア付き）
     """
-    query_embedding = embed_text(
-        query_text,
-        task_type="RETRIEVAL_QUERY",
-        dimensions=DEFAULT_DIMENSIONS,
-    )
+    generation = search_generation()
+    query_embedding = embed_query(query_text, generation)
     if query_embedding is None:
         return []
 
-    if client_name:
-        results = _run_query(
-            """
-            CALL db.index.vector.queryNodes('support_log_embedding', $top_k, $query_embedding)
-            YIELD node, score
-            MATCH (s:Supporter)-[:LOGGED]->(node)-[:ABOUT]->(c:Client)
-            WHERE c.name CONTAINS $client_name
-            RETURN node.date AS 日付,
-                   s.name AS 支援者,
-                   c.name AS クライアント,
-                   node.situation AS 状況,
-                   node.action AS 対応,
-                   node.effectiveness AS 効果,
-                   node.note AS メモ,
-                   score AS スコア
-            ORDER BY score DESC
-            """,
-            {
-                "top_k": top_k * 3,  # フィルタ前に多めに取得
-                "query_embedding": query_embedding,
-                "client_name": client_name,
-            },
-        )
-    else:
-        results = _run_query(
+    def neo4j_search():
+        if client_name:
+            return _run_query(
+                """
+                CALL db.index.vector.queryNodes($index_name, $top_k, $query_embedding)
+                YIELD node, score
+                MATCH (s:Supporter)-[:LOGGED]->(node)-[:ABOUT]->(c:Client {name: $client_name})
+                RETURN node.date AS 日付,
+                       s.name AS 支援者,
+                       c.name AS クライアント,
+                       node.situation AS 状況,
+                       node.action AS 対応,
+                       node.effectiveness AS 効果,
+                       node.note AS メモ,
+                       score AS スコア
+                ORDER BY score DESC
+                """,
+                {
+                    "index_name": generation.index_for("support_log_embedding"),
+                    "top_k": top_k * 3,  # フィルタ前に多めに取得
+                    "query_embedding": query_embedding,
+                    "client_name": _resolve_client_name(client_name),
+                },
+            )
+        return _run_query(
             """
-            CALL db.index.vector.queryNodes('support_log_embedding', $top_k, $query_embedding)
+            CALL db.index.vector.queryNodes($index_name, $top_k, $query_embedding)
             YIELD node, score
             MATCH (s:Supporter)-[:LOGGED]->(node)-[:ABOUT]->(c:Client)
             RETURN node.date AS 日付,
@@ -730,11 +1031,32 @@ def search_support_logs_semantic(
             ORDER BY score DESC
             """,
             {
+                "index_name": generation.index_for("support_log_embedding"),
                 "top_k": top_k,
                 "query_embedding": query_embedding,
             },
         )
 
+    def local_search(index):
+        # クライアントで絞る場合は、そのクライアントの記録だけを正確に比べる
+        name = _local_client_name(client_name) if client_name else None
+        return [
+            {
+                "日付": payload.get("date"),
+                "支援者": payload.get("supporter"),
+                "クライアント": client,
+                "状況": payload.get("situation"),
+                "対応": payload.get("action"),
+                "効果": payload.get("effectiveness"),
+                "メモ": payload.get("note"),
+                "スコア": score,
+            }
+            for element_id, score, payload in index.search(query_embedding, top_k, client=name)
+            for client in ([name] if name else index.clients_of(element_id))
+        ]
+
+    results = _search_with_backend("support_log_embedding", generation, neo4j_search, local_search)
+
     log(f"支援記録セマンティック検索: '{query_text}' → {len(results)}件")
     return results
 
@@ -753,27 +1075,39 @@ def search_ng_actions_semantic(
     Returns:
         禁忌事項のリスト（スコア付き）
     """
-    query_embedding = embed_text(
-        query_text,
-        task_type="RETRIEVAL_QUERY",
-        dimensions=DEFAULT_DIMENSIONS,
-    )
+    generation = search_generation()
+    query_embedding = embed_query(query_text, generation)
     if query_embedding is None:
         return []
 
-    results = _run_query(
-        """
-        CALL db.index.vector.queryNodes('ng_action_embedding', $top_k, $query_embedding)
-        YIELD node, score
-        MATCH (c:Client)-[:MUST_AVOID]->(node)
-        RETURN c.name AS クライアント,
-               node.action AS 禁忌事項,
-               node.reason AS 理由,
-               node.riskLevel AS リスクレベル,
-               score AS スコア
-        ORDER BY score DESC
-        """,
-        {"top_k": top_k, "query_embedding": query_embedding},
+    results = _search_with_backend(
+        "ng_action_embedding",
+        generation,
+        lambda: _run_query(
+            """
+            CALL db.index.vector.queryNodes($index_name, $top_k, $query_embedding)
+            YIELD node, score
+            MATCH (c:Client)-[:MUST_AVOID]->(node)
+            RETURN c.name AS クライアント,
+                   node.action AS 禁忌事項,
+                   node.reason AS 理由,
+                   node.riskLevel AS リスクレベル,
+                   score AS スコア
+            ORDER BY score DESC
+            """,
+            {"index_name": generation.index_for("ng_action_embedding"), "top_k": top_k, "query_embedding": query_embedding},
+        ),
+        lambda index: [
+            {
+                "クライアント": client,
+                "禁忌事項": payload.get("action"),
+                "理由": payload.get("reason"),
+                "リスクレベル": payload.get("riskLevel"),
+                "スコア": score,
+            }
+            for element_id, score, payload in index.search(query_embedding, top_k)
+            for client in index.clients_of(element_id)
+        ],
     )
     log(f"禁忌事項セマンティック検索: '{query_text}' → {len(results)}件")
     return results
@@ -799,41 +1133,37 @@ def search_meeting_records_semantic(
     Returns:
         面談記録のリスト（スコア付き）
     """
-    query_embedding = embed_text(
-        query_text,
-        task_type="RETRIEVAL_QUERY",
-        dimensions=DEFAULT_DIMENSIONS,
-    )
+    generation = search_generation()
+    query_embedding = embed_query(query_text, generation)
     if query_embedding is None:
         return []
 
-    if client_name:
-        results = _run_query(
-            """
-            CALL db.index.vector.queryNodes($index_name, $top_k, $query_embedding)
-            YIELD node, score
-            MATCH (s:Supporter)-[:RECORDED]->(node)-[:ABOUT]->(c:Client)
-            WHERE c.name CONTAINS $client_name
-            RETURN node.date AS 日付,
-                   node.title AS タイトル,
-                   node.duration AS 秒数,
-                   node.filePath AS ファイルパス,
-                   s.name AS 記録者,
-                   c.name AS クライアント,
-                   node.note AS メモ,
-                   COALESCE(left(node.transcript, 100), '') AS 文字起こし抜粋,
-                   score AS スコア
-            ORDER BY score DESC
-            """,
-            {
-                "index_name": index_name,
-                "top_k": top_k * 3,
-                "query_embedding": query_embedding,
-                "client_name": client_name,
-            },
-        )
-    else:
-        results = _run_query(
+    def neo4j_search():
+        if client_name:
+            return _run_query(
+                """
+                CALL db.index.vector.queryNodes($index_name, $top_k, $query_embedding)
+                YIELD node, score
+                MATCH (s:Supporter)-[:RECORDED]->(node)-[:ABOUT]->(c:Client {name: $client_name})
+                RETURN node.date AS 日付,
+                       node.title AS タイトル,
+                       node.duration AS 秒数,
+                       node.filePath AS ファイルパス,
+                       s.name AS 記録者,
+                       c.name AS クライアント,
+                       node.note AS メモ,
+                       COALESCE(left(node.transcript, 100), '') AS 文字起こし抜粋,
+                       score AS スコア
+                ORDER BY score DESC
+                """,
+                {
+                    "index_name": generation.index_for(index_name),
+                    "top_k": top_k * 3,
+                    "query_embedding": query_embedding,
+                    "client_name": _resolve_client_name(client_name),
+                },
+            )
+        return _run_query(
             """
             CALL db.index.vector.queryNodes($index_name, $top_k, $query_embedding)
             YIELD node, score
@@ -850,12 +1180,32 @@ def search_meeting_records_semantic(
             ORDER BY score DESC
             """,
             {
-                "index_name": index_name,
+                "index_name": generation.index_for(index_name),
                 "top_k": top_k,
                 "query_embedding": query_embedding,
             },
         )
 
+    def local_search(index):
+        name = _local_client_name(client_name) if client_name else None
+        return [
+            {
+                "日付": payload.get("date"),
+                "タイトル": payload.get("title"),
+                "秒数": payload.get("duration"),
+                "ファイルパス": payload.get("filePath"),
+                "記録者": payload.get("supporter"),
+                "クライアント": client,
+                "メモ": payload.get("note"),
+                "文字起こし抜粋": payload.get("transcript") or "",
+                "スコア": score,
+            }
+            for element_id, score, payload in index.search(query_embedding, top_k, client=name)
+            for client in ([name] if name else index.clients_of(element_id))
+        ]
+
+    results = _search_with_backend(index_name, generation, neo4j_search, local_search)
+
     log(f"面談記録セマンティック検索: '{query_text}' → {len(results)}件")
     return results
 
@@ -878,31 +1228,24 @@ def backfill_support_log_embeddings(
     Returns:
         {"processed": int, "success": int, "failed": int}
     """
+    prop = active_generation().property_for("embedding")
+    projection = EMBEDDING_TEXT_BUILDERS["SupportLog"].projection("log")
     if client_name:
         nodes = _run_query(
-            """
-            MATCH (log:SupportLog)-[:ABOUT]->(c:Client)
-            WHERE c.name CONTAINS $client_name
-              AND log.embedding IS NULL
-            RETURN elementId(log) AS id,
-                   log.situation AS situation,
-                   log.action AS action,
-                   log.note AS note,
-                   log.effectiveness AS effectiveness
+            f"""
+            MATCH (c:Client {{name: $client_name}})<-[:ABOUT]-(log:SupportLog)
+            WHERE log.{prop} IS NULL
+            RETURN elementId(log) AS id, {projection}
             LIMIT $batch_size
             """,
-            {"client_name": client_name, "batch_size": batch_size},
+            {"client_name": _resolve_client_name(client_name), "batch_size": batch_size},
         )
     else:
         nodes = _run_query(
-            """
+            f"""
             MATCH (log:SupportLog)
-            WHERE log.embedding IS NULL
-            RETURN elementId(log) AS id,
-                   log.situation AS situation,
-                   log.action AS action,
-                   log.note AS note,
-                   log.effectiveness AS effectiveness
+            WHERE log.{prop} IS NULL
+            RETURN elementId(log) AS id, {projection}
             LIMIT $batch_size
             """,
             {"batch_size": batch_size},
@@ -913,40 +1256,18 @@ def backfill_support_log_embeddings(
         return {"processed": 0, "success": 0, "failed": 0}
 
     # テキスト表現を構築
-    texts = []
-    for node in nodes:
-        parts = []
-        if node.get("situation"):
-            parts.append(f"状況: {node['situation']}")
-        if node.get("action"):
-            parts.append(f"対応: {node['action']}")
-        if node.get("note"):
-            parts.append(f"メモ: {node['note']}")
-        if node.get("effectiveness"):
-            parts.append(f"効果: {node['effectiveness']}")
-        texts.append("。".join(parts) if parts else "記録なし")
-
-    # バッチembedding生成
-    embeddings = embed_texts_batch(texts)
-
-    success = 0
-    failed = 0
-    for node, emb in zip(nodes, embeddings):
-        if emb is None:
-            failed += 1
-            continue
-        try:
-            _run_query(
-                """
-                MATCH (n) WHERE elementId(n) = $id
-                CALL db.create.setNodeVectorProperty(n, 'embedding', $embedding)
-                """,
-                {"id": node["id"], "embedding": emb},
-            )
-            success += 1
-        except Exception as e:
-            log(f"embedding付与失敗: {node['id']} - {e}", "ERROR")
-            failed += 1
+    texts = [build_text("SupportLog", node) or "記録なし" for node in nodes]
+
+    # バッチembedding生成・書き込み（移行中はシャドウの世代にも）
+    try:
+        success = embed_and_write(
+            (node["id"], "embedding", text, text_hash("SupportLog", text))
+            for node, text in zip(nodes, texts)
+        )
+    except Exception as e:
+        log(f"embedding書き込み失敗: {e}", "ERROR")
+        success = 0
+    failed = len(nodes) - success
 
     log(f"SupportLog バックフィル完了: {success}/{len(nodes)} 成功")
     return {"processed": len(nodes), "success": success, "failed": failed}
@@ -959,14 +1280,12 @@ def backfill_ng_action_embeddings(batch_size: int = 50) -> dict:
     Returns:
         {"processed": int, "success": int, "failed": int}
     """
+    prop = active_generation().property_for("embedding")
     nodes = _run_query(
-        """
+        f"""
         MATCH (ng:NgAction)
-        WHERE ng.embedding IS NULL
-        RETURN elementId(ng) AS id,
-               ng.action AS action,
-               ng.reason AS reason,
-               ng.riskLevel AS riskLevel
+        WHERE ng.{prop} IS NULL
+        RETURN elementId(ng) AS id, {EMBEDDING_TEXT_BUILDERS["NgAction"].projection("ng")}
         LIMIT $batch_size
         """,
         {"batch_size": batch_size},
@@ -976,35 +1295,17 @@ def backfill_ng_action_embeddings(batch_size: int = 50) -> dict:
         log("embedding未付与のNgActionがありません")
         return {"processed": 0, "success": 0, "failed": 0}
 
-    texts = []
-    for node in nodes:
-        parts = [f"禁忌: {node.get('action', '')}"]
-        if node.get("reason"):
-            parts.append(f"理由: {node['reason']}")
-        if node.get("riskLevel"):
-            parts.append(f"リスク: {node['riskLevel']}")
-        texts.append("。".join(parts))
-
-    embeddings = embed_texts_batch(texts)
-
-    success = 0
-    failed = 0
-    for node, emb in zip(nodes, embeddings):
-        if emb is None:
-            failed += 1
-            continue
-        try:
-            _run_query(
-                """
-                MATCH (n) WHERE elementId(n) = $id
-                CALL db.create.setNodeVectorProperty(n, 'embedding', $embedding)
-                """,
-                {"id": node["id"], "embedding": emb},
-            )
-            success += 1
-        except Exception as e:
-            log(f"embedding付与失敗: {node['id']} - {e}", "ERROR")
-            failed += 1
+    texts = [build_text("NgAction", node) or "禁忌" for node in nodes]
+
+    try:
+        success = embed_and_write(
+            (node["id"], "embedding", text, text_hash("NgAction", text))
+            for node, text in zip(nodes, texts)
+        )
+    except Exception as e:
+        log(f"embedding書き込み失敗: {e}", "ERROR")
+        success = 0
+    failed = len(nodes) - success
 
     log(f"NgAction バックフィル完了: {success}/{len(nodes)} 成功")
     return {"processed": len(nodes), "success": success, "failed": failed}
@@ -1015,23 +1316,22 @@ def backfill_ng_action_embeddings(batch_size: int = 50) -> dict:
 # =============================================================================
 
 def cosine_similarity(a: list[float], b: list[float]) -> float:
-    """2つのベクトル間のコサイン類似度を計算（NumPy不要版）"""
-    if len(a) != len(b):
-        raise ValueError(f"ベクトル次元が不一致: {len(a)} vs {len(b)}")
-    dot = sum(x * y for x, y in zip(a, b))
-    norm_a = sum(x * x for x in a) ** 0.5
-    norm_b = sum(x * x for x in b) ** 0.5
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return dot / (norm_a * norm_b)
+    """
+    2つのベクトル間のコサイン類似度を計算
+
+    1 ペアだけの計算用。多数のペアを比べるときは lib/similarity.py の to_matrix・pairs_above・top_k を使う。
+    """
+    from lib.similarity import cosine_similarity as _cosine_similarity
+    return _cosine_similarity(a, b)
 
 
 def get_embedding_stats() -> dict:
     """embedding付与状況の統計情報を取得"""
     stats = {}
+    active = active_generation()
     for index_name, config in VECTOR_INDEXES.items():
         label = config["label"]
-        prop = config["property"]
+        prop = active.property_for(config["property"])
         total = _run_query(f"MATCH (n:{label}) RETURN count(n) AS c")
         embedded = _run_query(
             f"MATCH (n:{label}) WHERE n.{prop} IS NOT NULL RETURN count(n) AS c"
@@ -1077,12 +1377,16 @@ def register_meeting_record(
         ext = os.path.splitext(audio_path)[1].lower()
         mime_type = _AUDIO_MIME_TYPES.get(ext, "audio/mpeg")
 
+    # 登録時のベクトルは現行の世代で作り、移行中の他の世代には作成後に書き込む
+    state = get_generation_state()
+    active = state.active
+
     # 音声の長さチェック
     duration = _get_audio_duration(audio_path)
     audio_embedding = None
     if duration <= 80 or duration < 0:
         # 80秒以下、または長さ不明の場合はembeddingを試行
-        audio_embedding = embed_audio(audio_path)
+        audio_embedding = embed_audio(audio_path, dimensions=active.dimensions, model=active.model)
         if audio_embedding is None:
             log("音声embedding生成失敗（テキストembeddingのみで続行）", "WARN")
     else:
@@ -1103,12 +1407,14 @@ def register_meeting_record(
 
     text_embedding = None
     if text_for_embedding:
-        text_embedding = embed_text(text_for_embedding, task_type="RETRIEVAL_DOCUMENT")
+        text_embedding = embed_text(
+            text_for_embedding, task_type="RETRIEVAL_DOCUMENT", dimensions=active.dimensions, model=active.model,
+        )
 
     # Neo4j に登録
     try:
         duration_int = int(duration) if duration > 0 else None
-        _run_query(
+        created = _run_query(
             """
             MERGE (c:Client {name: $client_name})
             MERGE (s:Supporter {name: $supporter_name})
@@ -1126,11 +1432,11 @@ def register_meeting_record(
             WITH m
             CALL { WITH m
                 WITH m WHERE $audio_embedding IS NOT NULL
-                CALL db.create.setNodeVectorProperty(m, 'embedding', $audio_embedding)
+                CALL db.create.setNodeVectorProperty(m, $audio_property, $audio_embedding)
             }
             CALL { WITH m
                 WITH m WHERE $text_embedding IS NOT NULL
-                CALL db.create.setNodeVectorProperty(m, 'textEmbedding', $text_embedding)
+                CALL db.create.setNodeVectorProperty(m, $text_property, $text_embedding)
             }
             RETURN elementId(m) AS id
             """,
@@ -1146,8 +1452,24 @@ def register_meeting_record(
                 "note": note or None,
                 "audio_embedding": audio_embedding,
                 "text_embedding": text_embedding,
+                "audio_property": active.property_for("embedding"),
+                "text_property": active.property_for("textEmbedding"),
             },
         )
+        for generation in state.generations()[1:] if created else []:
+            try:
+                write_vectors([
+                    (created[0]["id"], generation.property_for("embedding"),
+                     embed_audio(abs_path, dimensions=generation.dimensions, model=generation.model)
+                     if audio_embedding is not None else None),
+                    (created[0]["id"], generation.property_for("textEmbedding"),
+                     embed_text(text_for_embedding, dimensions=generation.dimensions, model=generation.model)
+                     if text_embedding is not None else None),
+                ])
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                log(f"世代 {generation} の面談記録 Embedding 書き込みに失敗（移行のバックフィルで補います）: {e}", "WARN")
         log(f"面談記録登録完了: {client_name} ({date})")
         return {
             "status": "success",
@@ -1248,46 +1570,55 @@ def build_client_summary_text(client_name: str) -> Optional[str]:
     return text
 
 
-def embed_client_summary(
-    client_name: str,
-    dimensions: int = DEFAULT_DIMENSIONS,
-) -> bool:
+def embed_client_summary(client_name: str) -> bool:
     """
     特定クライアントの summaryEmbedding を生成・付与
 
     1. build_client_summary_text() で概要テキスト構築
-    2. embed_text(text, task_type="CLUSTERING") でembedding生成
+    2. embed_text(text, task_type="CLUSTERING") でembedding生成（移行中はシャドウの世代の分も）
     3. Neo4j の Client ノードに summaryEmbedding を付与
 
     Args:
         client_name: クライアント名
-        dimensions: 出力次元数
 
     Returns:
-        成功なら True
+        現行の世代で付与できたら True
     """
     text = build_client_summary_text(client_name)
     if not text:
         return False
 
-    embedding = embed_text(text, task_type="CLUSTERING", dimensions=dimensions)
-    if embedding is None:
-        log(f"Client summaryEmbedding 生成失敗: {client_name}", "ERROR")
-        return False
+    for i, generation in enumerate(get_generation_state().generations()):
+        embedding = embed_text(text, task_type="CLUSTERING", dimensions=generation.dimensions, model=generation.model)
+        if embedding is None:
+            log(f"Client summaryEmbedding 生成失敗: {client_name} ({generation})", "ERROR" if i == 0 else "WARN")
+            if i == 0:
+                return False
+            continue
 
-    try:
-        _run_query(
-            """
-            MATCH (c:Client {name: $name})
-            CALL db.create.setNodeVectorProperty(c, 'summaryEmbedding', $embedding)
-            """,
-            {"name": client_name, "embedding": embedding},
-        )
-        log(f"Client summaryEmbedding 付与完了: {client_name}")
-        return True
-    except Exception as e:
-        log(f"Client summaryEmbedding 付与エラー ({client_name}): {e}", "ERROR")
-        return False
+        prop = generation.property_for("summaryEmbedding")
+        try:
+            _run_query(
+                """
+                MATCH (c:Client {name: $name})
+                CALL db.create.setNodeVectorProperty(c, $property, $embedding)
+                SET c += $props
+                """,
+                {
+                    "name": client_name,
+                    "property": prop,
+                    "embedding": embedding,
+                    "props": {hash_property(prop): content_hash(CLIENT_SUMMARY_VERSION, text)},
+                },
+            )
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            log(f"Client summaryEmbedding 付与エラー ({client_name}, {generation}): {e}", "ERROR" if i == 0 else "WARN")
+            if i == 0:
+                return False
+    log(f"Client summaryEmbedding 付与完了: {client_name}")
+    return True
 
 
 def find_similar_clients(
@@ -1306,43 +1637,58 @@ def find_similar_clients(
     Returns:
         [{"name": str, "スコア": float, "conditions": list, ...}, ...]
     """
-    base = _run_query(
-        """
-        MATCH (c:Client {name: $client_name})
-        WHERE c.summaryEmbedding IS NOT NULL
-        RETURN c.summaryEmbedding AS embedding
-        """,
-        {"client_name": client_name},
-    )
-
-    if not base:
-        log(f"summaryEmbedding が未付与です: {client_name}", "WARN")
-        return []
-
-    query_vec = base[0]["embedding"]
+    generation = search_generation()
     top_k_plus = top_k + (1 if exclude_self else 0)
 
-    results = _run_query(
-        """
-        CALL db.index.vector.queryNodes('client_summary_embedding', $top_k_plus, $query_vec)
-        YIELD node, score
-        WHERE ($exclude_self = false OR node.name <> $client_name)
-        OPTIONAL MATCH (node)-[:HAS_CONDITION]->(con:Condition)
-        RETURN node.name AS name,
-               node.dob AS dob,
-               collect(DISTINCT con.name) AS conditions,
-               score AS スコア
-        ORDER BY score DESC
-        LIMIT $top_k
-        """,
-        {
-            "top_k_plus": top_k_plus,
-            "query_vec": query_vec,
-            "client_name": client_name,
-            "exclude_self": exclude_self,
-            "top_k": top_k,
-        },
-    )
+    def neo4j_search():
+        base = _run_query(
+            """
+            MATCH (c:Client {name: $client_name})
+            WHERE c[$property] IS NOT NULL
+            RETURN c[$property] AS embedding
+            """,
+            {"client_name": client_name, "property": generation.property_for("summaryEmbedding")},
+        )
+        if not base:
+            log(f"summaryEmbedding が未付与です: {client_name}", "WARN")
+            return []
+        return _run_query(
+            """
+            CALL db.index.vector.queryNodes($index_name, $top_k_plus, $query_vec)
+            YIELD node, score
+            WHERE ($exclude_self = false OR node.name <> $client_name)
+            OPTIONAL MATCH (node)-[:HAS_CONDITION]->(con:Condition)
+            RETURN node.name AS name,
+                   node.dob AS dob,
+                   collect(DISTINCT con.name) AS conditions,
+                   score AS スコア
+            ORDER BY score DESC
+            LIMIT $top_k
+            """,
+            {
+                "index_name": generation.index_for("client_summary_embedding"),
+                "top_k_plus": top_k_plus,
+                "query_vec": base[0]["embedding"],
+                "client_name": client_name,
+                "exclude_self": exclude_self,
+                "top_k": top_k,
+            },
+        )
+
+    def local_search(index):
+        element_id = index.find("name", client_name)
+        if element_id is None:
+            log(f"summaryEmbedding が未付与です: {client_name}", "WARN")
+            return []
+        hits = index.search(index.vector(element_id), top_k_plus)
+        return [
+            {"name": payload.get("name"), "dob": payload.get("dob"),
+             "conditions": payload.get("conditions") or [], "スコア": score}
+            for _, score, payload in hits
+            if not (exclude_self and payload.get("name") == client_name)
+        ][:top_k]
+
+    results = _search_with_backend("client_summary_embedding", generation, neo4j_search, local_search)
     log(f"類似クライアント検索: {client_name} → {len(results)}件")
     return results
 
@@ -1363,29 +1709,36 @@ def search_similar_clients_by_text(
     Returns:
         類似クライアントのリスト（スコア付き）
     """
-    query_embedding = embed_text(
-        description,
-        task_type="RETRIEVAL_QUERY",
-        dimensions=DEFAULT_DIMENSIONS,
-    )
+    generation = search_generation()
+    query_embedding = embed_query(description, generation)
     if query_embedding is None:
         return []
 
-    results = _run_query(
-        """
-        CALL db.index.vector.queryNodes('client_summary_embedding', $top_k, $query_embedding)
-        YIELD node, score
-        OPTIONAL MATCH (node)-[:HAS_CONDITION]->(con:Condition)
-        RETURN node.name AS name,
-               node.dob AS dob,
-               collect(DISTINCT con.name) AS conditions,
-               score AS スコア
-        ORDER BY score DESC
-        """,
-        {
-            "top_k": top_k,
-            "query_embedding": query_embedding,
-        },
+    results = _search_with_backend(
+        "client_summary_embedding",
+        generation,
+        lambda: _run_query(
+            """
+            CALL db.index.vector.queryNodes($index_name, $top_k, $query_embedding)
+            YIELD node, score
+            OPTIONAL MATCH (node)-[:HAS_CONDITION]->(con:Condition)
+            RETURN node.name AS name,
+                   node.dob AS dob,
+                   collect(DISTINCT con.name) AS conditions,
+                   score AS スコア
+            ORDER BY score DESC
+            """,
+            {
+                "index_name": generation.index_for("client_summary_embedding"),
+                "top_k": top_k,
+                "query_embedding": query_embedding,
+            },
+        ),
+        lambda index: [
+            {"name": payload.get("name"), "dob": payload.get("dob"),
+             "conditions": payload.get("conditions") or [], "スコア": score}
+            for _, score, payload in index.search(query_embedding, top_k)
+        ],
     )
     log(f"テキストベース類似クライアント検索: '{description[:30]}...' → {len(results)}件")
     return results
@@ -0,0 +1,256 @@
+"""
+内容アドレス型の Embedding キャッシュ（SQLite）
+
+embed_text / embed_texts_batch は毎回 Gemini API を呼んでいた。
+バックフィルを再実行すると同じテキストを埋め込み直すことになる。
+「大きな音を出さない」のような同じ NgAction の文言も、クライアントごとに何度も現れる。
+lib/embedding.py の下で透過的に結果を保存し、同じ入力なら API を呼ばずに返す。
+
+- キーは sha256(モデル, task_type, 次元数, テキスト)。入力が同じなら結果も同じなので無効化は不要
+- ベクトルは float32（既定）または float16 のバイト列で保存する
+  （768 次元で 3KB / 1.5KB。JSON の float リストの 1/3〜1/6）
+- ファイルの合計サイズが上限を超えたら、最後に使われた時刻の古いものから追い出す
+- SQLite の WAL モードで、MCP サーバー・field-ui・バッチなど複数プロセスから共有できる
+
+環境変数:
+  EMBEDDING_CACHE_MODE    "on"（既定）/ "off" / "cache-only"
+                          cache-only はキャッシュにない入力で API を呼ばずに None を返す（テスト・オフラインのベンチマーク用）
+  EMBEDDING_CACHE_PATH    SQLite ファイル（デフォルト: ~/.cache/nest-support/embeddings.sqlite3）
+  EMBEDDING_CACHE_MAX_MB  ベクトルの合計サイズの上限・MB（デフォルト: 256）
+  EMBEDDING_CACHE_DTYPE   "float32"（既定）/ "float16"
+"""
+
+import hashlib
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+MODES = ("on", "off", "cache-only")
+
+# struct の書式文字（float16 は "e"）
+_DTYPE_FORMATS = {"float32": "f", "float16": "e"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key       BLOB PRIMARY KEY,
+    dtype     TEXT NOT NULL,
+    vector    BLOB NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used);
+"""
+
+# 上限を超えたときは上限のこの割合まで追い出す（追い出しの頻度を抑える）
+_EVICT_TO_RATIO = 0.9
+
+# 1 文の IN (...) に渡すキーの数（SQLite の変数の上限 999 未満）
+_CHUNK = 500
+
+
+def _log(message: str, level: str = "INFO"):
+    sys.stderr.write(f"[EmbeddingCache:{level}] {message}\n")
+    sys.stderr.flush()
+
+
+def cache_key(model: str, task_type: str, dimensions: int, text: str) -> bytes:
+    """入力の組み合わせの sha256（区切りに NUL を使い、フィールドの境界をずらした衝突を防ぐ）"""
+    return hashlib.sha256(f"{model}\0{task_type}\0{dimensions}\0{text}".encode("utf-8")).digest()
+
+
+def pack_vector(values: list[float], dtype: str = "float32") -> bytes:
+    return struct.pack(f"<{len(values)}{_DTYPE_FORMATS[dtype]}", *values)
+
+
+def unpack_vector(blob: bytes, dtype: str = "float32") -> list[float]:
+    fmt = _DTYPE_FORMATS[dtype]
+    return list(struct.unpack(f"<{len(blob) // struct.calcsize(fmt)}{fmt}", blob))
+
+
+class EmbeddingCache:
+    """SQLite に保存する有界の Embedding キャッシュ（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_bytes: int = 256 * 1024 * 1024,
+        dtype: str = "float32",
+        mode: str = "on",
+    ):
+        if dtype not in _DTYPE_FORMATS:
+            raise ValueError(f"未対応の dtype: {dtype}（{', '.join(_DTYPE_FORMATS)}）")
+        if mode not in MODES:
+            raise ValueError(f"未対応のモード: {mode}（{', '.join(MODES)}）")
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.dtype = dtype
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._bytes: Optional[int] = None
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def cache_only(self) -> bool:
+        return self.mode == "cache-only"
+
+    def _connect(self) -> sqlite3.Connection:
+        # 初回の利用時に開く（import 時にファイルを作らない）
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            self._bytes = conn.execute("SELECT coalesce(sum(length(vector)), 0) FROM embeddings").fetchone()[0]
+        return self._conn
+
+    # --- 取得・格納 ---
+
+    def get_many(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        """キャッシュにあるキーのベクトルを返す（ないキーは含まない）"""
+        if not self.enabled or not keys:
+            return {}
+        unique = list(dict.fromkeys(keys))
+        found: dict[bytes, list[float]] = {}
+        with self._lock:
+            conn = self._connect()
+            for key, dtype, blob in self._select(conn, "key, dtype, vector", unique):
+                found[key] = unpack_vector(blob, dtype)
+            if found:
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(time.time(), key) for key in found],
+                )
+                conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self._hits += hits
+            self._misses += len(keys) - hits
+        return found
+
+    @staticmethod
+    def _select(conn: sqlite3.Connection, columns: str, keys: list[bytes]) -> list[tuple]:
+        rows = []
+        for i in range(0, len(keys), _CHUNK):
+            chunk = keys[i:i + _CHUNK]
+            rows += conn.execute(
+                f"SELECT {columns} FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+        return rows
+
+    def get(self, key: bytes) -> Optional[list[float]]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: dict[bytes, list[float]]) -> None:
+        if self.mode != "on" or not items:
+            return
+        now = time.time()
+        rows = [(key, self.dtype, pack_vector(values, self.dtype), now) for key, values in items.items()]
+        with self._lock:
+            conn = self._connect()
+            replaced = sum(size for _, size in self._select(conn, "key, length(vector)", list(items)))
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            conn.commit()
+            self._writes += len(rows)
+            self._bytes += sum(len(row[2]) for row in rows) - replaced
+            if self._bytes > self.max_bytes:
+                self._evict(conn)
+
+    def put(self, key: bytes, values: list[float]) -> None:
+        self.put_many({key: values})
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """最後に使われた時刻の古いものから、合計が上限の 9 割になるまで消す"""
+        target = int(self.max_bytes * _EVICT_TO_RATIO)
+        removed = 0
+        cursor = conn.execute("SELECT key, length(vector) FROM embeddings ORDER BY last_used")
+        victims = []
+        for key, size in cursor:
+            if self._bytes - removed <= target:
+                break
+            victims.append((key,))
+            removed += size
+        conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+        conn.commit()
+        # 他プロセスの書き込みも含めて数え直す
+        self._bytes = conn.execute("SELECT coalesce(sum(length(vector)), 0) FROM embeddings").fetchone()[0]
+        self._evictions += len(victims)
+        _log(f"{len(victims)} 件を追い出しました（{self._bytes / 1024 / 1024:.1f}MB）")
+
+    # --- 統計 ---
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            entries = 0
+            if self._conn is not None:
+                entries = self._conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+            return {
+                "mode": self.mode,
+                "path": str(self.path),
+                "dtype": self.dtype,
+                "entries": entries,
+                "bytes": self._bytes or 0,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "writes": self._writes,
+                "evictions": self._evictions,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# =============================================================================
+# プロセス共有のインスタンス
+# =============================================================================
+
+def _cache_from_env() -> EmbeddingCache:
+    default_path = Path.home() / ".cache" / "nest-support" / "embeddings.sqlite3"
+    return EmbeddingCache(
+        path=Path(os.getenv("EMBEDDING_CACHE_PATH", str(default_path))).expanduser(),
+        max_bytes=int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")) * 1024 * 1024),
+        dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float32"),
+        mode=os.getenv("EMBEDDING_CACHE_MODE", "on").lower(),
+    )
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _cache_from_env()
+    return _cache
+
+
+def set_embedding_cache(cache: EmbeddingCache) -> Optional[EmbeddingCache]:
+    """キャッシュを差し替え、以前のものを返す（テスト・ベンチマーク用）"""
+    global _cache
+    previous, _cache = _cache, cache
+    return previous
+
+
+def get_embedding_cache_stats() -> dict:
+    return get_embedding_cache().stats()
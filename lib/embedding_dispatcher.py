@@ -0,0 +1,260 @@
+"""
+Gemini Embedding の一括生成ディスパッチャー（レート制限・チャンク分割・部分リトライ）
+
+以前の embed_texts_batch は、リスト全体を 1 回の embed_content で送っていた。
+その 1 回が失敗すると全件が [None] * len(texts) になり、
+バックフィルは time.sleep(0.5) の固定間隔でしか流量を調整できなかった。
+
+- 入力を API に送れる大きさのチャンクに分け、同時実行数を絞って並行に送る
+- 1 分あたりのリクエスト数・トークン数のトークンバケットで流量を制限する（プロセス内で共有）
+- 失敗したチャンクだけを、ジッター付き指数バックオフで再送する
+- 429（RESOURCE_EXHAUSTED）を受けたらチャンクを半分にし、
+  目標レイテンシ内で成功が続けば少しずつ大きくする（AIMD）
+- 処理件数・429 の回数・スループット（texts/sec）を記録する
+
+呼び出し元の ContextVar（デッドライン・ワークロードクラス）はワーカースレッドに引き継ぐ。
+予算切れ（DeadlineExceeded）は再送せずに送出する。
+
+環境変数:
+  GEMINI_EMBED_RPM             1 分あたりのリクエスト数の上限（デフォルト: 100）
+  GEMINI_EMBED_TPM             1 分あたりのトークン数の上限（デフォルト: 30000）
+  GEMINI_EMBED_CONCURRENCY     同時に送るチャンク数（デフォルト: 4）
+  GEMINI_EMBED_CHUNK_SIZE      最初のチャンクの件数（デフォルト: 32）
+  GEMINI_EMBED_MAX_CHUNK_SIZE  チャンクの件数の上限（デフォルト: 100、API の 1 リクエストの上限）
+  GEMINI_EMBED_MAX_RETRIES     チャンクごとの再送回数（デフォルト: 5）
+  GEMINI_EMBED_TARGET_SECONDS  チャンクを大きくしてよいレイテンシ・秒（デフォルト: 5）
+"""
+
+import contextvars
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from lib.deadline import DeadlineExceeded, check
+
+# 再送する HTTP ステータス（code を持たない例外は通信エラーとして再送する）
+_RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _log(message: str, level: str = "INFO"):
+    sys.stderr.write(f"[EmbedDispatcher:{level}] {message}\n")
+    sys.stderr.flush()
+
+
+def estimate_tokens(text: str) -> int:
+    """トークン数の見積もり（UTF-8 で 4 バイトあたり 1 トークン。日本語は 1 文字 0.75 トークン程度）"""
+    return max(1, math.ceil(len(text.encode("utf-8")) / 4))
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+def is_retryable(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    return code is None or code in _RETRYABLE_CODES or is_rate_limited(error)
+
+
+class TokenBucket:
+    """1 分あたり rate_per_minute だけ補充されるトークンバケット（スレッドセーフ）"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """amount だけ取り出す（足りなければ補充を待つ）。待った秒数を返す"""
+        # 容量を超える要求はバケットが満杯になった時点で通す
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class EmbeddingDispatcher:
+    """
+    テキストのリストをチャンクに分けて embed_fn で埋め込む。
+
+    embed_fn(texts, task_type, dimensions) は成功すれば texts と同じ長さのベクトルのリストを返し、
+    失敗すれば例外を送出する（429 は code=429 または RESOURCE_EXHAUSTED を含むメッセージ）。
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[list[str], str, int], list[list[float]]],
+        requests_per_minute: float = 100,
+        tokens_per_minute: float = 30000,
+        concurrency: int = 4,
+        chunk_size: int = 32,
+        min_chunk_size: int = 1,
+        max_chunk_size: int = 100,
+        max_retries: int = 5,
+        target_seconds: float = 5.0,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 30.0,
+    ):
+        self.embed_fn = embed_fn
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.max_retries = max_retries
+        self.target_seconds = target_seconds
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._lock = threading.Lock()
+        self._stats = {
+            "texts": 0, "embedded": 0, "failed": 0, "requests": 0, "retries": 0,
+            "rate_limited": 0, "throttle_wait_seconds": 0.0, "busy_seconds": 0.0,
+        }
+
+    # --- チャンクサイズの調整 ---
+
+    def _shrink(self) -> None:
+        with self._lock:
+            before = self.chunk_size
+            self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+            self._stats["rate_limited"] += 1
+        if self.chunk_size != before:
+            _log(f"429 を受けたためチャンクを縮小: {before} → {self.chunk_size}", "WARN")
+
+    def _grow(self, latency: float) -> None:
+        if latency > self.target_seconds:
+            return
+        with self._lock:
+            self.chunk_size = min(self.max_chunk_size, self.chunk_size + max(1, self.chunk_size // 4))
+
+    def _next_chunk(self, cursor: list[int], total: int) -> Optional[tuple[int, int]]:
+        with self._lock:
+            start = cursor[0]
+            if start >= total:
+                return None
+            end = min(total, start + self.chunk_size)
+            cursor[0] = end
+            return start, end
+
+    # --- 実行 ---
+
+    def _send(self, texts: list[str], task_type: str, dimensions: int) -> list[list[float]]:
+        waited = self.requests.acquire(1)
+        waited += self.tokens.acquire(sum(estimate_tokens(t) for t in texts))
+        check("embed_texts_batch")  # 流量制限で待つ間に予算を使い切った
+        started = time.monotonic()
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["throttle_wait_seconds"] += waited
+        vectors = self.embed_fn(texts, task_type, dimensions)
+        if len(vectors) != len(texts):
+            raise ValueError(f"ベクトル数 {len(vectors)} が入力 {len(texts)} 件と一致しません")
+        self._grow(time.monotonic() - started)
+        return vectors
+
+    def _run_chunk(self, texts: list[str], task_type: str, dimensions: int) -> list[Optional[list[float]]]:
+        """1 チャンクを送る。失敗したらこのチャンクだけを再送し、上限を超えたら None で埋める"""
+        attempt = 0
+        while True:
+            try:
+                return self._send(texts, task_type, dimensions)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                check("embed_texts_batch")  # デッドラインによるタイムアウトは再送しない
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    _log(f"{len(texts)} 件のチャンクを諦めます（{attempt} 回再送）: {e}", "ERROR")
+                    return [None] * len(texts)
+                rate_limited = is_rate_limited(e)
+                if rate_limited:
+                    self._shrink()
+                attempt += 1
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt))))
+                check("embed_texts_batch")
+                size = self.chunk_size
+                if rate_limited and len(texts) > size:
+                    # 縮小後の大きさに分けて送り直す（分けた各チャンクがそれぞれ再送回数を持つ）
+                    results = []
+                    for i in range(0, len(texts), size):
+                        results += self._run_chunk(texts[i:i + size], task_type, dimensions)
+                    return results
+
+    def embed(self, texts: list[str], task_type: str, dimensions: int) -> list[Optional[list[float]]]:
+        """texts と同じ順序でベクトル（失敗したチャンクの分は None）を返す"""
+        if not texts:
+            return []
+        results: list[Optional[list[float]]] = [None] * len(texts)
+        cursor = [0]
+        started = time.monotonic()
+
+        def worker():
+            while True:
+                span = self._next_chunk(cursor, len(texts))
+                if span is None:
+                    return
+                start, end = span
+                results[start:end] = self._run_chunk(texts[start:end], task_type, dimensions)
+
+        workers = min(self.concurrency, math.ceil(len(texts) / self.chunk_size))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # デッドライン・ワークロードクラスをワーカーに引き継ぐ
+            futures = [pool.submit(contextvars.copy_context().run, worker) for _ in range(workers)]
+            errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            raise errors[0]
+
+        embedded = sum(1 for r in results if r is not None)
+        with self._lock:
+            self._stats["texts"] += len(texts)
+            self._stats["embedded"] += embedded
+            self._stats["failed"] += len(texts) - embedded
+            self._stats["busy_seconds"] += time.monotonic() - started
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["chunk_size"] = self.chunk_size
+        busy = stats["busy_seconds"]
+        stats["texts_per_sec"] = round(stats["embedded"] / busy, 1) if busy else 0.0
+        stats["throttle_wait_seconds"] = round(stats["throttle_wait_seconds"], 2)
+        stats["busy_seconds"] = round(busy, 2)
+        return stats
+
+
+# =============================================================================
+# プロセス共有のインスタンス
+# =============================================================================
+
+def dispatcher_from_env(embed_fn) -> EmbeddingDispatcher:
+    return EmbeddingDispatcher(
+        embed_fn,
+        requests_per_minute=float(os.getenv("GEMINI_EMBED_RPM", "100")),
+        tokens_per_minute=float(os.getenv("GEMINI_EMBED_TPM", "30000")),
+        concurrency=int(os.getenv("GEMINI_EMBED_CONCURRENCY", "4")),
+        chunk_size=int(os.getenv("GEMINI_EMBED_CHUNK_SIZE", "32")),
+        max_chunk_size=int(os.getenv("GEMINI_EMBED_MAX_CHUNK_SIZE", "100")),
+        max_retries=int(os.getenv("GEMINI_EMBED_MAX_RETRIES", "5")),
+        target_seconds=float(os.getenv("GEMINI_EMBED_TARGET_SECONDS", "5")),
+    )
@@ -0,0 +1,506 @@
+"""
+Embedding の世代（モデル・次元数）と、シャドウインデックスによる無停止の移行
+
+EMBEDDING_MODEL はプレビュー版で、VECTOR_INDEXES の 6 つのインデックスは 768 次元で固定されていた。
+モデルや次元数を変えるには、インデックスを消してすべて埋め込み直すしかなく、その間は検索が使えなかった。
+
+世代（EmbeddingGeneration）はモデル・次元数・版の組。版 1 は従来のプロパティとインデックス
+（embedding / support_log_embedding）を使い、版 N はそれぞれに接尾辞を付けたものを使う
+（embeddingV2 / support_log_embedding_v2）。どの世代が使われているかは Neo4j の
+(:EmbeddingState {key: "embedding"}) に保存し、すべてのプロセスがこれを参照する。
+Neo4j に繋がらないときは、ローカルの ANN 索引を作った世代（lib/ann_index.py の generation.json）を使う。
+
+移行の手順（scripts/migrate_embedding_model.py）:
+  1. start     新しい世代をシャドウとして登録し、シャドウのベクトルインデックスを作る。
+               以後、登録時の Embedding 付与は現行とシャドウの両方に書き込む（二重書き込み）
+  2. backfill  既存ノードのシャドウ側を、流量制限付きのバックフィル（lib/backfill.py）で埋める
+  3. evaluate  検証用のクエリ集合で、現行とシャドウの recall@k を比べる
+  4. switch    シャドウを現行に切り替える（1 トランザクションで状態を更新）。
+               semantic_search などの検索は次の再読み込みから新しいインデックスを使う。
+               旧世代は「退役」として残し、切り戻しに備えて二重書き込みを続ける
+  5. drop      退役した世代のインデックスとプロパティを削除する
+  abort        シャドウを破棄する（切り替え前のみ）
+
+状態の更新は revision による楽観的排他で行い、別の移行操作と競合したら GenerationConflictError を送出する。
+
+環境変数:
+  EMBEDDING_GENERATION_REFRESH_SECONDS  世代の状態を読み直す間隔・秒（デフォルト: 30）
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Optional
+
+STATE_KEY = "embedding"
+
+LOAD_STATE_QUERY = """
+MATCH (s:EmbeddingState {key: $key})
+RETURN s {.*} AS state
+"""
+
+# revision が読んだときと同じ場合だけ更新する（行が返らなければ競合）
+SAVE_STATE_QUERY = """
+MERGE (s:EmbeddingState {key: $key})
+WITH s WHERE coalesce(s.revision, 0) = $revision
+SET s += $props, s.revision = $revision + 1, s.updatedAt = datetime()
+RETURN s.revision AS revision
+"""
+
+_SUFFIX = re.compile(r"V\d+$")
+
+_SLOTS = ("active", "shadow", "retired")
+
+
+def _log(message: str, level: str = "INFO"):
+    sys.stderr.write(f"[EmbeddingGeneration:{level}] {message}\n")
+    sys.stderr.flush()
+
+
+class GenerationConflictError(RuntimeError):
+    """移行の前提を満たさない、または別の移行操作と競合した"""
+
+
+@dataclass(frozen=True)
+class EmbeddingGeneration:
+    version: int
+    model: str
+    dimensions: int
+
+    def property_for(self, base_property: str) -> str:
+        return base_property if self.version == 1 else f"{base_property}V{self.version}"
+
+    def index_for(self, base_index: str) -> str:
+        return base_index if self.version == 1 else f"{base_index}_v{self.version}"
+
+    def __str__(self) -> str:
+        return f"v{self.version} ({self.model}, {self.dimensions}次元)"
+
+
+def base_property(vector_property: str) -> str:
+    """世代の接尾辞を除いたプロパティ名（embeddingV2 → embedding）"""
+    return _SUFFIX.sub("", vector_property)
+
+
+@dataclass(frozen=True)
+class GenerationState:
+    active: EmbeddingGeneration
+    shadow: Optional[EmbeddingGeneration] = None
+    retired: Optional[EmbeddingGeneration] = None
+    revision: int = 0
+
+    def generations(self) -> list[EmbeddingGeneration]:
+        """ベクトルを書き込む世代（現行が先頭）"""
+        return [g for g in (self.active, self.shadow, self.retired) if g is not None]
+
+    def to_props(self) -> dict:
+        props = {}
+        for slot in _SLOTS:
+            generation = getattr(self, slot)
+            props[f"{slot}Version"] = generation.version if generation else None
+            props[f"{slot}Model"] = generation.model if generation else None
+            props[f"{slot}Dimensions"] = generation.dimensions if generation else None
+        return props
+
+    @classmethod
+    def from_props(cls, props: dict, default: EmbeddingGeneration) -> "GenerationState":
+        slots = {}
+        for slot in _SLOTS:
+            if props.get(f"{slot}Version") is not None:
+                slots[slot] = EmbeddingGeneration(
+                    int(props[f"{slot}Version"]), props[f"{slot}Model"], int(props[f"{slot}Dimensions"]),
+                )
+        return cls(
+            active=slots.get("active", default),
+            shadow=slots.get("shadow"),
+            retired=slots.get("retired"),
+            revision=int(props.get("revision") or 0),
+        )
+
+
+def default_generation() -> EmbeddingGeneration:
+    """状態が保存されていないときの世代（lib.embedding の定数）"""
+    from lib.embedding import DEFAULT_DIMENSIONS, EMBEDDING_MODEL
+    return EmbeddingGeneration(1, EMBEDDING_MODEL, DEFAULT_DIMENSIONS)
+
+
+def _default_run_query(query, params=None):
+    from lib.db_new_operations import run_query
+    return run_query(query, params)
+
+
+def load_generation_state(run_query=None) -> GenerationState:
+    rows = (run_query or _default_run_query)(LOAD_STATE_QUERY, {"key": STATE_KEY})
+    return GenerationState.from_props(rows[0]["state"] if rows else {}, default_generation())
+
+
+def save_generation_state(state: GenerationState, run_query=None) -> GenerationState:
+    """state.revision が保存されているものと同じなら保存し、revision を進めた状態を返す"""
+    rows = (run_query or _default_run_query)(
+        SAVE_STATE_QUERY, {"key": STATE_KEY, "revision": state.revision, "props": state.to_props()},
+    )
+    if not rows:
+        raise GenerationConflictError("Embedding の世代が別の操作で更新されました。状態を確認してやり直してください")
+    saved = replace(state, revision=rows[0]["revision"])
+    set_generation_state(saved, pin=False)
+    return saved
+
+
+# =============================================================================
+# プロセス内のキャッシュ
+# =============================================================================
+
+_state: Optional[GenerationState] = None
+_loaded_at = 0.0
+_pinned = False
+_loading = False
+_lock = threading.Lock()
+_REFRESH_SECONDS = float(os.getenv("EMBEDDING_GENERATION_REFRESH_SECONDS", "30"))
+
+
+def _fallback_state() -> GenerationState:
+    """Neo4j から読めず、キャッシュもないときの状態（ローカルの ANN 索引を作った世代、なければ既定の世代）"""
+    try:
+        from lib.ann_index import load_local_generation
+        local = load_local_generation()
+    except Exception as e:
+        _log(f"ローカルの索引の世代を読み込めません: {e}", "WARN")
+        local = None
+    return GenerationState(local or default_generation())
+
+
+def get_generation_state(refresh: bool = False) -> GenerationState:
+    """
+    世代の状態（REFRESH_SECONDS ごとに Neo4j から読み直す）
+
+    読み直しはロックの外で行い、その間（別のスレッドが読み直している間も）は直前の状態を返す。
+    読み込みに失敗したら直前の状態（なければローカルの ANN 索引の世代、それもなければ既定の世代）を使い、
+    次の間隔まで読み直さない。
+    """
+    global _state, _loaded_at, _loading
+    with _lock:
+        fresh = _state is not None and (_pinned or time.monotonic() - _loaded_at < _REFRESH_SECONDS)
+        if (fresh and not refresh) or (_loading and _state is not None):
+            return _state
+        _loading = True
+
+    loaded, error = None, None
+    try:
+        loaded = load_generation_state()
+    except Exception as e:
+        error = e
+    except BaseException:
+        with _lock:
+            _loading = False
+        raise
+
+    with _lock:
+        _loading = False
+        if _pinned:  # 読み込み中に set_generation_state で固定された
+            return _state
+        if loaded is not None:
+            _state = loaded
+        else:
+            _state = _state or _fallback_state()
+            _log(f"世代の状態を読み込めないため {_state.active} を使います: {error}", "WARN")
+        _loaded_at = time.monotonic()
+        return _state
+
+
+def set_generation_state(state: Optional[GenerationState], pin: bool = True) -> Optional[GenerationState]:
+    """
+    状態を差し替え、以前のものを返す
+
+    pin=True なら Neo4j から読み直さない（テスト・オフラインのベンチマーク用）。None で読み直しに戻す。
+    """
+    global _state, _loaded_at, _pinned
+    with _lock:
+        previous = _state
+        _state, _loaded_at, _pinned = state, time.monotonic(), pin and state is not None
+    return previous
+
+
+def active_generation() -> EmbeddingGeneration:
+    return get_generation_state().active
+
+
+# =============================================================================
+# 移行の操作
+# =============================================================================
+
+def vector_index_definitions(state: Optional[GenerationState] = None) -> dict[str, dict]:
+    """
+    state（省略時は現在の状態）のすべての世代のベクトルインデックス
+
+    VECTOR_INDEXES と同じ形（インデックス名 → label / property / dimensions）に、
+    ベースのインデックス名（base）と世代の版（version）を加えたもの。
+    """
+    from lib.embedding import VECTOR_INDEXES
+
+    state = state or get_generation_state()
+    return {
+        generation.index_for(base_index): {
+            "label": config["label"],
+            "property": generation.property_for(config["property"]),
+            "dimensions": generation.dimensions,
+            "base": base_index,
+            "version": generation.version,
+        }
+        for generation in state.generations()
+        for base_index, config in VECTOR_INDEXES.items()
+    }
+
+
+def start_migration(model: str, dimensions: int, run_query=None) -> GenerationState:
+    """新しい世代をシャドウとして登録し、シャドウのベクトルインデックスを作る"""
+    state = load_generation_state(run_query)
+    if state.shadow is not None:
+        raise GenerationConflictError(f"移行中のシャドウ {state.shadow} があります（switch か abort が先）")
+    if state.retired is not None:
+        raise GenerationConflictError(f"退役した世代 {state.retired} が残っています（drop が先）")
+    if (model, dimensions) == (state.active.model, state.active.dimensions):
+        raise GenerationConflictError(f"現行の世代 {state.active} と同じモデル・次元数です")
+
+    shadow = EmbeddingGeneration(state.active.version + 1, model, dimensions)
+    state = save_generation_state(replace(state, shadow=shadow), run_query)
+
+    from lib.embedding import ensure_vector_indexes
+    ensure_vector_indexes(state, run_query=run_query)
+    _log(f"シャドウ {shadow} を登録しました。以後の Embedding 付与は現行 {state.active} と二重に書き込みます")
+    return state
+
+
+def migration_status(run_query=None) -> dict:
+    """インデックスごとに、現行・シャドウのベクトルを持つノード数と、シャドウ側が未付与の数"""
+    run_query = run_query or _default_run_query
+    state = load_generation_state(run_query)
+    from lib.embedding import VECTOR_INDEXES
+
+    indexes = {}
+    target = state.shadow or state.retired
+    for base_index, config in VECTOR_INDEXES.items():
+        active_prop = state.active.property_for(config["property"])
+        row = {"active": 0, "target": 0, "missing": 0}
+        if target is not None:
+            target_prop = target.property_for(config["property"])
+            # 現行のベクトルを持つのに、移行先（シャドウ、切り替え後は退役）のベクトルを持たないノード
+            source, dest = (active_prop, target_prop) if state.shadow else (target_prop, active_prop)
+            result = run_query(
+                f"""
+                MATCH (n:{config['label']})
+                RETURN count(n.{active_prop}) AS active, count(n.{target_prop}) AS target,
+                       count(CASE WHEN n.{source} IS NOT NULL AND n.{dest} IS NULL THEN 1 END) AS missing
+                """
+            )
+            row = dict(result[0]) if result else row
+        else:
+            result = run_query(f"MATCH (n:{config['label']}) RETURN count(n.{active_prop}) AS active")
+            row["active"] = result[0]["active"] if result else 0
+        indexes[base_index] = row
+    return {
+        "active": str(state.active),
+        "shadow": str(state.shadow) if state.shadow else None,
+        "retired": str(state.retired) if state.retired else None,
+        "revision": state.revision,
+        "indexes": indexes,
+    }
+
+
+def recall_at_k(retrieved: list[str], relevant: list[str]) -> float:
+    if not relevant:
+        return 0.0
+    return len(set(retrieved) & set(relevant)) / len(relevant)
+
+
+def evaluate_recall(queries: list[dict], k: int = 10, run_query=None) -> dict:
+    """
+    検証用のクエリ集合で、現行とシャドウ（切り替え後は退役）の recall@k を比べる
+
+    queries は {"index": ベースのインデックス名, "query": テキスト, "relevant": [elementId, ...]} のリスト。
+    両世代で同じクエリを検索し、正解のうち上位 k 件に入った割合を平均する。
+    overlap は両世代の上位 k 件の重なり（結果がどれだけ入れ替わるかの目安）。
+    """
+    from lib.embedding import embed_texts_batch
+
+    run_query = run_query or _default_run_query
+    state = load_generation_state(run_query)
+    other = state.shadow or state.retired
+    if other is None:
+        raise GenerationConflictError("比較するシャドウの世代がありません")
+
+    generations = {"current": state.active, "candidate": other} if state.shadow else \
+        {"current": other, "candidate": state.active}
+    texts = [q["query"] for q in queries]
+    retrieved = {}
+    for role, generation in generations.items():
+        vectors = embed_texts_batch(texts, "RETRIEVAL_QUERY", dimensions=generation.dimensions, model=generation.model)
+        retrieved[role] = []
+        for q, vector in zip(queries, vectors):
+            if vector is None:
+                retrieved[role].append([])
+                continue
+            rows = run_query(
+                "CALL db.index.vector.queryNodes($index, $k, $vector) YIELD node RETURN elementId(node) AS id",
+                {"index": generation.index_for(q["index"]), "k": k, "vector": vector},
+            )
+            retrieved[role].append([r["id"] for r in rows])
+
+    return {
+        "current": str(generations["current"]),
+        "candidate": str(generations["candidate"]),
+        **compare_recall(queries, retrieved["current"], retrieved["candidate"], k),
+    }
+
+
+def compare_recall(queries: list[dict], current: list[list[str]], candidate: list[list[str]], k: int) -> dict:
+    """クエリごとの上位 k 件（current・candidate）から、全体とインデックスごとの recall@k・重なりを集計する"""
+    per_index: dict[str, dict] = {}
+    for q, cur, cand in zip(queries, current, candidate):
+        entry = per_index.setdefault(q["index"], {"queries": 0, "current": 0.0, "candidate": 0.0, "overlap": 0.0})
+        entry["queries"] += 1
+        entry["current"] += recall_at_k(cur, q["relevant"])
+        entry["candidate"] += recall_at_k(cand, q["relevant"])
+        entry["overlap"] += len(set(cur) & set(cand)) / k
+    for entry in per_index.values():
+        for key in ("current", "candidate", "overlap"):
+            entry[key] = round(entry[key] / entry["queries"], 4)
+
+    total = len(queries) or 1
+    return {
+        "k": k,
+        "queries": len(queries),
+        "recall_current": round(sum(recall_at_k(r, q["relevant"]) for r, q in zip(current, queries)) / total, 4),
+        "recall_candidate": round(sum(recall_at_k(r, q["relevant"]) for r, q in zip(candidate, queries)) / total, 4),
+        "indexes": per_index,
+    }
+
+
+def held_out_queries(per_index: int = 50, run_query=None) -> list[dict]:
+    """
+    検証用のクエリ集合を作る（ラベル付きのクエリ集合がない場合）
+
+    現行・シャドウの両方のベクトルを持つノードを無作為に選び、その正規のテキストをクエリ、
+    そのノード自身を正解とする（既知項目の検索）。どちらかの世代で埋め込みが欠けていれば recall が下がる。
+    対象は lib.embedding_texts に構築ルールがあるラベル（SupportLog・NgAction・CarePreference）のインデックス。
+    """
+    from lib.embedding import VECTOR_INDEXES
+    from lib.embedding_texts import EMBEDDING_TEXT_BUILDERS
+
+    run_query = run_query or _default_run_query
+    state = load_generation_state(run_query)
+    other = state.shadow or state.retired
+    if other is None:
+        raise GenerationConflictError("比較するシャドウの世代がありません")
+
+    queries = []
+    for base_index, config in VECTOR_INDEXES.items():
+        builder = EMBEDDING_TEXT_BUILDERS.get(config["label"])
+        if builder is None or builder.property != config["property"]:
+            continue
+        rows = run_query(
+            f"""
+            MATCH (n:{config['label']})
+            WHERE n.{state.active.property_for(config['property'])} IS NOT NULL
+              AND n.{other.property_for(config['property'])} IS NOT NULL
+            WITH n ORDER BY rand() LIMIT $limit
+            RETURN elementId(n) AS id, {builder.projection()}
+            """,
+            {"limit": per_index},
+        )
+        for row in rows:
+            text = builder.build(row)
+            if text:
+                queries.append({"index": base_index, "query": text, "relevant": [row["id"]]})
+    return queries
+
+
+def switch_generation(
+    evaluation: Optional[dict] = None,
+    min_recall_ratio: float = 0.95,
+    force: bool = False,
+    run_query=None,
+) -> GenerationState:
+    """
+    シャドウを現行に切り替える（状態の更新は 1 トランザクション）
+
+    切り替えの前提:
+      - シャドウ側が未付与のノードがない（migration_status の missing がすべて 0）
+      - evaluation（evaluate_recall の結果）で、シャドウの recall@k が現行の min_recall_ratio 倍以上
+    force=True なら前提を確かめない。
+    旧世代は退役として残し、drop まで二重書き込みを続ける（問題があれば rollback_generation で戻せる）。
+    """
+    run_query = run_query or _default_run_query
+    state = load_generation_state(run_query)
+    if state.shadow is None:
+        raise GenerationConflictError("切り替えるシャドウの世代がありません")
+    if not force:
+        missing = {name: row["missing"] for name, row in migration_status(run_query)["indexes"].items() if row["missing"]}
+        if missing:
+            raise GenerationConflictError(f"シャドウ側が未付与のノードがあります（backfill が先）: {missing}")
+        if evaluation is None:
+            raise GenerationConflictError("recall@k の評価結果がありません（evaluate が先）")
+        if evaluation["recall_candidate"] < evaluation["recall_current"] * min_recall_ratio:
+            raise GenerationConflictError(
+                f"シャドウの recall@{evaluation['k']} {evaluation['recall_candidate']} が"
+                f"現行 {evaluation['recall_current']} の {min_recall_ratio:.0%} に届きません"
+            )
+    state = save_generation_state(
+        GenerationState(active=state.shadow, retired=state.active, revision=state.revision), run_query,
+    )
+    _log(f"現行の世代を {state.active} に切り替えました（旧世代 {state.retired} は drop まで更新を続けます）")
+    return state
+
+
+def rollback_generation(run_query=None) -> GenerationState:
+    """switch を取り消す（退役した世代を現行に戻し、切り替えた世代をシャドウに戻す）"""
+    state = load_generation_state(run_query)
+    if state.retired is None:
+        raise GenerationConflictError("戻す先の退役した世代がありません")
+    state = save_generation_state(
+        GenerationState(active=state.retired, shadow=state.active, revision=state.revision), run_query,
+    )
+    _log(f"現行の世代を {state.active} に戻しました")
+    return state
+
+
+def _drop_generation(generation: EmbeddingGeneration, run_query) -> None:
+    from lib.embedding import VECTOR_INDEXES
+    from lib.embedding_texts import hash_property
+
+    for base_index, config in VECTOR_INDEXES.items():
+        # インデックス名・プロパティ名はモジュールの定数と世代の版から作るため、文字列に埋め込んでよい
+        run_query(f"DROP INDEX `{generation.index_for(base_index)}` IF EXISTS")
+        prop = generation.property_for(config["property"])
+        run_query(f"""
+            MATCH (n:{config['label']}) WHERE n.{prop} IS NOT NULL
+            CALL {{ WITH n REMOVE n.{prop}, n.{hash_property(prop)} }} IN TRANSACTIONS OF 1000 ROWS
+        """)
+    _log(f"世代 {generation} のインデックスとプロパティを削除しました")
+
+
+def drop_retired(run_query=None) -> GenerationState:
+    """退役した世代のインデックスとプロパティを削除する（switch の後）"""
+    run_query = run_query or _default_run_query
+    state = load_generation_state(run_query)
+    if state.retired is None:
+        raise GenerationConflictError("削除する退役した世代がありません")
+    retired = state.retired
+    # 先に状態から外して二重書き込みを止めてから消す
+    state = save_generation_state(replace(state, retired=None), run_query)
+    _drop_generation(retired, run_query)
+    return state
+
+
+def abort_migration(run_query=None) -> GenerationState:
+    """シャドウの世代を破棄する（switch の前）"""
+    run_query = run_query or _default_run_query
+    state = load_generation_state(run_query)
+    if state.shadow is None:
+        raise GenerationConflictError("破棄するシャドウの世代がありません")
+    shadow = state.shadow
+    state = save_generation_state(replace(state, shadow=None), run_query)
+    _drop_generation(shadow, run_query)
+    return state
@@ -0,0 +1,84 @@
+"""
+Embedding 用テキストの構築ルール（版付きの正規レジストリ）
+
+SupportLog のテキストは db_operations・db_new_operations・バックフィル・embed_support_log で
+それぞれ別に組み立てていた。感情・きっかけ・文脈を含むものと含まないものがあり、
+同じベクトルインデックスに異なる入力のベクトルが混在していた。
+テキストの構築はここに一本化し、ノードにはベクトルと並べてハッシュを保存する。
+
+- embeddingHash = "v<版>:<テキストの sha256>"
+  構築ルールを変えたら version を上げる。テキストか版が変わったノードは、
+  保存されたハッシュと現在のハッシュが食い違うので再埋め込みの対象になる
+  （scripts/backfill_embeddings.py --stale）
+- ハッシュはベクトルのプロパティ名に "Hash" を付けたプロパティに保存する
+  （embedding → embeddingHash、summaryEmbedding → summaryEmbeddingHash）
+"""
+
+import hashlib
+from dataclasses import dataclass
+
+# Client の summaryEmbedding（lib.embedding.build_client_summary_text）の構築ルールの版
+CLIENT_SUMMARY_VERSION = 1
+
+
+def content_hash(version: int, text: str) -> str:
+    return f"v{version}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+def hash_property(vector_property: str) -> str:
+    """ベクトルのプロパティに対応するハッシュのプロパティ名"""
+    return f"{vector_property}Hash"
+
+
+@dataclass(frozen=True)
+class TextBuilder:
+    """ノードのプロパティを「見出し: 値」の形で「。」区切りにつなぐ"""
+    label: str
+    version: int
+    fields: tuple[tuple[str, str], ...]  # (プロパティ名, 見出し)
+    property: str = "embedding"
+
+    def build(self, props: dict) -> str:
+        return "。".join(f"{heading}: {props[name]}" for name, heading in self.fields if props.get(name))
+
+    def hash(self, text: str) -> str:
+        return content_hash(self.version, text)
+
+    def projection(self, variable: str = "n") -> str:
+        """構築に必要なプロパティを返す RETURN 句の列"""
+        return ", ".join(f"{variable}.{name} AS {name}" for name, _ in self.fields)
+
+
+EMBEDDING_TEXT_BUILDERS = {
+    builder.label: builder
+    for builder in (
+        TextBuilder("SupportLog", 1, (
+            ("emotion", "感情"),
+            ("triggerTag", "きっかけ"),
+            ("situation", "状況"),
+            ("action", "対応"),
+            ("context", "文脈"),
+            ("note", "メモ"),
+            ("effectiveness", "効果"),
+        )),
+        TextBuilder("NgAction", 1, (
+            ("action", "禁忌"),
+            ("reason", "理由"),
+            ("riskLevel", "リスク"),
+        )),
+        TextBuilder("CarePreference", 1, (
+            ("category", "カテゴリ"),
+            ("instruction", "指示"),
+        )),
+    )
+}
+
+
+def build_text(label: str, props: dict) -> str:
+    """label のノードの Embedding 用テキスト（対象外のラベル・情報がなければ空文字列）"""
+    builder = EMBEDDING_TEXT_BUILDERS.get(label)
+    return builder.build(props) if builder else ""
+
+
+def text_hash(label: str, text: str) -> str:
+    return EMBEDDING_TEXT_BUILDERS[label].hash(text)
@@ -0,0 +1,410 @@
+"""
+バッチ型グラフ登録エンジン
+
+register_to_database() の書き込みを 1 つの管理書き込みトランザクションにまとめる。
+
+- ノードは (ラベル, MERGEキー) ごとにグループ化し、UNWIND で一括 MERGE / CREATE
+- temp_id → elementId の対応はメモリ上で解決
+- リレーションシップはタイプごとに UNWIND で一括 MERGE
+- 監査ログも同じトランザクション内で UNWIND 登録
+
+途中の文が失敗した場合はトランザクション全体がロールバックされるため、
+「ノードだけ登録されてリレーションが無い」といった中途半端なグラフは残らない。
+"""
+
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+def _log(message: str, level: str = "INFO"):
+    sys.stderr.write(f"[GraphWriter:{level}] {message}\n")
+    sys.stderr.flush()
+
+
+# ラベル・リレーションタイプ・プロパティキーとして埋め込み可能な識別子
+_IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+# =============================================================================
+# 書き込み計画
+# =============================================================================
+
+@dataclass
+class NodeGroup:
+    """同一の Cypher 文で UNWIND 登録できるノードの集まり"""
+    label: str
+    merge_keys: tuple[str, ...]  # 空タプルなら CREATE
+    rows: list[dict] = field(default_factory=list)
+
+    @property
+    def is_merge(self) -> bool:
+        return bool(self.merge_keys)
+
+
+@dataclass
+class GraphWritePlan:
+    """検証済みグラフから組み立てた書き込み計画"""
+    nodes: list[dict]                      # 登録対象ノード（元の順序を維持）
+    node_groups: list[NodeGroup]
+    relationships: list[dict]
+    client_name: str = "Unknown"
+    warnings: list[str] = field(default_factory=list)
+
+
+def plan_graph_write(
+    extracted_graph: dict,
+    merge_keys: dict[str, list[str]],
+    missing_merge_key: str = "create",
+) -> GraphWritePlan:
+    """
+    グラフ構造 (nodes, relationships) を UNWIND 用の書き込み計画に変換する。
+
+    Args:
+        extracted_graph: Guardian Layer で正規化済みのグラフ
+        merge_keys: ラベル → MERGE キーの定義 (MERGE_KEYS)
+        missing_merge_key: MERGE 対象ラベルでキーが欠けている場合の扱い
+            - "create": 新規作成にフォールバック
+            - "skip": 登録をスキップ
+
+    Returns:
+        GraphWritePlan
+    """
+    warnings = []
+    nodes = []
+    groups: dict[tuple, NodeGroup] = {}
+    client_name = "Unknown"
+
+    for node in extracted_graph.get("nodes", []):
+        if node.get("label") == "Client":
+            client_name = node.get("properties", {}).get("name", "Unknown")
+            break
+
+    for node in extracted_graph.get("nodes", []):
+        temp_id = node.get("temp_id")
+        label = node.get("label")
+        props = node.get("properties", {})
+
+        if not temp_id or not label:
+            continue
+        if not _IDENTIFIER_PATTERN.match(label):
+            warnings.append(f"ラベルに使用できない文字を含むためスキップ: {label!r}")
+            continue
+
+        keys: tuple[str, ...] = ()
+        if label in merge_keys:
+            # 値が null のキーは MERGE に使えないため欠損として扱う
+            keys = tuple(k for k in merge_keys[label] if props.get(k) is not None)
+            if not keys:
+                if missing_merge_key == "skip":
+                    warnings.append(f"MERGEキーが不足しているためスキップ: {label} - {props}")
+                    continue
+
+        idx = len(nodes)
+        nodes.append({"idx": idx, "temp_id": temp_id, "label": label, "properties": props,
+                      "action": "MERGE/UPDATE" if keys else "CREATE"})
+
+        group = groups.setdefault((label, keys), NodeGroup(label=label, merge_keys=keys))
+        row = {"idx": idx, "props": props}
+        if keys:
+            row["match"] = {k: props[k] for k in keys}
+        group.rows.append(row)
+
+    relationships = []
+    for rel in extracted_graph.get("relationships", []):
+        rel_type = rel.get("type")
+        if not rel_type:
+            continue
+        if not _IDENTIFIER_PATTERN.match(rel_type):
+            warnings.append(f"リレーションタイプに使用できない文字を含むためスキップ: {rel_type!r}")
+            continue
+        relationships.append(rel)
+
+    return GraphWritePlan(
+        nodes=nodes,
+        node_groups=list(groups.values()),
+        relationships=relationships,
+        client_name=client_name,
+        warnings=warnings,
+    )
+
+
+def merge_graphs(
+    graphs: list[tuple[int, dict]],
+    merge_keys: dict[str, list[str]],
+) -> tuple[dict, list[dict]]:
+    """
+    複数のグラフを 1 つのグラフに統合する（register_many 用）。
+
+    - temp_id はグラフ番号で名前空間を分ける ("{index}:{temp_id}")
+    - MERGE キーが同じノード（各グラフに登場する同一 Client / Supporter 等）は 1 ノードに集約し、
+      プロパティは逐次登録時の SET n += props と同じく後勝ちで統合する
+
+    Args:
+        graphs: (グラフ番号, 正規化済みグラフ) のリスト
+
+    Returns:
+        (統合グラフ, occurrences)
+        occurrences は元グラフの各ノードについて
+        {"graph": 番号, "temp_id": 統合後の temp_id, "label", "properties"} を保持する。
+    """
+    nodes: list[dict] = []
+    relationships: list[dict] = []
+    occurrences: list[dict] = []
+    representative: dict[tuple, dict] = {}
+
+    for index, graph in graphs:
+        alias: dict[str, str] = {}
+        for node in graph.get("nodes", []):
+            temp_id = node.get("temp_id")
+            label = node.get("label")
+            props = node.get("properties", {})
+            if not temp_id or not label:
+                continue
+
+            merged_temp_id = f"{index}:{temp_id}"
+            keys = tuple(k for k in merge_keys.get(label, []) if props.get(k) is not None)
+            dedupe_key = (label, tuple((k, props[k]) for k in keys)) if keys else None
+
+            if dedupe_key is not None and dedupe_key in representative:
+                rep = representative[dedupe_key]
+                rep["properties"].update(props)
+                merged_temp_id = rep["temp_id"]
+            else:
+                merged = {**node, "temp_id": merged_temp_id, "properties": dict(props)}
+                nodes.append(merged)
+                if dedupe_key is not None:
+                    representative[dedupe_key] = merged
+
+            alias[temp_id] = merged_temp_id
+            occurrences.append({"graph": index, "temp_id": merged_temp_id,
+                                "label": label, "properties": props})
+
+        for rel in graph.get("relationships", []):
+            relationships.append({
+                **rel,
+                "source_temp_id": alias.get(rel.get("source_temp_id")),
+                "target_temp_id": alias.get(rel.get("target_temp_id")),
+            })
+
+    return {"nodes": nodes, "relationships": relationships}, occurrences
+
+
+# =============================================================================
+# Cypher 文の構築
+# =============================================================================
+
+def node_group_statement(group: NodeGroup) -> tuple[str, dict]:
+    """ノードグループ 1 つ分の UNWIND 文を構築"""
+    if group.is_merge:
+        match_clause = ", ".join(f"`{k}`: row.match.`{k}`" for k in group.merge_keys)
+        query = f"""
+            UNWIND $rows AS row
+            MERGE (n:`{group.label}` {{{match_clause}}})
+            SET n += row.props
+            RETURN row.idx AS idx, elementId(n) AS internal_id
+        """
+    else:
+        query = f"""
+            UNWIND $rows AS row
+            CREATE (n:`{group.label}`)
+            SET n = row.props
+            RETURN row.idx AS idx, elementId(n) AS internal_id
+        """
+    return query, {"rows": group.rows}
+
+
+def relationship_statements(
+    relationships: list[dict], temp_id_map: dict[str, str]
+) -> list[tuple[str, dict]]:
+    """temp_id を elementId に解決し、リレーションタイプごとの UNWIND 文を構築"""
+    by_type: dict[str, list[dict]] = {}
+    for rel in relationships:
+        source_id = temp_id_map.get(rel.get("source_temp_id"))
+        target_id = temp_id_map.get(rel.get("target_temp_id"))
+        if not source_id or not target_id:
+            continue
+        by_type.setdefault(rel["type"], []).append({
+            "source_id": source_id,
+            "target_id": target_id,
+            "props": rel.get("properties", {}),
+        })
+
+    statements = []
+    for rel_type, rows in by_type.items():
+        statements.append((f"""
+            UNWIND $rows AS row
+            MATCH (source) WHERE elementId(source) = row.source_id
+            MATCH (target) WHERE elementId(target) = row.target_id
+            MERGE (source)-[r:`{rel_type}`]->(target)
+            SET r += row.props
+        """, {"rows": rows}))
+    return statements
+
+
+# e.timestamp は lib/audit_sink.py でバッファリングしたエントリの記録時刻（なければ書き込み時刻）。
+# AUDIT_FOR は Client.name の一意制約インデックスで引く（クライアント名のないエントリは MATCH しない）
+AUDIT_LOG_BATCH_QUERY = """
+    UNWIND $entries AS e
+    CREATE (al:AuditLog {
+        timestamp: coalesce(e.timestamp, datetime()),
+        user: e.user,
+        action: e.action,
+        targetType: e.targetType,
+        targetName: e.targetName,
+        details: e.details,
+        clientName: e.clientName
+    })
+    WITH al, e
+    WHERE e.clientName <> ''
+    MATCH (c:Client {name: e.clientName})
+    CREATE (al)-[:AUDIT_FOR]->(c)
+"""
+
+
+# =============================================================================
+# 実行
+# =============================================================================
+
+@dataclass
+class GraphWriteResult:
+    temp_id_map: dict[str, str]
+    registered: list[dict]   # 登録できたノード (plan.nodes の要素、元の順序)
+    statements: int          # 実行した Cypher 文の数（= Bolt 往復回数）
+
+
+def execute_graph_write(
+    tx,
+    plan: GraphWritePlan,
+    audit_entry_builder: Optional[Callable[[dict], Optional[dict]]] = None,
+    after_write: Optional[Callable] = None,
+) -> GraphWriteResult:
+    """
+    書き込み計画を 1 つのトランザクション内で実行する。
+
+    Args:
+        tx: neo4j の ManagedTransaction（session.execute_write から渡されるもの）
+        plan: plan_graph_write() の戻り値
+        audit_entry_builder: 登録済みノード → 監査ログエントリ
+            ({user, action, targetType, targetName, details, clientName}) の変換関数。
+            None を返したノードは監査対象外。1 ノードに複数件を記録する場合はリストを返す。
+        after_write: after_write(tx, result) を同じトランザクションの最後に呼ぶ
+            （時系列チェーンへの差し込みなど、登録と一緒にコミットしたい処理）
+
+    Returns:
+        GraphWriteResult
+    """
+    statements = 0
+    internal_ids: dict[int, str] = {}
+
+    # 1. ノード（ラベル × MERGEキーごとに 1 文）
+    for group in plan.node_groups:
+        query, params = node_group_statement(group)
+        for record in tx.run(query, params):
+            internal_ids[record["idx"]] = record["internal_id"]
+        statements += 1
+
+    temp_id_map, registered = _resolve_temp_ids(plan, internal_ids)
+
+    # 2. リレーションシップ（タイプごとに 1 文）
+    for query, params in relationship_statements(plan.relationships, temp_id_map):
+        tx.run(query, params).consume()
+        statements += 1
+
+    # 3. 監査ログ（1 文）
+    entries = _collect_audit_entries(registered, audit_entry_builder)
+    if entries:
+        tx.run(AUDIT_LOG_BATCH_QUERY, {"entries": entries}).consume()
+        statements += 1
+
+    result = GraphWriteResult(temp_id_map=temp_id_map, registered=registered, statements=statements)
+    if after_write is not None:
+        after_write(tx, result)
+    return result
+
+
+async def execute_graph_write_async(
+    tx,
+    plan: GraphWritePlan,
+    audit_entry_builder: Optional[Callable[[dict], Optional[dict]]] = None,
+    after_write: Optional[Callable] = None,
+) -> GraphWriteResult:
+    """
+    execute_graph_write() の非同期版。
+
+    Args:
+        tx: neo4j の AsyncManagedTransaction（AsyncSession.execute_write から渡されるもの）
+        after_write: await after_write(tx, result) を同じトランザクションの最後に呼ぶ
+    """
+    statements = 0
+    internal_ids: dict[int, str] = {}
+
+    for group in plan.node_groups:
+        query, params = node_group_statement(group)
+        result = await tx.run(query, params)
+        async for record in result:
+            internal_ids[record["idx"]] = record["internal_id"]
+        statements += 1
+
+    temp_id_map, registered = _resolve_temp_ids(plan, internal_ids)
+
+    for query, params in relationship_statements(plan.relationships, temp_id_map):
+        result = await tx.run(query, params)
+        await result.consume()
+        statements += 1
+
+    entries = _collect_audit_entries(registered, audit_entry_builder)
+    if entries:
+        result = await tx.run(AUDIT_LOG_BATCH_QUERY, {"entries": entries})
+        await result.consume()
+        statements += 1
+
+    written = GraphWriteResult(temp_id_map=temp_id_map, registered=registered, statements=statements)
+    if after_write is not None:
+        await after_write(tx, written)
+    return written
+
+
+def _resolve_temp_ids(plan: GraphWritePlan, internal_ids: dict[int, str]) -> tuple[dict, list]:
+    """ノード文の戻り値 (idx → elementId) から temp_id_map と登録済みノードを組み立てる"""
+    temp_id_map = {}
+    registered = []
+    for node in plan.nodes:
+        internal_id = internal_ids.get(node["idx"])
+        if internal_id:
+            temp_id_map[node["temp_id"]] = internal_id
+            registered.append(node)
+    return temp_id_map, registered
+
+
+def _collect_audit_entries(registered: list[dict], audit_entry_builder) -> list[dict]:
+    if audit_entry_builder is None:
+        return []
+    entries = []
+    for node in registered:
+        entry = audit_entry_builder(node)
+        if isinstance(entry, list):
+            entries.extend(entry)
+        elif entry:
+            entries.append(entry)
+    return entries
+
+
+def write_graph(
+    run_in_transaction: Callable,
+    plan: GraphWritePlan,
+    audit_entry_builder: Optional[Callable[[dict], Optional[dict]]] = None,
+    after_write: Optional[Callable] = None,
+) -> GraphWriteResult:
+    """
+    書き込み計画を管理トランザクションで実行する。
+
+    Args:
+        run_in_transaction: work(tx) を受け取り書き込みトランザクション内で実行する関数
+            （db_operations.run_in_transaction など）
+        after_write: execute_graph_write() を参照
+    """
+    result = run_in_transaction(lambda tx: execute_graph_write(tx, plan, audit_entry_builder, after_write))
+    _log(f"バッチ登録: ノード {len(result.registered)} 件, Cypher {result.statements} 文 / 1 トランザクション")
+    return result
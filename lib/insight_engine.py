@@ -229,9 +229,11 @@ def detect_cascading_risk(
 # スタッフ負荷 (Staff SOS)
 # =============================================================================
 
+# 期間内のログ（SupportLog.date の RANGE インデックス）から辿る
 _STAFF_LOAD_QUERY = """
-MATCH (s:Supporter)-[:LOGGED]->(log:SupportLog)
+MATCH (log:SupportLog)
 WHERE log.date >= date() - duration({days: $days})
+MATCH (s:Supporter)-[:LOGGED]->(log)
 WITH s.name AS staffName,
      count(log) AS totalLogs,
      count(CASE WHEN log.emotion IN $negativeEmotions THEN 1 END) AS negativeLogs
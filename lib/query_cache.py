@@ -0,0 +1,209 @@
+"""
+クライアント単位の世代付きクエリ結果キャッシュ
+
+同じクライアントに対する読み取りクエリ（get_client_detail, resolve_client,
+直近の支援記録など）が短時間に何度も実行されるため、プロセス内で結果をキャッシュする。
+
+- キーは (クエリの指紋, パラメータ, クライアント, 世代)
+- 各クライアントは世代カウンターを持ち、書き込み（register_to_database など）のたびに
+  invalidate_client() で世代を進める。古い世代のエントリは二度と参照されず、LRU で追い出される
+- クライアントに紐づかないクエリ（resolve_client など）は全体の世代を使い、
+  どのクライアントへの書き込みでも無効化される
+- 読み込み中に書き込みがあった場合も、読み込み開始時の世代で格納されるため古い結果は返らない
+- 別プロセス（MCP サーバーと field-ui など）からの書き込みは検知できないため、TTL を安全弁とする
+
+安全性が重要な読み取り（SOS 通知など）は use_cache=False で常に DB から取得する。
+
+環境変数:
+  QUERY_CACHE_ENABLED      "false" で無効化（デフォルト: true）
+  QUERY_CACHE_MAX_ENTRIES  最大エントリ数（デフォルト: 1024）
+  QUERY_CACHE_TTL_SECONDS  エントリの有効期間・秒（デフォルト: 30、0 で無期限）
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+_GLOBAL = "*"
+
+
+def query_fingerprint(query: str) -> str:
+    """空白の違いを無視したクエリの指紋"""
+    return hashlib.sha1(" ".join(query.split()).encode("utf-8")).hexdigest()[:16]
+
+
+class QueryCache:
+    """有界 LRU のクエリ結果キャッシュ（スレッドセーフ）"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    # --- 世代管理 ---
+
+    def generation(self, client: Optional[str] = None) -> int:
+        with self._lock:
+            return self._generations.get(client or _GLOBAL, 0)
+
+    def invalidate_client(self, client: Optional[str] = None) -> None:
+        """クライアントの世代を進める（全体の世代も進める）"""
+        with self._lock:
+            if client:
+                self._generations[client] = self._generations.get(client, 0) + 1
+            self._generations[_GLOBAL] = self._generations.get(_GLOBAL, 0) + 1
+            self._invalidations += 1
+
+    # --- 取得 ---
+
+    def _key(self, query: str, params: Optional[dict], client: Optional[str]) -> tuple:
+        scope = client or _GLOBAL
+        params_key = json.dumps(params or {}, sort_keys=True, ensure_ascii=False, default=str)
+        return (query_fingerprint(query), params_key, scope, self._generations.get(scope, 0))
+
+    def _lookup(self, key: tuple) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            if not self.ttl_seconds or time.monotonic() - stored_at < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return True, value
+            del self._entries[key]
+        self._misses += 1
+        return False, None
+
+    def _store(self, key: tuple, value: Any) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def get_or_load(
+        self,
+        query: str,
+        params: Optional[dict],
+        loader: Callable[[], Any],
+        client: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> Any:
+        """
+        キャッシュにあれば返し、無ければ loader() の結果を格納して返す。
+
+        Args:
+            query / params: キャッシュキーに使うクエリとパラメータ
+            loader: キャッシュミス時に実行する関数
+            client: 結果が依存するクライアント名（None なら全体の世代）
+            use_cache: False なら常に loader() を実行し、結果も格納しない
+        """
+        if not (self.enabled and use_cache):
+            return loader()
+        with self._lock:
+            key = self._key(query, params, client)
+            hit, value = self._lookup(key)
+        if hit:
+            return copy.deepcopy(value)
+        value = loader()
+        with self._lock:
+            self._store(key, value)
+        return copy.deepcopy(value)
+
+    async def async_get_or_load(
+        self,
+        query: str,
+        params: Optional[dict],
+        loader: Callable[[], Awaitable[Any]],
+        client: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> Any:
+        """get_or_load の非同期版（loader はコルーチン関数）"""
+        if not (self.enabled and use_cache):
+            return await loader()
+        with self._lock:
+            key = self._key(query, params, client)
+            hit, value = self._lookup(key)
+        if hit:
+            return copy.deepcopy(value)
+        value = await loader()
+        with self._lock:
+            self._store(key, value)
+        return copy.deepcopy(value)
+
+    # --- 統計 ---
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# =============================================================================
+# プロセス共有のインスタンス
+# =============================================================================
+
+_cache = QueryCache(
+    max_entries=int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("QUERY_CACHE_TTL_SECONDS", "30")),
+    enabled=os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true",
+)
+
+
+def get_query_cache() -> QueryCache:
+    return _cache
+
+
+def cached_query(query, params, loader, client=None, use_cache=True):
+    """get_query_cache().get_or_load() のショートカット"""
+    return _cache.get_or_load(query, params, loader, client=client, use_cache=use_cache)
+
+
+async def async_cached_query(query, params, loader, client=None, use_cache=True):
+    """get_query_cache().async_get_or_load() のショートカット"""
+    return await _cache.async_get_or_load(query, params, loader, client=client, use_cache=use_cache)
+
+
+_invalidation_listeners: list[Callable[[Optional[str]], None]] = []
+
+
+def add_invalidation_listener(listener: Callable[[Optional[str]], None]) -> None:
+    """invalidate_client() の呼び出しを通知する関数を登録（クライアント識別子索引の差分更新など）"""
+    if listener not in _invalidation_listeners:
+        _invalidation_listeners.append(listener)
+
+
+def invalidate_client(client_name: Optional[str] = None) -> None:
+    """クライアントへの書き込み後に呼ぶ（None なら全体の世代のみ進める）"""
+    _cache.invalidate_client(client_name)
+    for listener in _invalidation_listeners:
+        listener(client_name)
+
+
+def get_cache_stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,331 @@
+"""
+起動時のスキーマ準備（インデックス・制約）
+
+登録処理の MERGE（MERGE_KEYS）・Skill のクエリテンプレートの起点検索・
+ベクトル検索がラベルスキャンにならないよう、必要なインデックスと制約を導出して冪等に作成する。
+
+- MERGE_KEYS の各ラベル → RANGE インデックス（複数キーなら複合インデックス）。
+  一意性制約は UNIQUE_MERGE_KEYS（scripts/migrate_schema_v2.py と同じく Client.name のみ）に限る。
+  NgAction.action・KeyPerson.name・Certificate.type などはクライアントごとの値で、別のクライアントが
+  同じ値を持ち、Skill のテンプレートもクライアントごとに CREATE するため、制約を付けると登録が失敗する。
+  ほかのラベルの制約は scripts/bootstrap_schema.py --unique で明示したときだけ作る（起動時には作らない）。
+  既存データに重複がある場合は制約を作らず RANGE インデックスで代替し、警告として報告する
+  （重複の解消は scripts/migrate_schema_v2.py などで別途行う）。既存のインデックスは削除しない
+- claude-skills 配下のテンプレート（*.cypher / *.md / *.py、livelihood-support を除く）の MATCH・MERGE の起点
+  (x:Label {prop: ...}) → RANGE インデックス（制約で既に引けるものは除く）
+- DATE_RANGE_INDEXES（直近 7 日・30 日などの期間検索の対象）→ RANGE インデックス
+- lib/embedding.py の VECTOR_INDEXES → ベクトルインデックス（ensure_vector_indexes で作成。
+  移行中の Embedding の世代の分も含む。lib/embedding_generations.py）
+
+作成後は db.awaitIndexes で ONLINE になるまで待ち、ONLINE でないもの・
+インデックスで引けない MERGE のパスを報告する。
+アプリの起動時（bootstrap_schema_on_startup）は作成だけして待たない（インデックスの構築はサーバー側で続き、
+その間の検索はラベルスキャンになるだけ）。ONLINE まで待つのは scripts/bootstrap_schema.py。
+
+環境変数:
+  SCHEMA_BOOTSTRAP_ENABLED       "false" で起動時の実行を無効化（デフォルト: true）
+  SCHEMA_BOOTSTRAP_WAIT_SECONDS  scripts/bootstrap_schema.py の ONLINE 待ちの上限・秒（デフォルト: 300）
+"""
+
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+_SKILLS_DIR = Path(__file__).resolve().parent.parent / "claude-skills"
+_TEMPLATE_SUFFIXES = (".cypher", ".md", ".py")
+# 別の Neo4j インスタンス（livelihood-support-db）を対象とする Skill
+_OTHER_DATABASE_SKILLS = {"livelihood-support"}
+
+# 一意性制約を付ける MERGE キー（ほかの MERGE キーは RANGE インデックス）
+UNIQUE_MERGE_KEYS = {"Client": ("name",)}
+
+# 日付の範囲検索（log.date >= date() - duration(...)）をインデックスシークにする
+DATE_RANGE_INDEXES = [("SupportLog", "date"), ("MeetingRecord", "date")]
+
+# MATCH / MERGE の直後のノードパターンで、プロパティ指定のあるもの
+_ANCHOR_PATTERN = re.compile(r"\b(?:MATCH|MERGE)\s+(?:\w+\s*=\s*)?\(\w*:(\w+)\s*\{\s*(\w+)\s*:")
+
+
+def _log(message: str, level: str = "INFO"):
+    sys.stderr.write(f"[SchemaBootstrap:{level}] {message}\n")
+    sys.stderr.flush()
+
+
+@dataclass(frozen=True)
+class SchemaRequirement:
+    """必要なインデックス・制約 1 件"""
+    kind: str                    # "unique" / "range" / "vector"
+    label: str
+    properties: tuple[str, ...]
+    source: str                  # 導出元（"MERGE_KEYS" / テンプレートのパス / "VECTOR_INDEXES"）
+    name: str = ""
+
+    @property
+    def schema_name(self) -> str:
+        if self.name:
+            return self.name
+        suffix = "_".join(p.lower() for p in self.properties)
+        if self.kind == "unique":
+            return f"constraint_{self.label.lower()}_{suffix}_unique"
+        return f"idx_{self.label.lower()}_{suffix}"
+
+
+@dataclass
+class SchemaReport:
+    created: list[str] = field(default_factory=list)
+    existing: list[str] = field(default_factory=list)
+    fallbacks: list[str] = field(default_factory=list)   # 一意性制約の代わりに RANGE インデックスを作成
+    errors: list[dict] = field(default_factory=list)
+    not_online: list[dict] = field(default_factory=list)
+    unbacked: list[str] = field(default_factory=list)    # インデックスで引けない MERGE / テンプレートの起点
+
+    def as_dict(self) -> dict:
+        return {
+            "created": self.created, "existing": self.existing, "fallbacks": self.fallbacks,
+            "errors": self.errors, "not_online": self.not_online, "unbacked": self.unbacked,
+        }
+
+
+# =============================================================================
+# 導出
+# =============================================================================
+
+def merge_key_requirements(
+    merge_keys: dict[str, list[str]], unique_labels: Iterable[str] = (),
+) -> list[SchemaRequirement]:
+    """UNIQUE_MERGE_KEYS と unique_labels のラベルは一意性制約、それ以外は RANGE インデックス"""
+    unique_labels = set(unique_labels)
+    return [
+        SchemaRequirement(
+            "unique" if label in unique_labels or UNIQUE_MERGE_KEYS.get(label) == tuple(keys) else "range",
+            label, tuple(keys), "MERGE_KEYS",
+        )
+        for label, keys in merge_keys.items() if keys
+    ]
+
+
+def template_anchors(paths: Iterable[Path]) -> dict[tuple[str, str], str]:
+    """テンプレートから (ラベル, プロパティ) → 最初に見つかったファイル を抽出"""
+    anchors: dict[tuple[str, str], str] = {}
+    for path in paths:
+        try:
+            text = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            continue
+        for label, prop in _ANCHOR_PATTERN.findall(text):
+            anchors.setdefault((label, prop), str(path))
+    return anchors
+
+
+def template_paths(skills_dir: Path = _SKILLS_DIR) -> list[Path]:
+    if not skills_dir.is_dir():
+        return []
+    return sorted(
+        p for p in skills_dir.rglob("*")
+        if p.is_file() and p.suffix in _TEMPLATE_SUFFIXES and "__pycache__" not in p.parts
+        and p.relative_to(skills_dir).parts[0] not in _OTHER_DATABASE_SKILLS
+    )
+
+
+def vector_requirements(vector_indexes: dict[str, dict]) -> list[SchemaRequirement]:
+    return [
+        SchemaRequirement("vector", config["label"], (config["property"],), "VECTOR_INDEXES", name=name)
+        for name, config in vector_indexes.items()
+    ]
+
+
+def derive_requirements(
+    merge_keys: dict[str, list[str]],
+    vector_indexes: Optional[dict[str, dict]] = None,
+    templates: Optional[Iterable[Path]] = None,
+    range_indexes: Iterable[tuple[str, str]] = DATE_RANGE_INDEXES,
+    unique_labels: Iterable[str] = (),
+) -> list[SchemaRequirement]:
+    """
+    MERGE_KEYS・テンプレート・日付の範囲検索・ベクトルインデックス定義から必要なスキーマを導出する。
+    テンプレートの起点のうち、MERGE キーの先頭キーで引けるものは RANGE インデックスを作らない。
+    unique_labels は UNIQUE_MERGE_KEYS に加えて一意性制約にするラベル（CLI で明示したときだけ）。
+    """
+    requirements = merge_key_requirements(merge_keys, unique_labels)
+    requirements.extend(
+        SchemaRequirement("range", label, (prop,), "DATE_RANGE_INDEXES") for label, prop in range_indexes
+    )
+    covered = {(r.label, r.properties[0]) for r in requirements}
+    for (label, prop), source in sorted(template_anchors(templates if templates is not None else template_paths()).items()):
+        if (label, prop) not in covered:
+            requirements.append(SchemaRequirement("range", label, (prop,), source))
+            covered.add((label, prop))
+    requirements.extend(vector_requirements(vector_indexes or {}))
+    return requirements
+
+
+# =============================================================================
+# 適用
+# =============================================================================
+
+def _index_backs(index: dict, label: str, properties: tuple[str, ...]) -> bool:
+    """インデックスが (label, properties) の等価検索に使えるか（先頭プロパティが含まれていれば可）"""
+    if label not in (index.get("labelsOrTypes") or []):
+        return False
+    index_props = index.get("properties") or []
+    return bool(index_props) and index_props[0] in properties and set(index_props) <= set(properties)
+
+
+def _find_index(indexes: list[dict], requirement: SchemaRequirement) -> Optional[dict]:
+    kinds = {"vector": {"VECTOR"}}.get(requirement.kind, {"RANGE"})
+    for index in indexes:
+        if index.get("type") in kinds and _index_backs(index, requirement.label, requirement.properties):
+            if requirement.kind == "unique" and not index.get("owningConstraint"):
+                continue
+            return index
+    return None
+
+
+def _property_list(properties: tuple[str, ...]) -> str:
+    props = ", ".join(f"n.`{p}`" for p in properties)
+    return f"({props})" if len(properties) > 1 else props
+
+
+def _duplicate_count(run_query: Callable, requirement: SchemaRequirement) -> int:
+    keys = ", ".join(f"n.`{p}` AS `{p}`" for p in requirement.properties)
+    rows = run_query(
+        f"MATCH (n:`{requirement.label}`) WITH {keys}, count(*) AS c WHERE c > 1 RETURN count(*) AS duplicates"
+    )
+    return rows[0]["duplicates"] if rows else 0
+
+
+def _create_unique(run_query: Callable, requirement: SchemaRequirement, indexes: list[dict], report: SchemaReport):
+    # 既存データに重複があると制約を作れない。MERGE の検索だけでもインデックスで引けるようにする
+    duplicates = _duplicate_count(run_query, requirement)
+    if duplicates:
+        _log(f"{requirement.label}({', '.join(requirement.properties)}) に重複が {duplicates} 組あるため"
+             f" 一意性制約の代わりに RANGE インデックスを使用", "WARN")
+        fallback = SchemaRequirement("range", requirement.label, requirement.properties, requirement.source)
+        if not _find_index(indexes, fallback):
+            _create_range(run_query, fallback, report)
+        report.fallbacks.append(requirement.schema_name)
+        return
+
+    # 同じプロパティの RANGE インデックスがあると制約を作れない。既存のインデックスは削除せずに使い、
+    # 制約への置き換えは scripts/migrate_schema_v2.py に任せる
+    for index in indexes:
+        if (index.get("type") == "RANGE" and not index.get("owningConstraint")
+                and index.get("labelsOrTypes") == [requirement.label]
+                and tuple(index.get("properties") or ()) == requirement.properties):
+            _log(f"{requirement.label}({', '.join(requirement.properties)}) には既存のインデックス"
+                 f" {index['name']} があるため一意性制約は作りません", "WARN")
+            report.fallbacks.append(requirement.schema_name)
+            return
+    try:
+        run_query(
+            f"CREATE CONSTRAINT `{requirement.schema_name}` IF NOT EXISTS "
+            f"FOR (n:`{requirement.label}`) REQUIRE {_property_list(requirement.properties)} IS UNIQUE"
+        )
+        report.created.append(requirement.schema_name)
+    except Exception as e:
+        report.errors.append({"schema": requirement.schema_name, "error": str(e)})
+        _log(f"一意性制約の作成エラー: {requirement.schema_name} - {e}", "ERROR")
+        _create_range(run_query, SchemaRequirement("range", requirement.label, requirement.properties,
+                                                   requirement.source), report)
+
+
+def _create_range(run_query: Callable, requirement: SchemaRequirement, report: SchemaReport):
+    try:
+        run_query(
+            f"CREATE INDEX `{requirement.schema_name}` IF NOT EXISTS "
+            f"FOR (n:`{requirement.label}`) ON {_property_list(requirement.properties)}"
+        )
+        report.created.append(requirement.schema_name)
+    except Exception as e:
+        report.errors.append({"schema": requirement.schema_name, "error": str(e)})
+        _log(f"インデックス作成エラー: {requirement.schema_name} - {e}", "ERROR")
+
+
+def bootstrap_schema(
+    run_query: Optional[Callable] = None,
+    requirements: Optional[list[SchemaRequirement]] = None,
+    wait_seconds: Optional[float] = None,
+) -> SchemaReport:
+    """
+    必要なインデックス・制約を作成し、ONLINE になるまで待つ（冪等操作）。
+
+    Args:
+        run_query: クエリ実行関数（省略時は db_new_operations.run_query）
+        requirements: 省略時は MERGE_KEYS・テンプレート・VECTOR_INDEXES から導出
+            （一意性制約は UNIQUE_MERGE_KEYS のみ）
+        wait_seconds: ONLINE 待ちの上限（0 なら待たない）
+
+    Returns:
+        SchemaReport
+    """
+    if run_query is None:
+        from lib.db_new_operations import run_query
+    if requirements is None:
+        from lib.db_new_operations import MERGE_KEYS
+        from lib.embedding_generations import vector_index_definitions
+        requirements = derive_requirements(MERGE_KEYS, vector_index_definitions())
+    if wait_seconds is None:
+        wait_seconds = float(os.getenv("SCHEMA_BOOTSTRAP_WAIT_SECONDS", "300"))
+
+    report = SchemaReport()
+    indexes = run_query("SHOW INDEXES YIELD name, type, labelsOrTypes, properties, state, owningConstraint")
+
+    missing_vectors = False
+    for requirement in requirements:
+        if _find_index(indexes, requirement):
+            report.existing.append(requirement.schema_name)
+        elif requirement.kind == "unique":
+            _create_unique(run_query, requirement, indexes, report)
+        elif requirement.kind == "range":
+            _create_range(run_query, requirement, report)
+        else:
+            missing_vectors = True
+
+    if missing_vectors:
+        from lib.embedding import ensure_vector_indexes
+        vector_result = ensure_vector_indexes()
+        report.created.extend(vector_result["created"])
+        report.errors.extend(vector_result["errors"])
+
+    if wait_seconds and report.created:
+        try:
+            run_query("CALL db.awaitIndexes($seconds)", {"seconds": int(wait_seconds)})
+        except Exception as e:
+            _log(f"インデックスの ONLINE 待ちがタイムアウト: {e}", "WARN")
+
+    indexes = run_query("SHOW INDEXES YIELD name, type, labelsOrTypes, properties, state, owningConstraint")
+    for requirement in requirements:
+        index = _find_index(indexes, requirement) or (
+            _find_index(indexes, SchemaRequirement("range", requirement.label, requirement.properties, ""))
+            if requirement.kind == "unique" else None
+        )
+        path = f"{requirement.label}({', '.join(requirement.properties)}) ← {requirement.source}"
+        if index is None:
+            report.unbacked.append(path)
+        elif index.get("state") != "ONLINE":
+            report.not_online.append({"schema": index.get("name"), "state": index.get("state")})
+
+    _log(f"スキーマ準備: 作成 {len(report.created)} / 既存 {len(report.existing)} / 代替 {len(report.fallbacks)}"
+         f" / 未ONLINE {len(report.not_online)} / インデックスなし {len(report.unbacked)}",
+         "WARN" if report.unbacked or report.not_online or report.errors else "INFO")
+    for path in report.unbacked:
+        _log(f"インデックスで引けない検索: {path}", "WARN")
+    return report
+
+
+def bootstrap_schema_on_startup() -> Optional[SchemaReport]:
+    """
+    アプリ起動時に呼ぶ（ベストエフォート。SCHEMA_BOOTSTRAP_ENABLED=false で無効）
+
+    起動を止めないよう、作成したインデックスが ONLINE になるのを待たない（未ONLINE として報告する）。
+    """
+    if os.getenv("SCHEMA_BOOTSTRAP_ENABLED", "true").lower() != "true":
+        return None
+    try:
+        return bootstrap_schema(wait_seconds=0)
+    except Exception as e:
+        _log(f"スキーマ準備をスキップ: {e}", "WARN")
+        return None
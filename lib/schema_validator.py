@@ -8,6 +8,9 @@ LLM が生成した構造化データの品質を担保する「守護神」レ
 
 import re
 import sys
+from datetime import date, datetime
+
+from lib.utils import safe_date_parse
 
 
 def _log(message: str, level: str = "INFO"):
@@ -168,6 +171,68 @@ def normalize_properties(props: dict, label: str | None = None) -> dict:
     return normalized
 
 
+# =============================================================================
+# 日付の正規化
+# =============================================================================
+
+# 日付として保存するプロパティ（名前が "Date" で終わるものも対象）
+DATE_PROPERTIES = frozenset({"date", "dob"})
+
+# 日時（datetime）として扱うため日付に変換しないプロパティ
+_DATETIME_PROPERTIES = frozenset({"timestamp", "createdAt", "updatedAt"})
+
+
+def is_date_property(prop_name: str) -> bool:
+    return prop_name in DATE_PROPERTIES or (prop_name.endswith("Date") and prop_name not in _DATETIME_PROPERTIES)
+
+
+def coerce_date_value(value):
+    """
+    日付らしい値を date に変換する（西暦・和暦・ISO 日時文字列）。
+
+    Returns:
+        (変換後の値, 変換できたか)。変換できない値はそのまま返す
+    """
+    if value is None or (isinstance(value, date) and not isinstance(value, datetime)):
+        return value, True
+    if isinstance(value, datetime):
+        return value.date(), True
+    if not isinstance(value, str) or not value.strip():
+        return value, False
+    parsed = safe_date_parse(value)
+    if parsed is None:
+        try:
+            parsed = datetime.fromisoformat(value.strip()).date()
+        except ValueError:
+            return value, False
+    return parsed, True
+
+
+def normalize_dates(props: dict, label: str | None = None) -> tuple[dict, list[str]]:
+    """
+    日付プロパティの値を date に変換する（Neo4j には Date 型として保存され、
+    log.date >= date() - duration(...) の範囲検索が RANGE インデックスで引ける）。
+
+    Returns:
+        (変換後のプロパティ, 変換できなかった値の警告)
+    """
+    warnings = []
+    converted = dict(props)
+    for key, value in props.items():
+        if not is_date_property(key):
+            continue
+        if isinstance(value, str) and not value.strip():
+            # 空文字列は保存しない（文字列と Date の混在を防ぐ）
+            del converted[key]
+            continue
+        new_value, ok = coerce_date_value(value)
+        if ok:
+            converted[key] = new_value
+        else:
+            warnings.append(f"[{label or '?'}] 日付として解釈できない値: {key}={value!r}")
+    return converted, warnings
+
+
 # =============================================================================
 # バリデーション関数
 # =============================================================================
@@ -230,6 +295,7 @@ def validate_and_normalize_graph(extracted_graph: dict) -> tuple[dict, list[str]
     - プロパティ名の camelCase 変換
     - リレーションタイプの検証 (廃止名の自動修正含む)
     - 列挙値の検証
+    - 日付プロパティの date 型への変換（和暦を含む）
 
     Returns:
         (normalized_graph, warnings)
@@ -252,8 +318,9 @@ def validate_and_normalize_graph(extracted_graph: dict) -> tuple[dict, list[str]
         if not is_valid:
             warnings.append(msg)
 
-        # プロパティ名の camelCase 正規化
-        normalized_props = normalize_properties(props, label)
+        # プロパティ名の camelCase 正規化・日付の型変換
+        normalized_props, date_warnings = normalize_dates(normalize_properties(props, label), label)
+        warnings.extend(date_warnings)
 
         # 列挙値の検証
         for prop_name, value in normalized_props.items():
@@ -278,7 +345,10 @@ def validate_and_normalize_graph(extracted_graph: dict) -> tuple[dict, list[str]
 
         # リレーションプロパティの camelCase 正規化
         rel_props = rel.get("properties", {})
-        normalized_props = normalize_properties(rel_props, f"rel:{corrected}")
+        normalized_props, date_warnings = normalize_dates(
+            normalize_properties(rel_props, f"rel:{corrected}"), f"rel:{corrected}"
+        )
+        warnings.extend(date_warnings)
 
         normalized["relationships"].append({
             **rel,
@@ -0,0 +1,125 @@
+"""
+ベクトルの類似度計算（NumPy）
+
+lib.embedding.cosine_similarity は Python の sum(x * y ...) で 1 ペアずつ計算していた。
+scripts/check_weight_consistency.py はこれを全ペアに対して呼ぶため、n 件で n²/2 × 768 回の
+インタプリタ上の演算になり、NgAction が数千件あると数分かかっていた。
+
+- ベクトルは連続した float32 の行列（件数 × 次元）に読み込み、行ごとに一度だけ L2 正規化する。
+  コサイン類似度は正規化した行どうしの内積になる
+- 全ペアの比較は block_size 行ずつの行列積で行い、ブロックごとに閾値以上のペア・上位 k 件だけを取り出す。
+  同時に持つ類似度はブロック 1 つ分（block_size² 要素、1024 なら 4MB）で、n × n の行列は作らない
+"""
+
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """行ごとに L2 正規化する（その場で書き換える。ノルム 0 の行は 0 のまま）"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def to_matrix(vectors: Iterable, dimensions: Optional[int] = None) -> np.ndarray:
+    """
+    ベクトルの列を正規化済みの連続した float32 行列にする
+
+    要素は list・array("f")・np.ndarray のいずれでもよい。空なら (0, dimensions) の行列を返す。
+
+    Raises:
+        ValueError: 次元の異なるベクトルが混ざっている
+    """
+    rows = [np.asarray(v, dtype=np.float32) for v in vectors]
+    if not rows:
+        return np.zeros((0, dimensions or 0), dtype=np.float32)
+    if len({row.shape for row in rows}) > 1:
+        raise ValueError(f"ベクトル次元が不一致: {sorted({row.shape[0] for row in rows})}")
+    return normalize_rows(np.vstack(rows))
+
+
+def cosine_similarity(a, b) -> float:
+    """2 つのベクトルのコサイン類似度（どちらかのノルムが 0 なら 0.0）"""
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    if a.shape != b.shape:
+        raise ValueError(f"ベクトル次元が不一致: {len(a)} vs {len(b)}")
+    norm = float(np.linalg.norm(a)) * float(np.linalg.norm(b))
+    if norm == 0:
+        return 0.0
+    return float(np.dot(a, b)) / norm
+
+
+def pairs_above(
+    matrix: np.ndarray, threshold: float, block_size: int = DEFAULT_BLOCK_SIZE,
+) -> Iterator[tuple[int, int, float]]:
+    """
+    正規化済みの行列の行のペア (i, j)（i < j）のうち、類似度が threshold 以上のものを返す
+
+    行のブロックと列のブロックの積を上三角の分だけ計算する（対角のブロックは i < j の要素だけを見る）。
+    """
+    n = len(matrix)
+    for row_start in range(0, n, block_size):
+        rows = matrix[row_start:row_start + block_size]
+        for col_start in range(row_start, n, block_size):
+            sims = rows @ matrix[col_start:col_start + block_size].T
+            hits = sims >= threshold
+            if col_start == row_start:
+                hits = np.triu(hits, k=1)
+            for i, j in zip(*np.nonzero(hits)):
+                yield row_start + int(i), col_start + int(j), float(sims[i, j])
+
+
+def top_k(
+    queries: np.ndarray,
+    matrix: np.ndarray,
+    k: int,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    exclude_self: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    正規化済みのクエリ行列の各行について、matrix の中で類似度の高い上位 k 行を返す
+
+    クエリ・matrix とも block_size 行ずつに分け、ブロックごとの上位 k 件とそれまでの上位 k 件を併合する。
+    exclude_self=True なら queries と matrix が同じ行列とみなし、自分自身（同じ行番号）を除く。
+
+    Returns:
+        (インデックス, 類似度)。どちらも (クエリ数, min(k, 候補数)) で、類似度の降順
+    """
+    n = len(matrix)
+    k = min(k, n - 1 if exclude_self else n)
+    q = len(queries)
+    indices = np.zeros((q, max(k, 0)), dtype=np.int64)
+    scores = np.zeros((q, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, scores
+    for q_start in range(0, q, block_size):
+        block = slice(q_start, q_start + block_size)
+        indices[block], scores[block] = _top_k_block(queries[block], q_start, matrix, k, block_size, exclude_self)
+    return indices, scores
+
+
+def _top_k_block(queries, q_start, matrix, k, block_size, exclude_self):
+    own = np.arange(q_start, q_start + len(queries))
+    best_idx = np.empty((len(queries), 0), dtype=np.int64)
+    best_sim = np.empty((len(queries), 0), dtype=np.float32)
+    for col_start in range(0, len(matrix), block_size):
+        sims = queries @ matrix[col_start:col_start + block_size].T
+        if exclude_self:
+            in_block = (own >= col_start) & (own < col_start + sims.shape[1])
+            sims[np.nonzero(in_block)[0], own[in_block] - col_start] = -np.inf
+        idx = np.broadcast_to(np.arange(col_start, col_start + sims.shape[1]), sims.shape)
+        cand_sim = np.concatenate([best_sim, sims], axis=1)
+        cand_idx = np.concatenate([best_idx, idx], axis=1)
+        if cand_sim.shape[1] > k:
+            keep = np.argpartition(-cand_sim, k - 1, axis=1)[:, :k]
+            cand_sim = np.take_along_axis(cand_sim, keep, axis=1)
+            cand_idx = np.take_along_axis(cand_idx, keep, axis=1)
+        best_sim, best_idx = cand_sim, cand_idx
+
+    order = np.argsort(-best_sim, axis=1, kind="stable")
+    return np.take_along_axis(best_idx, order, axis=1), np.take_along_axis(best_sim, order, axis=1)
@@ -0,0 +1,219 @@
+"""
+SupportLog の時系列チェーン（FOLLOWS リレーション）の維持
+
+クライアントごとの SupportLog を日付順に (newer)-[:FOLLOWS]->(older) で連結する。
+並び順は (date, elementId) で、同じ日付のログは elementId の順で決定的に並べる。
+date を持たないログはチェーンに含めない。
+
+- 登録時は新しいログだけを、登録と同じトランザクションで既存チェーンに挿入（splice）する。
+  直前のログは SupportLog.date のインデックスで日付の範囲（CHAIN_SPLICE_WINDOW_DAYS 日前まで）を引いて探し、
+  直後のログはチェーン上の直前のログの後続をたどる。その間に差し込むため、過去日付での登録（遡り入力）にも対応する。
+  範囲内に直前のログがないとき（間隔が空いた・最古のログより前の遡り入力）だけクライアントのログを展開する。
+  後続をたどるため、既存チェーンが整合していることが前提（崩れたチェーンは scripts/repair_support_log_chains.py で修復）。
+  以前はクライアントの全ログ同士を突き合わせて再構築しており、ログ数 n に対して O(n²) だった
+- 1 回の登録で大量のログが入った場合は、クライアント単位の再構築（ソートして隣同士を連結、
+  O(n log n)）のほうが速いので切り替える
+- 全クライアントの修復は CALL {} IN TRANSACTIONS でクライアント単位にコミットする
+  （自動コミットトランザクションが必要。run_query が自動で切り替える）
+"""
+
+from typing import Iterable
+
+# これより多くのログを一度に挿入する場合はクライアント単位で再構築する
+CHAIN_SPLICE_LIMIT = 50
+
+# 直前のログを日付のインデックスで探す範囲（日）。範囲内になければクライアントのログを展開する
+CHAIN_SPLICE_WINDOW_DAYS = 90
+
+# 新しいログ 1 件を既存チェーンに差し込む。
+# 1. 対象ログの既存 FOLLOWS を外す（再実行・抽出時に付いた誤ったリンクの修正）。
+#    チェーンの途中にあったログなら前後をつなぎ直す（$pending との間の抽出時のリンクはつながない）
+# 2. (date, elementId) で直前 prev を探す。まず日付の範囲（SupportLog.date のインデックスシーク）、
+#    範囲内になければクライアントのログを展開する
+# 3. 直後 next はチェーン上の prev の後続（prev がなければクライアントの最古のログ）
+# 4. next から出る FOLLOWS と prev に入る FOLLOWS（= next→prev の旧リンク）を外し、
+#    next→log→prev を張る
+# $pending（このあと差し込む残りのログ）はまだチェーンにないため前後の候補から除く。
+# 1 件差し込むごとに、チェーンは差し込み済みのログの日付順に整合する
+SPLICE_LOG_QUERY = """
+MATCH (log:SupportLog)-[:ABOUT]->(c:Client)
+WHERE elementId(log) = $id AND log.date IS NOT NULL
+CALL {
+    WITH log
+    OPTIONAL MATCH (newer:SupportLog)-[:FOLLOWS]->(log)-[:FOLLOWS]->(older:SupportLog)
+    WHERE NOT elementId(newer) IN $pending AND NOT elementId(older) IN $pending
+    FOREACH (_ IN CASE WHEN newer IS NULL THEN [] ELSE [1] END | MERGE (newer)-[:FOLLOWS]->(older))
+}
+OPTIONAL MATCH (log)-[old:FOLLOWS]-(:SupportLog)
+DELETE old
+WITH DISTINCT log, c
+CALL {
+    WITH log, c
+    OPTIONAL MATCH (p:SupportLog)
+    WHERE p.date >= log.date - duration({days: $window_days}) AND p.date <= log.date
+      AND p <> log AND (p.date < log.date OR elementId(p) < elementId(log))
+      AND NOT elementId(p) IN $pending AND (p)-[:ABOUT]->(c)
+    WITH p ORDER BY p.date DESC, elementId(p) DESC
+    LIMIT 1
+    RETURN p AS near
+}
+CALL {
+    WITH log, c, near
+    WITH log, c, near WHERE near IS NULL
+    MATCH (c)<-[:ABOUT]-(p:SupportLog)
+    WHERE p <> log AND p.date IS NOT NULL AND NOT elementId(p) IN $pending
+      AND (p.date < log.date OR (p.date = log.date AND elementId(p) < elementId(log)))
+    WITH p ORDER BY p.date DESC, elementId(p) DESC
+    LIMIT 1
+    RETURN collect(p) AS far
+}
+WITH log, c, coalesce(near, far[0]) AS prev
+CALL {
+    WITH log, prev
+    OPTIONAL MATCH (n:SupportLog)-[:FOLLOWS]->(prev)
+    WHERE n <> log AND NOT elementId(n) IN $pending
+    WITH n ORDER BY n.date ASC, elementId(n) ASC
+    LIMIT 1
+    RETURN n AS successor
+}
+CALL {
+    WITH log, c, prev
+    WITH log, c, prev WHERE prev IS NULL
+    MATCH (c)<-[:ABOUT]-(n:SupportLog)
+    WHERE n <> log AND n.date IS NOT NULL AND NOT elementId(n) IN $pending
+    WITH n ORDER BY n.date ASC, elementId(n) ASC
+    LIMIT 1
+    RETURN collect(n) AS oldest
+}
+WITH log, prev, coalesce(successor, oldest[0]) AS next
+OPTIONAL MATCH (next)-[staleOut:FOLLOWS]->(:SupportLog)
+OPTIONAL MATCH (:SupportLog)-[staleIn:FOLLOWS]->(prev)
+DELETE staleOut, staleIn
+WITH DISTINCT log, prev, next
+FOREACH (_ IN CASE WHEN prev IS NULL THEN [] ELSE [1] END | MERGE (log)-[:FOLLOWS]->(prev))
+FOREACH (_ IN CASE WHEN next IS NULL THEN [] ELSE [1] END | MERGE (next)-[:FOLLOWS]->(log))
+RETURN count(*) AS spliced
+"""
+
+# クライアント 1 名分のチェーンを作り直す（ソートして隣同士を連結）
+REBUILD_CLIENT_CHAIN_QUERY = """
+MATCH (c:Client {name: $name})
+CALL {
+    WITH c
+    OPTIONAL MATCH (c)<-[:ABOUT]-(:SupportLog)-[f:FOLLOWS]->(:SupportLog)
+    DELETE f
+}
+CALL {
+    WITH c
+    MATCH (c)<-[:ABOUT]-(log:SupportLog)
+    WHERE log.date IS NOT NULL
+    WITH log ORDER BY log.date ASC, elementId(log) ASC
+    WITH collect(log) AS logs
+    UNWIND range(1, size(logs) - 1) AS i
+    WITH logs[i] AS newer, logs[i - 1] AS older
+    MERGE (newer)-[:FOLLOWS]->(older)
+    RETURN count(*) AS linked
+}
+RETURN sum(linked) AS linked
+"""
+
+
+def repair_all_chains_query(clients_per_transaction: int = 20) -> str:
+    """全クライアントのチェーンを再構築するクエリ（自動コミットで実行する）"""
+    batch = int(clients_per_transaction)
+    if batch < 1:
+        raise ValueError("clients_per_transaction は 1 以上を指定してください")
+    return f"""
+MATCH (c:Client)
+WHERE EXISTS {{ (c)<-[:ABOUT]-(:SupportLog) }}
+CALL {{
+    WITH c
+    OPTIONAL MATCH (c)<-[:ABOUT]-(:SupportLog)-[f:FOLLOWS]->(:SupportLog)
+    DELETE f
+    WITH DISTINCT c
+    MATCH (c)<-[:ABOUT]-(log:SupportLog)
+    WHERE log.date IS NOT NULL
+    WITH log ORDER BY log.date ASC, elementId(log) ASC
+    WITH collect(log) AS logs
+    UNWIND range(1, size(logs) - 1) AS i
+    WITH logs[i] AS newer, logs[i - 1] AS older
+    MERGE (newer)-[:FOLLOWS]->(older)
+}} IN TRANSACTIONS OF {batch} ROWS
+"""
+
+
+def support_log_ids(nodes: Iterable[dict], temp_id_map: dict) -> list[str]:
+    """登録したグラフのノードから、SupportLog の elementId を取り出す"""
+    return [
+        temp_id_map[node["temp_id"]] for node in nodes
+        if node.get("label") == "SupportLog" and node.get("temp_id") in temp_id_map
+    ]
+
+
+def support_log_ids_by_client(graph: dict, temp_id_map: dict) -> dict[str, list[str]]:
+    """登録したグラフの ABOUT リレーションから、クライアント名ごとの SupportLog の elementId を取り出す"""
+    labels = {n.get("temp_id"): n.get("label") for n in graph.get("nodes", [])}
+    names = {
+        n.get("temp_id"): (n.get("properties") or {}).get("name")
+        for n in graph.get("nodes", []) if n.get("label") == "Client"
+    }
+    by_client: dict[str, list[str]] = {}
+    for rel in graph.get("relationships", []):
+        source, target = rel.get("source_temp_id"), rel.get("target_temp_id")
+        if (rel.get("type") == "ABOUT" and labels.get(source) == "SupportLog"
+                and names.get(target) and source in temp_id_map):
+            by_client.setdefault(names[target], []).append(temp_id_map[source])
+    return by_client
+
+
+def _splice_params(log_ids: list[str], position: int) -> dict:
+    return {"id": log_ids[position], "pending": log_ids[position + 1:], "window_days": CHAIN_SPLICE_WINDOW_DAYS}
+
+
+def splice_support_logs(tx, log_ids: list[str]) -> int:
+    """新しいログを 1 件ずつ既存チェーンに差し込む（書き込みトランザクション内で呼ぶ）"""
+    for position in range(len(log_ids)):
+        tx.run(SPLICE_LOG_QUERY, _splice_params(log_ids, position)).consume()
+    return len(log_ids)
+
+
+async def async_splice_support_logs(tx, log_ids: list[str]) -> int:
+    """splice_support_logs() の非同期版（AsyncManagedTransaction 内で呼ぶ）"""
+    for position in range(len(log_ids)):
+        result = await tx.run(SPLICE_LOG_QUERY, _splice_params(log_ids, position))
+        await result.consume()
+    return len(log_ids)
+
+
+def rebuild_client_chain(tx, client_name: str) -> None:
+    """クライアント 1 名分のチェーンを作り直す（書き込みトランザクション内で呼ぶ）"""
+    tx.run(REBUILD_CLIENT_CHAIN_QUERY, {"name": client_name}).consume()
+
+
+def update_support_log_chain(tx, client_names: Iterable[str], log_ids: list[str]) -> str:
+    """
+    新しいログをチェーンに反映する（書き込みトランザクション内で呼ぶ）。
+
+    挿入件数が CHAIN_SPLICE_LIMIT 以下なら差し込み、超えるか log_ids が空なら
+    対象クライアントのチェーンを再構築する。
+
+    Returns:
+        "splice" / "rebuild"（どちらで反映したか）
+    """
+    if log_ids and len(log_ids) <= CHAIN_SPLICE_LIMIT:
+        splice_support_logs(tx, log_ids)
+        return "splice"
+    for client_name in client_names:
+        rebuild_client_chain(tx, client_name)
+    return "rebuild"
+
+
+async def async_update_support_log_chain(tx, client_names: Iterable[str], log_ids: list[str]) -> str:
+    """update_support_log_chain() の非同期版（AsyncManagedTransaction 内で呼ぶ）"""
+    if log_ids and len(log_ids) <= CHAIN_SPLICE_LIMIT:
+        await async_splice_support_logs(tx, log_ids)
+        return "splice"
+    for client_name in client_names:
+        result = await tx.run(REBUILD_CLIENT_CHAIN_QUERY, {"name": client_name})
+        await result.consume()
+    return "rebuild"
@@ -0,0 +1,254 @@
+"""
+Skill の Cypher テンプレートのプロファイル（db hits の回帰検出）
+
+本番の読み取りの大半は Skill のテンプレート（claude-skills/*/SKILL.md の ```cypher ブロック、
+ecomap-generator/templates/*.cypher、cypher_templates.TEMPLATES / ANALYSIS_QUERIES）経由で
+実行されるが、それぞれのコストが把握されていなかった。
+
+- テンプレートの抽出と代表パラメータの割り当て
+- PROFILE の結果（プラン）から db hits・行数・ページキャッシュ・経過時間を集計
+- ホットなラベルの NodeByLabelScan / AllNodesScan と、インデックスシークを検出
+- ベースライン（JSON）との差分で db hits の悪化とスキャンの新規発生を報告
+  （スキャンがインデックスシークに置き換わったテンプレートは改善として報告）
+
+実行は scripts/profile_templates.py から行う（書き込みを含むテンプレートもあるため、
+各テンプレートは明示トランザクション内で PROFILE し、必ずロールバックする）。
+"""
+
+import re
+import sys
+from dataclasses import asdict, dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Iterable, Optional
+
+_ROOT = Path(__file__).resolve().parent.parent
+_SKILLS_DIR = _ROOT / "claude-skills"
+_ECOMAP_TEMPLATES_DIR = _SKILLS_DIR / "ecomap-generator" / "templates"
+
+# 別の Neo4j インスタンス（livelihood-support-db）を対象とする Skill
+_OTHER_DATABASE_SKILLS = {"livelihood-support"}
+
+# 件数が多く、全件スキャンが問題になるラベル
+HOT_LABELS = {"Client", "SupportLog", "AuditLog", "NgAction", "CarePreference", "KeyPerson", "MeetingRecord"}
+
+# .cypher テンプレート内のクライアント名のプレースホルダ
+_CLIENT_PLACEHOLDER = "'クライアント名'"
+
+_CYPHER_BLOCK = re.compile(r"```cypher\s*\n(.*?)```", re.S)
+_PARAM = re.compile(r"\$(\w+)")
+_SCHEMA_STATEMENT = re.compile(
+    r"\s*(SHOW\b|(CREATE|DROP)\s+((VECTOR|FULLTEXT|TEXT|RANGE|POINT|LOOKUP)\s+)?(INDEX|CONSTRAINT)\b)", re.I
+)
+_IN_TRANSACTIONS = re.compile(r"\}\s*IN\s+TRANSACTIONS\b", re.I)
+_CYPHER_START = re.compile(r"^\s*(MATCH|OPTIONAL|MERGE|CREATE|WITH|UNWIND|CALL|RETURN)\b", re.I | re.M)
+
+_CLIENT_PARAMS = {"clientName", "client_name", "client", "name"}
+_DATE_PARAMS = {"date", "dob", "startDate", "issueDate", "nextRenewalDate", "renewal"}
+_PARAM_DEFAULTS = {
+    "limit": 10, "days": 30, "minFrequency": 2, "rank": 1, "capacity": 10, "currentUsers": 1,
+    "rating": 3, "duration": 30, "frequency": 1, "providers": [], "aliases": [],
+    "keyword": "食事", "serviceKeyword": "生活介護", "riskLevel": "Panic", "risk": "Panic",
+    "priority": "High", "pri": "High", "effectiveness": "Effective", "status": "Active",
+}
+
+
+def _log(message: str, level: str = "INFO"):
+    sys.stderr.write(f"[TemplateProfile:{level}] {message}\n")
+    sys.stderr.flush()
+
+
+# =============================================================================
+# 抽出
+# =============================================================================
+
+@dataclass
+class CypherTemplate:
+    template_id: str   # 例: "visit-prep/SKILL.md#2", "cypher_templates.ANALYSIS_QUERIES.ng_by_risk"
+    query: str
+
+    @property
+    def parameters(self) -> list[str]:
+        return sorted(set(_PARAM.findall(_strip_comments(self.query))))
+
+
+def _strip_comments(query: str) -> str:
+    # 行頭・空白の後の // のみ（文字列中の URL は残す）
+    return re.sub(r"(^|\s)//[^\n]*", r"\1", query)
+
+
+def _split_statements(block: str) -> list[str]:
+    """; 区切りのブロックを文に分け、Cypher として実行できるものだけを返す"""
+    statements = []
+    for statement in _strip_comments(block).split(";"):
+        statement = statement.strip()
+        if statement and _CYPHER_START.search(statement):
+            statements.append(statement)
+    return statements
+
+
+def is_profilable(query: str) -> bool:
+    """PROFILE できる文か（スキーマ操作・SHOW・自動コミット専用の文を除く）"""
+    return not (_SCHEMA_STATEMENT.match(query) or _IN_TRANSACTIONS.search(query))
+
+
+def skill_templates(skills_dir: Path = _SKILLS_DIR) -> list[CypherTemplate]:
+    templates = []
+    for path in sorted(skills_dir.glob("*/SKILL.md")):
+        skill = path.parent.name
+        if skill in _OTHER_DATABASE_SKILLS:
+            continue
+        n = 0
+        for block in _CYPHER_BLOCK.findall(path.read_text(encoding="utf-8")):
+            for statement in _split_statements(block):
+                n += 1
+                templates.append(CypherTemplate(f"{skill}/SKILL.md#{n}", statement))
+    return templates
+
+
+def ecomap_file_templates(templates_dir: Path = _ECOMAP_TEMPLATES_DIR) -> list[CypherTemplate]:
+    templates = []
+    for path in sorted(templates_dir.glob("*.cypher")):
+        query = path.read_text(encoding="utf-8").replace(_CLIENT_PLACEHOLDER, "$client_name")
+        for i, statement in enumerate(_split_statements(query), start=1):
+            templates.append(CypherTemplate(f"ecomap-generator/templates/{path.name}#{i}", statement))
+    return templates
+
+
+def ecomap_python_templates() -> list[CypherTemplate]:
+    scripts_dir = str(_SKILLS_DIR / "ecomap-generator" / "scripts")
+    if scripts_dir not in sys.path:
+        sys.path.insert(0, scripts_dir)
+    import cypher_templates
+
+    templates = [
+        CypherTemplate(f"cypher_templates.TEMPLATES.{name}", t.query.strip())
+        for name, t in cypher_templates.TEMPLATES.items()
+    ]
+    templates.extend(
+        CypherTemplate(f"cypher_templates.ANALYSIS_QUERIES.{name}", query.strip())
+        for name, query in cypher_templates.ANALYSIS_QUERIES.items()
+    )
+    return templates
+
+
+def collect_templates() -> list[CypherTemplate]:
+    """プロファイル対象のテンプレートをすべて集める"""
+    return skill_templates() + ecomap_file_templates() + ecomap_python_templates()
+
+
+def bind_parameters(template: CypherTemplate, client_name: str, today: Optional[date] = None) -> dict:
+    """テンプレートのパラメータに代表値を割り当てる（未知のパラメータは空文字列）"""
+    today = today or date.today()
+    params = {}
+    for name in template.parameters:
+        if name in _CLIENT_PARAMS:
+            params[name] = client_name
+        elif name in _DATE_PARAMS:
+            params[name] = today.isoformat()
+        else:
+            params[name] = _PARAM_DEFAULTS.get(name, "")
+    return params
+
+
+# =============================================================================
+# プランの集計
+# =============================================================================
+
+@dataclass
+class ProfileResult:
+    template_id: str
+    db_hits: int = 0
+    rows: int = 0
+    page_cache_hits: int = 0
+    page_cache_misses: int = 0
+    elapsed_ms: float = 0.0
+    scans: list[str] = field(default_factory=list)   # 例: "NodeByLabelScan(c:Client)"
+    seeks: list[str] = field(default_factory=list)   # 例: "NodeUniqueIndexSeek(c:Client(name) WHERE name = $clientName)"
+    error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _operator_name(plan: dict) -> str:
+    return (plan.get("operatorType") or "").split("@")[0]
+
+
+def _on_hot_label(details: str) -> bool:
+    return any(re.search(rf":{label}\b", details) for label in HOT_LABELS)
+
+
+def summarize_profile(template_id: str, plan: dict, elapsed_ms: float = 0.0) -> ProfileResult:
+    """
+    PROFILE のプラン（neo4j ドライバーの ResultSummary.profile）を集計する。
+
+    rows は最上位オペレーターの行数、その他はプラン全体の合計。
+    """
+    result = ProfileResult(template_id, rows=int(plan.get("rows", 0)), elapsed_ms=round(elapsed_ms, 2))
+    stack = [plan]
+    while stack:
+        op = stack.pop()
+        result.db_hits += int(op.get("dbHits", 0))
+        result.page_cache_hits += int(op.get("pageCacheHits", 0))
+        result.page_cache_misses += int(op.get("pageCacheMisses", 0))
+        name = _operator_name(op)
+        details = str((op.get("args") or {}).get("Details", ""))
+        if name == "AllNodesScan":
+            result.scans.append(f"AllNodesScan({details})")
+        elif name == "NodeByLabelScan" and _on_hot_label(details):
+            result.scans.append(f"NodeByLabelScan({details})")
+        elif "IndexSeek" in name and _on_hot_label(details):
+            result.seeks.append(f"{name}({details})")
+        stack.extend(op.get("children") or [])
+    result.scans.sort()
+    result.seeks.sort()
+    return result
+
+
+# =============================================================================
+# ベースラインとの比較
+# =============================================================================
+
+def compare_to_baseline(
+    results: Iterable[ProfileResult],
+    baseline: dict[str, dict],
+    tolerance: float = 0.2,
+    min_db_hits: int = 100,
+) -> dict[str, list[str]]:
+    """
+    ベースラインと比べて悪化したテンプレートと、全件スキャンを含むテンプレートを報告する。
+
+    Args:
+        tolerance: db hits の許容増加率
+        min_db_hits: この値未満の増加は無視する（小さなテンプレートの揺らぎ対策）
+
+    Returns:
+        {"regressions": [...], "scans": [...], "improvements": [...]}
+        regressions は db hits の悪化・新たに発生したスキャン・実行エラー、
+        scans はホットなラベルの全件スキャンを含むテンプレートすべて、
+        improvements はベースラインのスキャンが解消したテンプレート（置き換わったインデックスシーク）
+    """
+    regressions, scans, improvements = [], [], []
+    for result in results:
+        if result.error:
+            regressions.append(f"{result.template_id}: 実行エラー {result.error}")
+            continue
+        before = baseline.get(result.template_id)
+        if result.scans:
+            scans.append(f"{result.template_id}: {', '.join(result.scans)}")
+        if before is None:
+            continue
+        new_scans = sorted(set(result.scans) - set(before.get("scans", [])))
+        if new_scans:
+            regressions.append(f"{result.template_id}: 全件スキャンが発生 {', '.join(new_scans)}")
+        resolved = sorted(set(before.get("scans", [])) - set(result.scans))
+        if resolved:
+            improvements.append(
+                f"{result.template_id}: {', '.join(resolved)} → {', '.join(result.seeks) or 'スキャンなし'}"
+            )
+        if before.get("db_hits") is not None:
+            increase = result.db_hits - before["db_hits"]
+            if increase >= min_db_hits and result.db_hits > before["db_hits"] * (1 + tolerance):
+                regressions.append(f"{result.template_id}: db hits {before['db_hits']} → {result.db_hits}")
+    return {"regressions": regressions, "scans": scans, "improvements": improvements}
@@ -0,0 +1,283 @@
+"""
+ワークロードクラス（レーン）による DB アクセスの分離
+
+SOS の緊急照会と、バックフィル・WAM NET 同期・データ品質チェックなどのバッチ処理が
+同じドライバーのコネクションプールを共有している。長いバッチがプールを使い切ると、
+そのとき届いた緊急照会が接続待ちになる。
+
+lib/db_runtime.py のクエリ実行は、呼び出し元のワークロードクラスのレーンで枠を取ってから接続を使う。
+- emergency   SOS など。専用の枠を持ち、実行中はバッチの新しいクエリを開始させない
+- interactive 画面・API からの通常の読み書き（既定）
+- batch       バックフィル・同期・スキャン。同時実行数を小さく抑え、緊急照会の間は一時停止する
+
+レーンの同時実行数の合計はドライバーのプールサイズ（NEO4J_MAX_CONNECTION_POOL_SIZE）以下に配分するため、
+緊急照会は他のレーンの負荷にかかわらず接続を確保できる。
+
+使い方:
+    with workload("batch"):
+        run_query(...)   # このブロック内のクエリはバッチレーンで実行される
+ContextVar で保持するため、スレッド・asyncio のタスクごとに独立している。
+
+プロセスをまたぐ一時停止:
+  SOS の API サーバーとバッチのスクリプトは別のプロセスで動くため、緊急照会の実行中は
+  WORKLOAD_SIGNAL_DIR に emergency-<pid> のシグナルファイルを置き、バッチレーンは枠を取るときに
+  他のプロセスのシグナルファイルも確認する（同じホスト上のプロセスだけが対象）。
+  プロセスが異常終了して残ったファイルは WORKLOAD_EMERGENCY_SIGNAL_TTL 秒を過ぎたら無視する。
+
+環境変数:
+  WORKLOAD_EMERGENCY_SLOTS / WORKLOAD_BATCH_SLOTS  レーンの同時実行数（interactive はプールの残り）
+  WORKLOAD_<CLASS>_WAIT_SECONDS                    枠の空き待ちの上限・秒
+  WORKLOAD_<CLASS>_QUERY_TIMEOUT                   クエリのタイムアウト・秒（0 ならサーバーの設定に従う）
+  WORKLOAD_SIGNAL_DIR                              シグナルファイルの置き場所
+                                                   （デフォルト: ~/.cache/nest-support/workload、空ならプロセス内のみ）
+  WORKLOAD_EMERGENCY_SIGNAL_TTL                    シグナルファイルを有効とみなす秒数（デフォルト: 60）
+"""
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+EMERGENCY = "emergency"
+INTERACTIVE = "interactive"
+BATCH = "batch"
+WORKLOAD_CLASSES = (EMERGENCY, INTERACTIVE, BATCH)
+
+_current: ContextVar[str] = ContextVar("workload", default=INTERACTIVE)
+
+DEFAULT_SIGNAL_DIR = Path.home() / ".cache" / "nest-support" / "workload"
+SIGNAL_POLL_SECONDS = 0.05  # 他のプロセスのシグナルを確認する間隔（プロセスをまたぐ通知はないため）
+
+
+@contextmanager
+def workload(name: str):
+    """ブロック内のクエリを指定したワークロードクラスで実行する"""
+    if name not in WORKLOAD_CLASSES:
+        raise ValueError(f"不明なワークロードクラス: {name}（{', '.join(WORKLOAD_CLASSES)}）")
+    token = _current.set(name)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def current_workload() -> str:
+    return _current.get()
+
+
+# =============================================================================
+# レーン
+# =============================================================================
+
+@dataclass
+class LaneConfig:
+    slots: int                      # 同時実行数
+    wait_seconds: float             # 枠の空き待ちの上限
+    query_timeout: Optional[float]  # クエリのタイムアウト（None ならサーバーの設定）
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def lane_configs_from_env() -> dict[str, LaneConfig]:
+    pool_size = int(os.getenv("NEO4J_MAX_CONNECTION_POOL_SIZE", "50"))
+    emergency = int(os.getenv("WORKLOAD_EMERGENCY_SLOTS", str(max(2, pool_size // 10))))
+    batch = int(os.getenv("WORKLOAD_BATCH_SLOTS", str(max(1, pool_size // 5))))
+    interactive = max(1, pool_size - emergency - batch)
+    defaults = {
+        EMERGENCY: (emergency, 10.0, 10.0),
+        INTERACTIVE: (interactive, 30.0, 0.0),
+        BATCH: (batch, 600.0, 0.0),
+    }
+    configs = {}
+    for name, (slots, wait, timeout) in defaults.items():
+        timeout = _env_float(f"WORKLOAD_{name.upper()}_QUERY_TIMEOUT", timeout)
+        configs[name] = LaneConfig(
+            slots=slots,
+            wait_seconds=_env_float(f"WORKLOAD_{name.upper()}_WAIT_SECONDS", wait),
+            query_timeout=timeout or None,
+        )
+    return configs
+
+
+def signal_dir_from_env() -> Optional[Path]:
+    value = os.getenv("WORKLOAD_SIGNAL_DIR", str(DEFAULT_SIGNAL_DIR))
+    return Path(value).expanduser() if value else None
+
+
+class EmergencySignal:
+    """
+    緊急照会の実行中であることを他のプロセスに知らせるシグナルファイル。
+
+    プロセスごとに emergency-<pid> を置き（実行中は枠を取るたびに更新時刻を進める）、
+    すべての緊急照会が終わったら消す。ファイルシステムの失敗はプロセス内の分離に影響させない。
+    """
+
+    PREFIX = "emergency-"
+
+    def __init__(self, directory: Path, ttl: Optional[float] = None):
+        self.directory = directory
+        self.ttl = _env_float("WORKLOAD_EMERGENCY_SIGNAL_TTL", 60.0) if ttl is None else ttl
+        self.path = directory / f"{self.PREFIX}{os.getpid()}"
+
+    def mark(self) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.path.touch()
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        try:
+            self.path.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    def active_elsewhere(self) -> bool:
+        """他のプロセスで緊急照会が実行中か（TTL を過ぎたファイルは異常終了の残骸として無視する）"""
+        now = time.time()
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not entry.name.startswith(self.PREFIX) or entry.path == str(self.path):
+                        continue
+                    try:
+                        if now - entry.stat().st_mtime < self.ttl:
+                            return True
+                    except FileNotFoundError:
+                        continue
+        except OSError:
+            return False
+        return False
+
+
+class WorkloadGovernor:
+    """
+    ワークロードクラスごとの同時実行数を管理する。
+
+    同期コード（スレッド）からは acquire、非同期コードからは async_acquire で枠を取る。
+    非同期側はイベントループを止めないよう、空きを短い間隔で確認しながら待つ。
+
+    signal_dir を渡すと、緊急照会の実行中をシグナルファイルで他のプロセスにも知らせ、
+    バッチレーンは他のプロセスの緊急照会の間も待つ。省略時の分離はこのプロセスの中だけ。
+    """
+
+    def __init__(self, configs: dict[str, LaneConfig], signal_dir: Optional[Path] = None):
+        self.configs = configs
+        self.signal = EmergencySignal(Path(signal_dir)) if signal_dir else None
+        self._cond = threading.Condition()
+        self._in_flight = {name: 0 for name in configs}
+        self._paused = False
+        self._acquired = {name: 0 for name in configs}
+        self._timeouts = {name: 0 for name in configs}
+        self._wait_ms_max = {name: 0.0 for name in configs}
+
+    # --- 枠の取得・返却 ---
+
+    def _can_enter(self, name: str) -> bool:
+        if self._in_flight[name] >= self.configs[name].slots:
+            return False
+        if name == BATCH and (self._paused or self._in_flight[EMERGENCY] > 0 or self._emergency_elsewhere()):
+            return False
+        return True
+
+    def _emergency_elsewhere(self) -> bool:
+        return self.signal is not None and self.signal.active_elsewhere()
+
+    def _enter(self, name: str, started: float) -> None:
+        if name == EMERGENCY and self.signal is not None:
+            self.signal.mark()
+        self._in_flight[name] += 1
+        self._acquired[name] += 1
+        self._wait_ms_max[name] = max(self._wait_ms_max[name], (time.perf_counter() - started) * 1000)
+
+    def acquire(self, name: str, timeout: Optional[float] = None) -> bool:
+        """枠を取る。timeout（既定はレーンの wait_seconds）までに取れなければ False"""
+        timeout = self.configs[name].wait_seconds if timeout is None else timeout
+        started = time.perf_counter()
+        # 他のプロセスのシグナルは notify されないため、バッチは短い間隔で確認し直す
+        poll = SIGNAL_POLL_SECONDS if name == BATCH and self.signal is not None else None
+        deadline = started + timeout
+        with self._cond:
+            while not self._can_enter(name):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts[name] += 1
+                    return False
+                self._cond.wait(min(remaining, poll) if poll else remaining)
+            self._enter(name, started)
+            return True
+
+    async def async_acquire(self, name: str, timeout: Optional[float] = None) -> bool:
+        timeout = self.configs[name].wait_seconds if timeout is None else timeout
+        started = time.perf_counter()
+        delay = 0.001
+        while True:
+            with self._cond:
+                if self._can_enter(name):
+                    self._enter(name, started)
+                    return True
+                if time.perf_counter() - started >= timeout:
+                    self._timeouts[name] += 1
+                    return False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    def release(self, name: str) -> None:
+        with self._cond:
+            self._in_flight[name] -= 1
+            if name == EMERGENCY and self._in_flight[name] == 0 and self.signal is not None:
+                self.signal.clear()
+            self._cond.notify_all()
+
+    # --- バッチの一時停止 ---
+
+    def pause_batch(self) -> None:
+        """バッチレーンの新しいクエリを止める（実行中のクエリは完了まで続く）"""
+        with self._cond:
+            self._paused = True
+
+    def resume_batch(self) -> None:
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                name: {
+                    "slots": config.slots,
+                    "in_flight": self._in_flight[name],
+                    "acquired": self._acquired[name],
+                    "timeouts": self._timeouts[name],
+                    "wait_ms_max": round(self._wait_ms_max[name], 1),
+                    "paused": name == BATCH and (
+                        self._paused or self._in_flight[EMERGENCY] > 0 or self._emergency_elsewhere()
+                    ),
+                }
+                for name, config in self.configs.items()
+            }
+
+
+_governor = WorkloadGovernor(lane_configs_from_env(), signal_dir=signal_dir_from_env())
+
+
+def get_governor() -> WorkloadGovernor:
+    return _governor
+
+
+def set_governor(governor: WorkloadGovernor) -> WorkloadGovernor:
+    """レーンの設定を差し替え、以前のものを返す（テスト・ベンチマーク用）"""
+    global _governor
+    previous, _governor = _governor, governor
+    return previous
+
+
+def get_workload_stats() -> dict:
+    return _governor.stats()
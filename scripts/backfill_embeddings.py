@@ -2,19 +2,24 @@
 既存ノードへの Embedding 一括付与（バックフィル）スクリプト
 
 Gemini Embedding 2 を使って SupportLog, NgAction, CarePreference の
-既存ノードに embedding を付与する。
+既存ノードに embedding を付与する（現行の Embedding の世代のプロパティ。
+モデルの移行中のシャドウ側は scripts/migrate_embedding_model.py backfill で埋める）。
+elementId の順に進み、バッチごとにチェックポイントを保存する（lib/backfill.py）。
+中断した場合は同じコマンドを再実行すれば続きから処理する。
 
 使用例:
     uv run python scripts/backfill_embeddings.py --all
     uv run python scripts/backfill_embeddings.py --label SupportLog
     uv run python scripts/backfill_embeddings.py --label SupportLog --client "山田健太"
+    uv run python scripts/backfill_embeddings.py --all --workers 4
+    uv run python scripts/backfill_embeddings.py --label SupportLog --restart
+    uv run python scripts/backfill_embeddings.py --all --stale   # テキストが変わったノードだけ再埋め込み
     uv run python scripts/backfill_embeddings.py --dry-run
     uv run python scripts/backfill_embeddings.py --stats
 """
 
 import argparse
 import sys
-import time
 from pathlib import Path
 
 # プロジェクトルートをパスに追加（scripts/ から実行する場合）
@@ -48,260 +53,47 @@ def get_stats():
     print()
 
 
-def backfill_label(label: str, client_name: str | None, batch_size: int, dry_run: bool):
-    """指定ラベルのノードにembeddingをバックフィル"""
-    from lib.embedding import backfill_support_log_embeddings, backfill_ng_action_embeddings
-    from lib.db_new_operations import run_query
-    from lib.embedding import embed_texts_batch, _run_query
-
-    if label == "SupportLog":
-        return _backfill_loop(
-            label="SupportLog",
-            fetch_fn=lambda bs: _fetch_support_logs(client_name, bs),
-            text_fn=_support_log_text,
-            batch_size=batch_size,
-            dry_run=dry_run,
-        )
-    elif label == "NgAction":
-        return _backfill_loop(
-            label="NgAction",
-            fetch_fn=lambda bs: _fetch_ng_actions(bs),
-            text_fn=_ng_action_text,
-            batch_size=batch_size,
-            dry_run=dry_run,
-        )
-    elif label == "CarePreference":
-        return _backfill_loop(
-            label="CarePreference",
-            fetch_fn=lambda bs: _fetch_care_preferences(bs),
-            text_fn=_care_preference_text,
-            batch_size=batch_size,
-            dry_run=dry_run,
-        )
-    elif label == "Client":
-        return _backfill_clients(batch_size=batch_size, dry_run=dry_run)
-    else:
-        log(f"未対応のラベル: {label}", "ERROR")
-        return {"processed": 0, "success": 0, "failed": 0}
-
-
-# --- Fetch 関数 ---
-
-def _fetch_support_logs(client_name: str | None, batch_size: int) -> list:
-    from lib.db_new_operations import run_query
-
-    if client_name:
-        return run_query(
-            """
-            MATCH (log:SupportLog)-[:ABOUT]->(c:Client)
-            WHERE c.name CONTAINS $client_name AND log.embedding IS NULL
-            RETURN elementId(log) AS id,
-                   log.situation AS situation, log.action AS action,
-                   log.note AS note, log.effectiveness AS effectiveness
-            LIMIT $batch_size
-            """,
-            {"client_name": client_name, "batch_size": batch_size},
-        )
-    return run_query(
-        """
-        MATCH (log:SupportLog)
-        WHERE log.embedding IS NULL
-        RETURN elementId(log) AS id,
-               log.situation AS situation, log.action AS action,
-               log.note AS note, log.effectiveness AS effectiveness
-        LIMIT $batch_size
-        """,
-        {"batch_size": batch_size},
-    )
-
-
-def _fetch_ng_actions(batch_size: int) -> list:
-    from lib.db_new_operations import run_query
-
-    return run_query(
-        """
-        MATCH (ng:NgAction)
-        WHERE ng.embedding IS NULL
-        RETURN elementId(ng) AS id,
-               ng.action AS action, ng.reason AS reason, ng.riskLevel AS riskLevel
-        LIMIT $batch_size
-        """,
-        {"batch_size": batch_size},
-    )
-
-
-def _fetch_care_preferences(batch_size: int) -> list:
-    from lib.db_new_operations import run_query
-
-    return run_query(
-        """
-        MATCH (cp:CarePreference)
-        WHERE cp.embedding IS NULL
-        RETURN elementId(cp) AS id,
-               cp.category AS category, cp.instruction AS instruction
-        LIMIT $batch_size
-        """,
-        {"batch_size": batch_size},
-    )
-
-
-# --- テキスト構築関数 ---
-
-def _support_log_text(node: dict) -> str:
-    parts = []
-    if node.get("situation"):
-        parts.append(f"状況: {node['situation']}")
-    if node.get("action"):
-        parts.append(f"対応: {node['action']}")
-    if node.get("note"):
-        parts.append(f"メモ: {node['note']}")
-    if node.get("effectiveness"):
-        parts.append(f"効果: {node['effectiveness']}")
-    return "。".join(parts) if parts else ""
-
-
-def _ng_action_text(node: dict) -> str:
-    parts = [f"禁忌: {node.get('action', '')}"]
-    if node.get("reason"):
-        parts.append(f"理由: {node['reason']}")
-    if node.get("riskLevel"):
-        parts.append(f"リスク: {node['riskLevel']}")
-    return "。".join(parts)
-
-
-def _care_preference_text(node: dict) -> str:
-    parts = []
-    if node.get("category"):
-        parts.append(f"カテゴリ: {node['category']}")
-    if node.get("instruction"):
-        parts.append(f"指示: {node['instruction']}")
-    return "。".join(parts) if parts else ""
-
-
-# --- バックフィルループ ---
-
-def _backfill_loop(
+def backfill_label(
     label: str,
-    fetch_fn,
-    text_fn,
+    client_name: str | None,
     batch_size: int,
     dry_run: bool,
+    workers: int = 1,
+    checkpoint_dir: str | None = None,
+    restart: bool = False,
+    stale: bool = False,
 ) -> dict:
-    """バッチ単位でembeddingを付与するループ"""
-    from lib.embedding import embed_texts_batch
-    from lib.db_new_operations import run_query
-
-    total_processed = 0
-    total_success = 0
-    total_failed = 0
-
-    while True:
-        nodes = fetch_fn(batch_size)
-        if not nodes:
-            break
-
-        if dry_run:
-            total_processed += len(nodes)
-            log(f"[dry-run] {label}: {len(nodes)} 件見つかりました")
-            break  # dry-run では1バッチだけカウントして終了
-
-        texts = [text_fn(n) for n in nodes]
-        # 空テキストのノードをスキップ
-        valid = [(n, t) for n, t in zip(nodes, texts) if t]
-        if not valid:
-            break
-
-        valid_nodes, valid_texts = zip(*valid)
-        embeddings = embed_texts_batch(list(valid_texts))
+    """
+    指定ラベルのノードにembeddingをバックフィル（チェックポイントがあれば続きから）
 
-        batch_success = 0
-        for node, emb in zip(valid_nodes, embeddings):
-            if emb is None:
-                total_failed += 1
-                continue
-            try:
-                run_query(
-                    """
-                    MATCH (n) WHERE elementId(n) = $id
-                    CALL db.create.setNodeVectorProperty(n, 'embedding', $embedding)
-                    """,
-                    {"id": node["id"], "embedding": emb},
-                )
-                batch_success += 1
-            except Exception as e:
-                log(f"付与失敗 ({node['id']}): {e}", "WARN")
-                total_failed += 1
-
-        total_processed += len(valid_nodes)
-        total_success += batch_success
-        log(f"{label}: バッチ {batch_success}/{len(valid_nodes)} 件付与", "OK")
-
-        # 全件処理済みならループを抜ける
-        if len(nodes) < batch_size:
-            break
-
-        # レートリミット対策
-        time.sleep(0.5)
-
-    return {"processed": total_processed, "success": total_success, "failed": total_failed}
-
-
-# --- Client summaryEmbedding バックフィル ---
-
-def _backfill_clients(batch_size: int, dry_run: bool) -> dict:
-    """Client の summaryEmbedding を一括付与"""
-    from lib.embedding import build_client_summary_text, embed_text
+    stale=True なら付与済みのノードのうち、テキストか構築ルールの版が変わったものだけを埋め込み直す
+    """
+    from lib.backfill import label_specs, run_backfill
     from lib.db_new_operations import run_query
+    from lib.embedding_generations import active_generation
 
-    clients = run_query(
-        """
-        MATCH (c:Client)
-        WHERE c.summaryEmbedding IS NULL
-        RETURN c.name AS name
-        LIMIT $batch_size
-        """,
-        {"batch_size": batch_size},
-    )
-
-    if not clients:
-        log("summaryEmbedding 未付与の Client がありません")
+    spec = label_specs(active_generation(), client_name, stale=stale).get(label)
+    if spec is None:
+        log(f"未対応のラベル: {label}", "ERROR")
         return {"processed": 0, "success": 0, "failed": 0}
 
     if dry_run:
-        log(f"[dry-run] Client: {len(clients)} 件が未付与")
-        return {"processed": len(clients), "success": 0, "failed": 0}
-
-    success = 0
-    failed = 0
-    for client in clients:
-        name = client["name"]
-        text = build_client_summary_text(name)
-        if not text:
-            log(f"Client 概要テキスト構築スキップ: {name}", "WARN")
-            failed += 1
-            continue
-        embedding = embed_text(text, task_type="CLUSTERING")
-        if embedding is None:
-            failed += 1
-            continue
-        try:
-            run_query(
-                """
-                MATCH (c:Client {name: $name})
-                CALL db.create.setNodeVectorProperty(c, 'summaryEmbedding', $embedding)
-                """,
-                {"name": name, "embedding": embedding},
-            )
-            success += 1
-            log(f"Client summaryEmbedding 付与: {name}", "OK")
-        except Exception as e:
-            log(f"Client summaryEmbedding 付与失敗 ({name}): {e}", "WARN")
-            failed += 1
-
-        # レートリミット対策
-        time.sleep(0.5)
+        total = run_query(spec.count_query(), spec.params)[0]["total"]
+        if stale:
+            log(f"[dry-run] {label}: 付与済み {total} 件のハッシュを照合します")
+        else:
+            log(f"[dry-run] {label}: {total} 件見つかりました")
+        return {"processed": total, "success": 0, "failed": 0}
 
-    return {"processed": len(clients), "success": success, "failed": failed}
+    result = run_backfill(
+        spec, batch_size=batch_size, workers=workers, checkpoint_dir=checkpoint_dir, restart=restart,
+    )
+    if stale:
+        log(f"{label}: {result['processed']} 件中 {result['success']} 件を再埋め込み、"
+            f"変更なし {result['unchanged']} 件（チェックポイント: {result['checkpoint']}）", "OK")
+    else:
+        log(f"{label}: {result['success']}/{result['processed']} 件付与（チェックポイント: {result['checkpoint']}）", "OK")
+    return result
 
 
 def main():
@@ -313,7 +105,8 @@ def main():
         help="SupportLog, NgAction, CarePreference の全てを処理",
     )
     parser.add_argument(
-        "--label", choices=["SupportLog", "NgAction", "CarePreference", "Client"],
+        "--label",
+        choices=["SupportLog", "NgAction", "CarePreference", "Client", "MeetingRecord", "MeetingRecordAudio"],
         help="特定のラベルのみ処理",
     )
     parser.add_argument(
@@ -324,6 +117,22 @@ def main():
         "--batch-size", type=int, default=20,
         help="一度に処理するノード数（デフォルト: 20）",
     )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="elementId の範囲を分けて並行に処理する数（デフォルト: 1）",
+    )
+    parser.add_argument(
+        "--checkpoint-dir", type=str, default=None,
+        help="チェックポイントの保存先（デフォルト: ~/.cache/nest-support/backfill）",
+    )
+    parser.add_argument(
+        "--stale", action="store_true",
+        help="付与済みのノードのうち、テキストか構築ルールの版が変わったものだけを埋め込み直す",
+    )
+    parser.add_argument(
+        "--restart", action="store_true",
+        help="残っているチェックポイントを捨てて最初から処理する",
+    )
     parser.add_argument(
         "--dry-run", action="store_true",
         help="実際には付与せず、対象件数のみ表示",
@@ -354,6 +163,9 @@ def main():
 
     print(f"\n🚀 バックフィル開始: {', '.join(labels)}")
     if args.client:
+        # 識別子（通称・ふりがな・clientId など）を完全一致の氏名に解決してから絞り込む
+        from lib.db_new_operations import resolve_client_name
+        args.client = resolve_client_name(args.client)
         print(f"   フィルタ: client={args.client}")
 
     results = {}
@@ -364,6 +176,10 @@ def main():
             client_name=args.client if label == "SupportLog" else None,
             batch_size=args.batch_size,
             dry_run=args.dry_run,
+            workers=args.workers,
+            checkpoint_dir=args.checkpoint_dir,
+            restart=args.restart,
+            stale=args.stale,
         )
         results[label] = result
 
@@ -375,6 +191,18 @@ def main():
             print(f"  {label}: {r['processed']} 件が未付与")
         else:
             print(f"  {label}: {r['success']}/{r['processed']} 成功, {r['failed']} 失敗")
+            if r.get("failed"):
+                print(f"    失敗したノードは {r['checkpoint']} の failed に記録しています（次回の実行で再試行）")
+    if not args.dry_run:
+        from lib.embedding_cache import get_embedding_cache_stats
+        cache = get_embedding_cache_stats()
+        print(f"  Embedding キャッシュ: ヒット {cache['hits']} / ミス {cache['misses']}"
+              f" (ヒット率 {cache['hit_rate']:.1%}, {cache['entries']} 件, {cache['bytes'] / 1024 / 1024:.1f}MB)")
+        from lib.embedding import get_embedding_dispatcher_stats
+        api = get_embedding_dispatcher_stats()
+        print(f"  Gemini API: {api['texts_per_sec']} texts/sec, {api['requests']} リクエスト,"
+              f" 再送 {api['retries']} (429: {api['rate_limited']}), 流量制限の待ち {api['throttle_wait_seconds']} 秒,"
+              f" チャンク {api['chunk_size']} 件")
     print()
 
     # 最終統計
@@ -382,4 +210,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    from lib.workload import workload
+
+    # 緊急照会の間は一時停止する低優先度のレーンで実行する
+    with workload("batch"):
+        main()
@@ -0,0 +1,136 @@
+"""
+ローカルの ANN 索引（lib/ann_index.py）のベンチマーク: recall@k と 1 クエリのレイテンシ
+
+正解は全件との正確な内積（lib/similarity.top_k）の上位 k 件。
+- 合成データ（デフォルト）: クラスタ状の 768 次元ベクトル N 件で索引を作り、nprobe ごとに比べる
+- --neo4j: scripts/build_ann_index.py で作った索引と同じベクトルに対し、Neo4j の
+  db.index.vector.queryNodes とローカル索引の両方を同じ正解で比べる（Neo4j の HNSW も近似のため）
+
+クエリは格納済みのベクトルに雑音を加えたもの（--neo4j では格納済みのベクトルそのもの）。
+
+使用例:
+    uv run python scripts/benchmarks/bench_ann_index.py
+    uv run python scripts/benchmarks/bench_ann_index.py --sizes 10000 100000 --nprobe 1 4 8 16
+    uv run python scripts/benchmarks/bench_ann_index.py --neo4j --index support_log_embedding --queries 200
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+
+from lib.ann_index import IVFIndex
+from lib.similarity import to_matrix, top_k
+
+
+def _vectors(count: int, dimensions: int, cluster_size: int = 50, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, count // cluster_size), dimensions), dtype=np.float32)
+    members = rng.integers(0, len(centers), size=count)
+    return centers[members] + 1.0 * rng.standard_normal((count, dimensions), dtype=np.float32)
+
+
+def _recall(found: list[set], exact: np.ndarray, k: int) -> float:
+    return float(np.mean([len(f & set(row[:k].tolist())) / k for f, row in zip(found, exact)]))
+
+
+def _timed(fn, queries) -> tuple[list, float]:
+    """各クエリの結果と 1 クエリあたりのミリ秒（中央値）"""
+    results, times = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        results.append(fn(q))
+        times.append(time.perf_counter() - t0)
+    return results, float(np.median(times)) * 1000
+
+
+def run_synthetic(args):
+    print(f"\n📊 合成データ（{args.dimensions} 次元, k={args.k}, クエリ {args.queries} 件）")
+    print(f"  {'件数':>9} {'nlist':>6} {'作成 秒':>8} {'開く ms':>8} {'nprobe':>7} {'recall':>7} {'ms/クエリ':>10} {'全件 ms':>9}")
+    rng = np.random.default_rng(1)
+    for size in args.sizes:
+        vectors = _vectors(size, args.dimensions)
+        ids = [str(i) for i in range(size)]
+        picks = rng.choice(size, args.queries, replace=False)
+        queries = vectors[picks] + 0.5 * rng.standard_normal((args.queries, args.dimensions), dtype=np.float32)
+        matrix = to_matrix(vectors)
+        exact, _ = top_k(to_matrix(queries), matrix, args.k)
+        _, brute_ms = _timed(lambda q: top_k(to_matrix([q]), matrix, args.k), queries)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            t0 = time.perf_counter()
+            built = IVFIndex.build(Path(tmp) / "bench", ids, vectors)
+            built.save()
+            build_s = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            index = IVFIndex.open(Path(tmp) / "bench")
+            open_ms = (time.perf_counter() - t0) * 1000
+            for nprobe in args.nprobe:
+                hits, ms = _timed(lambda q: index.search(q, args.k, nprobe=nprobe), queries)
+                recall = _recall([{int(h[0]) for h in hit} for hit in hits], exact, args.k)
+                print(f"  {size:>9,} {len(index.centroids):>6} {build_s:>8.1f} {open_ms:>8.1f}"
+                      f" {nprobe:>7} {recall:>7.3f} {ms:>10.2f} {brute_ms:>9.2f}")
+            del index, built
+
+
+def run_neo4j(args):
+    from lib.ann_index import get_local_index
+    from lib.db_new_operations import run_query
+    from lib.embedding_generations import active_generation
+
+    name = active_generation().index_for(args.index)
+    index = get_local_index(name)
+    if index is None:
+        print(f"ローカルの索引がありません: {name}（scripts/build_ann_index.py --index {args.index}）")
+        return 1
+    ids, _, matrix = index.rows()
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(ids), min(args.queries, len(ids)), replace=False)
+    queries = matrix[picks]
+    exact_idx, _ = top_k(queries, matrix, args.k)
+    exact = np.array([[ids[i] for i in row] for row in exact_idx])
+
+    def recall(found):
+        return float(np.mean([len(set(f) & set(row.tolist())) / args.k for f, row in zip(found, exact)]))
+
+    query = """
+    CALL db.index.vector.queryNodes($index_name, $k, $vector) YIELD node
+    RETURN elementId(node) AS id
+    """
+    neo4j_hits, neo4j_ms = _timed(
+        lambda q: [r["id"] for r in run_query(query, {"index_name": name, "k": args.k, "vector": q.tolist()})],
+        queries,
+    )
+    print(f"\n📊 {name}（{len(ids):,} 件, k={args.k}, クエリ {len(queries)} 件）")
+    print(f"  {'エンジン':<16} {'recall':>7} {'ms/クエリ':>10}")
+    print(f"  {'Neo4j':<16} {recall(neo4j_hits):>7.3f} {neo4j_ms:>10.2f}")
+    for nprobe in args.nprobe:
+        hits, ms = _timed(lambda q: [h[0] for h in index.search(q, args.k, nprobe=nprobe)], queries)
+        print(f"  {f'local nprobe={nprobe}':<16} {recall(hits):>7.3f} {ms:>10.2f}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ローカル ANN 索引の recall@k とレイテンシ")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--neo4j", action="store_true", help="Neo4j のベクトルインデックスと比べる")
+    parser.add_argument("--index", type=str, default="support_log_embedding",
+                        help="--neo4j で比べるインデックス（世代 1 の名前）")
+    args = parser.parse_args()
+    if args.neo4j:
+        return run_neo4j(args)
+    run_synthetic(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
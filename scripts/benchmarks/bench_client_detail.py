@@ -0,0 +1,192 @@
+"""
+クライアント詳細カード ベンチマーク: セクション別クエリ（旧実装） vs 単一プロジェクション
+
+展開カード（get_client_detail）とエコマップ（fetch_client_data）のデータ取得について、
+旧実装のセクションごとのクエリ（5 本 / 8 本、それぞれ別セッション）と
+lib/client_card.py の CALL {} プロジェクション（1 本）の end-to-end レイテンシを比較する。
+
+使用例:
+    # 実 Neo4j にベンチ用クライアントを作成して計測（終了時に削除）
+    uv run python scripts/benchmarks/bench_client_detail.py --iterations 200
+
+    # Neo4j なしで計測（1 往復あたりの遅延を擬似的に付与）
+    uv run python scripts/benchmarks/bench_client_detail.py --offline --rtt-ms 2 --query-ms 1
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BENCH_PREFIX = "__bench_detail__"
+
+# 旧実装（get_client_detail）のセクション別クエリ
+LEGACY_DETAIL_QUERIES = [
+    """
+    MATCH (c:Client {name: $name})
+    OPTIONAL MATCH (c)-[:HAS_CONDITION]->(con:Condition)
+    OPTIONAL MATCH (c)-[:HAS_CERTIFICATE]->(cert:Certificate)
+    RETURN c.name as name, c.dob as dob, c.bloodType as bloodType,
+           collect(DISTINCT con.name) as conditions,
+           collect(DISTINCT {type: cert.type, grade: cert.grade, renewal: cert.nextRenewalDate}) as certificates
+    """,
+    """
+    MATCH (c:Client {name: $name})-[:MUST_AVOID]->(ng:NgAction)
+    RETURN ng.action as action, ng.reason as reason, ng.riskLevel as risk
+    """,
+    """
+    MATCH (c:Client {name: $name})-[:REQUIRES]->(cp:CarePreference)
+    RETURN cp.category as category, cp.instruction as instruction
+    ORDER BY cp.priority DESC LIMIT 5
+    """,
+    """
+    MATCH (c:Client {name: $name})-[r:HAS_KEY_PERSON]->(kp:KeyPerson)
+    RETURN kp.name as name, kp.phone as phone, kp.relationship as relationship, r.rank as rank
+    ORDER BY r.rank ASC LIMIT 3
+    """,
+    """
+    MATCH (s:Supporter)-[:LOGGED]->(log:SupportLog)-[:ABOUT]->(c:Client {name: $name})
+    RETURN log.date as date, log.situation as situation,
+           log.effectiveness as effectiveness, s.name as supporter
+    ORDER BY log.date DESC LIMIT 5
+    """,
+]
+
+# 旧実装（エコマップ fetch_client_data）のセクション別クエリ
+LEGACY_ECOMAP_QUERIES = [
+    "MATCH (c:Client {name: $name}) RETURN c.name as name, c.dob as dob, c.bloodType as bloodType",
+    """
+    MATCH (c:Client {name: $name})-[:PROHIBITED|MUST_AVOID]->(ng:NgAction)
+    RETURN ng.action as action, ng.reason as reason, ng.riskLevel as riskLevel
+    ORDER BY CASE ng.riskLevel WHEN 'LifeThreatening' THEN 1 WHEN 'Panic' THEN 2 ELSE 3 END
+    """,
+    """
+    MATCH (c:Client {name: $name})-[:PREFERS|REQUIRES]->(cp:CarePreference)
+    RETURN cp.category as category, cp.instruction as instruction, cp.priority as priority
+    """,
+    """
+    MATCH (c:Client {name: $name})-[r:EMERGENCY_CONTACT|HAS_KEY_PERSON]->(kp:KeyPerson)
+    RETURN kp.name as name, kp.relationship as relationship, kp.phone as phone,
+           coalesce(r.rank, r.priority) as priority
+    ORDER BY coalesce(r.rank, r.priority, 99)
+    """,
+    """
+    MATCH (c:Client {name: $name})-[:HAS_GUARDIAN|HAS_LEGAL_REP]->(g:Guardian)
+    RETURN g.name as name, g.type as type, g.phone as phone
+    """,
+    """
+    MATCH (c:Client {name: $name})-[:HAS_CERTIFICATE]->(cert:Certificate)
+    RETURN cert.type as type, cert.grade as grade
+    """,
+    """
+    MATCH (c:Client {name: $name})-[:TREATED_AT]->(h:Hospital)
+    RETURN h.name as name, h.specialty as specialty
+    """,
+    """
+    MATCH (c:Client {name: $name})-[:HAS_CONDITION]->(cond:Condition)
+    RETURN cond.name as name
+    """,
+]
+
+SEED_QUERY = """
+CREATE (c:Client {name: $name, dob: date('1990-04-01'), bloodType: 'A'})
+WITH c
+UNWIND range(1, 5) AS i
+CREATE (c)-[:MUST_AVOID]->(:NgAction {action: 'ng' + i, reason: 'r', riskLevel: 'Panic'})
+CREATE (c)-[:REQUIRES]->(:CarePreference {category: 'cat' + i, instruction: 'cp' + i, priority: 'High'})
+CREATE (c)-[:HAS_CONDITION]->(:Condition {name: $name + 'cond' + i})
+WITH c, collect(i) AS seeded
+UNWIND range(1, 3) AS i
+CREATE (c)-[:HAS_KEY_PERSON {rank: i}]->(:KeyPerson {name: 'kp' + i, relationship: '親族', phone: '000'})
+CREATE (c)-[:HAS_CERTIFICATE]->(:Certificate {type: '療育手帳', grade: 'A' + i,
+                                              nextRenewalDate: date() + duration({days: 30 * i})})
+CREATE (c)-[:TREATED_AT]->(:Hospital {name: $name + 'h' + i, specialty: '内科'})
+WITH c, collect(i) AS seeded
+CREATE (s:Supporter {name: $name + 'supporter'})
+WITH c, s
+UNWIND range(1, 30) AS i
+CREATE (s)-[:LOGGED]->(:SupportLog {date: date() - duration({days: i}), situation: 's' + i,
+                                    effectiveness: 'Effective'})-[:ABOUT]->(c)
+"""
+
+CLEANUP_QUERY = """
+MATCH (c:Client {name: $name})
+OPTIONAL MATCH (c)--(n)
+OPTIONAL MATCH (s:Supporter {name: $name + 'supporter'})
+DETACH DELETE n, s, c
+"""
+
+
+def _time_calls(fn, iterations: int) -> dict:
+    timings = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    timings.sort()
+    return {"p50_ms": statistics.median(timings), "p99_ms": timings[max(int(len(timings) * 0.99) - 1, 0)]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="クライアント詳細カードの取得レイテンシを比較")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--offline", action="store_true", help="Neo4j に接続せず計測")
+    parser.add_argument("--rtt-ms", type=float, default=2.0, help="オフライン時の 1 往復（セッション取得含む）の遅延")
+    parser.add_argument("--query-ms", type=float, default=1.0, help="オフライン時のセクション 1 つ分のサーバー処理時間")
+    args = parser.parse_args()
+
+    from lib import db_new_operations as db
+    from lib.client_card import CLIENT_CARD_QUERY, fetch_client_card
+
+    name = f"{BENCH_PREFIX}{uuid.uuid4().hex[:6]}"
+    params = {"name": name}
+
+    if args.offline:
+        def run_query(query, params=None):
+            # 単一プロジェクションは選択セクション数ぶんのサーバー処理 + 1 往復
+            sections = len(params.get("sections", [])) if query == CLIENT_CARD_QUERY else 1
+            time.sleep((args.rtt_ms + args.query_ms * sections) / 1000)
+            return []
+        stack = patch.object(db, "run_query", run_query)
+        stack.start()
+        cleanup = stack.stop
+    else:
+        run_query = db.run_query
+        run_query(SEED_QUERY, params)
+        cleanup = lambda: run_query(CLEANUP_QUERY, params)
+
+    scenarios = [
+        ("展開カード", lambda: [run_query(q, params) for q in LEGACY_DETAIL_QUERIES],
+         lambda: db.get_client_detail(name, use_cache=False), len(LEGACY_DETAIL_QUERIES)),
+        ("エコマップ", lambda: [run_query(q, params) for q in LEGACY_ECOMAP_QUERIES],
+         lambda: fetch_client_card(run_query, name, ("ngActions", "carePreferences", "keyPersons", "guardians",
+                                                     "certificates", "hospitals", "conditions")),
+         len(LEGACY_ECOMAP_QUERIES)),
+    ]
+
+    print(f"\nクライアント詳細カード ベンチマーク  iterations={args.iterations}"
+          + (f"  (offline rtt={args.rtt_ms}ms query={args.query_ms}ms)" if args.offline else ""))
+    print(f"\n  {'対象':<10} {'旧実装':>8} {'p50(ms)':>10} {'p99(ms)':>10} {'単一 p50(ms)':>14} {'p99(ms)':>10}")
+    print(f"  {'─' * 68}")
+    try:
+        for label, legacy, card, n_queries in scenarios:
+            before = _time_calls(legacy, args.iterations)
+            after = _time_calls(card, args.iterations)
+            print(f"  {label:<10} {str(n_queries) + ' 本':>8} {before['p50_ms']:>10.2f} {before['p99_ms']:>10.2f} "
+                  f"{after['p50_ms']:>14.2f} {after['p99_ms']:>10.2f}")
+    finally:
+        cleanup()
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+FastAPI 同時実行ベンチマーク: 同期ドライバー（旧実装） vs 非同期ドライバー
+
+field-ui のダッシュボード集計と SOS API を同じイベントループ（= 同じ uvicorn ワーカー）に載せ、
+100 件の同時リクエストを投げたときの p50 / p99 レイテンシを比較する。
+
+- before: async エンドポイントから同期版 run_query / resolve_client を直接呼ぶ（旧実装の再現）
+- after : lib.async_db_operations の非同期ドライバー経由（現行実装）
+
+LINE 送信はどちらのモードでも無効化する。
+
+使用例:
+    # 実 Neo4j に対して計測（.env の NEO4J_URI を使用、読み取りのみ）
+    uv run python scripts/benchmarks/bench_concurrency.py --requests 100 --client 山田健太
+
+    # Neo4j なしで計測（クエリ遅延を擬似的に付与）
+    uv run python scripts/benchmarks/bench_concurrency.py --offline --query-ms 20 --slow-query-ms 300
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import statistics
+import sys
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _load_app(name: str, path: Path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# =============================================================================
+# クエリ実行の差し替え
+# =============================================================================
+
+def _blocking_patches(field_ui, sos, offline: bool, query_s: float, slow_query_s: float) -> list:
+    """旧実装の再現: 同期呼び出しでイベントループをブロックする"""
+    from lib import db_new_operations as db
+
+    def sync_query(latency_s):
+        def run(query, params=None):
+            if offline:
+                time.sleep(latency_s)
+                return []
+            return db.run_query(query, params)
+        return run
+
+    def blocking(fn):
+        async def wrapper(*args, **kwargs):
+            return fn(*args, **kwargs)
+        return wrapper
+
+    dashboard_query = sync_query(slow_query_s)
+    sos_query = sync_query(query_s)
+
+    def sync_resolve(identifier):
+        if offline:
+            time.sleep(query_s)
+            return None
+        return db.resolve_client(identifier)
+
+    return [
+        patch.object(field_ui, "async_run_query", blocking(dashboard_query)),
+        patch.object(sos, "async_run_query", blocking(sos_query)),
+        patch.object(sos, "async_resolve_client", blocking(sync_resolve)),
+    ]
+
+
+def _async_patches(field_ui, sos, offline: bool, query_s: float, slow_query_s: float) -> list:
+    """現行実装: オフライン時のみ非同期ドライバーを擬似遅延に差し替える"""
+    if not offline:
+        return []
+
+    def async_query(latency_s):
+        async def run(query, params=None):
+            await asyncio.sleep(latency_s)
+            return []
+        return run
+
+    async def async_resolve(identifier):
+        await asyncio.sleep(query_s)
+        return None
+
+    return [
+        patch.object(field_ui, "async_run_query", async_query(slow_query_s)),
+        patch.object(sos, "async_run_query", async_query(query_s)),
+        patch.object(sos, "async_resolve_client", async_resolve),
+    ]
+
+
+# =============================================================================
+# 計測
+# =============================================================================
+
+async def _timed(client: httpx.AsyncClient, kind: str, t0: float, method: str, url: str, **kwargs):
+    # t0 は全リクエスト共通の発行時刻（ループがブロックされて開始が遅れた分も待ち時間に含める）
+    response = await client.request(method, url, **kwargs)
+    return kind, (time.perf_counter() - t0) * 1000, response.status_code
+
+
+async def _run_load(field_ui_app, sos_app, n_requests: int, client_name: str) -> dict:
+    dashboard = httpx.AsyncClient(transport=httpx.ASGITransport(app=field_ui_app), base_url="http://field-ui")
+    sos = httpx.AsyncClient(transport=httpx.ASGITransport(app=sos_app), base_url="http://sos")
+    async with dashboard, sos:
+        tasks = []
+        t0 = time.perf_counter()
+        for i in range(n_requests):
+            if i % 2 == 0:
+                tasks.append(_timed(dashboard, "dashboard", t0, "GET", "/api/dashboard/summary"))
+            else:
+                tasks.append(_timed(sos, "sos", t0, "POST", "/api/sos", json={"client_id": client_name}))
+        results = await asyncio.gather(*tasks)
+
+    by_kind: dict[str, list[float]] = {}
+    errors = 0
+    for kind, ms, status in results:
+        by_kind.setdefault(kind, []).append(ms)
+        if status >= 400:
+            errors += 1
+    return {"latencies": by_kind, "errors": errors}
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def run_mode(mode: str, field_ui, sos, args) -> dict:
+    query_s = args.query_ms / 1000
+    slow_query_s = args.slow_query_ms / 1000
+    build = _blocking_patches if mode == "before" else _async_patches
+
+    async def noop_line(message: str) -> bool:
+        return True
+
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(sos, "send_line_message", noop_line))
+        for p in build(field_ui, sos, args.offline, query_s, slow_query_s):
+            stack.enter_context(p)
+
+        async def main():
+            try:
+                return await _run_load(field_ui.app, sos.app, args.requests, args.client)
+            finally:
+                from lib.async_db_operations import close_async_driver
+                await close_async_driver()
+
+        return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同期ドライバーと非同期ドライバーの同時実行レイテンシを比較")
+    parser.add_argument("--requests", type=int, default=100, help="同時リクエスト数（半数ずつダッシュボード / SOS）")
+    parser.add_argument("--client", default="ベンチマーク利用者", help="SOS リクエストの client_id")
+    parser.add_argument("--offline", action="store_true", help="Neo4j に接続せず擬似遅延で計測")
+    parser.add_argument("--query-ms", type=float, default=20.0, help="オフライン時の通常クエリの遅延 (ms)")
+    parser.add_argument("--slow-query-ms", type=float, default=300.0, help="オフライン時のダッシュボード集計の遅延 (ms)")
+    args = parser.parse_args()
+
+    field_ui = _load_app("field_ui_server", ROOT / "field-ui" / "server.py")
+    sos = _load_app("sos_api_server", ROOT / "sos" / "api_server.py")
+
+    print(f"\nFastAPI 同時実行ベンチマーク  requests={args.requests}"
+          + (f"  (offline: query={args.query_ms}ms, dashboard={args.slow_query_ms}ms)" if args.offline else ""))
+
+    results = {
+        "before (sync driver)": run_mode("before", field_ui, sos, args),
+        "after  (async driver)": run_mode("after", field_ui, sos, args),
+    }
+
+    print(f"\n  {'モード':<22} {'種別':<10} {'p50(ms)':>10} {'p99(ms)':>10} {'最大(ms)':>10}")
+    print(f"  {'─' * 66}")
+    for name, r in results.items():
+        for kind, values in sorted(r["latencies"].items()):
+            print(f"  {name:<22} {kind:<10} {statistics.median(values):>10.1f} "
+                  f"{_percentile(values, 99):>10.1f} {max(values):>10.1f}")
+        if r["errors"]:
+            print(f"  {'':<22} ⚠️ エラー応答: {r['errors']} 件")
+    print()
+
+
+if __name__ == "__main__":
+    main()
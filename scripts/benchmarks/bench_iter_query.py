@@ -0,0 +1,187 @@
+"""
+大量読み取りのメモリベンチマーク: run_query（全件 list） vs iter_query（ストリーミング）
+
+ノード（既定 500,000 件）を JSON Lines に書き出し（出力先は /dev/null）、ピーク RSS を比較する。
+ピーク RSS はプロセス全体の最大値なので、方式ごとに子プロセスで計測する。
+
+使用例:
+    # 実 Neo4j にベンチ用ノードを作成して計測（終了時に削除）
+    uv run python scripts/benchmarks/bench_iter_query.py --nodes 500000
+
+    # Neo4j なしで計測（ドライバーのレコードを模したジェネレーターで同じ経路を通す）
+    uv run python scripts/benchmarks/bench_iter_query.py --offline --nodes 500000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BENCH_LABEL = "BenchExport"
+
+SEED_QUERY = f"""
+UNWIND range(1, $nodes) AS i
+CALL {{
+  WITH i
+  CREATE (:{BENCH_LABEL} {{id: i, name: 'node-' + i, note: '支援記録のエクスポート用ダミーテキスト ' + i}})
+}} IN TRANSACTIONS OF 10000 ROWS
+"""
+
+EXPORT_QUERY = f"MATCH (n:{BENCH_LABEL}) RETURN n.id AS id, n.name AS name, n.note AS note"
+
+CLEANUP_QUERY = f"""
+MATCH (n:{BENCH_LABEL})
+CALL {{ WITH n DETACH DELETE n }} IN TRANSACTIONS OF 10000 ROWS
+"""
+
+
+def _peak_rss_mb() -> float:
+    # Linux は KiB、macOS はバイト
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class _OfflineRecord(tuple):
+    """neo4j.Record の代わり（data() / values() のみ）"""
+    _keys = ("id", "name", "note")
+
+    def data(self):
+        return dict(zip(self._keys, self))
+
+    def values(self):
+        return list(self)
+
+
+def _offline_records(nodes: int):
+    for i in range(1, nodes + 1):
+        yield _OfflineRecord((i, f"node-{i}", f"支援記録のエクスポート用ダミーテキスト {i}"))
+
+
+class _OfflineResult:
+    def __init__(self, nodes: int):
+        self.nodes = nodes
+
+    def data(self):
+        return [r.data() for r in _offline_records(self.nodes)]
+
+
+class _OfflineSession:
+    """execute_query（execute_read → tx.run().data()）と stream_query（session.run を反復）の両方に応じる"""
+
+    def __init__(self, nodes: int):
+        self.nodes = nodes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_read(self, work):
+        return work(self)
+
+    def run(self, query, params):
+        return _OfflineResult(self.nodes)
+
+    def close(self):
+        pass
+
+
+class _OfflineStreamSession(_OfflineSession):
+    def run(self, query, params):
+        return _offline_records(self.nodes)
+
+
+class OfflineDriver:
+    def __init__(self, nodes: int):
+        self.nodes = nodes
+
+    def session(self, **kwargs):
+        # stream_query は fetch_size を指定してセッションを開く
+        return _OfflineStreamSession(self.nodes) if "fetch_size" in kwargs else _OfflineSession(self.nodes)
+
+
+def run_child(mode: str, nodes: int, offline: bool) -> dict:
+    """子プロセス内で 1 方式のエクスポートを実行する"""
+    from lib.db_runtime import execute_query, stream_query
+
+    if offline:
+        driver = OfflineDriver(nodes)
+    else:
+        from lib.db_new_operations import get_driver
+        driver = get_driver()
+
+    baseline_mb = _peak_rss_mb()
+    t0 = time.perf_counter()
+    rows = 0
+    with open(os.devnull, "w", encoding="utf-8") as f:
+        if mode == "run_query":
+            records = execute_query(driver, EXPORT_QUERY)
+        else:
+            records = stream_query(driver, EXPORT_QUERY, fetch_size=1000, row_type=tuple)
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            rows += 1
+    return {
+        "mode": mode,
+        "rows": rows,
+        "seconds": round(time.perf_counter() - t0, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "baseline_rss_mb": round(baseline_mb, 1),
+    }
+
+
+def measure(mode: str, nodes: int, offline: bool) -> dict:
+    cmd = [sys.executable, __file__, "--child", mode, "--nodes", str(nodes)]
+    if offline:
+        cmd.append("--offline")
+    completed = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run_query と iter_query のピーク RSS を比較")
+    parser.add_argument("--nodes", type=int, default=500_000, help="エクスポートするノード数")
+    parser.add_argument("--offline", action="store_true", help="Neo4j なしで計測")
+    parser.add_argument("--keep", action="store_true", help="ベンチ用ノードを削除しない")
+    parser.add_argument("--child", choices=["run_query", "iter_query"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.nodes, args.offline)))
+        return
+
+    if not args.offline:
+        from lib.db_new_operations import run_query
+        print(f"ベンチ用ノード {args.nodes:,} 件を作成中...")
+        run_query(SEED_QUERY, {"nodes": args.nodes})
+
+    try:
+        results = [measure(mode, args.nodes, args.offline) for mode in ("run_query", "iter_query")]
+    finally:
+        if not args.offline and not args.keep:
+            run_query(CLEANUP_QUERY)
+
+    print(f"\n📊 {args.nodes:,} 件のエクスポート ({'offline' if args.offline else 'Neo4j'})")
+    print(f"  {'方式':<12} {'行数':>10} {'秒':>8} {'ピーク RSS':>12} {'起動時 RSS':>12}")
+    for r in results:
+        print(f"  {r['mode']:<12} {r['rows']:>10,} {r['seconds']:>8.2f} "
+              f"{r['peak_rss_mb']:>10.1f}MB {r['baseline_rss_mb']:>10.1f}MB")
+    before, after = results
+    grown_before = before["peak_rss_mb"] - before["baseline_rss_mb"]
+    grown_after = after["peak_rss_mb"] - after["baseline_rss_mb"]
+    print(f"\n  エクスポート中の増加: {grown_before:.1f}MB → {grown_after:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
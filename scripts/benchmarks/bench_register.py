@@ -0,0 +1,222 @@
+"""
+register_to_database ベンチマーク: 逐次登録 vs 1 トランザクション UNWIND 一括登録
+
+音声アップロード 1 件相当のグラフ（ノード 15 件・リレーション 20 件）を繰り返し登録し、
+Bolt 往復回数（実行した Cypher 文の数）と実時間を比較する。
+
+使用例:
+    # 実 Neo4j に対して計測（.env の NEO4J_URI を使用。登録したデータは最後に削除）
+    uv run python scripts/benchmarks/bench_register.py --iterations 20
+
+    # db_operations 側のエンジンで計測
+    uv run python scripts/benchmarks/bench_register.py --module db_operations
+
+    # Neo4j なしで往復回数のみ確認（1 往復あたりの遅延を擬似的に付与）
+    uv run python scripts/benchmarks/bench_register.py --offline --rtt-ms 2
+"""
+
+import argparse
+import importlib
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BENCH_PREFIX = "__bench_register__"
+
+
+def build_graph(run_id: str, iteration: int) -> dict:
+    """ノード 15 件・リレーション 20 件のグラフを生成"""
+    p = f"{BENCH_PREFIX}{run_id}"
+    nodes = [
+        {"temp_id": "c1", "label": "Client", "properties": {"name": f"{p}_client"}},
+        {"temp_id": "s1", "label": "Supporter", "properties": {"name": f"{p}_supporter"}},
+        {"temp_id": "con1", "label": "Condition", "properties": {"name": f"{p}_自閉スペクトラム症"}},
+        {"temp_id": "con2", "label": "Condition", "properties": {"name": f"{p}_てんかん"}},
+    ]
+    for i in range(4):
+        nodes.append({"temp_id": f"ng{i}", "label": "NgAction", "properties": {
+            "action": f"{p}_禁忌{i}", "reason": "パニックの誘因", "riskLevel": "Panic"}})
+    for i in range(3):
+        nodes.append({"temp_id": f"cp{i}", "label": "CarePreference", "properties": {
+            "category": "コミュニケーション", "instruction": f"{p}_指示{i}", "priority": "High"}})
+    for i in range(4):
+        nodes.append({"temp_id": f"log{i}", "label": "SupportLog", "properties": {
+            "date": f"2026-03-{10 + i:02d}", "situation": f"{p}_状況{iteration}_{i}",
+            "action": "静かな別室に移動", "effectiveness": "Effective", "emotion": "Calm"}})
+
+    rels = [
+        ("c1", "con1", "HAS_CONDITION"), ("c1", "con2", "HAS_CONDITION"),
+        ("ng0", "con1", "IN_CONTEXT"), ("ng1", "con2", "IN_CONTEXT"),
+        ("c1", "s1", "SUPPORTED_BY"),
+    ]
+    rels += [("c1", f"ng{i}", "MUST_AVOID") for i in range(4)]
+    rels += [("c1", f"cp{i}", "REQUIRES") for i in range(3)]
+    rels += [("s1", f"log{i}", "LOGGED") for i in range(4)]
+    rels += [(f"log{i}", "c1", "ABOUT") for i in range(4)]
+    return {
+        "nodes": nodes,
+        "relationships": [
+            {"source_temp_id": s, "target_temp_id": t, "type": r, "properties": {}} for s, t, r in rels
+        ],
+    }
+
+
+# =============================================================================
+# 往復回数の計測用ラッパー
+# =============================================================================
+
+class RoundTripCounter:
+    def __init__(self, rtt_s: float = 0.0, offline: bool = False):
+        self.count = 0
+        self.rtt_s = rtt_s
+        self.offline = offline
+        self._next_id = 0
+
+    def _fake_rows(self, query, params):
+        """オフライン時: RETURN される elementId を擬似生成"""
+        if "RETURN row.idx" in query:
+            rows = []
+            for row in params["rows"]:
+                self._next_id += 1
+                rows.append({"idx": row["idx"], "internal_id": f"4:bench:{self._next_id}"})
+            return rows
+        if "elementId(n)" in query:
+            self._next_id += 1
+            return [{"internal_id": f"4:bench:{self._next_id}", "id": f"4:bench:{self._next_id}"}]
+        return []
+
+    def wrap_run_query(self, original):
+        def run_query(query, params=None, *args, **kwargs):
+            self.count += 1
+            if self.offline:
+                time.sleep(self.rtt_s)
+                return self._fake_rows(query, params or {})
+            return original(query, params, *args, **kwargs)
+        return run_query
+
+    def wrap_run_in_transaction(self, original):
+        counter = self
+
+        class _Result(list):
+            def consume(self):
+                return None
+
+        class CountingTx:
+            def __init__(self, tx):
+                self._tx = tx
+
+            def run(self, query, params=None, **kwargs):
+                counter.count += 1
+                if counter.offline:
+                    time.sleep(counter.rtt_s)
+                    return _Result(counter._fake_rows(query, params or {}))
+                return self._tx.run(query, params, **kwargs)
+
+        def run_in_transaction(work, *args, **kwargs):
+            if counter.offline:
+                time.sleep(counter.rtt_s * 2)  # BEGIN / COMMIT
+                return work(CountingTx(None))
+            return original(lambda tx: work(CountingTx(tx)), *args, **kwargs)
+        return run_in_transaction
+
+
+def run_mode(module, batched: bool, iterations: int, run_id: str, rtt_s: float, offline: bool) -> dict:
+    counter = RoundTripCounter(rtt_s=rtt_s, offline=offline)
+    timings = []
+    trips = []
+    noop = lambda *a, **k: None
+    embed_hooks = [name for name in (
+        "_attach_embeddings", "_attach_embeddings_batch",
+        "_try_attach_client_summary_embedding", "_try_attach_client_summary",
+    ) if hasattr(module, name)]
+
+    patches = [
+        patch.object(module, "run_query", counter.wrap_run_query(module.run_query)),
+        patch.object(module, "run_in_transaction", counter.wrap_run_in_transaction(module.run_in_transaction)),
+    ] + [patch.object(module, name, noop) for name in embed_hooks]
+
+    for p in patches:
+        p.start()
+    try:
+        for i in range(iterations):
+            graph = build_graph(run_id, i)
+            before = counter.count
+            t0 = time.perf_counter()
+            result = module.register_to_database(graph, user_name="bench", batched=batched)
+            timings.append((time.perf_counter() - t0) * 1000)
+            trips.append(counter.count - before)
+            if result.get("status") != "success":
+                print(f"  ⚠️ 登録失敗: {result}")
+    finally:
+        for p in patches:
+            p.stop()
+
+    return {
+        "round_trips": statistics.mean(trips),
+        "p50_ms": statistics.median(timings),
+        "mean_ms": statistics.mean(timings),
+        "max_ms": max(timings),
+    }
+
+
+def cleanup(module, run_id: str):
+    prefix = f"{BENCH_PREFIX}{run_id}"
+    module.run_query("""
+        MATCH (n)
+        WHERE n.name STARTS WITH $prefix OR n.action STARTS WITH $prefix
+           OR n.instruction STARTS WITH $prefix OR n.situation STARTS WITH $prefix
+           OR n.clientName STARTS WITH $prefix
+        DETACH DELETE n
+    """, {"prefix": prefix})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="register_to_database の逐次登録と一括登録を比較")
+    parser.add_argument("--module", choices=["db_new_operations", "db_operations"],
+                        default="db_new_operations")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--offline", action="store_true",
+                        help="Neo4j に接続せず往復回数のみ計測（遅延は --rtt-ms で擬似付与）")
+    parser.add_argument("--rtt-ms", type=float, default=1.0,
+                        help="オフライン時の 1 往復あたりの擬似遅延 (ms)")
+    args = parser.parse_args()
+
+    module = importlib.import_module(f"lib.{args.module}")
+    run_id = uuid.uuid4().hex[:8]
+    rtt_s = args.rtt_ms / 1000
+
+    print(f"\nregister_to_database ベンチマーク  module={args.module}  iterations={args.iterations}"
+          + ("  (offline)" if args.offline else ""))
+    print("グラフ: ノード 15 件 / リレーション 20 件（embedding 付与は計測対象外）\n")
+
+    try:
+        results = {
+            "逐次 (per-query)": run_mode(module, False, args.iterations, run_id, rtt_s, args.offline),
+            "一括 (UNWIND/1tx)": run_mode(module, True, args.iterations, run_id, rtt_s, args.offline),
+        }
+    finally:
+        if not args.offline:
+            cleanup(module, run_id)
+
+    print(f"  {'モード':<20} {'往復回数':>8} {'p50(ms)':>10} {'平均(ms)':>10} {'最大(ms)':>10}")
+    print(f"  {'─' * 62}")
+    for name, r in results.items():
+        print(f"  {name:<20} {r['round_trips']:>8.1f} {r['p50_ms']:>10.1f} {r['mean_ms']:>10.1f} {r['max_ms']:>10.1f}")
+
+    legacy, batched = results.values()
+    if batched["p50_ms"] > 0:
+        print(f"\n  往復回数: {legacy['round_trips'] / batched['round_trips']:.1f}x 削減"
+              f"  /  p50: {legacy['p50_ms'] / batched['p50_ms']:.1f}x 高速化\n")
+
+
+if __name__ == "__main__":
+    main()
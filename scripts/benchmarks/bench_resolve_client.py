@@ -0,0 +1,149 @@
+"""
+resolve_client ベンチマーク: 従来のクエリ経路 vs インメモリ識別子索引
+
+クライアント 10,000 件を想定し、完全一致・ふりがな・部分一致・未登録の各パターンで
+resolve_client の所要時間を比較する。
+
+使用例:
+    # 実 Neo4j に 10,000 件のベンチ用クライアントを作成して計測（終了時に削除）
+    uv run python scripts/benchmarks/bench_resolve_client.py --clients 10000
+
+    # Neo4j なしで計測（従来経路は CONTAINS 全件走査を Python で再現した参考値）
+    uv run python scripts/benchmarks/bench_resolve_client.py --offline
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BENCH_PREFIX = "__bench_resolve__"
+
+_FAMILY = ["山田", "佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺", "中村", "小林", "加藤"]
+_FAMILY_KANA = ["やまだ", "さとう", "すずき", "たかはし", "たなか", "いとう", "わたなべ", "なかむら", "こばやし", "かとう"]
+_GIVEN = ["健太", "花子", "一郎", "美咲", "翔太", "陽菜", "大輔", "結衣", "拓海", "さくら"]
+_GIVEN_KANA = ["けんた", "はなこ", "いちろう", "みさき", "しょうた", "ひな", "だいすけ", "ゆい", "たくみ", "さくら"]
+
+
+def build_clients(n: int, run_id: str) -> list[dict]:
+    clients = []
+    for i in range(n):
+        f, g = i % 10, (i // 10) % 10
+        clients.append({
+            "clientId": f"c-{run_id}-{i:05d}",
+            "displayCode": f"A-{run_id}{i:05d}",
+            "name": f"{_FAMILY[f]}{_GIVEN[g]}{i}",
+            "kana": f"{_FAMILY_KANA[f]}{_GIVEN_KANA[g]}{i}",
+            "aliases": [f"{_GIVEN_KANA[g]}ちゃん{i}"],
+            "bloodType": None,
+            "dob": None,
+        })
+    return clients
+
+
+def build_lookups(clients: list[dict], count: int) -> dict[str, list[str]]:
+    rng = random.Random(42)
+    sample = [rng.choice(clients) for _ in range(count)]
+    return {
+        "clientId": [c["clientId"] for c in sample],
+        "氏名（完全一致）": [c["name"] + "さん" for c in sample],
+        "ふりがな": [c["kana"] for c in sample],
+        "部分一致": [c["name"][2:] for c in sample],
+        "未登録": [f"未登録者{i}" for i in range(count)],
+    }
+
+
+def _time_calls(fn, identifiers: list[str]) -> dict:
+    timings = []
+    for ident in identifiers:
+        t0 = time.perf_counter()
+        fn(ident)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    timings.sort()
+    return {"p50_us": statistics.median(timings), "p99_us": timings[int(len(timings) * 0.99) - 1]}
+
+
+def _scan_like_contains(clients: list[dict]):
+    """オフライン時の従来経路の参考値: 双方向 CONTAINS の全件走査"""
+    def resolve(identifier: str):
+        clean = identifier.replace("さん", "").strip()
+        for c in clients:
+            if c["clientId"] == clean or c["displayCode"] == clean or c["name"] == clean or c["kana"] == clean:
+                return c
+        for c in clients:
+            if (clean in c["name"] or c["name"] in clean or clean in c["kana"] or c["kana"] in clean
+                    or any(clean in a or a in clean for a in c["aliases"])):
+                return c
+        return None
+    return resolve
+
+
+def main():
+    parser = argparse.ArgumentParser(description="resolve_client のクエリ経路と識別子索引を比較")
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=200, help="パターンごとの検索回数")
+    parser.add_argument("--offline", action="store_true", help="Neo4j に接続せず計測")
+    args = parser.parse_args()
+
+    from lib.client_index import ClientIndex
+
+    run_id = uuid.uuid4().hex[:6]
+    clients = build_clients(args.clients, run_id)
+    lookups = build_lookups(clients, args.lookups)
+
+    t0 = time.perf_counter()
+    index = ClientIndex()
+    index.replace_all(clients)
+    build_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    index.replace_all(clients)
+    rebuild_s = time.perf_counter() - t0
+
+    if args.offline:
+        baseline_name = "CONTAINS 走査 (参考)"
+        baseline = _scan_like_contains(clients)
+        cleanup = lambda: None
+    else:
+        from lib.db_new_operations import resolve_client, run_query
+        baseline_name = "Cypher 4段階"
+        run_query("""
+            UNWIND $rows AS row
+            CREATE (c:Client {clientId: row.clientId, displayCode: row.displayCode,
+                              name: row.name, kana: row.kana, aliases: row.aliases})
+        """, {"rows": [{**c, "name": BENCH_PREFIX + c["name"]} for c in clients]})
+        # ベンチ用データでは氏名に接頭辞を付けるため、検索語も合わせる
+        lookups["氏名（完全一致）"] = [BENCH_PREFIX + x for x in lookups["氏名（完全一致）"]]
+        baseline = lambda ident: resolve_client(ident, use_cache=False, use_index=False)
+        index.replace_all(run_query("MATCH (c:Client) WHERE c.name STARTS WITH $p RETURN c.clientId AS clientId, "
+                                    "c.displayCode AS displayCode, c.name AS name, c.kana AS kana, "
+                                    "c.aliases AS aliases", {"p": BENCH_PREFIX}))
+        cleanup = lambda: run_query("MATCH (c:Client) WHERE c.name STARTS WITH $p DETACH DELETE c",
+                                    {"p": BENCH_PREFIX})
+
+    print(f"\nresolve_client ベンチマーク  clients={args.clients}  lookups={args.lookups}/パターン"
+          + ("  (offline)" if args.offline else ""))
+    print(f"索引構築: 初回 {build_s:.2f} 秒 / 再読み込み {rebuild_s:.2f} 秒 / 正規化形 {index.stats()['terms']} 件\n")
+    print(f"  {'パターン':<16} {baseline_name + ' p50(µs)':>24} {'p99(µs)':>10} {'索引 p50(µs)':>14} {'p99(µs)':>10}")
+    print(f"  {'─' * 80}")
+    try:
+        for pattern, identifiers in lookups.items():
+            base = _time_calls(baseline, identifiers)
+            idx = _time_calls(index.lookup, identifiers)
+            print(f"  {pattern:<16} {base['p50_us']:>24.1f} {base['p99_us']:>10.1f} "
+                  f"{idx['p50_us']:>14.1f} {idx['p99_us']:>10.1f}")
+    finally:
+        cleanup()
+    print()
+
+
+if __name__ == "__main__":
+    main()
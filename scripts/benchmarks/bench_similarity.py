@@ -0,0 +1,103 @@
+"""
+類似度計算のベンチマーク: Python のループ（変更前の cosine_similarity）vs lib/similarity.py（NumPy）
+
+check_weight_consistency と同じく、N 件のベクトルの全ペアから類似度が閾値以上のペアを取り出す。
+768 次元のベクトルはクラスタ状に生成する（同じクラスタのペアが閾値 0.85 を超える）。
+
+変更前の実装は 1 万件で 5,000 万ペアになり実測できないため、--legacy-budget 秒の間に処理した
+ペア数から全ペア分の時間を見積もる（表の「推定」）。
+
+使用例:
+    uv run python scripts/benchmarks/bench_similarity.py
+    uv run python scripts/benchmarks/bench_similarity.py --sizes 1000 10000 50000 --block-size 2048
+    uv run python scripts/benchmarks/bench_similarity.py --sizes 1000 --legacy-budget 0   # 1k は全ペアを実測
+"""
+
+import argparse
+import sys
+import time
+from array import array
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import numpy as np
+
+from lib.similarity import pairs_above, to_matrix
+
+
+def legacy_cosine(a, b) -> float:
+    """変更前の lib.embedding.cosine_similarity"""
+    if len(a) != len(b):
+        raise ValueError(f"ベクトル次元が不一致: {len(a)} vs {len(b)}")
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = sum(x * x for x in a) ** 0.5
+    norm_b = sum(x * x for x in b) ** 0.5
+    if norm_a == 0 or norm_b == 0:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+
+def _vectors(count: int, dimensions: int, cluster_size: int = 20) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(1, count // cluster_size), dimensions), dtype=np.float32)
+    members = rng.integers(0, len(centers), size=count)
+    return centers[members] + 0.35 * rng.standard_normal((count, dimensions), dtype=np.float32)
+
+
+def run_legacy(rows: list[array], threshold: float, budget: float) -> dict:
+    """変更前の全ペアのループ。budget 秒を超えたら打ち切り、処理したペア数から全体を見積もる"""
+    n = len(rows)
+    total = n * (n - 1) // 2
+    done = hits = 0
+    t0 = time.perf_counter()
+    for i in range(n):
+        for j in range(i + 1, n):
+            if legacy_cosine(rows[i], rows[j]) >= threshold:
+                hits += 1
+        done += n - i - 1
+        if budget and time.perf_counter() - t0 > budget:
+            break
+    seconds = time.perf_counter() - t0
+    return {
+        "seconds": seconds * total / done if done else 0.0,
+        "estimated": done < total,
+        "pairs": hits if done == total else None,
+    }
+
+
+def run_numpy(vectors: np.ndarray, threshold: float, block_size: int) -> dict:
+    t0 = time.perf_counter()
+    matrix = to_matrix(vectors)
+    hits = sum(1 for _ in pairs_above(matrix, threshold, block_size=block_size))
+    return {"seconds": time.perf_counter() - t0, "pairs": hits}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全ペアの類似度計算: Python のループ vs NumPy のブロック行列積")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--legacy-budget", type=float, default=10.0,
+                        help="変更前の実装を実測する上限・秒（0 なら全ペアを実測）")
+    args = parser.parse_args()
+
+    print(f"\n📊 全ペアの類似度（{args.dimensions} 次元, threshold={args.threshold}, block={args.block_size}）")
+    print(f"  {'件数':>8} {'ペア数':>16} {'ループ 秒':>14} {'NumPy 秒':>10} {'倍率':>10} {'一致ペア':>10}")
+    for size in args.sizes:
+        vectors = _vectors(size, args.dimensions)
+        legacy = run_legacy([array("f", row) for row in vectors], args.threshold, args.legacy_budget)
+        fast = run_numpy(vectors, args.threshold, args.block_size)
+        if legacy["pairs"] is not None and legacy["pairs"] != fast["pairs"]:
+            print(f"  ⚠️ {size} 件: 閾値以上のペア数が一致しません（ループ {legacy['pairs']} / NumPy {fast['pairs']}）")
+        legacy_s = f"{legacy['seconds']:,.1f}{' (推定)' if legacy['estimated'] else ''}"
+        speedup = legacy["seconds"] / fast["seconds"] if fast["seconds"] else 0.0
+        print(f"  {size:>8,} {size * (size - 1) // 2:>16,} {legacy_s:>14} {fast['seconds']:>10.2f}"
+              f" {speedup:>9,.0f}x {fast['pairs']:>10,}")
+    peak = args.block_size * args.block_size * 4 / 1024 / 1024
+    print(f"\n  NumPy 側が同時に持つ類似度: ブロック 1 つ分 {peak:.0f}MB（件数によらない）")
+
+
+if __name__ == "__main__":
+    main()
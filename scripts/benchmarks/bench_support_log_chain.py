@@ -0,0 +1,164 @@
+"""
+SupportLog 時系列チェーン ベンチマーク: 全件再構築（旧実装） vs 差し込み
+
+ログ数の多いクライアント（既定 5,000 件）に 1 件ずつログを追加し、
+旧実装の _run_support_log_chain_query（全ログ同士を突き合わせる O(n²)）と
+lib/support_log_chain.py の差し込み（直前のログを日付の範囲で引き、直後はチェーンの後続をたどる）の
+1 件あたりの時間を比較する。
+追加するログの日付はランダム（遡り入力・同日を含む）。
+
+使用例:
+    # 実 Neo4j にベンチ用クライアントを作成して計測（終了時に削除）
+    uv run python scripts/benchmarks/bench_support_log_chain.py --logs 5000 --inserts 20
+
+    # Neo4j なしで計測（同じアルゴリズムを Python で実行し、走査行数を比較）
+    uv run python scripts/benchmarks/bench_support_log_chain.py --offline --inserts 3
+"""
+
+import argparse
+import bisect
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from lib.support_log_chain import CHAIN_SPLICE_WINDOW_DAYS
+
+BENCH_PREFIX = "__bench_chain__"
+
+# 旧実装（lib/db_operations.py _run_support_log_chain_query）
+LEGACY_CHAIN_QUERY = """
+MATCH (log:SupportLog)-[:ABOUT]->(c:Client {name: $name})
+WITH log ORDER BY log.date DESC
+MATCH (current:SupportLog)-[:ABOUT]->(c:Client {name: $name})
+WHERE NOT (current)-[:FOLLOWS]->()
+OPTIONAL MATCH (prev:SupportLog)-[:ABOUT]->(c)
+WHERE prev <> current AND prev.date <= current.date
+WITH current, prev ORDER BY prev.date DESC
+WITH current, collect(prev)[0] AS imm_prev
+WHERE imm_prev IS NOT NULL
+MERGE (current)-[:FOLLOWS]->(imm_prev)
+"""
+
+SEED_QUERY = """
+CREATE (c:Client {name: $name})
+WITH c
+UNWIND range(1, $logs) AS i
+CREATE (:SupportLog {date: date('2010-01-01') + duration({days: toInteger(rand() * 5000)}),
+                     situation: 's' + i})-[:ABOUT]->(c)
+"""
+
+INSERT_QUERY = """
+MATCH (c:Client {name: $name})
+CREATE (log:SupportLog {date: date($date), situation: 'bench'})-[:ABOUT]->(c)
+RETURN elementId(log) AS id
+"""
+
+CLEANUP_QUERY = """
+MATCH (c:Client {name: $name})
+OPTIONAL MATCH (c)<-[:ABOUT]-(log:SupportLog)
+DETACH DELETE log, c
+"""
+
+
+def _random_date(rng: random.Random) -> date:
+    return date(2010, 1, 1) + timedelta(days=rng.randrange(5000))
+
+
+def _summary(timings: list[float]) -> str:
+    timings = sorted(timings)
+    return f"p50 {statistics.median(timings):>9.2f} ms  max {timings[-1]:>9.2f} ms"
+
+
+def run_offline(n_logs: int, inserts: int, seed: int):
+    """同じアルゴリズムを Python で実行し、1 件追加あたりの走査行数と時間を比較する"""
+    rng = random.Random(seed)
+    keys = sorted((_random_date(rng), i) for i in range(n_logs))
+
+    legacy_rows, splice_rows, legacy_ms, splice_ms = [], [], [], []
+    for k in range(inserts):
+        new = (_random_date(rng), n_logs + k)
+
+        # 旧実装: 全ログ n 行 × チェーン未接続ログ × 候補 prev の全走査
+        t0 = time.perf_counter()
+        rows = 0
+        for _ in keys:
+            rows += 1
+            best = None
+            for prev in keys:
+                rows += 1
+                if prev[0] <= new[0] and (best is None or prev > best):
+                    best = prev
+        legacy_ms.append((time.perf_counter() - t0) * 1000)
+        legacy_rows.append(rows)
+
+        # 差し込み: 直前のログを日付の範囲（CHAIN_SPLICE_WINDOW_DAYS 日）で引き、直後はチェーンの後続をたどる
+        # （Neo4j 側は範囲内のログ + 1 行。範囲内になければクライアントの ABOUT を展開する。Python 側は二分探索）
+        t0 = time.perf_counter()
+        pos = bisect.bisect_left(keys, new)
+        _prev, _next = keys[pos - 1] if pos else None, keys[pos] if pos < len(keys) else None
+        lower = bisect.bisect_left(keys, (new[0] - timedelta(days=CHAIN_SPLICE_WINDOW_DAYS),))
+        keys.insert(pos, new)
+        splice_ms.append((time.perf_counter() - t0) * 1000)
+        splice_rows.append(pos - lower + 1 if pos > lower else len(keys) - 1)
+
+    return (legacy_ms, statistics.mean(legacy_rows)), (splice_ms, statistics.mean(splice_rows))
+
+
+def run_live(n_logs: int, inserts: int, seed: int):
+    from lib.db_new_operations import run_in_transaction, run_query
+    from lib.support_log_chain import rebuild_client_chain, splice_support_logs
+
+    rng = random.Random(seed)
+    name = f"{BENCH_PREFIX}{uuid.uuid4().hex[:6]}"
+    run_query(SEED_QUERY, {"name": name, "logs": n_logs})
+    run_in_transaction(lambda tx: rebuild_client_chain(tx, name))
+
+    legacy_ms, splice_ms = [], []
+    try:
+        for _ in range(inserts):
+            log_date = _random_date(rng).isoformat()
+            run_query(INSERT_QUERY, {"name": name, "date": log_date})
+            t0 = time.perf_counter()
+            run_query(LEGACY_CHAIN_QUERY, {"name": name}, write=True)
+            legacy_ms.append((time.perf_counter() - t0) * 1000)
+
+            log_id = run_query(INSERT_QUERY, {"name": name, "date": log_date})[0]["id"]
+            t0 = time.perf_counter()
+            run_in_transaction(lambda tx: splice_support_logs(tx, [log_id]))
+            splice_ms.append((time.perf_counter() - t0) * 1000)
+    finally:
+        run_query(CLEANUP_QUERY, {"name": name})
+    return (legacy_ms, None), (splice_ms, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SupportLog 時系列チェーンの更新コストを比較")
+    parser.add_argument("--logs", type=int, default=5000, help="クライアントの既存ログ件数")
+    parser.add_argument("--inserts", type=int, default=20, help="追加するログ件数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--offline", action="store_true", help="Neo4j に接続せず計測")
+    args = parser.parse_args()
+
+    runner = run_offline if args.offline else run_live
+    (legacy, legacy_rows), (splice, splice_rows) = runner(args.logs, args.inserts, args.seed)
+
+    print(f"\nSupportLog 時系列チェーン ベンチマーク  logs={args.logs} inserts={args.inserts}"
+          + ("  (offline)" if args.offline else ""))
+    print(f"  {'─' * 64}")
+    for label, timings, rows in (("全件再構築", legacy, legacy_rows), ("差し込み", splice, splice_rows)):
+        print(f"  {label:<8} {_summary(timings)}" + (f"  走査 {rows:>12,.0f} 行/件" if rows else ""))
+    print(f"\n  速度比: {statistics.median(legacy) / max(statistics.median(splice), 1e-6):.0f} 倍\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+ベクトル書き込みのベンチマーク: ノードごとの setNodeVectorProperty vs write_vectors（UNWIND 一括）
+
+バックフィルと同じく 768 次元のベクトルを N 件書き込み、vectors/sec と往復回数を比較する。
+
+使用例:
+    # 実 Neo4j にベンチ用ノードを作成して計測（終了時に削除）
+    uv run python scripts/benchmarks/bench_vector_write.py --vectors 10000
+
+    # Neo4j なしで計測（1 往復あたりの遅延を --rtt-ms で擬似付与）
+    uv run python scripts/benchmarks/bench_vector_write.py --offline --vectors 10000 --rtt-ms 2
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BENCH_LABEL = "BenchVectorWrite"
+
+SEED_QUERY = f"""
+UNWIND range(1, $vectors) AS i
+CALL {{
+  WITH i
+  CREATE (n:{BENCH_LABEL} {{id: i}})
+}} IN TRANSACTIONS OF 10000 ROWS
+"""
+
+IDS_QUERY = f"MATCH (n:{BENCH_LABEL}) RETURN elementId(n) AS id ORDER BY n.id"
+
+RESET_QUERY = f"MATCH (n:{BENCH_LABEL}) REMOVE n.embedding"
+
+CLEANUP_QUERY = f"""
+MATCH (n:{BENCH_LABEL})
+CALL {{ WITH n DETACH DELETE n }} IN TRANSACTIONS OF 10000 ROWS
+"""
+
+# 変更前の書き込み（ノードごとに 1 往復・1 トランザクション）
+PER_NODE_QUERY = """
+MATCH (n) WHERE elementId(n) = $id
+CALL db.create.setNodeVectorProperty(n, 'embedding', $embedding)
+"""
+
+
+class OfflineRunner:
+    """run_query の代わり。1 回の呼び出しを 1 往復として数え、擬似遅延を入れる"""
+
+    def __init__(self, rtt_s: float):
+        self.rtt_s = rtt_s
+        self.round_trips = 0
+
+    def __call__(self, query, params=None):
+        self.round_trips += 1
+        time.sleep(self.rtt_s)
+        rows = (params or {}).get("rows")
+        return [{"written": len(rows)}] if rows is not None else []
+
+
+class CountingRunner:
+    """実 Neo4j の run_query を包んで往復回数を数える"""
+
+    def __init__(self, run_query):
+        self.run_query = run_query
+        self.round_trips = 0
+
+    def __call__(self, query, params=None):
+        self.round_trips += 1
+        return self.run_query(query, params)
+
+
+def _vectors(count: int, dimensions: int) -> list[list[float]]:
+    rng = random.Random(0)
+    return [[rng.uniform(-1, 1) for _ in range(dimensions)] for _ in range(count)]
+
+
+def run_mode(mode: str, ids: list[str], vectors: list[list[float]], runner, chunk_size: int) -> dict:
+    from lib.embedding import write_vectors
+
+    t0 = time.perf_counter()
+    if mode == "per-node":
+        for element_id, vector in zip(ids, vectors):
+            runner(PER_NODE_QUERY, {"id": element_id, "embedding": vector})
+        written = len(ids)
+    else:
+        written = write_vectors(
+            ((element_id, "embedding", vector) for element_id, vector in zip(ids, vectors)),
+            chunk_size=chunk_size, run_query=runner,
+        )
+    seconds = time.perf_counter() - t0
+    return {
+        "mode": mode,
+        "written": written,
+        "round_trips": runner.round_trips,
+        "seconds": round(seconds, 2),
+        "vectors_per_sec": round(written / seconds, 1) if seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ノードごとの書き込みと write_vectors の vectors/sec を比較")
+    parser.add_argument("--vectors", type=int, default=10_000, help="書き込むベクトル数")
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--chunk-size", type=int, default=500, help="write_vectors の 1 トランザクションの件数")
+    parser.add_argument("--offline", action="store_true", help="Neo4j なしで計測")
+    parser.add_argument("--rtt-ms", type=float, default=1.0, help="オフライン時の 1 往復あたりの擬似遅延 (ms)")
+    parser.add_argument("--keep", action="store_true", help="ベンチ用ノードを削除しない")
+    args = parser.parse_args()
+
+    vectors = _vectors(args.vectors, args.dimensions)
+
+    if args.offline:
+        ids = [f"offline:{i}" for i in range(args.vectors)]
+        make_runner = lambda: OfflineRunner(args.rtt_ms / 1000)  # noqa: E731
+    else:
+        from lib.db_new_operations import run_query
+        print(f"ベンチ用ノード {args.vectors:,} 件を作成中...")
+        run_query(SEED_QUERY, {"vectors": args.vectors})
+        ids = [row["id"] for row in run_query(IDS_QUERY)]
+        make_runner = lambda: CountingRunner(run_query)  # noqa: E731
+
+    try:
+        results = []
+        for mode in ("per-node", "bulk"):
+            if not args.offline:
+                run_query(RESET_QUERY)
+            results.append(run_mode(mode, ids, vectors, make_runner(), args.chunk_size))
+    finally:
+        if not args.offline and not args.keep:
+            run_query(CLEANUP_QUERY)
+
+    print(f"\n📊 {args.vectors:,} 件 × {args.dimensions} 次元の書き込み ({'offline' if args.offline else 'Neo4j'})")
+    print(f"  {'方式':<10} {'件数':>10} {'往復回数':>10} {'秒':>8} {'vectors/sec':>12}")
+    for r in results:
+        print(f"  {r['mode']:<10} {r['written']:>10,} {r['round_trips']:>10,} "
+              f"{r['seconds']:>8.2f} {r['vectors_per_sec']:>12,.1f}")
+    per_node, bulk = results
+    if per_node["vectors_per_sec"]:
+        print(f"\n  スループット: {bulk['vectors_per_sec'] / per_node['vectors_per_sec']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+スキーマ準備コマンド（lib/schema_bootstrap.py の手動実行）
+
+field-ui の起動時にも実行されるが、起動時は作成だけで ONLINE を待たない。
+初回セットアップやインデックス追加後に、ONLINE になるまで待って確認するのに使う。
+
+使用例:
+    uv run python scripts/bootstrap_schema.py              # 作成して ONLINE まで待つ
+    uv run python scripts/bootstrap_schema.py --dry-run    # 導出したインデックス・制約の一覧のみ
+    uv run python scripts/bootstrap_schema.py --wait 0     # ONLINE を待たない
+    uv run python scripts/bootstrap_schema.py --unique Supporter   # Client.name 以外にも一意性制約を付ける
+
+一意性制約は Client.name だけに付け、ほかの MERGE キーは RANGE インデックスにする。
+--unique はクライアントをまたいで値が一意であることを確かめたラベルにだけ使うこと
+（NgAction.action・KeyPerson.name・Certificate.type などはクライアントごとの値で、制約を付けると登録が失敗する）。
+
+終了コード: インデックスで引けない検索・ONLINE でないインデックス・作成エラーがあれば 1
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MERGE キー・テンプレート・ベクトル検索のインデックスと制約を作成")
+    parser.add_argument("--dry-run", action="store_true", help="導出結果を表示するだけで作成しない")
+    parser.add_argument("--wait", type=float, default=None, help="ONLINE 待ちの上限・秒")
+    parser.add_argument("--unique", action="append", default=[], metavar="LABEL",
+                        help="MERGE キーに一意性制約を付けるラベル（複数指定可。Client は常に付ける）")
+    args = parser.parse_args()
+
+    from lib.db_new_operations import MERGE_KEYS
+    from lib.embedding_generations import vector_index_definitions
+    from lib.schema_bootstrap import bootstrap_schema, derive_requirements
+
+    unknown = [label for label in args.unique if label not in MERGE_KEYS]
+    if unknown:
+        parser.error(f"MERGE_KEYS にないラベル: {', '.join(unknown)}")
+    requirements = derive_requirements(MERGE_KEYS, vector_index_definitions(), unique_labels=args.unique)
+    if args.dry_run:
+        for r in requirements:
+            print(f"  {r.kind:<7} {r.schema_name:<55} {r.label}({', '.join(r.properties)})  ← {r.source}")
+        return 0
+
+    report = bootstrap_schema(requirements=requirements, wait_seconds=args.wait)
+    print(json.dumps(report.as_dict(), ensure_ascii=False, indent=2))
+    return 1 if report.unbacked or report.not_online or report.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+ローカルの ANN 索引（lib/ann_index.py）の作成・差分更新スクリプト
+
+Neo4j から現行の Embedding の世代のベクトルを書き出し、ANN_INDEX_DIR に IVF-flat の索引を作る。
+2 回目以降は elementId とテキストのハッシュを照合し、新しい・テキストが変わったノードの追加と
+消えたノードの削除だけを行う。リスク・優先度やクライアントとの関係だけが変わった場合は
+ハッシュが変わらないため、--rebuild で作り直す。
+
+作った索引は VECTOR_SEARCH_BACKEND=local / auto の検索と
+scripts/check_weight_consistency.py --backend local が使う。
+現行の世代（lib/embedding_generations.py）は ANN_INDEX_DIR/generation.json に記録し、
+Neo4j に問い合わせない local の検索はこの世代のモデル・インデックスを使う。
+
+使用例:
+    uv run python scripts/build_ann_index.py --all
+    uv run python scripts/build_ann_index.py --index support_log_embedding
+    uv run python scripts/build_ann_index.py --all --rebuild --nlist 256
+    uv run python scripts/build_ann_index.py --all --dir /mnt/offline/ann
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加（scripts/ から実行する場合）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def main():
+    from lib.ann_index import EXPORT_SPECS, index_dir, sync_index
+
+    parser = argparse.ArgumentParser(description="Neo4j のベクトルからローカルの ANN 索引を作る・更新する")
+    parser.add_argument("--all", action="store_true", help="すべてのベクトルインデックスを処理")
+    parser.add_argument("--index", action="append", choices=sorted(EXPORT_SPECS),
+                        help="処理するインデックス（複数指定可）")
+    parser.add_argument("--rebuild", action="store_true", help="差分ではなく全件を書き出して作り直す")
+    parser.add_argument("--nlist", type=int, default=None,
+                        help="作り直すときのリスト数（デフォルト: 件数の平方根）")
+    parser.add_argument("--dir", type=str, default=None,
+                        help="索引の保存先（デフォルト: ANN_INDEX_DIR または ~/.cache/nest-support/ann）")
+    args = parser.parse_args()
+
+    if not args.all and not args.index:
+        parser.print_help()
+        print("\n--all または --index を指定してください。")
+        return 1
+
+    names = sorted(EXPORT_SPECS) if args.all else args.index
+    print(f"\n🗂  ローカル索引の{'作り直し' if args.rebuild else '同期'}: {args.dir or index_dir()}")
+    failed = 0
+    for name in names:
+        try:
+            result = sync_index(name, rebuild=args.rebuild, nlist=args.nlist, directory=args.dir)
+        except Exception as e:
+            print(f"  ❌ {name}: {e}")
+            failed += 1
+            continue
+        print(f"  ✅ {result['index']}: {result['mode']}  +{result['added']} / -{result['removed']}"
+              f"  （計 {result['total']} 件）")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    from lib.workload import workload
+
+    # 緊急照会の間は一時停止する低優先度のレーンで実行する
+    with workload("batch"):
+        sys.exit(main())
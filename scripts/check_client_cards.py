@@ -0,0 +1,102 @@
+"""
+マテリアライズドカード整合性チェッカー / 再構築コマンド
+
+Client ノードに保存されたクライアントカード（cardJson）と、グラフから
+ライブに組み立てたカードを比較し、食い違いを報告する。
+登録経路（register_to_database など）を通らない書き込み（MCP からの直接 Cypher、
+手作業の修正など）はカードに反映されないため、定期的に実行して修復する。
+
+使用例:
+    uv run python scripts/check_client_cards.py                      # 全クライアントを検査
+    uv run python scripts/check_client_cards.py --client "山田健太"   # 1 名のみ
+    uv run python scripts/check_client_cards.py --repair             # 食い違いのあるカードを再計算
+    uv run python scripts/check_client_cards.py --rebuild-all        # 全クライアントのカードを再計算
+
+終了コード: 食い違いが残っていれば 1（--repair / --rebuild-all 後は 0）
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CLIENTS_QUERY = """
+MATCH (c:Client)
+WHERE $name IS NULL OR c.name = $name
+RETURN c.name AS name, c.cardJson AS cardJson, c.cardVersion AS cardVersion
+ORDER BY c.name
+"""
+
+
+def log(message: str, level: str = "INFO"):
+    prefix = {"INFO": "  ", "OK": "  ✅", "WARN": "  ⚠️", "ERROR": "  ❌"}
+    sys.stderr.write(f"{prefix.get(level, '  ')} {message}\n")
+    sys.stderr.flush()
+
+
+def check_client(row: dict) -> list[str]:
+    """1 クライアント分を検査し、問題の説明を返す（問題なしなら空リスト）"""
+    from lib.client_card import CARD_LOG_LIMIT, CARD_VERSION, card_from_json, compare_cards, fetch_client_card
+    from lib.db_new_operations import run_query
+
+    if not row["cardJson"]:
+        return ["カード未作成"]
+    if row["cardVersion"] != CARD_VERSION:
+        return [f"カード形式が古い (v{row['cardVersion']} → v{CARD_VERSION})"]
+    live = fetch_client_card(run_query, row["name"], log_limit=CARD_LOG_LIMIT)
+    diff = compare_cards(card_from_json(row["cardJson"]), live)
+    return [f"不一致: {', '.join(diff)}"] if diff else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="マテリアライズドカードの整合性チェック・再構築")
+    parser.add_argument("--client", help="対象クライアント名（省略時は全員）")
+    parser.add_argument("--repair", action="store_true", help="食い違いのあるカードを再計算する")
+    parser.add_argument("--rebuild-all", action="store_true", help="検査せずに全カードを再計算する")
+    args = parser.parse_args()
+
+    from lib.db_new_operations import refresh_client_card, run_query
+
+    rows = run_query(CLIENTS_QUERY, {"name": args.client})
+    if not rows:
+        log("対象のクライアントがいません", "WARN")
+        return 0
+
+    t0 = time.perf_counter()
+    if args.rebuild_all:
+        rebuilt = sum(1 for row in rows if refresh_client_card(row["name"]) is not None)
+        log(f"{rebuilt} / {len(rows)} 件のカードを再計算しました ({time.perf_counter() - t0:.1f} 秒)", "OK")
+        return 0 if rebuilt == len(rows) else 1
+
+    problems = {}
+    for row in rows:
+        issues = check_client(row)
+        if issues:
+            problems[row["name"]] = issues
+
+    print(f"\n📋 クライアントカード整合性チェック: {len(rows)} 件中 {len(problems)} 件に問題"
+          f" ({time.perf_counter() - t0:.1f} 秒)")
+    for name, issues in problems.items():
+        print(f"  - {name}: {'; '.join(issues)}")
+    if not problems:
+        log("すべてのカードがグラフと一致しています", "OK")
+        return 0
+
+    if args.repair:
+        failed = [name for name in problems if refresh_client_card(name) is None]
+        if failed:
+            log(f"再計算に失敗: {', '.join(failed)}", "ERROR")
+            return 1
+        log(f"{len(problems)} 件のカードを再計算しました", "OK")
+        return 0
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,7 @@ Usage:
     uv run python scripts/check_weight_consistency.py --only ng
     uv run python scripts/check_weight_consistency.py --only cp
     uv run python scripts/check_weight_consistency.py --client "テスト太郎"
+    uv run python scripts/check_weight_consistency.py --backend local   # Neo4j なしでローカルの索引から
 
 前提:
     - Neo4j 起動中 (bolt://localhost:7687)
@@ -17,18 +18,25 @@ Usage:
       未付与の場合:
           uv run python scripts/backfill_embeddings.py --label NgAction
           uv run python scripts/backfill_embeddings.py --label CarePreference
+    - --backend local の場合は Neo4j の代わりにローカルの ANN 索引（lib/ann_index.py）が必要
+          uv run python scripts/build_ann_index.py --index ng_action_embedding --index care_preference_embedding
 """
 from __future__ import annotations
 
 import argparse
 import sys
+from array import array
 from pathlib import Path
+from typing import NamedTuple
 
+import numpy as np
 from neo4j import GraphDatabase
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from lib.embedding import cosine_similarity
+from lib.db_runtime import stream_query
+from lib.embedding_generations import active_generation
+from lib.similarity import pairs_above, to_matrix
 
 URI = "bolt://localhost:7687"
 AUTH = ("neo4j", "password")
@@ -38,65 +46,94 @@ RISK_ORDER = {"LifeThreatening": 3, "Panic": 2, "Discomfort": 1}
 PRIORITY_ORDER = {"High": 3, "Medium": 2, "Low": 1}
 
 
+class WeightNode(NamedTuple):
+    id: str
+    weight: str | None
+    text: str | None
+    client: str | None
+
+
 def fetch_nodes_with_embedding(
-    session, label: str, weight_prop: str, client_filter: str | None
-) -> list[dict]:
+    driver, label: str, weight_prop: str, client_filter: str | None
+) -> tuple[list[WeightNode], np.ndarray]:
     """
     指定ラベルのノードのうち embedding を持つものを取得。
-    client_filter が指定されたとき、そのクライアントに紐づくもののみ対象。
+    client_filter（完全一致の氏名）が指定されたとき、そのクライアントに紐づくもののみ対象。
+
+    全ペアの比較のため embedding はすべて保持するが、結果はストリーミングで受け取り、
+    1 件ずつ float32 の配列に詰め替える（全件の dict のリストを経由しない）。
+    ベクトルは nodes と同じ順の正規化済み行列（lib/similarity.py）にして返す。
     """
     rel = "MUST_AVOID" if label == "NgAction" else "REQUIRES"
-    if client_filter:
-        query = f"""
-        MATCH (c:Client)-[:{rel}]->(n:{label})
-        WHERE n.embedding IS NOT NULL AND c.name CONTAINS $name
-        RETURN elementId(n) AS id, n.embedding AS emb,
-               n[$wp] AS weight,
-               coalesce(n.action, n.instruction) AS text,
-               c.name AS client
-        """
-    else:
-        query = f"""
-        MATCH (c:Client)-[:{rel}]->(n:{label})
-        WHERE n.embedding IS NOT NULL
-        RETURN elementId(n) AS id, n.embedding AS emb,
-               n[$wp] AS weight,
-               coalesce(n.action, n.instruction) AS text,
-               c.name AS client
-        """
-    result = []
-    for r in session.run(query, wp=weight_prop, name=client_filter or ""):
-        result.append({
-            "id": r["id"],
-            "emb": r["emb"],
-            "weight": r["weight"],
-            "text": r["text"],
-            "client": r["client"],
-        })
-    return result
+    client_pattern = "(c:Client {name: $name})" if client_filter else "(c:Client)"
+    query = f"""
+    MATCH {client_pattern}-[:{rel}]->(n:{label})
+    WHERE n[$vp] IS NOT NULL
+    RETURN elementId(n) AS id, n[$vp] AS emb,
+           n[$wp] AS weight,
+           coalesce(n.action, n.instruction) AS text,
+           c.name AS client
+    """
+    # ベクトルは現行の Embedding の世代のプロパティ（lib/embedding_generations.py）から読む
+    vector_prop = active_generation().property_for("embedding")
+    params = {"vp": vector_prop, "wp": weight_prop, "name": client_filter or ""}
+    nodes, vectors = [], []
+    for node_id, emb, weight, text, client in stream_query(driver, query, params, row_type=tuple):
+        nodes.append(WeightNode(node_id, weight, text, client))
+        vectors.append(array("f", emb))
+    return nodes, to_matrix(vectors)
+
+
+# ラベルごとのローカル索引（lib/ann_index.py）と、payload の本文のキー
+LOCAL_INDEXES = {
+    "NgAction": ("ng_action_embedding", "action"),
+    "CarePreference": ("care_preference_embedding", "instruction"),
+}
+
+
+def fetch_nodes_from_local_index(
+    label: str, weight_prop: str, client_filter: str | None
+) -> tuple[list[WeightNode], np.ndarray]:
+    """
+    fetch_nodes_with_embedding と同じ (nodes, matrix) をローカルの ANN 索引から作る（Neo4j に接続しない）。
+    Neo4j の結果と同じく、複数のクライアントに紐づくノードはクライアントごとに 1 行にする。
+    """
+    from lib.ann_index import get_local_index, load_local_generation
+
+    index_name, text_key = LOCAL_INDEXES[label]
+    # 索引を作った世代（generation.json）。なければ現行の世代
+    name = (load_local_generation() or active_generation()).index_for(index_name)
+    index = get_local_index(name)
+    if index is None:
+        print(f"\n{label}: ローカルの索引がありません（scripts/build_ann_index.py --index {index_name}）")
+        return [], to_matrix([])
+    ids, payloads, vectors = index.rows(client_filter)
+    nodes, rows = [], []
+    for row, (node_id, payload) in enumerate(zip(ids, payloads)):
+        for client in [client_filter] if client_filter else index.clients_of(node_id):
+            nodes.append(WeightNode(node_id, payload.get(weight_prop), payload.get(text_key), client))
+            rows.append(row)
+    return nodes, vectors[rows]
 
 
 def find_inconsistent_pairs(
-    nodes: list[dict], threshold: float, weight_order: dict[str, int]
+    nodes: list[WeightNode], matrix: np.ndarray, threshold: float, weight_order: dict[str, int]
 ) -> list[tuple]:
     """
     ノード群から類似ペアを抽出し、weight が異なるものを返す。
+    matrix は nodes と同じ順の正規化済みベクトル（fetch_nodes_with_embedding の戻り値）。
     戻り値: (similarity, node_a, node_b, gap) のリスト。gap は順序段差。
+
+    weight のないノードはペアにならないので先に除き、残りの全ペアをブロック単位の行列積で比べる。
     """
+    weighted = [i for i, node in enumerate(nodes) if node.weight is not None]
     pairs: list[tuple] = []
-    for i in range(len(nodes)):
-        for j in range(i + 1, len(nodes)):
-            a, b = nodes[i], nodes[j]
-            sim = cosine_similarity(a["emb"], b["emb"])
-            if sim < threshold:
-                continue
-            wa, wb = a["weight"], b["weight"]
-            if wa is None or wb is None:
-                continue
-            if wa == wb:
-                continue
-            gap = abs(weight_order.get(wa, 0) - weight_order.get(wb, 0))
-            pairs.append((sim, a, b, gap))
+    for i, j, sim in pairs_above(matrix[weighted], threshold):
+        a, b = nodes[weighted[i]], nodes[weighted[j]]
+        if a.weight == b.weight:
+            continue
+        gap = abs(weight_order.get(a.weight, 0) - weight_order.get(b.weight, 0))
+        pairs.append((sim, a, b, gap))
     # 重大度順: gap 降順 → sim 降順
     pairs.sort(key=lambda x: (-x[3], -x[0]))
     return pairs
@@ -121,15 +158,15 @@ def print_report(
         print(f"\n  🔴 重大（段差 ≥ 2）: {len(critical)} 件")
         for sim, a, b, gap in critical:
             print(f"\n  類似度 {sim:.3f}  (段差 {gap})")
-            print(f"    [{a['weight']:15s}] {a['text']}  ({a['client']})")
-            print(f"    [{b['weight']:15s}] {b['text']}  ({b['client']})")
+            print(f"    [{a.weight:15s}] {a.text}  ({a.client})")
+            print(f"    [{b.weight:15s}] {b.text}  ({b.client})")
 
     if warning:
         print(f"\n  🟡 要確認（段差 1）: {len(warning)} 件")
         for sim, a, b, gap in warning:
             print(f"\n  類似度 {sim:.3f}")
-            print(f"    [{a['weight']:15s}] {a['text']}  ({a['client']})")
-            print(f"    [{b['weight']:15s}] {b['text']}  ({b['client']})")
+            print(f"    [{a.weight:15s}] {a.text}  ({a.client})")
+            print(f"    [{b.weight:15s}] {b.text}  ({b.client})")
 
 
 def main() -> int:
@@ -142,6 +179,8 @@ def main() -> int:
                         help="ng: NgAction のみ / cp: CarePreference のみ")
     parser.add_argument("--client", type=str, default=None,
                         help="特定クライアントに関連する重みだけをチェック")
+    parser.add_argument("--backend", choices=["neo4j", "local"], default="neo4j",
+                        help="ベクトルの読み込み元 (local: ローカルの ANN 索引。default: neo4j)")
     args = parser.parse_args()
 
     targets: list[tuple[str, str, str, dict]] = []
@@ -150,23 +189,35 @@ def main() -> int:
     if args.only in (None, "cp"):
         targets.append(("CarePreference", "priority", "priority", PRIORITY_ORDER))
 
+    if args.client and args.backend == "neo4j":
+        # 識別子（通称・ふりがな・clientId など）を完全一致の氏名に解決してから絞り込む
+        from lib.db_new_operations import resolve_client_name
+        args.client = resolve_client_name(args.client)
+
     print(f"\n重み横断一貫性チェック  threshold={args.threshold}"
           + (f"  client={args.client}" if args.client else ""))
 
-    driver = GraphDatabase.driver(URI, auth=AUTH)
+    driver = GraphDatabase.driver(URI, auth=AUTH) if args.backend == "neo4j" else None
     try:
-        with driver.session() as s:
-            for label, weight_prop, weight_label, order in targets:
-                nodes = fetch_nodes_with_embedding(s, label, weight_prop, args.client)
-                if not nodes:
-                    print(f"\n{label}: 対象ノードなし（embedding 未付与の可能性あり）")
-                    continue
-                pairs = find_inconsistent_pairs(nodes, args.threshold, order)
-                print_report(label, weight_label, pairs, len(nodes))
+        for label, weight_prop, weight_label, order in targets:
+            if driver is None:
+                nodes, matrix = fetch_nodes_from_local_index(label, weight_prop, args.client)
+            else:
+                nodes, matrix = fetch_nodes_with_embedding(driver, label, weight_prop, args.client)
+            if not nodes:
+                print(f"\n{label}: 対象ノードなし（embedding 未付与の可能性あり）")
+                continue
+            pairs = find_inconsistent_pairs(nodes, matrix, args.threshold, order)
+            print_report(label, weight_label, pairs, len(nodes))
     finally:
-        driver.close()
+        if driver is not None:
+            driver.close()
     return 0
 
 
 if __name__ == "__main__":
-    sys.exit(main())
+    from lib.workload import workload
+
+    # 緊急照会の間は一時停止する低優先度のレーンで実行する
+    with workload("batch"):
+        sys.exit(main())
@@ -5,8 +5,7 @@ URI = "bolt://localhost:7687"
 AUTH = ("neo4j", "password")
 
 TEMPLATE_2_PROFILE = """
-MATCH (c:Client)
-WHERE c.name CONTAINS $clientName
+MATCH (c:Client {name: $clientName})
 OPTIONAL MATCH (c)-[:HAS_HISTORY]->(h:LifeHistory)
 OPTIONAL MATCH (c)-[:HAS_WISH]->(w:Wish)
 OPTIONAL MATCH (c)-[:HAS_CONDITION]->(con:Condition)
@@ -33,8 +32,7 @@ RETURN
 """
 
 TEMPLATE_5_SUPPORTLOG = """
-MATCH (s:Supporter)-[:LOGGED]->(log:SupportLog)-[:ABOUT]->(c:Client)
-WHERE c.name CONTAINS $clientName
+MATCH (s:Supporter)-[:LOGGED]->(log:SupportLog)-[:ABOUT]->(c:Client {name: $clientName})
 RETURN log.date AS date, s.name AS supporter, log.situation AS sit,
        log.action AS action, log.effectiveness AS eff, log.note AS note
 ORDER BY log.date DESC LIMIT 10
@@ -42,7 +40,7 @@ ORDER BY log.date DESC LIMIT 10
 
 TEMPLATE_7_AUDIT = """
 MATCH (al:AuditLog)
-WHERE al.clientName CONTAINS $clientName
+WHERE al.clientName = $clientName
 RETURN al.timestamp AS ts, al.user AS user, al.action AS action,
        al.targetType AS ttype, al.targetName AS tname, al.details AS details
 ORDER BY al.timestamp DESC LIMIT 5
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Embedding のモデル・次元数の無停止移行スクリプト
+
+シャドウのプロパティ・ベクトルインデックスに新しいモデルで埋め込み、recall@k を確かめてから
+検索を切り替える。切り替えまでの間も、現行のインデックスでの検索は止まらない（lib/embedding_generations.py）。
+
+使い方:
+  # 1. シャドウの世代を登録（以後の登録は現行・シャドウの両方に書き込まれる）
+  uv run python scripts/migrate_embedding_model.py start --model gemini-embedding-2 --dimensions 1536
+
+  # 2. 既存ノードのシャドウ側を埋める（チェックポイントから再開できる。音声は --audio で含める）
+  uv run python scripts/migrate_embedding_model.py backfill --workers 4
+
+  # 進み具合（インデックスごとのシャドウ側の未付与数）
+  uv run python scripts/migrate_embedding_model.py status
+
+  # 3. recall@k の比較（クエリ集合を省略すると既知項目の検索で評価する）
+  uv run python scripts/migrate_embedding_model.py evaluate --k 10
+  uv run python scripts/migrate_embedding_model.py evaluate --queries held_out.jsonl
+
+  # 4. 切り替え（未付与がなく、recall が現行の 95% 以上のときだけ）
+  uv run python scripts/migrate_embedding_model.py switch
+
+  # 切り替えの取り消し（drop の前まで）
+  uv run python scripts/migrate_embedding_model.py rollback
+
+  # 5. 旧世代のインデックスとプロパティを削除
+  uv run python scripts/migrate_embedding_model.py drop
+
+  # シャドウの破棄（switch の前まで）
+  uv run python scripts/migrate_embedding_model.py abort
+
+held_out.jsonl は 1 行に 1 つ {"index": "support_log_embedding", "query": "...", "relevant": ["<elementId>", ...]}。
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 既定で埋めるラベル（MeetingRecordAudio は音声ファイルを読み直すため --audio のときだけ）
+BACKFILL_LABELS = ["SupportLog", "NgAction", "CarePreference", "Client", "MeetingRecord"]
+
+
+def _print(result):
+    print(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+
+
+def _load_queries(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def cmd_start(args):
+    from lib.embedding_generations import start_migration
+
+    state = start_migration(args.model, args.dimensions)
+    print(f"シャドウ {state.shadow} を登録しました。次は backfill でシャドウ側を埋めてください。")
+
+
+def cmd_status(args):
+    from lib.embedding_generations import migration_status
+
+    _print(migration_status())
+
+
+def cmd_backfill(args):
+    from lib.backfill import label_specs, run_backfill
+    from lib.embedding_generations import load_generation_state
+
+    state = load_generation_state()
+    if state.shadow is None:
+        print("シャドウの世代がありません（start が先）")
+        return 1
+    specs = label_specs(state.shadow)
+    labels = BACKFILL_LABELS + (["MeetingRecordAudio"] if args.audio else [])
+    for label in labels:
+        print(f"\n--- {label} → {specs[label].property} ---")
+        result = run_backfill(
+            specs[label], batch_size=args.batch_size, workers=args.workers,
+            checkpoint_dir=args.checkpoint_dir, restart=args.restart,
+        )
+        print(f"  {result['success']}/{result['processed']} 成功, {result['failed']} 失敗"
+              f"（チェックポイント: {result['checkpoint']}）")
+    return 0
+
+
+def cmd_evaluate(args):
+    from lib.embedding_generations import evaluate_recall, held_out_queries
+
+    queries = _load_queries(args.queries) if args.queries else held_out_queries(args.sample)
+    if not queries:
+        print("評価に使うクエリがありません")
+        return 1
+    report = evaluate_recall(queries, k=args.k)
+    _print(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+def cmd_switch(args):
+    from lib.embedding_generations import evaluate_recall, held_out_queries, switch_generation
+
+    report = None
+    if not args.force:
+        if args.report:
+            report = json.loads(Path(args.report).read_text(encoding="utf-8"))
+        else:
+            queries = _load_queries(args.queries) if args.queries else held_out_queries(args.sample)
+            report = evaluate_recall(queries, k=args.k)
+        print(f"recall@{report['k']}: 現行 {report['recall_current']} / シャドウ {report['recall_candidate']}")
+    state = switch_generation(report, min_recall_ratio=args.min_recall_ratio, force=args.force)
+    print(f"現行の世代を {state.active} に切り替えました。旧世代 {state.retired} は drop で削除できます。")
+    return 0
+
+
+def cmd_rollback(args):
+    from lib.embedding_generations import rollback_generation
+
+    state = rollback_generation()
+    print(f"現行の世代を {state.active} に戻しました（{state.shadow} はシャドウに戻りました）")
+
+
+def cmd_drop(args):
+    from lib.embedding_generations import drop_retired
+
+    drop_retired()
+    print("旧世代のインデックスとプロパティを削除しました")
+
+
+def cmd_abort(args):
+    from lib.embedding_generations import abort_migration
+
+    abort_migration()
+    print("シャドウの世代を破棄しました")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding のモデル・次元数をシャドウインデックスで無停止に移行する")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("start", help="シャドウの世代を登録し、シャドウのインデックスを作る")
+    p.add_argument("--model", required=True, help="新しい Embedding モデル名")
+    p.add_argument("--dimensions", type=int, required=True, help="新しい出力次元数（768 / 1536 / 3072）")
+    p.set_defaults(func=cmd_start)
+
+    p = sub.add_parser("status", help="インデックスごとの付与状況")
+    p.set_defaults(func=cmd_status)
+
+    p = sub.add_parser("backfill", help="既存ノードのシャドウ側を埋める（チェックポイントから再開できる）")
+    p.add_argument("--batch-size", type=int, default=20)
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--checkpoint-dir", type=str, default=None)
+    p.add_argument("--restart", action="store_true", help="チェックポイントを捨てて最初から処理する")
+    p.add_argument("--audio", action="store_true", help="面談記録の音声 Embedding も埋める（音声ファイルが必要）")
+    p.set_defaults(func=cmd_backfill)
+
+    for name, func, help_text in (
+        ("evaluate", cmd_evaluate, "現行とシャドウの recall@k を比べる"),
+        ("switch", cmd_switch, "シャドウを現行に切り替える"),
+    ):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--k", type=int, default=10)
+        p.add_argument("--queries", type=str, default=None, help="検証用クエリ集合（JSONL）")
+        p.add_argument("--sample", type=int, default=50, help="クエリ集合を省略したときのインデックスあたりの件数")
+        p.set_defaults(func=func)
+    sub.choices["evaluate"].add_argument("--output", type=str, default=None, help="評価結果の保存先（JSON）")
+    sub.choices["switch"].add_argument("--report", type=str, default=None, help="evaluate --output の結果を使う")
+    sub.choices["switch"].add_argument("--min-recall-ratio", type=float, default=0.95,
+                                       help="シャドウの recall に求める現行比（デフォルト: 0.95）")
+    sub.choices["switch"].add_argument("--force", action="store_true", help="未付与・recall を確かめずに切り替える")
+
+    for name, func, help_text in (
+        ("rollback", cmd_rollback, "切り替えを取り消す（drop の前まで）"),
+        ("drop", cmd_drop, "旧世代のインデックスとプロパティを削除する"),
+        ("abort", cmd_abort, "シャドウの世代を破棄する（switch の前まで）"),
+    ):
+        sub.add_parser(name, help=help_text).set_defaults(func=func)
+
+    args = parser.parse_args()
+
+    from lib.embedding_generations import GenerationConflictError
+
+    try:
+        return args.func(args) or 0
+    except GenerationConflictError as e:
+        print(f"中止しました: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    from lib.workload import workload
+
+    # バックフィル・評価は低優先度のレーンで実行する
+    with workload("batch"):
+        sys.exit(main())
@@ -387,6 +387,7 @@ INDEXES_TO_CREATE = [
     ("idx_carepreference_category", "CarePreference", "category"),
     # 日付ベースのクエリ高速化
     ("idx_supportlog_date", "SupportLog", "date"),
+    ("idx_meetingrecord_date", "MeetingRecord", "date"),
     ("idx_certificate_renewal", "Certificate", "nextRenewalDate"),
     # 監査ログクエリ高速化
     ("idx_auditlog_timestamp", "AuditLog", "timestamp"),
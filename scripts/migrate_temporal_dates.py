@@ -0,0 +1,150 @@
+"""
+日付プロパティの型移行コマンド（文字列 → Neo4j の DATE 型）
+
+登録経路（lib/schema_validator.py normalize_dates）では日付を DATE 型に揃えて保存するが、
+それ以前のデータや MCP からの直接 Cypher で書き込まれたデータには
+'2024-01-15' や '令和6年1月15日' のような文字列のまま残っているものがある。
+文字列と DATE の比較は常に null になるため、`log.date >= date() - duration({days: 7})` の
+ような期間検索から漏れ、インデックスシークにもならない。
+
+データベース上の文字列の日付プロパティ（date / dob / *Date）を検出し、
+プロパティごとに 1 回の走査で elementId 順にストリーミングで読み出して Python 側で解釈（和暦を含む）、
+バッチごとに書き戻す。解釈できない値は変更せずに一覧で報告する。
+
+計算量: ラベルの走査はプロパティごとに 1 回（以前のようにページごとに走査し直さない）。
+読み出しのストリームと書き戻しは別の接続を使うため、バッチレーンの枠を 2 つ使う。
+
+使用例:
+    uv run python scripts/migrate_temporal_dates.py --dry-run     # 件数と解釈できない値の確認のみ
+    uv run python scripts/migrate_temporal_dates.py               # 移行を実行
+    uv run python scripts/migrate_temporal_dates.py --label SupportLog --batch 500
+
+移行後は SupportLog の時系列チェーンを scripts/repair_support_log_chains.py で再構築すること
+（文字列の日付で並べられていたチェーンが日付順になっていない可能性があるため）。
+
+終了コード: 解釈できない値があれば 1
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 文字列の値を持つノードプロパティ（型情報はデータのサンプリングに基づく）
+STRING_PROPERTIES_QUERY = """
+CALL db.schema.nodeTypeProperties()
+YIELD nodeLabels, propertyName, propertyTypes
+WHERE size(nodeLabels) = 1 AND 'String' IN propertyTypes
+RETURN nodeLabels[0] AS label, propertyName AS property
+ORDER BY label, property
+"""
+
+
+def log(message: str, level: str = "INFO"):
+    prefix = {"INFO": "  ", "OK": "  ✅", "WARN": "  ⚠️", "ERROR": "  ❌"}
+    sys.stderr.write(f"{prefix.get(level, '  ')} {message}\n")
+    sys.stderr.flush()
+
+
+def read_query(label: str, prop: str) -> str:
+    return f"""
+MATCH (n:`{label}`)
+WHERE n.`{prop}` IS :: STRING
+RETURN elementId(n) AS id, n.`{prop}` AS value
+ORDER BY id
+"""
+
+
+def write_batch_query(prop: str) -> str:
+    return f"""
+UNWIND $rows AS row
+MATCH (n) WHERE elementId(n) = row.id
+SET n.`{prop}` = CASE WHEN row.value IS NULL THEN null ELSE date(row.value) END
+"""
+
+
+def migrate_property(run_query, iter_query, label: str, prop: str, batch: int, dry_run: bool):
+    """
+    1 プロパティ分を移行する。
+
+    Returns:
+        (変換した件数, 解釈できなかった値のリスト)
+    """
+    from lib.schema_validator import coerce_date_value
+
+    converted, unparsed = 0, []
+    updates = []
+
+    def flush():
+        nonlocal converted, updates
+        if updates and not dry_run:
+            run_query(write_batch_query(prop), {"rows": updates}, write=True)
+        converted += len(updates)
+        updates = []
+
+    for element_id, raw in iter_query(read_query(label, prop), row_type=tuple):
+        if not str(raw).strip():
+            updates.append({"id": element_id, "value": None})
+        else:
+            value, ok = coerce_date_value(raw)
+            if ok:
+                updates.append({"id": element_id, "value": value.isoformat()})
+            else:
+                unparsed.append(raw)
+        if len(updates) >= batch:
+            flush()
+    flush()
+    return converted, unparsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文字列の日付プロパティを DATE 型に移行")
+    parser.add_argument("--dry-run", action="store_true", help="件数と解釈できない値を表示するだけで書き込まない")
+    parser.add_argument("--label", help="対象ラベル（省略時はすべて）")
+    parser.add_argument("--batch", type=int, default=1000, help="1 トランザクションで書き戻す件数")
+    args = parser.parse_args()
+
+    from lib.db_new_operations import iter_query, run_query
+    from lib.schema_validator import is_date_property
+
+    targets = [
+        (row["label"], row["property"])
+        for row in run_query(STRING_PROPERTIES_QUERY)
+        if is_date_property(row["property"]) and (not args.label or row["label"] == args.label)
+    ]
+    if not targets:
+        log("文字列の日付プロパティはありません", "OK")
+        return 0
+
+    t0 = time.perf_counter()
+    total, failures = 0, 0
+    for label, prop in targets:
+        converted, unparsed = migrate_property(run_query, iter_query, label, prop, args.batch, args.dry_run)
+        total += converted
+        failures += len(unparsed)
+        log(f"{label}.{prop}: {'変換対象' if args.dry_run else '変換'} {converted} 件")
+        for value in unparsed[:10]:
+            log(f"{label}.{prop}: 日付として解釈できない値 {value!r}", "WARN")
+        if len(unparsed) > 10:
+            log(f"{label}.{prop}: ほか {len(unparsed) - 10} 件", "WARN")
+
+    summary = f"{total} 件が変換対象です" if args.dry_run else f"{total} 件を変換しました"
+    log(f"{len(targets)} プロパティ, {summary} ({time.perf_counter() - t0:.1f} 秒)", "OK")
+    if failures:
+        log(f"解釈できない値が {failures} 件あります（手動で修正してください）", "ERROR")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    from lib.workload import workload
+
+    # 緊急照会の間は一時停止する低優先度のレーンで実行する
+    with workload("batch"):
+        sys.exit(main())
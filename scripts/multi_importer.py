@@ -126,7 +126,8 @@ def structurize_with_gemini(
     グラフデータを生成する。
     """
     try:
-        from lib.embedding import get_genai_client
+        from lib.deadline import check
+        from lib.embedding import gemini_http_options, get_genai_client
     except ImportError:
         _log("lib.embedding が利用できません", "ERROR")
         return None
@@ -152,10 +153,14 @@ def structurize_with_gemini(
 
     full_prompt = extraction_prompt + context_info + f"\n\n--- 以下のテキストを構造化してください ---\n\n{text}"
 
+    from google.genai import types
+
+    http_options = gemini_http_options("structurize_with_gemini")
     try:
         response = client.models.generate_content(
             model="gemini-2.0-flash",
             contents=[full_prompt],
+            config=types.GenerateContentConfig(http_options=http_options),
         )
         response_text = response.text.strip()
 
@@ -176,6 +181,7 @@ def structurize_with_gemini(
         _log(f"レスポンス先頭200文字: {response_text[:200]}", "DEBUG")
         return None
     except Exception as e:
+        check("structurize_with_gemini")  # デッドラインによるタイムアウトなら DeadlineExceeded
         _log(f"Gemini 構造化エラー: {e}", "ERROR")
         return None
 
@@ -0,0 +1,135 @@
+"""
+Skill の Cypher テンプレート PROFILE ハーネス
+
+すべてのテンプレート（lib/template_profile.py collect_templates）に代表パラメータを割り当てて
+PROFILE し、db hits・行数・ページキャッシュのヒット／ミス・経過時間を記録する。
+ベースライン（JSON）と比較して db hits が悪化したテンプレートと、
+ホットなラベルの NodeByLabelScan / AllNodesScan を含むテンプレートを報告する。
+ベースラインのスキャンが NodeIndexSeek などに置き換わったテンプレートは改善として表示する。
+
+各テンプレートは明示トランザクション内で実行し、必ずロールバックする（書き込みを含むテンプレートも安全）。
+計測はデモデータ（installer/demo-data.cypher）などを投入済みのデータベースで行うこと。
+
+使用例:
+    uv run python scripts/profile_templates.py --list                    # 対象テンプレートとパラメータの一覧
+    uv run python scripts/profile_templates.py --update-baseline         # ベースラインを作成・更新
+    uv run python scripts/profile_templates.py                           # ベースラインと比較
+    uv run python scripts/profile_templates.py --only visit-prep --fail-on-scan
+
+終了コード: 悪化（db hits の増加・新たな全件スキャン・実行エラー）があれば 1
+          （--fail-on-scan ならホットなラベルの全件スキャンがあるだけで 1）
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "benchmarks" / "template_profile_baseline.json"
+
+
+def log(message: str, level: str = "INFO"):
+    prefix = {"INFO": "  ", "OK": "  ✅", "WARN": "  ⚠️", "ERROR": "  ❌"}
+    sys.stderr.write(f"{prefix.get(level, '  ')} {message}\n")
+    sys.stderr.flush()
+
+
+def profile_template(driver, template, params):
+    """PROFILE を実行してロールバックし、集計結果を返す"""
+    from lib.template_profile import ProfileResult, summarize_profile
+
+    try:
+        with driver.session() as session:
+            tx = session.begin_transaction()
+            try:
+                summary = tx.run("PROFILE " + template.query, params).consume()
+            finally:
+                tx.rollback()
+    except Exception as e:
+        return ProfileResult(template.template_id, error=str(e).splitlines()[0][:200])
+    elapsed = (summary.result_available_after or 0) + (summary.result_consumed_after or 0)
+    return summarize_profile(template.template_id, summary.profile or {}, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skill の Cypher テンプレートを PROFILE して db hits を記録・比較")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="ベースライン JSON のパス")
+    parser.add_argument("--update-baseline", action="store_true", help="結果をベースラインとして保存する")
+    parser.add_argument("--client", help="パラメータに割り当てるクライアント名（省略時は登録済みの先頭）")
+    parser.add_argument("--only", help="テンプレート ID に含まれる文字列で絞り込む")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="db hits の許容増加率")
+    parser.add_argument("--fail-on-scan", action="store_true", help="全件スキャンがあれば終了コード 1")
+    parser.add_argument("--list", action="store_true", help="対象テンプレートの一覧を表示して終了")
+    args = parser.parse_args()
+
+    from lib.template_profile import bind_parameters, collect_templates, compare_to_baseline, is_profilable
+
+    templates = [t for t in collect_templates() if not args.only or args.only in t.template_id]
+    if args.list:
+        for t in templates:
+            mark = "" if is_profilable(t.query) else "  (対象外)"
+            print(f"  {t.template_id:<55} {', '.join('$' + p for p in t.parameters)}{mark}")
+        print(f"\n  {len(templates)} 件")
+        return 0
+
+    from lib.db_new_operations import get_driver, run_query
+
+    driver = get_driver()
+    if driver is None:
+        log("Neo4j に接続できません", "ERROR")
+        return 1
+    client_name = args.client
+    if not client_name:
+        rows = run_query("MATCH (c:Client) RETURN c.name AS name ORDER BY c.name LIMIT 1")
+        if not rows:
+            log("クライアントが登録されていません（デモデータを投入してください）", "ERROR")
+            return 1
+        client_name = rows[0]["name"]
+
+    results = []
+    for template in templates:
+        if not is_profilable(template.query):
+            continue
+        results.append(profile_template(driver, template, bind_parameters(template, client_name)))
+
+    print(f"\n📊 テンプレート PROFILE: {len(results)} 件 (client={client_name})")
+    print(f"  {'テンプレート':<52} {'db hits':>10} {'rows':>7} {'PC hit':>8} {'PC miss':>8} {'ms':>7}")
+    print(f"  {'─' * 98}")
+    for r in sorted(results, key=lambda r: -r.db_hits):
+        if r.error:
+            print(f"  {r.template_id:<55} エラー: {r.error}")
+            continue
+        print(f"  {r.template_id:<55} {r.db_hits:>10,} {r.rows:>7,} {r.page_cache_hits:>8,} "
+              f"{r.page_cache_misses:>8,} {r.elapsed_ms:>7.1f}" + ("  ⚠️ scan" if r.scans else ""))
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        baseline = {r.template_id: r.as_dict() for r in results if not r.error}
+        args.baseline.write_text(json.dumps(baseline, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+        log(f"ベースラインを保存しました: {args.baseline} ({len(baseline)} 件)", "OK")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+    if not baseline:
+        log(f"ベースラインがありません（--update-baseline で作成）: {args.baseline}", "WARN")
+    report = compare_to_baseline(results, baseline, tolerance=args.tolerance)
+
+    for line in report["improvements"]:
+        log(f"改善: {line}", "OK")
+    for line in report["scans"]:
+        log(f"全件スキャン: {line}", "WARN")
+    for line in report["regressions"]:
+        log(f"悪化: {line}", "ERROR")
+    if not report["regressions"]:
+        log("ベースラインからの悪化はありません", "OK")
+    return 1 if report["regressions"] or (args.fail_on_scan and report["scans"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
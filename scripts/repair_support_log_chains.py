@@ -0,0 +1,82 @@
+"""
+SupportLog 時系列チェーン（FOLLOWS）修復コマンド
+
+登録時はログを 1 件ずつ既存チェーンに差し込むが、登録経路を通らない書き込み
+（MCP からの直接 Cypher、ログの削除・日付修正など）はチェーンに反映されない。
+このコマンドでクライアント単位にチェーンを作り直す。
+
+全クライアントの修復は CALL {} IN TRANSACTIONS で数クライアントずつコミットするため、
+ログが多くてもトランザクションが肥大化しない。
+
+使用例:
+    uv run python scripts/repair_support_log_chains.py                      # 全クライアント
+    uv run python scripts/repair_support_log_chains.py --client "山田健太"   # 1 名のみ
+    uv run python scripts/repair_support_log_chains.py --batch 50           # 1 トランザクションあたりのクライアント数
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHAIN_STATS_QUERY = """
+MATCH (c:Client)
+WHERE $name IS NULL OR c.name = $name
+OPTIONAL MATCH (c)<-[:ABOUT]-(log:SupportLog)
+WITH c, count(log.date) AS dated
+OPTIONAL MATCH (c)<-[:ABOUT]-(:SupportLog)-[f:FOLLOWS]->(:SupportLog)
+WITH c, dated, count(f) AS links
+RETURN count(c) AS clients,
+       sum(CASE WHEN dated > 0 THEN dated - 1 ELSE 0 END) AS expected,
+       sum(links) AS links
+"""
+
+
+def log(message: str, level: str = "INFO"):
+    prefix = {"INFO": "  ", "OK": "  ✅", "WARN": "  ⚠️", "ERROR": "  ❌"}
+    sys.stderr.write(f"{prefix.get(level, '  ')} {message}\n")
+    sys.stderr.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SupportLog の時系列チェーンを再構築")
+    parser.add_argument("--client", help="対象クライアント名（省略時は全員）")
+    parser.add_argument("--batch", type=int, default=20, help="1 トランザクションでコミットするクライアント数")
+    args = parser.parse_args()
+
+    from lib.db_new_operations import run_in_transaction, run_query
+    from lib.support_log_chain import rebuild_client_chain, repair_all_chains_query
+
+    before = run_query(CHAIN_STATS_QUERY, {"name": args.client})[0]
+    if not before["clients"]:
+        log("対象のクライアントがいません", "WARN")
+        return 0
+    log(f"修復前: {before['clients']} 名, リンク {before['links']} / 期待値 {before['expected']}")
+
+    t0 = time.perf_counter()
+    if args.client:
+        run_in_transaction(lambda tx: rebuild_client_chain(tx, args.client))
+    else:
+        run_query(repair_all_chains_query(args.batch), write=True)
+    elapsed = time.perf_counter() - t0
+
+    after = run_query(CHAIN_STATS_QUERY, {"name": args.client})[0]
+    if after["links"] != after["expected"]:
+        log(f"修復後もリンク数が一致しません: {after['links']} / {after['expected']}", "ERROR")
+        return 1
+    log(f"{after['clients']} 名のチェーンを再構築しました (リンク {after['links']}, {elapsed:.1f} 秒)", "OK")
+    return 0
+
+
+if __name__ == "__main__":
+    from lib.workload import workload
+
+    # 緊急照会の間は一時停止する低優先度のレーンで実行する
+    with workload("batch"):
+        sys.exit(main())
@@ -11,19 +11,21 @@ nest SOS - APIサーバー
 import os
 import sys
 import httpx
+from contextlib import asynccontextmanager
 from datetime import datetime
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from neo4j import GraphDatabase
 
 # 親ディレクトリをパスに追加（lib/からインポートするため）
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from lib.db_operations import resolve_client, get_display_name, run_query
+from lib.async_db_operations import async_resolve_client, async_run_query, close_async_driver
+from lib.db_runtime import DatabaseAccessError
+from lib.workload import workload
 
 # 環境変数読み込み
 load_dotenv()
@@ -40,16 +42,22 @@ LINE_GROUP_ID = os.getenv("LINE_GROUP_ID", "")
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "")
 
 # --- Neo4j接続 ---
-# lib/db_operations.py から run_query を使用するため、ここでは定義不要
-# 古い関数が呼ばれている箇所があれば run_query に置き換える
+# lib/async_db_operations.py の共有非同期ドライバーを使用する
+# （同期ドライバーを async エンドポイントから呼ぶとイベントループが止まるため）
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_async_driver()
+
 
 # --- FastAPI ---
 app = FastAPI(
     title="nest SOS API",
     description="知的障害のある方向けの緊急通知システム",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS設定（スマホアプリからのアクセスを許可）
@@ -69,6 +77,13 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def emergency_workload(request, call_next):
+    """SOS のクエリはすべて緊急レーンで実行する（バッチ処理がプールを使い切っていても待たされない）"""
+    with workload("emergency"):
+        return await call_next(request)
+
+
 # --- リクエストモデル ---
 class SOSRequest(BaseModel):
     client_id: str  # クライアント識別子（名前またはID）
@@ -127,7 +142,7 @@ async def send_line_message(message: str) -> bool:
 
 
 # --- クライアント情報取得 ---
-def get_client_info(client_id: str) -> dict | None:
+async def get_client_info(client_id: str) -> dict | None:
     """
     Neo4jからクライアント情報を取得（仮名化対応）
 
@@ -137,7 +152,8 @@ def get_client_info(client_id: str) -> dict | None:
     - name (山田健太)
     """
     # まず仮名化対応の解決を試みる
-    resolved = resolve_client(client_id)
+    # SOS は安全性優先のためキャッシュを使わず常に最新の情報を参照する
+    resolved = await async_resolve_client(client_id, use_cache=False)
 
     if resolved:
         # 仮名化スキーマで見つかった場合
@@ -146,7 +162,7 @@ def get_client_info(client_id: str) -> dict | None:
 
         # キーパーソンを取得（clientId または name で検索）
         if client_id_internal:
-            kp_results = run_query("""
+            kp_results = await async_run_query("""
                 MATCH (c:Client {clientId: $clientId})
                 OPTIONAL MATCH (c)-[r:HAS_KEY_PERSON]->(kp:KeyPerson)
                 WITH kp, r
@@ -159,7 +175,7 @@ def get_client_info(client_id: str) -> dict | None:
                 }) as keyPersons
             """, {"clientId": client_id_internal})
         else:
-            kp_results = run_query("""
+            kp_results = await async_run_query("""
                 MATCH (c:Client {name: $name})
                 OPTIONAL MATCH (c)-[r:HAS_KEY_PERSON]->(kp:KeyPerson)
                 WITH kp, r
@@ -180,10 +196,9 @@ def get_client_info(client_id: str) -> dict | None:
             "keyPersons": kp_results[0]['keyPersons'] if kp_results else []
         }
 
-    # 後方互換性: 旧スキーマでの検索
-    results = run_query("""
-        MATCH (c:Client)
-        WHERE c.name CONTAINS $name OR c.id = $name
+    # 後方互換性: 旧スキーマでの検索（部分一致は別人に当たるおそれがあるため完全一致のみ）
+    results = await async_run_query("""
+        MATCH (c:Client {name: $name})
         OPTIONAL MATCH (c)-[r:HAS_KEY_PERSON]->(kp:KeyPerson)
         WITH c, kp, r
         ORDER BY r.rank
@@ -203,7 +218,7 @@ def get_client_info(client_id: str) -> dict | None:
     return None
 
 
-def get_client_cautions(client_identifier: str) -> list:
+async def get_client_cautions(client_identifier: str) -> list:
     """
     クライアントの禁忌事項（注意点）を取得（仮名化対応）
 
@@ -211,11 +226,11 @@ def get_client_cautions(client_identifier: str) -> list:
         client_identifier: clientId, displayCode, または name
     """
     # まず仮名化対応の解決を試みる
-    resolved = resolve_client(client_identifier)
+    resolved = await async_resolve_client(client_identifier, use_cache=False)
 
     if resolved and resolved.get('clientId'):
         # clientId で検索
-        results = run_query("""
+        results = await async_run_query("""
             MATCH (c:Client {clientId: $clientId})-[:MUST_AVOID]->(ng:NgAction)
             WHERE ng.riskLevel IN ['LifeThreatening', 'Panic']
             RETURN ng.action as action, ng.riskLevel as risk
@@ -229,7 +244,7 @@ def get_client_cautions(client_identifier: str) -> list:
 
     # 後方互換性: name で検索
     client_name = resolved.get('name') if resolved else client_identifier
-    results = run_query("""
+    results = await async_run_query("""
         MATCH (c:Client {name: $name})-[:MUST_AVOID]->(ng:NgAction)
         WHERE ng.riskLevel IN ['LifeThreatening', 'Panic']
         RETURN ng.action as action, ng.riskLevel as risk
@@ -250,10 +265,14 @@ def create_sos_message(
     cautions: list,
     latitude: float | None = None,
     longitude: float | None = None,
-    accuracy: float | None = None
+    accuracy: float | None = None,
+    cautions_failed: bool = False
 ) -> str:
     """
     SOSメッセージを作成
+
+    cautions_failed=True なら禁忌事項を照会できなかったことを明記する
+    （「注意事項なし」と区別するため）
     """
     now = datetime.now().strftime("%Y/%m/%d %H:%M")
 
@@ -287,7 +306,9 @@ def create_sos_message(
                 message += f"　・{kp['name']}（{rel}）{phone}\n"
 
     # 注意事項（禁忌事項）
-    if cautions:
+    if cautions_failed:
+        message += "\n⚠️ システム障害のため禁忌事項を取得できませんでした\n"
+    elif cautions:
         message += "\n⚠️ 対応時の注意:\n"
         for c in cautions:
             risk_mark = "🔴" if c.get('risk') == 'LifeThreatening' else "🟠"
@@ -311,7 +332,32 @@ async def receive_sos(request: SOSRequest):
     print(f"SOS受信: {request.client_id}")
 
     # クライアント情報を取得
-    client_info = get_client_info(request.client_id)
+    try:
+        client_info = await get_client_info(request.client_id)
+    except DatabaseAccessError as e:
+        # DB障害時は「未登録ユーザー」と誤認させず、照会できなかったことを明示して通知する
+        print(f"クライアント情報の取得に失敗: {e}")
+        message = f"""🆘【緊急SOS】
+
+ID: {request.client_id} の方からSOSがありました。
+⚠️ システム障害のため、本人情報・緊急連絡先を取得できませんでした。
+
+⏰ 発信時刻: {datetime.now().strftime("%Y/%m/%d %H:%M")}
+"""
+        if request.latitude and request.longitude:
+            message += f"\n📍 現在地:\nhttps://www.google.com/maps?q={request.latitude},{request.longitude}"
+
+        success = await send_line_message(message)
+        if not success:
+            raise HTTPException(status_code=500, detail="LINE送信に失敗しました")
+
+        return SOSResponse(
+            success=True,
+            message="SOSを送信しました（利用者情報の取得に失敗）",
+            client_name=None,
+            mock_mode=_mock_mode,
+            sent_message=message
+        )
 
     if not client_info:
         # クライアントが見つからない場合も通知は送る
@@ -337,8 +383,14 @@ async def receive_sos(request: SOSRequest):
     client_name = client_info['name']
     key_persons = client_info.get('keyPersons', [])
 
-    # 禁忌事項を取得
-    cautions = get_client_cautions(client_name)
+    # 禁忌事項を取得（失敗しても通知自体は送るが、「禁忌なし」と誤認させない）
+    cautions_failed = False
+    try:
+        cautions = await get_client_cautions(client_name)
+    except DatabaseAccessError as e:
+        print(f"禁忌事項の取得に失敗: {e}")
+        cautions = []
+        cautions_failed = True
 
     # メッセージ作成
     message = create_sos_message(
@@ -347,7 +399,8 @@ async def receive_sos(request: SOSRequest):
         cautions=cautions,
         latitude=request.latitude,
         longitude=request.longitude,
-        accuracy=request.accuracy
+        accuracy=request.accuracy,
+        cautions_failed=cautions_failed
     )
 
     print(f"Generated SOS Message:\n{message}")
@@ -358,7 +411,7 @@ async def receive_sos(request: SOSRequest):
     if success:
         return SOSResponse(
             success=True,
-            message="SOSを送信しました",
+            message="SOSを送信しました（禁忌事項の取得に失敗）" if cautions_failed else "SOSを送信しました",
             client_name=client_name,
             mock_mode=_mock_mode,
             sent_message=message
@@ -370,12 +423,17 @@ async def receive_sos(request: SOSRequest):
         )
 
 
+@app.exception_handler(DatabaseAccessError)
+async def database_error_handler(request, exc: DatabaseAccessError):
+    return JSONResponse(status_code=503, content={"detail": "データベースに接続できません"})
+
+
 @app.get("/api/client/{client_id}")
 async def get_client(client_id: str):
     """
     クライアント情報を取得（アプリ起動時の確認用）
     """
-    client_info = get_client_info(client_id)
+    client_info = await get_client_info(client_id)
 
     if client_info:
         return {
@@ -0,0 +1,188 @@
+"""
+ann_index モジュールのユニットテスト
+Neo4j・Gemini なしで、IVF 索引の recall・追加と削除・クライアントでの絞り込み・メモリマップでの
+読み込み・Neo4j からの差分同期・検索関数のバックエンドの切り替えを検証する。
+"""
+
+import numpy as np
+import pytest
+
+import lib.embedding as embedding
+from lib.ann_index import IVFIndex, get_local_index, load_local_generation, save_local_generation, sync_index
+from lib.embedding_generations import EmbeddingGeneration, GenerationState, set_generation_state
+from lib.similarity import to_matrix, top_k
+
+V1 = EmbeddingGeneration(1, "gemini-embedding-2-preview", 768)
+V2 = EmbeddingGeneration(2, "gemini-embedding-2", 768)
+
+
+def _vectors(count, dimensions=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((20, dimensions))
+    return centers[rng.integers(0, 20, size=count)] + 0.3 * rng.standard_normal((count, dimensions))
+
+
+def _index(path, count=2000):
+    vectors = _vectors(count)
+    ids = [f"n{i}" for i in range(count)]
+    payloads = [{"i": i} for i in range(count)]
+    clients = [[f"c{i % 10}"] for i in range(count)]
+    return IVFIndex.build(path, ids, vectors, payloads, clients=clients, nlist=20), vectors
+
+
+@pytest.fixture(autouse=True)
+def pinned_state():
+    previous = set_generation_state(GenerationState(V1))
+    yield
+    set_generation_state(previous, pin=False)
+
+
+def test_search_recall_against_exact(tmp_path):
+    index, vectors = _index(tmp_path / "a")
+    queries = vectors[:50] + 0.1 * np.random.default_rng(1).standard_normal(vectors[:50].shape)
+    exact, _ = top_k(to_matrix(queries), to_matrix(vectors), 10)
+    recall = np.mean([
+        len({int(h[0][1:]) for h in index.search(q, 10, nprobe=4)} & set(row.tolist())) / 10
+        for q, row in zip(queries, exact)
+    ])
+    assert recall >= 0.95
+    hits = index.search(vectors[7], 3)
+    assert hits[0][:1] == ("n7",) and hits[0][2] == {"i": 7}
+    assert [h[1] for h in hits] == sorted((h[1] for h in hits), reverse=True)
+
+
+def test_add_remove_and_client_filter(tmp_path):
+    index, vectors = _index(tmp_path / "a")
+    index.remove(["n7", "missing"])
+    assert "n7" not in index and len(index) == 1999
+    assert all(h[0] != "n7" for h in index.search(vectors[7], 5, nprobe=20))
+
+    index.add(["n8"], [-vectors[8]], [{"i": "moved"}], clients=[["c99"]])  # 同じ elementId は置き換え
+    assert len(index) == 1999
+    assert index.search(-vectors[8], 1, client="c99") == [("n8", pytest.approx(1.0), {"i": "moved"})]
+    assert index.clients_of("n8") == ["c99"]
+    assert all(int(h[0][1:]) % 10 == 3 for h in index.search(vectors[3], 20, client="c3"))
+    assert index.search(vectors[3], 5, client="nobody") == []
+    with pytest.raises(ValueError):
+        index.add(["x"], [[1.0, 0.0]])
+
+
+def test_reopen_from_disk_and_update_in_place(tmp_path):
+    index, vectors = _index(tmp_path / "a")
+    index.save()
+
+    opened = IVFIndex.open(tmp_path / "a")
+    assert isinstance(opened.vectors, np.memmap) and len(opened) == 2000
+    assert opened.search(vectors[5], 1)[0][0] == "n5"
+
+    writable = IVFIndex.open(tmp_path / "a", writable=True)
+    writable.add(["new"], [vectors[5]], [{"i": "new"}], clients=[["c5"]])
+    writable.remove(["n5"])
+    writable.save()
+    reopened = IVFIndex.open(tmp_path / "a")
+    assert len(reopened) == 2000 and "n5" not in reopened
+    assert reopened.search(vectors[5], 1, client="c5")[0][0] == "new"
+
+
+def test_save_compacts_deleted_rows(tmp_path):
+    index, vectors = _index(tmp_path / "a")
+    index.remove([f"n{i}" for i in range(1000)])
+    index.save()
+    reopened = IVFIndex.open(tmp_path / "a")
+    assert len(reopened) == len(reopened.ids) == 1000
+    ids, payloads, matrix = reopened.rows("c4")
+    assert len(ids) == len(payloads) == len(matrix) == 100
+    assert reopened.search(vectors[1500], 1)[0][0] == "n1500"
+
+
+class FakeGraph:
+    """ローカル索引への書き出しクエリに応じる iter_query / run_query"""
+
+    def __init__(self, vectors):
+        self.nodes = {f"n{i}": (vec.tolist(), f"h{i}") for i, vec in enumerate(vectors)}
+        self.fetched = []
+
+    def rows(self, ids):
+        return [
+            {"id": eid, "vector": vec, "hash": digest, "payload": {"action": eid}, "clients": ["山田健太"]}
+            for eid, (vec, digest) in self.nodes.items() if ids is None or eid in ids
+        ]
+
+    def iter_query(self, query, params):
+        if "$ids" in query:
+            return iter(self.rows(params["ids"]))
+        return iter([{"id": eid, "hash": digest} for eid, (_, digest) in self.nodes.items()])
+
+    def run_query(self, query, params):
+        self.fetched.extend(params["ids"])
+        return self.rows(params["ids"])
+
+
+def test_sync_index_builds_then_applies_diff(tmp_path):
+    vectors = _vectors(300, dimensions=768)
+    graph = FakeGraph(vectors)
+    sync = dict(generation=V1, directory=tmp_path, run_query=graph.run_query, iter_query=graph.iter_query)
+
+    assert sync_index("ng_action_embedding", **sync)["mode"] == "build"
+    assert load_local_generation(tmp_path) == V1
+    del graph.nodes["n0"]
+    graph.nodes["n1"] = (vectors[2].tolist(), "changed")
+    graph.nodes["n300"] = (vectors[3].tolist(), "h300")
+    result = sync_index("ng_action_embedding", **sync)
+
+    assert (result["mode"], result["added"], result["removed"], result["total"]) == ("update", 2, 1, 300)
+    assert sorted(graph.fetched) == ["n1", "n300"]
+    index = IVFIndex.open(tmp_path / "ng_action_embedding")
+    assert "n0" not in index and index.hashes[index._rows["n1"]] == "changed"
+
+
+def test_search_backend_local_and_auto(tmp_path, monkeypatch):
+    vectors = _vectors(200, dimensions=768)
+    IVFIndex.build(
+        tmp_path / "ng_action_embedding", [f"n{i}" for i in range(200)], vectors,
+        [{"action": f"禁忌{i}", "reason": "理由", "riskLevel": "Panic"} for i in range(200)],
+        clients=[["山田健太", "佐藤花子"] if i == 0 else ["山田健太"] for i in range(200)],
+    ).save()
+    monkeypatch.setenv("ANN_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(embedding, "embed_query", lambda text, generation: vectors[0].tolist())
+    assert get_local_index("ng_action_embedding") is get_local_index("ng_action_embedding")
+
+    monkeypatch.setenv("VECTOR_SEARCH_BACKEND", "local")
+    results = embedding.search_ng_actions_semantic("大きな音", top_k=2)
+    assert [r["クライアント"] for r in results[:2]] == ["山田健太", "佐藤花子"]
+    assert results[0]["禁忌事項"] == "禁忌0" and results[0]["スコア"] == pytest.approx(1.0)
+
+    def unavailable(query, params=None):
+        raise RuntimeError("Neo4jドライバーが初期化されていません")
+
+    monkeypatch.setattr(embedding, "_run_query", unavailable)
+    monkeypatch.setenv("VECTOR_SEARCH_BACKEND", "auto")
+    assert embedding.search_ng_actions_semantic("大きな音", top_k=2)[0]["禁忌事項"] == "禁忌0"
+    monkeypatch.setenv("VECTOR_SEARCH_BACKEND", "neo4j")
+    with pytest.raises(RuntimeError):
+        embedding.search_ng_actions_semantic("大きな音")
+    monkeypatch.setenv("VECTOR_SEARCH_BACKEND", "faiss")
+    with pytest.raises(ValueError):
+        embedding.search_ng_actions_semantic("大きな音")
+
+
+def test_local_backend_uses_generation_of_the_index(tmp_path, monkeypatch):
+    # Neo4j の状態は v1 のまま読めないが、ローカルの索引は v2 で作られている
+    vectors = _vectors(50, dimensions=768)
+    IVFIndex.build(
+        tmp_path / "ng_action_embedding_v2", [f"n{i}" for i in range(50)], vectors,
+        [{"action": f"禁忌{i}", "reason": "理由", "riskLevel": "Panic"} for i in range(50)],
+        clients=[["山田健太"]] * 50, model=V2.model, version=2,
+    ).save()
+    monkeypatch.setenv("ANN_INDEX_DIR", str(tmp_path))
+    save_local_generation(V2)
+    used = []
+    monkeypatch.setattr(embedding, "embed_query", lambda text, generation: used.append(generation) or vectors[0].tolist())
+
+    monkeypatch.setenv("VECTOR_SEARCH_BACKEND", "local")
+    assert embedding.search_generation() == V2
+    assert embedding.search_ng_actions_semantic("大きな音", top_k=1)[0]["禁忌事項"] == "禁忌0"
+    assert used == [V2]
+    monkeypatch.setenv("VECTOR_SEARCH_BACKEND", "neo4j")
+    assert embedding.search_generation() == V1
+
@@ -0,0 +1,93 @@
+"""
+audit_sink モジュールのユニットテスト
+Neo4j接続なしで、バッファリング・一括書き込み・破棄カウンター・失敗時の再試行・
+終了時の書き込みを検証する。
+"""
+
+import threading
+
+from lib.audit_sink import AuditSink
+
+
+def _entry(i=0, client="山田健太"):
+    return {"user": "佐藤", "action": "CREATE", "targetType": "NgAction",
+            "targetName": f"ng{i}", "details": "", "clientName": client}
+
+
+class _Writer:
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.fail_times = fail_times
+        self.written = threading.Event()
+
+    def __call__(self, entries):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("Neo4j unavailable")
+        self.batches.append(list(entries))
+        self.written.set()
+
+
+class TestAuditSink:
+    def test_flush_writes_in_batches(self):
+        writer = _Writer()
+        sink = AuditSink(writer, max_batch=3, flush_interval_ms=60_000)
+        for i in range(7):
+            sink.submit(_entry(i))
+        sink.flush()
+        assert all(len(b) <= 3 for b in writer.batches)
+        assert [e["targetName"] for b in writer.batches for e in b] == [f"ng{i}" for i in range(7)]
+        stats = sink.stats()
+        assert stats["written"] == 7 and stats["queue_depth"] == 0
+        sink.close()
+
+    def test_full_batch_wakes_background_flush(self):
+        writer = _Writer()
+        sink = AuditSink(writer, max_batch=2, flush_interval_ms=60_000)
+        sink.submit(_entry(0))
+        sink.submit(_entry(1))
+        assert writer.written.wait(5)
+        sink.close()
+        assert sink.stats()["written"] == 2
+
+    def test_timestamp_is_taken_at_submit(self):
+        writer = _Writer()
+        sink = AuditSink(writer, flush_interval_ms=60_000)
+        entry = sink.submit(_entry())
+        sink.close()
+        assert writer.batches[0][0]["timestamp"] == entry["timestamp"]
+
+    def test_overflow_is_counted_as_dropped(self):
+        writer = _Writer()
+        sink = AuditSink(writer, max_batch=100, flush_interval_ms=60_000, max_queue=2)
+        for i in range(5):
+            sink.submit(_entry(i))
+        assert sink.stats()["dropped"] == 3
+        sink.close()
+        assert sum(map(len, writer.batches)) == 2
+
+    def test_failed_batch_is_retried(self):
+        writer = _Writer(fail_times=1)
+        sink = AuditSink(writer, max_batch=10, flush_interval_ms=60_000)
+        sink.submit(_entry(0))
+        sink.submit(_entry(1))
+        assert sink.flush() == 0
+        assert sink.pending() == 2 and sink.stats()["failures"] == 1
+        assert sink.flush() == 2
+        assert [e["targetName"] for e in writer.batches[0]] == ["ng0", "ng1"]
+        sink.close()
+
+    def test_close_drains_queue(self):
+        writer = _Writer()
+        sink = AuditSink(writer, max_batch=100, flush_interval_ms=60_000)
+        for i in range(5):
+            sink.submit(_entry(i))
+        sink.close()
+        assert sink.pending() == 0
+        assert sum(map(len, writer.batches)) == 5
+
+    def test_disabled_writes_synchronously(self):
+        writer = _Writer()
+        sink = AuditSink(writer, enabled=False)
+        sink.submit(_entry())
+        assert len(writer.batches) == 1 and sink.pending() == 0
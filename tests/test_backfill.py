@@ -0,0 +1,153 @@
+"""
+backfill モジュールのユニットテスト
+Neo4j・Gemini なしで、キーセットの進み方・失敗ノードの記録・チェックポイントからの再開・範囲の分割・
+ハッシュによる再埋め込みの対象の絞り込みを検証する。
+"""
+
+import dataclasses
+import threading
+
+import pytest
+
+from lib.backfill import EMBEDDING_FAILED, EMPTY_TEXT, Backfill, BackfillSpec, Checkpoint
+
+
+class FakeGraph:
+    """elementId → {text, embedding} を持ち、BackfillSpec のクエリに応じる"""
+
+    def __init__(self, texts: dict):
+        self.nodes = {
+            element_id: {"text": text, "embedding": None, "embeddingHash": None}
+            for element_id, text in texts.items()
+        }
+        self.pages = []
+        self.scans = []
+        self._lock = threading.Lock()
+
+    def _pending(self, query=""):
+        embedded = "IS NOT NULL" in query
+        return sorted(i for i, n in self.nodes.items() if (n["embedding"] is not None) == embedded)
+
+    def run_query(self, query, params):
+        if "count(n)" in query:
+            return [{"total": len(self._pending(query))}]
+        rows = [
+            {"id": i, "text": self.nodes[i]["text"], "storedHash": self.nodes[i]["embeddingHash"]}
+            for i in self._pending(query)
+            if i in params["ids"]
+        ]
+        with self._lock:
+            self.pages.append([r["id"] for r in rows])
+        return rows
+
+    def iter_query(self, query, params, row_type=dict):
+        # 対象ラベルの走査（範囲ごとの ID の読み出し・範囲の分割）
+        with self._lock:
+            self.scans.append((params["after"], params["until"]))
+        for i in self._pending(query):
+            if i > params["after"] and (params["until"] is None or i <= params["until"]):
+                yield (i,)
+
+    def write(self, rows):
+        written = 0
+        for element_id, prop, vector, digest in rows:
+            if vector is not None:
+                self.nodes[element_id][prop] = vector
+                self.nodes[element_id][prop + "Hash"] = digest
+                written += 1
+        return written
+
+
+def embed(texts, task_type):
+    return [None if "失敗" in t else [float(len(t))] for t in texts]
+
+
+SPEC = BackfillSpec(name="SupportLog", match="MATCH (n:SupportLog)", returns="n.text AS text",
+                    text_fn=lambda row: row["text"], hash_fn=lambda text: f"v1:{text}")
+
+
+def _backfill(graph, path, **kwargs):
+    options = dict(batch_size=3, run_query=graph.run_query, iter_query=graph.iter_query,
+                   embed_fn=embed, write_fn=graph.write)
+    options.update(kwargs)
+    spec = options.pop("spec", SPEC)
+    return Backfill(spec, Checkpoint.load(path), **options)
+
+
+def _texts(count):
+    return {f"4:db:{i:03d}": f"支援記録{i}" for i in range(count)}
+
+
+def test_failing_nodes_are_recorded_and_skipped(tmp_path):
+    texts = _texts(8)
+    texts["4:db:002"] = ""
+    texts["4:db:005"] = "失敗する記録"
+    graph = FakeGraph(texts)
+    result = _backfill(graph, tmp_path / "cp.json").run()
+
+    assert (result["processed"], result["success"], result["failed"], result["completed"]) == (8, 6, 2, True)
+    state = Checkpoint.load(tmp_path / "cp.json").state
+    assert state["failed"] == {"4:db:002": EMPTY_TEXT, "4:db:005": EMBEDDING_FAILED}
+    # 失敗したノードを再び取得しない。ラベルの走査は 1 回だけ
+    assert graph.pages == [["4:db:000", "4:db:001", "4:db:002"], ["4:db:003", "4:db:004", "4:db:005"],
+                           ["4:db:006", "4:db:007"]]
+    assert graph.scans == [("", None)]
+
+
+def test_resumes_after_crash(tmp_path):
+    graph = FakeGraph(_texts(10))
+    calls = []
+
+    def crashing_write(rows):
+        calls.append(1)
+        if len(calls) == 3:
+            raise ConnectionError("Neo4j が落ちた")
+        return graph.write(rows)
+
+    with pytest.raises(ConnectionError):
+        _backfill(graph, tmp_path / "cp.json", write_fn=crashing_write).run()
+    assert Checkpoint.load(tmp_path / "cp.json").state["ranges"][0]["after"] == "4:db:005"
+
+    graph.pages.clear()
+    graph.scans.clear()
+    result = _backfill(graph, tmp_path / "cp.json").run()
+    assert graph.scans == [("4:db:005", None)]  # カーソルの位置から読み直す
+    assert graph.pages[0] == ["4:db:006", "4:db:007", "4:db:008"]
+    assert (result["processed"], result["success"]) == (10, 10)
+    assert all(n["embedding"] is not None for n in graph.nodes.values())
+
+
+def test_workers_cover_disjoint_ranges(tmp_path):
+    graph = FakeGraph(_texts(20))
+    result = _backfill(graph, tmp_path / "cp.json", workers=3).run()
+
+    ranges = Checkpoint.load(tmp_path / "cp.json").state["ranges"]
+    assert len(ranges) == 3 and all(r["done"] for r in ranges)
+    fetched = [i for page in graph.pages for i in page]
+    assert sorted(fetched) == sorted(graph.nodes)  # 各ノードをちょうど 1 回ずつ
+    assert len(graph.scans) == 1 + 3  # 範囲の分割と、範囲ごとに 1 回
+    assert (result["processed"], result["success"]) == (20, 20)
+
+
+def test_completed_checkpoint_starts_a_new_run(tmp_path):
+    graph = FakeGraph(_texts(3))
+    _backfill(graph, tmp_path / "cp.json").run()
+    graph.nodes["4:db:100"] = {"text": "追加された記録", "embedding": None, "embeddingHash": None}
+    result = _backfill(graph, tmp_path / "cp.json").run()
+    assert (result["processed"], result["success"]) == (1, 1)
+
+
+def test_stale_run_reembeds_only_changed_nodes(tmp_path):
+    graph = FakeGraph(_texts(6))
+    _backfill(graph, tmp_path / "cp.json").run()
+    assert graph.nodes["4:db:000"]["embeddingHash"] == "v1:支援記録0"
+
+    graph.nodes["4:db:001"]["text"] = "支援記録1（追記あり）"
+    graph.nodes["4:db:004"]["embeddingHash"] = None  # ハッシュ導入前に付与されたノード
+    embedded = []
+    result = _backfill(graph, tmp_path / "stale.json", spec=dataclasses.replace(SPEC, stale=True),
+                       embed_fn=lambda texts, task_type: embedded.extend(texts) or embed(texts, task_type)).run()
+
+    assert embedded == ["支援記録1（追記あり）", "支援記録4"]
+    assert (result["processed"], result["success"], result["unchanged"]) == (6, 2, 4)
+    assert graph.nodes["4:db:001"]["embeddingHash"] == "v1:支援記録1（追記あり）"
@@ -0,0 +1,226 @@
+"""
+client_card モジュールのユニットテスト
+Neo4j接続なしで、パラメータ組み立て・カード整形・展開カードの単一クエリ化と
+マテリアライズドカードの保存・読み取り・差分検出を検証する。
+"""
+
+import asyncio
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+
+from lib.client_card import (
+    CARD_SECTIONS,
+    CARD_VERSION,
+    CLIENT_CARD_QUERY,
+    LOCK_CLIENT_QUERY,
+    MATERIALIZED_CARD_QUERY,
+    STORE_CARD_QUERY,
+    card_from_json,
+    card_from_rows,
+    card_params,
+    card_to_json,
+    compare_cards,
+    fetch_client_card,
+    fetch_materialized_card,
+    materialize_card,
+)
+
+
+def _row(**overrides):
+    row = {
+        "name": "山田健太", "dob": date(1990, 4, 1), "bloodType": "A",
+        "kana": "やまだけんた", "clientId": "c-0001", "displayCode": "A-001",
+        "conditions": [{"name": "自閉スペクトラム症", "status": "Active"}],
+        "certificates": [{"type": "療育手帳", "grade": "A", "nextRenewalDate": date(2027, 1, 1), "daysLeft": 77}],
+        "ngActions": [{"action": "後ろから声をかける", "reason": "パニック", "riskLevel": "Panic", "context": None}],
+        "carePreferences": [{"category": f"cat{i}", "instruction": f"cp{i}", "priority": "High"} for i in range(7)],
+        "keyPersons": [{"name": f"kp{i}", "relationship": "母", "phone": "000", "role": None, "rank": i}
+                       for i in range(1, 5)],
+        "guardians": [], "hospitals": [],
+        "recentLogs": [{"date": date(2026, 10, 1), "situation": "食事", "action": "見守り",
+                        "effectiveness": "Effective", "emotion": "Calm", "triggerTag": None,
+                        "context": None, "note": None, "supporter": "佐藤"}],
+    }
+    row.update(overrides)
+    return row
+
+
+class TestCardParams:
+    def test_defaults_to_all_sections(self):
+        params = card_params("山田健太")
+        assert params == {"name": "山田健太", "sections": list(CARD_SECTIONS), "logLimit": 5}
+
+    def test_selected_sections(self):
+        assert card_params("山田健太", ["ngActions"], log_limit=20)["sections"] == ["ngActions"]
+
+    def test_unknown_section_rejected(self):
+        with pytest.raises(ValueError):
+            card_params("山田健太", ["ngActions", "medications"])
+
+
+class TestCardFromRows:
+    def test_missing_client(self):
+        assert card_from_rows([]) is None
+
+    def test_unselected_sections_are_empty_lists(self):
+        card = card_from_rows([_row(hospitals=None, recentLogs=None)])
+        assert card["client"]["clientId"] == "c-0001"
+        assert card["hospitals"] == [] and card["recentLogs"] == []
+
+    def test_fetch_uses_single_query(self):
+        calls = []
+
+        def run_query(query, params):
+            calls.append((query, params))
+            return [_row()]
+
+        card = fetch_client_card(run_query, "山田健太", ["keyPersons"])
+        assert [q for q, _ in calls] == [CLIENT_CARD_QUERY]
+        assert calls[0][1]["sections"] == ["keyPersons"]
+        assert card["keyPersons"][0]["name"] == "kp1"
+
+
+class _FakeTx:
+    """materialize_card 用: クエリごとに結果を返し、実行したクエリを記録する"""
+
+    def __init__(self, found=1):
+        self.found = found
+        self.calls = []
+
+    def run(self, query, params=None):
+        self.calls.append((query, params))
+        if query == LOCK_CLIENT_QUERY:
+            return _FakeResult([{"found": self.found}])
+        if query == CLIENT_CARD_QUERY:
+            return _FakeResult([_row()])
+        return _FakeResult([])
+
+
+class _FakeResult(list):
+    def data(self):
+        return list(self)
+
+    def consume(self):
+        return None
+
+
+class TestMaterializedCard:
+    def test_json_round_trip_recomputes_days_left(self):
+        text = card_to_json(card_from_rows([_row()]))
+        assert "daysLeft" not in text
+        card = card_from_json(text, today=date(2026, 12, 1))
+        assert card["client"]["dob"] == "1990-04-01"
+        assert card["certificates"][0]["daysLeft"] == 31
+
+    def test_materialize_stores_card_in_one_transaction(self):
+        tx = _FakeTx()
+        card = materialize_card(tx, "山田健太")
+        queries = [q for q, _ in tx.calls]
+        assert queries == [LOCK_CLIENT_QUERY, CLIENT_CARD_QUERY, STORE_CARD_QUERY]
+        stored = tx.calls[-1][1]
+        assert stored["cardVersion"] == CARD_VERSION
+        assert compare_cards(card_from_json(stored["cardJson"]), card) == []
+
+    def test_materialize_unknown_client(self):
+        tx = _FakeTx(found=0)
+        assert materialize_card(tx, "存在しない人") is None
+        assert [q for q, _ in tx.calls] == [LOCK_CLIENT_QUERY]
+
+    def test_compare_detects_drift(self):
+        live = card_from_rows([_row()])
+        materialized = card_from_json(card_to_json(live))
+        materialized["ngActions"] = []
+        assert compare_cards(materialized, live) == ["ngActions"]
+        assert compare_cards(None, live) == ["client"]
+
+    def test_fetch_materialized_selects_sections(self):
+        stored = _stored()
+        card = fetch_materialized_card(lambda q, p: stored, "山田健太", ["ngActions"])
+        assert card["ngActions"] and card["carePreferences"] == []
+
+    def test_safety_sections_are_read_live(self):
+        # Skill からの書き込みでカードが古くなっていても、禁忌事項・キーパーソンはライブの結果を使う
+        new_ng = [{"action": "急に触る", "reason": "パニック", "riskLevel": "LifeThreatening", "context": None}]
+        stored = [{**_row(ngActions=new_ng, keyPersons=[]), "cardJson": _stored()[0]["cardJson"],
+                   "cardVersion": CARD_VERSION}]
+        params = []
+        card = fetch_materialized_card(lambda q, p: params.append(p) or stored, "山田健太",
+                                       ["ngActions", "keyPersons", "carePreferences"])
+        assert params[0]["sections"] == ["ngActions", "keyPersons"]
+        assert card["ngActions"] == new_ng and card["keyPersons"] == []
+        assert len(card["carePreferences"]) == 7  # それ以外はカードから
+
+    def test_legacy_renewal_string_has_no_days_left(self):
+        cert = {"type": "療育手帳", "grade": "A", "nextRenewalDate": "令和9年1月1日"}
+        card = card_from_json(card_to_json(card_from_rows([_row(certificates=[cert])])))
+        assert card["certificates"][0]["daysLeft"] is None
+
+    def test_outdated_card_falls_back_to_live(self):
+        calls = []
+
+        def run_query(query, params):
+            calls.append(query)
+            if query == MATERIALIZED_CARD_QUERY:
+                return [{"cardJson": "{}", "cardVersion": CARD_VERSION - 1}]
+            return [_row()]
+
+        card = fetch_materialized_card(run_query, "山田健太")
+        assert calls == [MATERIALIZED_CARD_QUERY, CLIENT_CARD_QUERY]
+        assert card["client"]["clientId"] == "c-0001"
+
+
+def _stored(row=None):
+    """MATERIALIZED_CARD_QUERY の結果（保存されたカードと、ライブのプロジェクションの列）"""
+    row = row or _row()
+    return [{**row, "cardJson": card_to_json(card_from_rows([row])), "cardVersion": CARD_VERSION}]
+
+
+class TestClientDetail:
+    @patch("lib.db_new_operations.run_query")
+    def test_get_client_detail_reads_one_property(self, mock_run):
+        from lib.db_new_operations import get_client_detail
+
+        mock_run.return_value = _stored()
+        detail = get_client_detail("山田健太", use_cache=False)
+
+        assert mock_run.call_count == 1
+        assert mock_run.call_args.args[0] == MATERIALIZED_CARD_QUERY
+        assert detail["basic"]["conditions"] == ["自閉スペクトラム症"]
+        assert detail["basic"]["certificates"] == [{"type": "療育手帳", "grade": "A", "renewal": "2027-01-01"}]
+        assert detail["ng_actions"] == [{"action": "後ろから声をかける", "reason": "パニック", "risk": "Panic"}]
+        assert len(detail["care_prefs"]) == 5
+        assert [kp["rank"] for kp in detail["key_persons"]] == [1, 2, 3]
+        assert detail["recent_logs"][0]["supporter"] == "佐藤"
+
+    @patch("lib.db_new_operations.run_query")
+    def test_get_client_detail_without_card_uses_live_projection(self, mock_run):
+        from lib.db_new_operations import get_client_detail
+
+        mock_run.side_effect = [[{"cardJson": None, "cardVersion": None}], [_row()]]
+        detail = get_client_detail("山田健太", use_cache=False)
+        assert mock_run.call_args.args[0] == CLIENT_CARD_QUERY
+        assert detail["basic"]["certificates"][0]["renewal"] == date(2027, 1, 1)
+
+    @patch("lib.db_new_operations.run_query")
+    def test_get_client_detail_unknown_client(self, mock_run):
+        from lib.db_new_operations import get_client_detail
+
+        mock_run.return_value = []
+        detail = get_client_detail("存在しない人", use_cache=False)
+        assert detail == {'basic': {}, 'ng_actions': [], 'care_prefs': [], 'key_persons': [], 'recent_logs': []}
+
+    def test_async_get_client_detail_reads_one_property(self):
+        from lib import async_db_operations
+
+        calls = []
+
+        async def fake_run(query, params=None, write=None):
+            calls.append(query)
+            return _stored()
+
+        with patch.object(async_db_operations, "async_run_query", fake_run):
+            detail = asyncio.run(async_db_operations.async_get_client_detail("山田健太", use_cache=False))
+        assert calls == [MATERIALIZED_CARD_QUERY]
+        assert detail["basic"]["name"] == "山田健太"
@@ -0,0 +1,85 @@
+"""
+client_index モジュールのユニットテスト
+Neo4j接続なしで、識別子の正規化・検索の優先順位・差分更新を検証する。
+"""
+
+import pytest
+
+from lib.client_index import LOAD_ALL_QUERY, LOAD_BY_NAMES_QUERY, ClientIndex, _kakasi
+
+
+def _record(name, client_id=None, code=None, kana=None, aliases=None):
+    return {"clientId": client_id, "displayCode": code, "bloodType": None,
+            "kana": kana, "aliases": aliases, "name": name, "dob": None}
+
+
+@pytest.fixture
+def index():
+    idx = ClientIndex()
+    idx.replace_all([
+        _record("山田健太", "c-0001", "A-001", kana="ヤマダケンタ", aliases=["けんちゃん"]),
+        _record("山田花子", "c-0002", "A-002", kana="やまだはなこ"),
+        _record("佐藤 一郎", "c-0003", "A-003"),
+    ])
+    return idx
+
+
+class TestLookup:
+    def test_client_id_and_display_code(self, index):
+        assert index.lookup("c-0002")["name"] == "山田花子"
+        assert index.lookup("A-003")["name"] == "佐藤 一郎"
+
+    def test_exact_name_with_honorific_and_spacing(self, index):
+        assert index.lookup("山田健太さん")["clientId"] == "c-0001"
+        assert index.lookup("佐藤一郎")["clientId"] == "c-0003"
+        assert index.lookup("けんちゃん")["clientId"] == "c-0001"
+
+    def test_kana_matches_hiragana_and_katakana(self, index):
+        assert index.lookup("やまだけんた")["clientId"] == "c-0001"
+        assert index.lookup("ヤマダハナコ")["clientId"] == "c-0002"
+
+    @pytest.mark.skipif(_kakasi is None, reason="pykakasi 未インストール")
+    def test_romaji_reading(self, index):
+        assert index.lookup("Yamada Hanako")["clientId"] == "c-0002"
+
+    def test_partial_prefers_prefix(self, index):
+        # 「山田」は両者の前方一致。優先度・長さが同じなら clientId 順で決定的に選ぶ
+        assert index.lookup("山田")["clientId"] == "c-0001"
+        assert index.lookup("花子")["clientId"] == "c-0002"
+
+    def test_identifier_containing_name(self, index):
+        assert index.lookup("山田花子さんの件で")["clientId"] == "c-0002"
+
+    def test_not_found(self, index):
+        assert index.lookup("鈴木") is None
+        assert index.lookup("") is None
+
+
+class TestRefresh:
+    def test_lazy_load_and_incremental_refresh(self):
+        calls = []
+
+        def run_query(query, params):
+            calls.append(query)
+            if query == LOAD_ALL_QUERY:
+                return [_record("山田健太", "c-0001")]
+            assert query == LOAD_BY_NAMES_QUERY and params == {"names": ["山田健太"]}
+            return [_record("山田健太", "c-0001", aliases=["ケンタ"])]
+
+        idx = ClientIndex()
+        idx.ensure_fresh(run_query)
+        idx.ensure_fresh(run_query)
+        assert calls == [LOAD_ALL_QUERY]
+
+        idx.mark_dirty("山田健太")
+        idx.ensure_fresh(run_query)
+        assert calls == [LOAD_ALL_QUERY, LOAD_BY_NAMES_QUERY]
+        assert idx.lookup("けんた")["clientId"] == "c-0001"
+        assert len(idx) == 1
+
+    def test_removed_client_disappears(self, index):
+        index.mark_dirty("山田花子")
+        index.ensure_fresh(lambda q, p: [])
+        assert index.lookup("c-0002") is None
+        assert index.lookup("山田花子") is None
+        assert index.lookup("山田")["clientId"] == "c-0001"
@@ -0,0 +1,217 @@
+"""
+db_runtime モジュールのユニットテスト
+Neo4j接続なしで、読み書き判定・例外変換・リトライ計測・ストリーミング読み取りを検証する。
+"""
+
+from typing import NamedTuple
+
+import pytest
+from unittest.mock import patch
+
+from neo4j.exceptions import ConnectionAcquisitionTimeoutError, CypherSyntaxError, ServiceUnavailable
+
+from lib.db_runtime import (
+    DatabaseUnavailableError,
+    PoolTimeoutError,
+    QueryExecutionError,
+    execute_query,
+    get_query_stats,
+    is_write_query,
+    reset_query_stats,
+    stream_query,
+)
+
+
+class _FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def data(self):
+        return self._rows
+
+
+class _FakeTx:
+    def run(self, query, params):
+        return _FakeResult([{"ok": 1}])
+
+
+class _FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        if self.driver.acquire_failures:
+            self.driver.acquire_failures -= 1
+            raise ConnectionAcquisitionTimeoutError("pool exhausted")
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _execute(self, mode, work):
+        self.driver.modes.append(mode)
+        # ドライバーのリトライを模擬: 一時的障害の回数だけ work を再実行
+        for _ in range(self.driver.transient_failures):
+            work(_FakeTx())
+        if self.driver.error:
+            raise self.driver.error
+        return work(_FakeTx())
+
+    def execute_read(self, work):
+        return self._execute("read", work)
+
+    def execute_write(self, work):
+        return self._execute("write", work)
+
+    def run(self, query, params):
+        self.driver.modes.append("auto")
+        return _FakeResult([])
+
+
+class FakeDriver:
+    def __init__(self, transient_failures=0, acquire_failures=0, error=None):
+        self.transient_failures = transient_failures
+        self.acquire_failures = acquire_failures
+        self.error = error
+        self.modes = []
+
+    def session(self):
+        return _FakeSession(self)
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    reset_query_stats()
+    yield
+    reset_query_stats()
+
+
+class TestIsWriteQuery:
+    def test_read_queries(self):
+        assert not is_write_query("MATCH (c:Client {name: $name}) RETURN c")
+        assert not is_write_query("SHOW VECTOR INDEXES")
+
+    def test_write_queries(self):
+        assert is_write_query("MERGE (s:Supporter {name: $n})")
+        assert is_write_query("MATCH (n) WHERE elementId(n) = $id CALL db.create.setNodeVectorProperty(n, 'e', $v)")
+        assert is_write_query("MATCH (n) DETACH DELETE n")
+
+    def test_keywords_inside_strings_and_comments_ignored(self):
+        assert not is_write_query("MATCH (n) WHERE n.note = 'CREATE' RETURN n // SET")
+
+
+class TestExecuteQuery:
+    def test_routes_read_and_write(self):
+        driver = FakeDriver()
+        assert execute_query(driver, "MATCH (n) RETURN n") == [{"ok": 1}]
+        execute_query(driver, "CREATE (n:X)")
+        execute_query(driver, "MATCH (n) RETURN n", write=True)
+        execute_query(driver, "MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 100 ROWS")
+        assert driver.modes == ["read", "write", "write", "auto"]
+
+    def test_counts_driver_retries(self):
+        execute_query(FakeDriver(transient_failures=2), "MATCH (n) RETURN n")
+        stats = get_query_stats(recent=1)
+        assert stats["calls"] == 1
+        assert stats["retries"] == 2
+        assert stats["recent"][0]["retries"] == 2
+
+    @patch("lib.db_runtime.time.sleep")
+    def test_pool_timeout_retried_then_raised(self, mock_sleep):
+        assert execute_query(FakeDriver(acquire_failures=1), "MATCH (n) RETURN n") == [{"ok": 1}]
+        with pytest.raises(PoolTimeoutError):
+            execute_query(FakeDriver(acquire_failures=10), "MATCH (n) RETURN n")
+        assert get_query_stats()["failures"] == 1
+
+    def test_typed_errors(self):
+        with pytest.raises(DatabaseUnavailableError):
+            execute_query(None, "MATCH (n) RETURN n")
+        with pytest.raises(DatabaseUnavailableError):
+            execute_query(FakeDriver(error=ServiceUnavailable("leader switch")), "MATCH (n) RETURN n")
+        with pytest.raises(QueryExecutionError):
+            execute_query(FakeDriver(error=CypherSyntaxError("bad")), "MATCH (n RETURN n")
+
+
+class _FakeRecord(tuple):
+    keys = ("id", "name")
+
+    def data(self):
+        return dict(zip(self.keys, self))
+
+    def values(self):
+        return list(self)
+
+
+class _StreamSession:
+    def __init__(self, driver, kwargs):
+        self.driver = driver
+        self.kwargs = kwargs
+
+    def run(self, query, params):
+        if self.driver.acquire_failures:
+            self.driver.acquire_failures -= 1
+            raise ConnectionAcquisitionTimeoutError("pool exhausted")
+        self.driver.session_kwargs.append(self.kwargs)
+        return self._records()
+
+    def _records(self):
+        for i in range(self.driver.rows):
+            self.driver.fetched += 1
+            yield _FakeRecord((i, f"n{i}"))
+
+    def close(self):
+        self.driver.closed += 1
+
+
+class StreamDriver:
+    def __init__(self, rows=5, acquire_failures=0):
+        self.rows = rows
+        self.acquire_failures = acquire_failures
+        self.session_kwargs = []
+        self.fetched = 0
+        self.closed = 0
+
+    def session(self, **kwargs):
+        return _StreamSession(self, kwargs)
+
+
+class Row(NamedTuple):
+    id: int
+    name: str
+
+
+class TestStreamQuery:
+    def test_row_types(self):
+        assert list(stream_query(StreamDriver(2), "MATCH (n) RETURN n.id AS id, n.name AS name")) == [
+            {"id": 0, "name": "n0"}, {"id": 1, "name": "n1"},
+        ]
+        assert list(stream_query(StreamDriver(2), "MATCH (n) RETURN n", row_type=tuple)) == [(0, "n0"), (1, "n1")]
+        rows = list(stream_query(StreamDriver(2), "MATCH (n) RETURN n", row_type=Row))
+        assert rows[1].name == "n1"
+
+    def test_lazy_and_closes_session_when_consumer_stops(self):
+        driver = StreamDriver(rows=1000)
+        stream = stream_query(driver, "MATCH (n) RETURN n", fetch_size=50)
+        assert driver.fetched == 0
+        for i, _ in enumerate(stream):
+            if i == 2:
+                break
+        stream.close()
+        assert driver.fetched == 3 and driver.closed == 1
+        assert driver.session_kwargs[0]["fetch_size"] == 50
+        assert driver.session_kwargs[0]["default_access_mode"] == "READ"
+        assert get_query_stats()["reads"] == 1
+
+    @patch("lib.db_runtime.time.sleep")
+    def test_pool_timeout_retried_before_first_row(self, mock_sleep):
+        driver = StreamDriver(rows=2, acquire_failures=1)
+        assert len(list(stream_query(driver, "MATCH (n) RETURN n"))) == 2
+        assert get_query_stats(recent=1)["recent"][0]["retries"] == 1
+        with pytest.raises(PoolTimeoutError):
+            list(stream_query(StreamDriver(acquire_failures=10), "MATCH (n) RETURN n"))
+
+    def test_rejects_writes(self):
+        with pytest.raises(ValueError):
+            list(stream_query(StreamDriver(), "MATCH (n) SET n.x = 1"))
+        with pytest.raises(DatabaseUnavailableError):
+            list(stream_query(None, "MATCH (n) RETURN n"))
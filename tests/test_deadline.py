@@ -0,0 +1,146 @@
+"""
+deadline モジュールのユニットテスト
+Neo4j・Gemini 接続なしで、残り時間の配分・段階の記録・予算切れ時の打ち切りと後回しを検証する。
+"""
+
+import asyncio
+import time
+
+import pytest
+from neo4j import Query
+
+from lib.db_runtime import execute_query
+from lib.deadline import (
+    DeadlineExceeded,
+    check,
+    current_deadline,
+    deadline,
+    defer_if_short,
+    stage,
+    timeout_for,
+    within,
+    without_deadline,
+)
+
+
+class TestTimeouts:
+    def test_no_deadline_keeps_default(self):
+        assert current_deadline() is None
+        assert timeout_for("Neo4j") is None
+        assert timeout_for("Neo4j", 10.0) == 10.0
+        check("Neo4j")
+
+    def test_remaining_caps_default(self):
+        with deadline(1.0):
+            assert 0.9 < timeout_for("Neo4j") <= 1.0
+            assert timeout_for("Neo4j", 0.5) == 0.5
+        assert current_deadline() is None
+
+    def test_nested_deadline_cannot_extend(self):
+        with deadline(0.5):
+            with deadline(60) as inner:
+                assert inner.budget <= 0.5
+
+    def test_expired_deadline_raises_with_stage(self):
+        with deadline(0) as d:
+            with pytest.raises(DeadlineExceeded) as exc_info:
+                with stage("transcribe"):
+                    timeout_for("transcribe_audio")
+        assert exc_info.value.stage == "transcribe"
+        assert exc_info.value.operation == "transcribe_audio"
+        assert d.report()["stages"] == [{"stage": "transcribe", "ms": 0, "status": "exceeded"}]
+        assert d.report()["exceeded_stage"] == "transcribe"
+
+    def test_defer_if_short(self):
+        assert not defer_if_short("embedding", 5.0)
+        with deadline(1.0) as d:
+            assert defer_if_short("embedding", 5.0)
+            assert not defer_if_short("summary_embedding", 0.5)
+        assert d.deferred == ["embedding"]
+
+    def test_without_deadline_lifts_budget_for_cleanup(self):
+        # コミット後の後始末は予算切れでも打ち切らない
+        with deadline(0) as d:
+            with without_deadline():
+                assert current_deadline() is None
+                assert timeout_for("Neo4j", 10.0) == 10.0
+                check("card")
+            assert current_deadline() is d
+
+
+class TestWithin:
+    def test_slow_stage_is_cut_off_and_reported(self):
+        async def handler():
+            with deadline(0.2):
+                try:
+                    await within("transcribe", asyncio.sleep(0.01))
+                    await within("structurize", asyncio.to_thread(time.sleep, 1.0))
+                except DeadlineExceeded as e:
+                    # 応答を返す時点（ワーカースレッドの終了を待たない）
+                    return e, e.report
+
+        error, report = asyncio.run(handler())
+        assert error.stage == "structurize"
+        assert [(s["stage"], s["status"]) for s in report["stages"]] == [
+            ("transcribe", "ok"), ("structurize", "exceeded"),
+        ]
+        assert report["elapsed_ms"] < 500
+
+    def test_deadline_reaches_worker_threads(self):
+        async def handler():
+            with deadline(5.0):
+                return await within("register", asyncio.to_thread(timeout_for, "Neo4j"))
+
+        assert 4.0 < asyncio.run(handler()) <= 5.0
+
+
+# --- Neo4j 呼び出しへの適用 ---
+
+class _Session:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, params):
+        self.driver.queries.append(query)
+        return self
+
+    def data(self):
+        return []
+
+
+class RecordingDriver:
+    def __init__(self):
+        self.queries = []
+
+    def session(self):
+        return _Session(self)
+
+
+class TestQueryTimeouts:
+    AUTO_COMMIT = "MATCH (n) CALL { WITH n SET n.x = 1 } IN TRANSACTIONS OF 10 ROWS"
+
+    def test_remaining_time_becomes_query_timeout(self):
+        driver = RecordingDriver()
+        with deadline(2.0):
+            execute_query(driver, self.AUTO_COMMIT)
+        query = driver.queries[0]
+        assert isinstance(query, Query)
+        assert 1.5 < query.timeout <= 2.0
+
+    def test_expired_deadline_skips_the_database(self):
+        driver = RecordingDriver()
+        with deadline(0), pytest.raises(DeadlineExceeded):
+            execute_query(driver, self.AUTO_COMMIT)
+        assert driver.queries == []
+
+    def test_cleanup_after_commit_runs_past_the_deadline(self):
+        driver = RecordingDriver()
+        with deadline(0), without_deadline():
+            execute_query(driver, self.AUTO_COMMIT)
+        assert len(driver.queries) == 1
@@ -0,0 +1,106 @@
+"""
+embedding_cache モジュールのユニットテスト
+Gemini API なしで、キー・圧縮保存・サイズ上限の追い出し・cache-only モードを検証する。
+"""
+
+import time
+
+import pytest
+
+from lib.embedding import EMBEDDING_MODEL, embed_text, embed_texts_batch
+from lib.embedding_cache import (
+    EmbeddingCache,
+    cache_key,
+    pack_vector,
+    set_embedding_cache,
+    unpack_vector,
+)
+
+VECTOR = [0.125, -0.5, 0.25, 1.0]
+
+
+def _key(text, task_type="RETRIEVAL_DOCUMENT", dimensions=4):
+    return cache_key(EMBEDDING_MODEL, task_type, dimensions, text)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = EmbeddingCache(tmp_path / "embeddings.sqlite3")
+    previous = set_embedding_cache(c)
+    yield c
+    set_embedding_cache(previous)
+    c.close()
+
+
+class TestStorage:
+    def test_key_covers_every_input(self):
+        base = cache_key("m", "RETRIEVAL_DOCUMENT", 768, "大きな音を出さない")
+        assert base == cache_key("m", "RETRIEVAL_DOCUMENT", 768, "大きな音を出さない")
+        assert base != cache_key("m", "RETRIEVAL_QUERY", 768, "大きな音を出さない")
+        assert base != cache_key("m", "RETRIEVAL_DOCUMENT", 1536, "大きな音を出さない")
+        assert base != cache_key("m2", "RETRIEVAL_DOCUMENT", 768, "大きな音を出さない")
+
+    def test_compact_blobs(self):
+        values = [0.1] * 768
+        assert len(pack_vector(values, "float32")) == 768 * 4
+        assert len(pack_vector(values, "float16")) == 768 * 2
+        assert unpack_vector(pack_vector(VECTOR, "float16"), "float16") == VECTOR
+        assert unpack_vector(pack_vector([0.1], "float32"))[0] == pytest.approx(0.1, abs=1e-7)
+
+    def test_round_trip_and_hit_rate(self, cache):
+        cache.put(_key("a"), VECTOR)
+        assert cache.get(_key("a")) == VECTOR
+        assert cache.get(_key("b")) is None
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+        assert (stats["entries"], stats["bytes"]) == (1, 16)
+
+    def test_persists_across_instances(self, tmp_path):
+        first = EmbeddingCache(tmp_path / "shared.sqlite3", dtype="float16")
+        first.put(_key("a"), VECTOR)
+        first.close()
+        second = EmbeddingCache(tmp_path / "shared.sqlite3")
+        assert second.get(_key("a")) == VECTOR  # 保存時の dtype で読み出す
+        assert second.stats()["bytes"] == 8
+        second.close()
+
+    def test_least_recently_used_are_evicted(self, tmp_path):
+        # 3 件（48 バイト）は収まり、4 件目で上限を超えて上限の 9 割（50 バイト）まで追い出す
+        c = EmbeddingCache(tmp_path / "small.sqlite3", max_bytes=56)
+        for name in ("a", "b", "c"):
+            c.put(_key(name), VECTOR)
+            time.sleep(0.01)
+        c.get(_key("a"))  # a を使ったので b が最も古い
+        c.put(_key("d"), VECTOR)
+        assert c.get(_key("b")) is None
+        assert all(c.get(_key(name)) == VECTOR for name in ("a", "c", "d"))
+        stats = c.stats()
+        assert (stats["bytes"], stats["evictions"]) == (48, 1)
+        c.close()
+
+    def test_invalid_settings(self, tmp_path):
+        with pytest.raises(ValueError):
+            EmbeddingCache(tmp_path / "x.sqlite3", dtype="int8")
+        with pytest.raises(ValueError):
+            EmbeddingCache(tmp_path / "x.sqlite3", mode="readonly")
+
+
+class TestEmbeddingFunctions:
+    def test_batch_is_served_from_cache(self, cache):
+        cache.put_many({_key("大きな音を出さない"): VECTOR, _key("急に触らない"): [0.0] * 4})
+        results = embed_texts_batch(["大きな音を出さない", "急に触らない", "大きな音を出さない"], dimensions=4)
+        assert results == [VECTOR, [0.0] * 4, VECTOR]
+        assert cache.stats()["hits"] == 3
+
+    def test_cache_only_never_calls_the_api(self, tmp_path, monkeypatch):
+        c = EmbeddingCache(tmp_path / "offline.sqlite3", mode="cache-only")
+        previous = set_embedding_cache(c)
+        try:
+            c.put(_key("a"), VECTOR)  # cache-only は書き込まない
+            monkeypatch.setattr("lib.embedding.get_genai_client", lambda: pytest.fail("API を呼んだ"))
+            assert embed_text("a", dimensions=4) is None
+            assert embed_texts_batch(["a", "b"], dimensions=4) == [None, None]
+            assert c.stats()["misses"] == 3
+        finally:
+            set_embedding_cache(previous)
+            c.close()
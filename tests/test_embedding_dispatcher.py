@@ -0,0 +1,125 @@
+"""
+embedding_dispatcher モジュールのユニットテスト
+Gemini API なしで、チャンク分割・部分リトライ・429 によるチャンク縮小・流量制限を検証する。
+"""
+
+import threading
+import time
+
+import pytest
+
+from lib.deadline import DeadlineExceeded, deadline
+from lib.embedding_dispatcher import EmbeddingDispatcher, TokenBucket
+from lib.workload import BATCH, current_workload, workload
+
+
+class APIError(Exception):
+    def __init__(self, code, message=""):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeAPI:
+    """テキストの長さを 1 次元のベクトルとして返す embed_content の代わり"""
+
+    def __init__(self, fail=None):
+        self.fail = fail or (lambda texts, call: None)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, texts, task_type, dimensions):
+        with self._lock:
+            self.calls.append(list(texts))
+            call = len(self.calls)
+        error = self.fail(texts, call)
+        if error:
+            raise error
+        return [[float(len(t))] for t in texts]
+
+
+def _dispatcher(api, **kwargs):
+    options = dict(requests_per_minute=60000, tokens_per_minute=10**9, chunk_size=4, backoff_base=0.001)
+    options.update(kwargs)
+    return EmbeddingDispatcher(api, **options)
+
+
+TEXTS = [f"テキスト{'あ' * i}" for i in range(20)]
+EXPECTED = [[float(len(t))] for t in TEXTS]
+
+
+class TestDispatch:
+    def test_chunks_keep_input_order(self):
+        api = FakeAPI()
+        d = _dispatcher(api, concurrency=3, target_seconds=0)
+        assert d.embed(TEXTS, "RETRIEVAL_DOCUMENT", 1) == EXPECTED
+        assert all(len(chunk) <= 4 for chunk in api.calls)
+        stats = d.stats()
+        assert (stats["texts"], stats["embedded"], stats["failed"], stats["requests"]) == (20, 20, 0, 5)
+        assert stats["texts_per_sec"] > 0
+
+    def test_only_the_failed_chunk_is_lost(self):
+        bad = TEXTS[5]
+        api = FakeAPI(fail=lambda texts, call: APIError(400, "INVALID_ARGUMENT") if bad in texts else None)
+        results = _dispatcher(api, concurrency=1, target_seconds=0).embed(TEXTS, "RETRIEVAL_DOCUMENT", 1)
+        assert results[4:8] == [None] * 4
+        assert results[:4] == EXPECTED[:4] and results[8:] == EXPECTED[8:]
+
+    def test_transient_failure_is_retried(self):
+        api = FakeAPI(fail=lambda texts, call: APIError(503, "UNAVAILABLE") if call == 2 else None)
+        d = _dispatcher(api, concurrency=1)
+        assert d.embed(TEXTS, "RETRIEVAL_DOCUMENT", 1) == EXPECTED
+        assert d.stats()["retries"] == 1
+
+    def test_rate_limit_shrinks_chunks(self):
+        # 3 件を超えるリクエストは 429
+        api = FakeAPI(fail=lambda texts, call: APIError(429, "RESOURCE_EXHAUSTED") if len(texts) > 3 else None)
+        d = _dispatcher(api, concurrency=1, chunk_size=16, target_seconds=0)
+        assert d.embed(TEXTS, "RETRIEVAL_DOCUMENT", 1) == EXPECTED
+        assert d.chunk_size <= 3
+        assert d.stats()["rate_limited"] >= 1
+
+    def test_fast_responses_grow_chunks(self):
+        d = _dispatcher(FakeAPI(), concurrency=1, chunk_size=2, max_chunk_size=8)
+        d.embed(TEXTS, "RETRIEVAL_DOCUMENT", 1)
+        assert d.chunk_size > 2
+        assert d.stats()["requests"] < 10  # 2 件ずつなら 10 リクエスト
+        d.embed(TEXTS * 3, "RETRIEVAL_DOCUMENT", 1)
+        assert d.chunk_size == 8
+
+    def test_gives_up_after_max_retries(self):
+        api = FakeAPI(fail=lambda texts, call: APIError(500))
+        d = _dispatcher(api, concurrency=1, max_retries=2)
+        assert d.embed(TEXTS[:3], "RETRIEVAL_DOCUMENT", 1) == [None] * 3
+        assert len(api.calls) == 3
+
+
+class TestContext:
+    def test_workers_inherit_caller_context(self):
+        seen = []
+
+        def api(texts, task_type, dimensions):
+            seen.append(current_workload())
+            return [[0.0] for _ in texts]
+
+        with workload(BATCH):
+            _dispatcher(api, concurrency=2).embed(TEXTS, "RETRIEVAL_DOCUMENT", 1)
+        assert set(seen) == {BATCH}
+
+    def test_expired_deadline_is_not_retried(self):
+        api = FakeAPI(fail=lambda texts, call: APIError(503))
+        with deadline(0), pytest.raises(DeadlineExceeded):
+            _dispatcher(api, concurrency=1).embed(TEXTS, "RETRIEVAL_DOCUMENT", 1)
+        assert api.calls == []
+
+
+class TestTokenBucket:
+    def test_waits_for_refill(self):
+        bucket = TokenBucket(rate_per_minute=600, capacity=1)  # 0.1 秒に 1 つ
+        assert bucket.acquire() == 0.0
+        started = time.monotonic()
+        waited = bucket.acquire()
+        assert 0.05 < waited and time.monotonic() - started >= 0.05
+
+    def test_oversized_request_passes_when_full(self):
+        bucket = TokenBucket(rate_per_minute=100)
+        assert bucket.acquire(1000) == 0.0
@@ -0,0 +1,185 @@
+"""
+embedding_generations モジュールのユニットテスト
+Neo4j・Gemini なしで、世代ごとの名前・状態の楽観的排他・移行の前提の確認・recall@k の集計・
+現行とシャドウへの二重書き込みを検証する。
+"""
+
+import pytest
+
+import lib.embedding as embedding
+import lib.embedding_generations as embedding_generations
+from lib.ann_index import save_local_generation
+from lib.backfill import label_specs
+from lib.embedding_generations import (
+    LOAD_STATE_QUERY,
+    SAVE_STATE_QUERY,
+    EmbeddingGeneration,
+    GenerationConflictError,
+    GenerationState,
+    base_property,
+    compare_recall,
+    get_generation_state,
+    load_generation_state,
+    save_generation_state,
+    set_generation_state,
+    start_migration,
+    switch_generation,
+)
+
+V1 = EmbeddingGeneration(1, "gemini-embedding-2-preview", 768)
+V2 = EmbeddingGeneration(2, "gemini-embedding-2", 1536)
+
+
+class FakeStore:
+    """(:EmbeddingState) の読み書き・インデックス作成・移行状況の集計に応じる run_query"""
+
+    def __init__(self, missing=0):
+        self.props = {}
+        self.missing = missing
+        self.created = []
+
+    def __call__(self, query, params=None):
+        if query == LOAD_STATE_QUERY:
+            return [{"state": dict(self.props)}] if self.props else []
+        if query == SAVE_STATE_QUERY:
+            if (self.props.get("revision") or 0) != params["revision"]:
+                return []
+            self.props.update(params["props"])
+            self.props["revision"] = params["revision"] + 1
+            return [{"revision": self.props["revision"]}]
+        if query.startswith("SHOW VECTOR INDEXES"):
+            return []
+        if "CREATE VECTOR INDEX" in query:
+            self.created.append(query.split("`")[1])
+            return []
+        if "AS missing" in query:
+            return [{"active": 10, "target": 10 - self.missing, "missing": self.missing}]
+        raise AssertionError(query)
+
+
+@pytest.fixture(autouse=True)
+def pinned_state():
+    previous = set_generation_state(GenerationState(V1))
+    yield
+    set_generation_state(previous, pin=False)
+
+
+def test_names_per_generation():
+    assert (V1.property_for("embedding"), V1.index_for("support_log_embedding")) == \
+        ("embedding", "support_log_embedding")
+    assert (V2.property_for("summaryEmbedding"), V2.index_for("client_summary_embedding")) == \
+        ("summaryEmbeddingV2", "client_summary_embedding_v2")
+    assert base_property("textEmbeddingV12") == "textEmbedding"
+    assert base_property("embedding") == "embedding"
+
+
+def test_state_round_trip_and_conflict():
+    store = FakeStore()
+    assert load_generation_state(store).active.version == 1  # 未保存なら既定の世代
+
+    state = start_migration(V2.model, V2.dimensions, run_query=store)
+    assert state.shadow == V2 and state.revision == 1
+    assert load_generation_state(store) == state
+    assert "support_log_embedding_v2" in store.created and "support_log_embedding" in store.created
+
+    store.props["revision"] = 5  # 別のプロセスが先に更新した
+    with pytest.raises(GenerationConflictError):
+        save_generation_state(state, store)
+    with pytest.raises(GenerationConflictError):
+        start_migration("other-model", 768, run_query=store)  # シャドウが残っている
+
+
+def test_reload_outside_lock_keeps_last_state(monkeypatch, tmp_path):
+    def unavailable():
+        assert not embedding_generations._lock.locked()  # Neo4j への問い合わせ中はロックを持たない
+        raise RuntimeError("Neo4j に接続できません")
+
+    monkeypatch.setattr(embedding_generations, "load_generation_state", unavailable)
+    set_generation_state(GenerationState(V2, retired=V1), pin=False)
+    assert get_generation_state(refresh=True).active == V2  # 直前の状態を使い続ける
+
+    # キャッシュもなければ、ローカルの ANN 索引を作った世代を使う（既定の v1 に戻さない）
+    monkeypatch.setenv("ANN_INDEX_DIR", str(tmp_path))
+    save_local_generation(V2)
+    set_generation_state(None, pin=False)
+    assert get_generation_state().active == V2
+
+    monkeypatch.setattr(embedding_generations, "load_generation_state", lambda: GenerationState(V1))
+    assert get_generation_state(refresh=True).active == V1
+
+
+def test_switch_requires_backfill_and_recall():
+    store = FakeStore(missing=3)
+    start_migration(V2.model, V2.dimensions, run_query=store)
+    good = {"k": 10, "recall_current": 0.9, "recall_candidate": 0.88}
+
+    with pytest.raises(GenerationConflictError, match="未付与"):
+        switch_generation(good, run_query=store)
+    store.missing = 0
+    with pytest.raises(GenerationConflictError, match="evaluate"):
+        switch_generation(run_query=store)
+    with pytest.raises(GenerationConflictError, match="届きません"):
+        switch_generation({**good, "recall_candidate": 0.5}, run_query=store)
+
+    state = switch_generation(good, run_query=store)
+    assert (state.active, state.shadow, state.retired) == (V2, None, V1)
+    assert load_generation_state(store).generations() == [V2, V1]
+
+
+def test_compare_recall():
+    queries = [
+        {"index": "support_log_embedding", "query": "a", "relevant": ["1"]},
+        {"index": "support_log_embedding", "query": "b", "relevant": ["2", "3"]},
+        {"index": "ng_action_embedding", "query": "c", "relevant": ["9"]},
+    ]
+    report = compare_recall(queries, [["1", "x"], ["2", "y"], []], [["1", "x"], ["2", "3"], ["9", "z"]], k=2)
+    assert (report["recall_current"], report["recall_candidate"]) == (0.5, 1.0)
+    assert report["indexes"]["support_log_embedding"] == {"queries": 2, "current": 0.75, "candidate": 1.0, "overlap": 0.75}
+    assert report["indexes"]["ng_action_embedding"]["overlap"] == 0.0
+
+
+def test_dual_write_to_active_and_shadow(monkeypatch):
+    set_generation_state(GenerationState(V1, shadow=V2))
+    calls = []
+
+    def fake_batch(texts, task_type="RETRIEVAL_DOCUMENT", dimensions=None, model=None):
+        calls.append((model, dimensions))
+        return [[float(dimensions)] for _ in texts]
+
+    written = []
+
+    def runner(query, params):
+        written.extend((row["id"], row["property"], row["vector"], row["props"]) for row in params["rows"])
+        return [{"written": len(params["rows"])}]
+
+    monkeypatch.setattr(embedding, "embed_texts_batch", fake_batch)
+    count = embedding.embed_and_write([("a", "embedding", "テキスト", "v1:h"), ("b", "embedding", "", None)], run_query=runner)
+
+    assert count == 1
+    assert calls == [(V1.model, 768), (V2.model, 1536)]
+    assert written == [("a", "embedding", [768.0], {"embeddingHash": "v1:h"}),
+                       ("a", "embeddingV2", [1536.0], {"embeddingV2Hash": "v1:h"})]
+
+
+def test_shadow_failure_does_not_fail_registration(monkeypatch):
+    set_generation_state(GenerationState(V1, shadow=V2))
+
+    def fake_batch(texts, task_type="RETRIEVAL_DOCUMENT", dimensions=None, model=None):
+        if model == V2.model:
+            raise RuntimeError("シャドウのモデルが 503")
+        return [[1.0] for _ in texts]
+
+    monkeypatch.setattr(embedding, "embed_texts_batch", fake_batch)
+    runner = lambda query, params: [{"written": len(params["rows"])}]  # noqa: E731
+    assert embedding.embed_and_write([("a", "embedding", "テキスト", None)], run_query=runner) == 1
+
+
+def test_backfill_specs_target_the_generation():
+    specs = label_specs(V2, client_name="山田健太")
+    assert specs["SupportLog"].property == "embeddingV2"
+    assert specs["SupportLog"].name == "SupportLog-v2"
+    assert specs["Client"].property == "summaryEmbeddingV2"
+    assert specs["MeetingRecord"].property == "textEmbeddingV2"
+    assert (specs["NgAction"].model, specs["NgAction"].dimensions) == (V2.model, 1536)
+    assert "n.embeddingV2 IS NULL" in specs["CarePreference"].batch_query()
+    assert label_specs(V1)["SupportLog"].name == "SupportLog"
@@ -0,0 +1,28 @@
+"""
+embedding_texts モジュールのユニットテスト
+テキストの構築ルールが 1 か所にまとまり、版とテキストでハッシュが決まることを検証する。
+"""
+
+from lib.embedding_texts import EMBEDDING_TEXT_BUILDERS, build_text, content_hash, hash_property, text_hash
+
+LOG = {"emotion": "不安", "situation": "食事中の大きな音", "action": "静かな別室に移動", "note": None}
+
+
+def test_support_log_text_includes_emotion_and_context():
+    assert build_text("SupportLog", LOG) == "感情: 不安。状況: 食事中の大きな音。対応: 静かな別室に移動"
+    assert build_text("SupportLog", {}) == ""
+    assert build_text("Client", {"name": "山田健太"}) == ""  # 構築ルールのないラベル
+
+
+def test_hash_changes_with_text_and_version():
+    text = build_text("SupportLog", LOG)
+    digest = text_hash("SupportLog", text)
+    assert digest.startswith("v1:") and digest == text_hash("SupportLog", text)
+    assert digest != text_hash("SupportLog", text + "。効果: 落ち着いた")
+    assert digest != content_hash(EMBEDDING_TEXT_BUILDERS["SupportLog"].version + 1, text)
+
+
+def test_projection_and_hash_property():
+    assert EMBEDDING_TEXT_BUILDERS["CarePreference"].projection("cp") == \
+        "cp.category AS category, cp.instruction AS instruction"
+    assert hash_property("summaryEmbedding") == "summaryEmbeddingHash"
@@ -0,0 +1,326 @@
+"""
+graph_writer モジュールのユニットテスト
+Neo4j接続なしで、書き込み計画の構築とトランザクション内の実行順序を検証する。
+"""
+
+import pytest
+from unittest.mock import patch
+
+from lib.graph_writer import (
+    plan_graph_write,
+    node_group_statement,
+    relationship_statements,
+    execute_graph_write,
+    execute_graph_write_async,
+    merge_graphs,
+    AUDIT_LOG_BATCH_QUERY,
+)
+from lib.db_new_operations import MERGE_KEYS
+from lib.support_log_chain import SPLICE_LOG_QUERY
+
+
+class _FakeResult(list):
+    def consume(self):
+        return None
+
+
+class FakeTx:
+    """UNWIND 文の rows に対して連番の elementId を返すトランザクションのモック"""
+
+    def __init__(self, fail_on: str | None = None):
+        self.calls = []
+        self.fail_on = fail_on
+        self._next_id = 0
+
+    def run(self, query, params=None):
+        self.calls.append((query, params))
+        if self.fail_on and self.fail_on in query:
+            raise RuntimeError("simulated failure")
+        if "RETURN row.idx" in query:
+            rows = []
+            for row in params["rows"]:
+                self._next_id += 1
+                rows.append({"idx": row["idx"], "internal_id": f"4:test:{self._next_id}"})
+            return _FakeResult(rows)
+        return _FakeResult()
+
+
+def _sample_graph():
+    return {
+        "nodes": [
+            {"temp_id": "c1", "label": "Client", "properties": {"name": "テスト太郎"}},
+            {"temp_id": "s1", "label": "Supporter", "properties": {"name": "佐藤"}},
+            {"temp_id": "ng1", "label": "NgAction", "properties": {"action": "大きな音", "riskLevel": "Panic"}},
+            {"temp_id": "ng2", "label": "NgAction", "properties": {"action": "急な予定変更", "riskLevel": "Panic"}},
+            {"temp_id": "log1", "label": "SupportLog", "properties": {"date": "2026-03-30", "situation": "食事"}},
+            {"temp_id": "log2", "label": "SupportLog", "properties": {"date": "2026-03-31", "situation": "作業"}},
+        ],
+        "relationships": [
+            {"source_temp_id": "c1", "target_temp_id": "ng1", "type": "MUST_AVOID", "properties": {}},
+            {"source_temp_id": "c1", "target_temp_id": "ng2", "type": "MUST_AVOID", "properties": {}},
+            {"source_temp_id": "s1", "target_temp_id": "log1", "type": "LOGGED", "properties": {}},
+            {"source_temp_id": "log1", "target_temp_id": "c1", "type": "ABOUT", "properties": {}},
+            {"source_temp_id": "log2", "target_temp_id": "c1", "type": "ABOUT", "properties": {}},
+        ],
+    }
+
+
+class TestPlanGraphWrite:
+    def test_groups_by_label_and_merge_key(self):
+        plan = plan_graph_write(_sample_graph(), MERGE_KEYS)
+        groups = {(g.label, g.merge_keys): len(g.rows) for g in plan.node_groups}
+        assert groups == {
+            ("Client", ("name",)): 1,
+            ("Supporter", ("name",)): 1,
+            ("NgAction", ("action",)): 2,
+            ("SupportLog", ()): 2,
+        }
+        assert plan.client_name == "テスト太郎"
+
+    def test_missing_merge_key_create(self):
+        graph = {"nodes": [{"temp_id": "k1", "label": "KeyPerson", "properties": {"phone": "090"}}]}
+        plan = plan_graph_write(graph, MERGE_KEYS, missing_merge_key="create")
+        assert len(plan.nodes) == 1
+        assert plan.node_groups[0].merge_keys == ()
+
+    def test_missing_merge_key_skip(self):
+        graph = {"nodes": [{"temp_id": "k1", "label": "KeyPerson", "properties": {"name": None}}]}
+        plan = plan_graph_write(graph, MERGE_KEYS, missing_merge_key="skip")
+        assert plan.nodes == []
+        assert len(plan.warnings) == 1
+
+    def test_unsafe_label_and_type_rejected(self):
+        graph = {
+            "nodes": [{"temp_id": "x", "label": "Client) DETACH DELETE (n", "properties": {}}],
+            "relationships": [{"source_temp_id": "a", "target_temp_id": "b", "type": "A]->() DELETE"}],
+        }
+        plan = plan_graph_write(graph, MERGE_KEYS)
+        assert plan.nodes == []
+        assert plan.relationships == []
+        assert len(plan.warnings) == 2
+
+
+class TestStatements:
+    def test_merge_statement_uses_unwind(self):
+        plan = plan_graph_write(_sample_graph(), MERGE_KEYS)
+        ng_group = next(g for g in plan.node_groups if g.label == "NgAction")
+        query, params = node_group_statement(ng_group)
+        assert "UNWIND $rows AS row" in query
+        assert "MERGE (n:`NgAction` {`action`: row.match.`action`})" in query
+        assert [r["match"]["action"] for r in params["rows"]] == ["大きな音", "急な予定変更"]
+
+    def test_relationships_grouped_by_type(self):
+        statements = relationship_statements(
+            _sample_graph()["relationships"],
+            {"c1": "id-c", "s1": "id-s", "ng1": "id-1", "ng2": "id-2", "log1": "id-l1"},
+        )
+        # log2 は未解決のため ABOUT は 1 件のみ
+        by_type = {q.split("[r:`")[1].split("`")[0]: p["rows"] for q, p in statements}
+        assert len(by_type["MUST_AVOID"]) == 2
+        assert len(by_type["LOGGED"]) == 1
+        assert len(by_type["ABOUT"]) == 1
+
+
+class TestExecuteGraphWrite:
+    def test_single_transaction_statement_count(self):
+        tx = FakeTx()
+        plan = plan_graph_write(_sample_graph(), MERGE_KEYS)
+        result = execute_graph_write(
+            tx, plan,
+            audit_entry_builder=lambda n: {"targetType": n["label"]} if n["label"] == "NgAction" else None,
+        )
+        # ノード 4 グループ + リレーション 3 タイプ + 監査ログ 1
+        assert result.statements == 8
+        assert len(tx.calls) == 8
+        assert set(result.temp_id_map) == {"c1", "s1", "ng1", "ng2", "log1", "log2"}
+        assert [n["temp_id"] for n in result.registered] == ["c1", "s1", "ng1", "ng2", "log1", "log2"]
+        audit_query, audit_params = tx.calls[-1]
+        assert audit_query == AUDIT_LOG_BATCH_QUERY
+        assert len(audit_params["entries"]) == 2
+
+    def test_failure_propagates_for_rollback(self):
+        tx = FakeTx(fail_on="MUST_AVOID")
+        plan = plan_graph_write(_sample_graph(), MERGE_KEYS)
+        with pytest.raises(RuntimeError):
+            execute_graph_write(tx, plan)
+
+
+class _FakeAsyncResult:
+    def __init__(self, records):
+        self._records = list(records)
+
+    def __aiter__(self):
+        async def gen():
+            for r in self._records:
+                yield r
+        return gen()
+
+    async def consume(self):
+        return None
+
+
+class FakeAsyncTx:
+    """FakeTx の AsyncManagedTransaction 版"""
+
+    def __init__(self, fail_on: str | None = None):
+        self._tx = FakeTx(fail_on=fail_on)
+
+    @property
+    def calls(self):
+        return self._tx.calls
+
+    async def run(self, query, params=None):
+        return _FakeAsyncResult(self._tx.run(query, params))
+
+
+class TestExecuteGraphWriteAsync:
+    def test_matches_sync_statement_count(self):
+        import asyncio
+
+        tx = FakeAsyncTx()
+        plan = plan_graph_write(_sample_graph(), MERGE_KEYS)
+        result = asyncio.run(execute_graph_write_async(
+            tx, plan,
+            audit_entry_builder=lambda n: {"targetType": n["label"]} if n["label"] == "NgAction" else None,
+        ))
+        assert result.statements == 8
+        assert set(result.temp_id_map) == {"c1", "s1", "ng1", "ng2", "log1", "log2"}
+        assert tx.calls[-1][0] == AUDIT_LOG_BATCH_QUERY
+
+
+class TestRegisterToDatabaseBatched:
+    @patch("lib.db_new_operations.refresh_client_card")
+    @patch("lib.db_new_operations._try_attach_client_summary_embedding")
+    @patch("lib.db_new_operations._attach_embeddings")
+    @patch("lib.db_new_operations._rebuild_support_log_chain")
+    @patch("lib.db_new_operations.run_in_transaction")
+    def test_result_dict_shape(self, mock_tx, mock_chain, mock_emb, mock_summary, mock_card):
+        from lib.db_new_operations import register_to_database
+
+        tx = FakeTx()
+        mock_tx.side_effect = lambda work: work(tx)
+        result = register_to_database(_sample_graph())
+        assert result["status"] == "success"
+        assert result["client_name"] == "テスト太郎"
+        assert result["registered_count"] == 6
+        assert set(result["registered_types"]) == {"Client", "Supporter", "NgAction", "SupportLog"}
+        # 新しい SupportLog だけを、登録と同じトランザクションの最後で時系列チェーンに差し込む
+        assert mock_tx.call_count == 1
+        spliced = [params["id"] for query, params in tx.calls if query == SPLICE_LOG_QUERY]
+        assert len(spliced) == 2 and tx.calls[-1][0] == SPLICE_LOG_QUERY
+        mock_chain.assert_not_called()
+        mock_card.assert_called_once_with("テスト太郎")
+
+    @patch("lib.db_new_operations._rebuild_support_log_chain")
+    @patch("lib.db_new_operations.run_in_transaction")
+    def test_rollback_returns_error(self, mock_tx, mock_chain):
+        from lib.db_new_operations import register_to_database
+
+        mock_tx.side_effect = lambda work: work(FakeTx(fail_on="ABOUT"))
+        result = register_to_database(_sample_graph())
+        assert result["status"] == "error"
+        mock_chain.assert_not_called()
+
+
+class TestAsyncRegisterContracts:
+    """field-ui は同期版の lib.db_operations と同じ契約、それ以外は lib.db_new_operations と同じ契約"""
+
+    def _register(self, register, graph):
+        import asyncio
+
+        tx = FakeAsyncTx()
+
+        async def run_in_transaction(work):
+            return await work(tx)
+
+        async def refresh(client_name):
+            return None
+
+        with patch("lib.async_db_operations.async_run_in_transaction", run_in_transaction), \
+                patch("lib.async_db_operations.async_refresh_client_card", refresh), \
+                patch("lib.async_db_operations._attach_embeddings"), \
+                patch("lib.async_db_operations._try_attach_client_summary_embedding"):
+            return asyncio.run(register(graph, user_name="field-ui:佐藤")), tx
+
+    def _audit_targets(self, tx):
+        entries = next(params["entries"] for query, params in tx.calls if query == AUDIT_LOG_BATCH_QUERY)
+        return {e["targetType"]: e["targetName"] for e in entries}
+
+    def test_compat_keeps_db_operations_contract(self):
+        from lib.async_db_operations import async_register_to_database_compat
+
+        graph = _sample_graph()
+        graph["nodes"].append({"temp_id": "k1", "label": "KeyPerson", "properties": {"phone": "090"}})
+        result, tx = self._register(async_register_to_database_compat, graph)
+        assert result["status"] == "success"
+        assert result["count"] == 7 and "registered_count" not in result  # MERGE キーが欠けたノードも作成
+        assert set(result["types"]) == {"Client", "Supporter", "NgAction", "SupportLog", "KeyPerson"}
+        assert self._audit_targets(tx)["SupportLog"] == "不明-不明"  # 感情-トリガー（db_operations の形式）
+        assert [q for q, _ in tx.calls].count(SPLICE_LOG_QUERY) == 2
+
+    def test_default_keeps_db_new_operations_contract(self):
+        from lib.async_db_operations import async_register_to_database
+
+        graph = _sample_graph()
+        graph["nodes"].append({"temp_id": "k1", "label": "KeyPerson", "properties": {"phone": "090"}})
+        result, tx = self._register(async_register_to_database, graph)
+        assert result["registered_count"] == 6 and "count" not in result  # MERGE キーが欠けたノードはスキップ
+        assert self._audit_targets(tx)["SupportLog"] == "作業 - "
+
+
+class TestMergeGraphs:
+    def test_dedupes_merge_key_nodes_across_graphs(self):
+        g2 = _sample_graph()
+        g2["nodes"][0]["properties"]["bloodType"] = "A"
+        merged, occurrences = merge_graphs([(0, _sample_graph()), (1, g2)], MERGE_KEYS)
+        clients = [n for n in merged["nodes"] if n["label"] == "Client"]
+        assert len(clients) == 1
+        assert clients[0]["temp_id"] == "0:c1"
+        assert clients[0]["properties"]["bloodType"] == "A"
+        # SupportLog は MERGE キーを持たないためグラフごとに別ノード
+        assert len([n for n in merged["nodes"] if n["label"] == "SupportLog"]) == 4
+        assert len(occurrences) == 12
+        about = [r for r in merged["relationships"] if r["type"] == "ABOUT"]
+        assert {r["target_temp_id"] for r in about} == {"0:c1"}
+
+
+class TestRegisterMany:
+    @patch("lib.db_new_operations.refresh_client_card")
+    @patch("lib.db_new_operations._try_attach_client_summary_embedding")
+    @patch("lib.db_new_operations._attach_embeddings")
+    @patch("lib.db_new_operations._rebuild_support_log_chain")
+    @patch("lib.db_new_operations.run_in_transaction")
+    def test_chunked_single_transaction(self, mock_tx, mock_chain, mock_emb, mock_summary, mock_card):
+        from lib.db_new_operations import register_many
+
+        tx = FakeTx()
+        mock_tx.side_effect = lambda work: work(tx)
+        result = register_many([_sample_graph() for _ in range(5)], chunk_size=5)
+        assert result["status"] == "success"
+        assert result["succeeded"] == 5
+        assert mock_tx.call_count == 1
+        assert all(r["registered_count"] == 6 for r in result["results"])
+        # 時系列チェーンはチャンクのトランザクション内で差し込む。サマリー・カード再計算はクライアントごとに 1 回
+        spliced = [params["id"] for query, params in tx.calls if query == SPLICE_LOG_QUERY]
+        assert len(set(spliced)) == 10
+        mock_chain.assert_not_called()
+        mock_summary.assert_called_once()
+        mock_card.assert_called_once_with("テスト太郎")
+
+    @patch("lib.db_new_operations.refresh_client_card")
+    @patch("lib.db_new_operations._try_attach_client_summary_embedding")
+    @patch("lib.db_new_operations._attach_embeddings")
+    @patch("lib.db_new_operations._rebuild_support_log_chain")
+    @patch("lib.db_new_operations.run_in_transaction")
+    def test_failed_chunk_isolates_bad_graph(self, mock_tx, mock_chain, mock_emb, mock_summary, mock_card):
+        from lib.db_new_operations import register_many
+
+        bad = _sample_graph()
+        bad["relationships"].append(
+            {"source_temp_id": "c1", "target_temp_id": "s1", "type": "BROKEN", "properties": {}})
+        mock_tx.side_effect = lambda work: work(FakeTx(fail_on="BROKEN"))
+        result = register_many([_sample_graph(), bad, {"client": {}}], chunk_size=10)
+        assert result["status"] == "partial"
+        assert [r["status"] for r in result["results"]] == ["success", "error", "error"]
+        # チャンク 1 回 + グラフ単位の再試行 2 回
+        assert mock_tx.call_count == 3
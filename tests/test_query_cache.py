@@ -0,0 +1,131 @@
+"""
+query_cache モジュールのユニットテスト
+世代による無効化・LRU 追い出し・キャッシュ無効化オプションを検証する。
+"""
+
+import asyncio
+from unittest.mock import patch
+
+from lib.query_cache import QueryCache
+
+Q = "MATCH (c:Client {name: $name}) RETURN c"
+
+
+class _Loader:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return [{"n": self.calls}]
+
+
+class TestQueryCache:
+    def test_hit_and_miss(self):
+        cache = QueryCache()
+        loader = _Loader()
+        assert cache.get_or_load(Q, {"name": "A"}, loader, client="A") == [{"n": 1}]
+        assert cache.get_or_load("MATCH (c:Client {name: $name})\n  RETURN c", {"name": "A"}, loader, client="A") == [{"n": 1}]
+        assert loader.calls == 1
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    def test_returned_value_is_a_copy(self):
+        cache = QueryCache()
+        first = cache.get_or_load(Q, {}, _Loader())
+        first[0]["n"] = "mutated"
+        assert cache.get_or_load(Q, {}, _Loader()) == [{"n": 1}]
+
+    def test_invalidation_is_per_client(self):
+        cache = QueryCache()
+        loader_a, loader_b, loader_global = _Loader(), _Loader(), _Loader()
+        cache.get_or_load(Q, {"name": "A"}, loader_a, client="A")
+        cache.get_or_load(Q, {"name": "B"}, loader_b, client="B")
+        cache.get_or_load("MATCH (c) RETURN c", {}, loader_global)
+
+        cache.invalidate_client("A")
+        cache.get_or_load(Q, {"name": "A"}, loader_a, client="A")
+        cache.get_or_load(Q, {"name": "B"}, loader_b, client="B")
+        cache.get_or_load("MATCH (c) RETURN c", {}, loader_global)
+        assert (loader_a.calls, loader_b.calls, loader_global.calls) == (2, 1, 2)
+
+    def test_write_during_load_is_never_served(self):
+        cache = QueryCache()
+
+        def loader_with_concurrent_write():
+            cache.invalidate_client("A")
+            return ["stale"]
+
+        cache.get_or_load(Q, {"name": "A"}, loader_with_concurrent_write, client="A")
+        assert cache.get_or_load(Q, {"name": "A"}, lambda: ["fresh"], client="A") == ["fresh"]
+
+    def test_lru_eviction(self):
+        cache = QueryCache(max_entries=2)
+        for name in ["A", "B"]:
+            cache.get_or_load(Q, {"name": name}, _Loader())
+        cache.get_or_load(Q, {"name": "A"}, _Loader())   # A を最近使用に
+        cache.get_or_load(Q, {"name": "C"}, _Loader())   # B が追い出される
+        loader = _Loader()
+        cache.get_or_load(Q, {"name": "A"}, loader)
+        assert loader.calls == 0
+        cache.get_or_load(Q, {"name": "B"}, loader)
+        assert loader.calls == 1
+        assert cache.stats()["evictions"] == 2
+
+    def test_use_cache_false_bypasses(self):
+        cache = QueryCache()
+        loader = _Loader()
+        cache.get_or_load(Q, {}, loader)
+        cache.get_or_load(Q, {}, loader, use_cache=False)
+        assert loader.calls == 2
+        assert cache.stats()["hits"] == 0
+
+    def test_ttl_expiry(self):
+        cache = QueryCache(ttl_seconds=10)
+        loader = _Loader()
+        with patch("lib.query_cache.time.monotonic", return_value=100.0):
+            cache.get_or_load(Q, {}, loader)
+        with patch("lib.query_cache.time.monotonic", return_value=111.0):
+            cache.get_or_load(Q, {}, loader)
+        assert loader.calls == 2
+
+    def test_async_get_or_load(self):
+        cache = QueryCache()
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            return [{"ok": True}]
+
+        async def run():
+            await cache.async_get_or_load(Q, {}, loader, client="A")
+            return await cache.async_get_or_load(Q, {}, loader, client="A")
+
+        assert asyncio.run(run()) == [{"ok": True}]
+        assert len(calls) == 1
+
+
+class TestWriteInvalidation:
+    @patch("lib.db_new_operations.refresh_client_card")
+    @patch("lib.db_new_operations._try_attach_client_summary_embedding")
+    @patch("lib.db_new_operations._attach_embeddings")
+    @patch("lib.db_new_operations._rebuild_support_log_chain")
+    @patch("lib.db_new_operations.run_in_transaction")
+    def test_register_to_database_bumps_client_generation(self, mock_tx, *_):
+        from lib.db_new_operations import register_to_database
+        from lib.query_cache import get_query_cache
+
+        class _Tx:
+            def run(self, query, params=None):
+                rows = [{"idx": r["idx"], "internal_id": f"4:t:{r['idx']}"} for r in params.get("rows", [])]
+                return _Result(rows if "RETURN row.idx" in query else [])
+
+        class _Result(list):
+            def consume(self):
+                return None
+
+        mock_tx.side_effect = lambda work: work(_Tx())
+        graph = {"nodes": [{"temp_id": "c1", "label": "Client", "properties": {"name": "テスト太郎"}}]}
+        before = get_query_cache().generation("テスト太郎")
+        register_to_database(graph)
+        assert get_query_cache().generation("テスト太郎") == before + 1
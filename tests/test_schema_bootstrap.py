@@ -0,0 +1,134 @@
+"""
+schema_bootstrap モジュールのユニットテスト
+Neo4j接続なしで、MERGE_KEYS・テンプレートからの導出と、冪等な作成・代替・未バック検出を検証する。
+"""
+
+import lib.schema_bootstrap as schema_bootstrap
+from lib.schema_bootstrap import SchemaRequirement, bootstrap_schema, derive_requirements, template_anchors
+
+MERGE_KEYS = {"Client": ["name"], "CarePreference": ["category", "instruction"]}
+
+
+def _index(name, label, props, owning=None, state="ONLINE", type_="RANGE"):
+    return {"name": name, "type": type_, "labelsOrTypes": [label], "properties": props,
+            "state": state, "owningConstraint": owning}
+
+
+class FakeDB:
+    """SHOW INDEXES と DDL を模したクエリ実行関数"""
+
+    def __init__(self, indexes=None, duplicates=0):
+        self.indexes = list(indexes or [])
+        self.duplicates = duplicates
+        self.queries = []
+
+    def __call__(self, query, params=None):
+        self.queries.append(query)
+        if query.startswith("SHOW INDEXES"):
+            return list(self.indexes)
+        if query.startswith("MATCH"):
+            return [{"duplicates": self.duplicates}]
+        if query.startswith("CREATE CONSTRAINT"):
+            name = query.split("`")[1]
+            label = query.split("(n:`")[1].split("`")[0]
+            props = [p.split("`")[0] for p in query.split("n.`")[1:]]
+            self.indexes.append(_index(name, label, props, owning=name))
+        elif query.startswith("CREATE INDEX"):
+            name = query.split("`")[1]
+            label = query.split("(n:`")[1].split("`")[0]
+            props = [p.split("`")[0] for p in query.split("n.`")[1:]]
+            self.indexes.append(_index(name, label, props))
+        elif query.startswith("DROP INDEX"):
+            name = query.split("`")[1]
+            self.indexes = [i for i in self.indexes if i["name"] != name]
+        return []
+
+
+class TestDerive:
+    def test_only_client_name_becomes_unique_constraint(self, tmp_path):
+        reqs = derive_requirements(MERGE_KEYS, templates=[], range_indexes=())
+        assert [(r.kind, r.label, r.properties) for r in reqs] == [
+            ("unique", "Client", ("name",)),
+            ("range", "CarePreference", ("category", "instruction")),
+        ]
+        assert reqs[1].schema_name == "idx_carepreference_category_instruction"
+
+    def test_other_constraints_are_opt_in(self):
+        reqs = derive_requirements(MERGE_KEYS, templates=[], range_indexes=(), unique_labels=["CarePreference"])
+        assert reqs[1].kind == "unique"
+        assert reqs[1].schema_name == "constraint_carepreference_category_instruction_unique"
+
+    def test_template_anchors_not_covered_by_merge_keys(self, tmp_path):
+        template = tmp_path / "q.cypher"
+        template.write_text(
+            "MATCH (c:Client {name: $client_name})\n"
+            "MATCH path = (sp:ServiceProvider {providerId: $id})\n"
+            "CREATE (w:Wish {content: 'x'})\n",
+            encoding="utf-8",
+        )
+        assert set(template_anchors([template])) == {("Client", "name"), ("ServiceProvider", "providerId")}
+        reqs = derive_requirements(MERGE_KEYS, {"v": {"label": "SupportLog", "property": "embedding"}}, [template], ())
+        assert [(r.kind, r.label) for r in reqs[2:]] == [("range", "ServiceProvider"), ("vector", "SupportLog")]
+
+    def test_date_range_indexes(self):
+        reqs = derive_requirements({}, templates=[])
+        assert [(r.kind, r.schema_name) for r in reqs] == [
+            ("range", "idx_supportlog_date"), ("range", "idx_meetingrecord_date"),
+        ]
+
+
+class TestBootstrap:
+    def test_creates_missing(self):
+        db = FakeDB()
+        report = bootstrap_schema(db, derive_requirements(MERGE_KEYS, templates=[], range_indexes=()), wait_seconds=5)
+        assert report.created == ["constraint_client_name_unique", "idx_carepreference_category_instruction"]
+        assert any(q.startswith("CALL db.awaitIndexes") for q in db.queries)
+        assert report.unbacked == [] and report.not_online == []
+
+    def test_never_drops_existing_index(self):
+        db = FakeDB([_index("idx_client_name", "Client", ["name"])])
+        report = bootstrap_schema(db, derive_requirements(MERGE_KEYS, templates=[], range_indexes=()), wait_seconds=0)
+        assert not any(q.startswith(("DROP", "CREATE CONSTRAINT")) for q in db.queries)
+        assert report.fallbacks == ["constraint_client_name_unique"]
+        assert report.unbacked == []
+
+    def test_idempotent(self):
+        db = FakeDB()
+        reqs = derive_requirements(MERGE_KEYS, templates=[], range_indexes=())
+        bootstrap_schema(db, reqs, wait_seconds=0)
+        db.queries.clear()
+        report = bootstrap_schema(db, reqs, wait_seconds=0)
+        assert report.created == [] and len(report.existing) == 2
+        assert all(q.startswith("SHOW INDEXES") for q in db.queries)
+
+    def test_duplicates_fall_back_to_range_index(self):
+        db = FakeDB(duplicates=3)
+        report = bootstrap_schema(db, [SchemaRequirement("unique", "Client", ("name",), "MERGE_KEYS")],
+                                  wait_seconds=0)
+        assert report.fallbacks == ["constraint_client_name_unique"]
+        assert report.created == ["idx_client_name"]
+        assert not any(q.startswith("CREATE CONSTRAINT") for q in db.queries)
+        assert report.unbacked == []
+
+    def test_reports_unbacked_and_not_online(self):
+        def failing(query, params=None):
+            if query.startswith("SHOW INDEXES"):
+                return [_index("idx_sp", "ServiceProvider", ["providerId"], state="POPULATING")]
+            if query.startswith("CREATE"):
+                raise RuntimeError("permission denied")
+            return []
+
+        reqs = [SchemaRequirement("range", "ServiceProvider", ("providerId",), "t.cypher"),
+                SchemaRequirement("range", "CareRole", ("name",), "SKILL.md")]
+        report = bootstrap_schema(failing, reqs, wait_seconds=0)
+        assert report.not_online == [{"schema": "idx_sp", "state": "POPULATING"}]
+        assert report.unbacked == ["CareRole(name) ← SKILL.md"]
+        assert report.errors[0]["schema"] == "idx_carerole_name"
+
+    def test_startup_does_not_wait_for_indexes(self, monkeypatch):
+        # 起動時は作成だけ（ONLINE 待ちは scripts/bootstrap_schema.py）
+        monkeypatch.setenv("SCHEMA_BOOTSTRAP_WAIT_SECONDS", "300")
+        calls = []
+        monkeypatch.setattr(schema_bootstrap, "bootstrap_schema", lambda **kwargs: calls.append(kwargs))
+        schema_bootstrap.bootstrap_schema_on_startup()
+        assert calls == [{"wait_seconds": 0}]
@@ -2,8 +2,12 @@
 schema_validator モジュールのユニットテスト
 """
 
+from datetime import date, datetime
+
 import pytest
 from lib.schema_validator import (
+    coerce_date_value,
+    normalize_dates,
     normalize_property_name,
     normalize_properties,
     validate_node_label,
@@ -175,3 +179,35 @@ class TestValidateAndNormalizeGraph:
         normalized, warnings = validate_and_normalize_graph(graph)
         assert len(warnings) == 0
         assert normalized["nodes"][0]["properties"]["bloodType"] == "O"
+
+
+class TestNormalizeDates:
+    def test_string_formats_become_dates(self):
+        props = {"date": "2024-01-15", "dob": "昭和50年3月15日", "nextRenewalDate": "2025/04/01",
+                 "issueDate": "2024-01-15T09:30:00", "situation": "2024-01-15"}
+        converted, warnings = normalize_dates(props, "SupportLog")
+        assert converted == {"date": date(2024, 1, 15), "dob": date(1975, 3, 15),
+                             "nextRenewalDate": date(2025, 4, 1), "issueDate": date(2024, 1, 15),
+                             "situation": "2024-01-15"}
+        assert warnings == []
+
+    def test_unparseable_kept_with_warning_and_empty_removed(self):
+        converted, warnings = normalize_dates({"date": "先週の火曜", "dob": "  ", "timestamp": "x"}, "Client")
+        assert converted == {"date": "先週の火曜", "timestamp": "x"}
+        assert warnings == ["[Client] 日付として解釈できない値: date='先週の火曜'"]
+
+    def test_native_values(self):
+        assert coerce_date_value(date(2024, 1, 1)) == (date(2024, 1, 1), True)
+        assert coerce_date_value(datetime(2024, 1, 1, 12, 0)) == (date(2024, 1, 1), True)
+        assert coerce_date_value(20240101) == (20240101, False)
+
+    def test_graph_nodes_and_relationships(self):
+        graph = {
+            "nodes": [{"temp_id": "l1", "label": "SupportLog", "properties": {"date": "令和6年1月15日"}}],
+            "relationships": [{"source_temp_id": "l1", "target_temp_id": "c1", "type": "ABOUT",
+                               "properties": {"start_date": "2024-02-01"}}],
+        }
+        normalized, warnings = validate_and_normalize_graph(graph)
+        assert normalized["nodes"][0]["properties"]["date"] == date(2024, 1, 15)
+        assert normalized["relationships"][0]["properties"]["startDate"] == date(2024, 2, 1)
+        assert warnings == []
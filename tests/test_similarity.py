@@ -0,0 +1,72 @@
+"""
+similarity モジュールのユニットテスト
+ブロック分割した行列積の結果が、素朴な全ペアの計算と一致することを確かめる。
+"""
+
+import numpy as np
+import pytest
+
+from lib.similarity import cosine_similarity, pairs_above, to_matrix, top_k
+
+
+def _vectors(count, dimensions=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((4, dimensions))
+    return (centers[rng.integers(0, 4, size=count)] + 0.4 * rng.standard_normal((count, dimensions))).tolist()
+
+
+def _naive_pairs(vectors, threshold):
+    return {
+        (i, j)
+        for i in range(len(vectors))
+        for j in range(i + 1, len(vectors))
+        if cosine_similarity(vectors[i], vectors[j]) >= threshold
+    }
+
+
+def test_cosine_similarity():
+    assert cosine_similarity([1, 0], [1, 0]) == pytest.approx(1.0)
+    assert cosine_similarity([1, 0], [0, 2]) == pytest.approx(0.0)
+    assert cosine_similarity([1, 1], [-1, -1]) == pytest.approx(-1.0)
+    assert cosine_similarity([0, 0], [1, 0]) == 0.0
+    with pytest.raises(ValueError):
+        cosine_similarity([1, 0], [1, 0, 0])
+
+
+def test_to_matrix_normalizes_once():
+    matrix = to_matrix([[3, 4], [0, 0]])
+    assert matrix.dtype == np.float32 and matrix.flags["C_CONTIGUOUS"]
+    assert matrix.tolist() == [[pytest.approx(0.6), pytest.approx(0.8)], [0.0, 0.0]]
+    assert to_matrix([], dimensions=768).shape == (0, 768)
+    with pytest.raises(ValueError):
+        to_matrix([[1, 0], [1, 0, 0]])
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64])
+def test_pairs_above_matches_naive(block_size):
+    vectors = _vectors(50)
+    found = {(i, j) for i, j, _ in pairs_above(to_matrix(vectors), 0.8, block_size=block_size)}
+    assert found == _naive_pairs(vectors, 0.8)
+    assert found  # クラスタ内のペアが閾値を超えている
+
+
+@pytest.mark.parametrize("block_size", [3, 64])
+def test_top_k_matches_naive(block_size):
+    vectors = _vectors(30)
+    matrix = to_matrix(vectors)
+    indices, scores = top_k(matrix, matrix, 5, block_size=block_size, exclude_self=True)
+
+    sims = matrix @ matrix.T
+    np.fill_diagonal(sims, -np.inf)
+    expected = np.sort(sims, axis=1)[:, ::-1][:, :5]
+    assert indices.shape == (30, 5)
+    assert np.allclose(scores, expected, atol=1e-6)
+    assert not (indices == np.arange(30)[:, None]).any()
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def test_top_k_with_fewer_candidates_than_k():
+    matrix = to_matrix([[1, 0], [0, 1]])
+    indices, scores = top_k(matrix[:1], matrix, 10)
+    assert indices.tolist() == [[0, 1]]
+    assert scores[0].tolist() == [pytest.approx(1.0), pytest.approx(0.0)]
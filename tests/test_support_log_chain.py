@@ -0,0 +1,136 @@
+"""
+support_log_chain モジュールのユニットテスト
+Neo4j接続なしで、登録グラフからのログ ID 抽出・差し込み／再構築の切り替え・
+修復クエリの自動コミット判定を検証する。
+"""
+
+import asyncio
+
+import pytest
+
+from lib.db_runtime import _requires_auto_commit
+from lib.support_log_chain import (
+    CHAIN_SPLICE_LIMIT,
+    CHAIN_SPLICE_WINDOW_DAYS,
+    REBUILD_CLIENT_CHAIN_QUERY,
+    SPLICE_LOG_QUERY,
+    async_update_support_log_chain,
+    repair_all_chains_query,
+    support_log_ids,
+    support_log_ids_by_client,
+    update_support_log_chain,
+)
+
+
+class _FakeResult(list):
+    def consume(self):
+        return None
+
+
+class _FakeTx:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, query, params=None):
+        self.calls.append((query, params))
+        return _FakeResult()
+
+
+def _graph():
+    return {
+        "nodes": [
+            {"temp_id": "c1", "label": "Client", "properties": {"name": "山田健太"}},
+            {"temp_id": "c2", "label": "Client", "properties": {"name": "佐藤花子"}},
+            {"temp_id": "log1", "label": "SupportLog", "properties": {"date": "2026-10-01"}},
+            {"temp_id": "log2", "label": "SupportLog", "properties": {"date": "2026-09-01"}},
+            {"temp_id": "log3", "label": "SupportLog", "properties": {"date": "2026-10-02"}},
+            {"temp_id": "ng1", "label": "NgAction", "properties": {"action": "大声"}},
+        ],
+        "relationships": [
+            {"source_temp_id": "log1", "target_temp_id": "c1", "type": "ABOUT"},
+            {"source_temp_id": "log2", "target_temp_id": "c1", "type": "ABOUT"},
+            {"source_temp_id": "log3", "target_temp_id": "c2", "type": "ABOUT"},
+            {"source_temp_id": "c1", "target_temp_id": "ng1", "type": "MUST_AVOID"},
+        ],
+    }
+
+
+_TEMP_ID_MAP = {"c1": "4:x:1", "c2": "4:x:2", "log1": "4:x:3", "log2": "4:x:4", "log3": "4:x:5", "ng1": "4:x:6"}
+
+
+class TestSupportLogIds:
+    def test_only_support_logs(self):
+        assert support_log_ids(_graph()["nodes"], _TEMP_ID_MAP) == ["4:x:3", "4:x:4", "4:x:5"]
+
+    def test_unwritten_nodes_are_skipped(self):
+        assert support_log_ids(_graph()["nodes"], {"log2": "4:x:4"}) == ["4:x:4"]
+
+    def test_grouped_by_client(self):
+        assert support_log_ids_by_client(_graph(), _TEMP_ID_MAP) == {
+            "山田健太": ["4:x:3", "4:x:4"],
+            "佐藤花子": ["4:x:5"],
+        }
+
+
+class TestUpdateChain:
+    def test_splices_each_new_log(self):
+        tx = _FakeTx()
+        assert update_support_log_chain(tx, ["山田健太"], ["4:x:3", "4:x:4"]) == "splice"
+        # まだ差し込んでいないログ（pending）は前後の候補から除く
+        window = CHAIN_SPLICE_WINDOW_DAYS
+        assert tx.calls == [
+            (SPLICE_LOG_QUERY, {"id": "4:x:3", "pending": ["4:x:4"], "window_days": window}),
+            (SPLICE_LOG_QUERY, {"id": "4:x:4", "pending": [], "window_days": window}),
+        ]
+
+    def test_async_splice_matches_sync(self):
+        class _AsyncResult:
+            async def consume(self):
+                return None
+
+        class _AsyncTx:
+            def __init__(self):
+                self.calls = []
+
+            async def run(self, query, params=None):
+                self.calls.append((query, params))
+                return _AsyncResult()
+
+        sync_tx, async_tx = _FakeTx(), _AsyncTx()
+        update_support_log_chain(sync_tx, ["山田健太"], ["4:x:3", "4:x:4"])
+        assert asyncio.run(async_update_support_log_chain(async_tx, ["山田健太"], ["4:x:3", "4:x:4"])) == "splice"
+        assert async_tx.calls == sync_tx.calls
+
+    def test_large_insert_rebuilds_client(self):
+        tx = _FakeTx()
+        ids = [f"4:x:{i}" for i in range(CHAIN_SPLICE_LIMIT + 1)]
+        assert update_support_log_chain(tx, ["山田健太"], ids) == "rebuild"
+        assert tx.calls == [(REBUILD_CLIENT_CHAIN_QUERY, {"name": "山田健太"})]
+
+    def test_unknown_ids_rebuild_client(self):
+        tx = _FakeTx()
+        assert update_support_log_chain(tx, ["山田健太"], []) == "rebuild"
+        assert [q for q, _ in tx.calls] == [REBUILD_CLIENT_CHAIN_QUERY]
+
+    def test_splice_orders_by_date_then_element_id(self):
+        # 同日のログは elementId で並べ、遡り入力でも前後両方のリンクを張り替える
+        assert "elementId(p) < elementId(log)" in SPLICE_LOG_QUERY
+        assert "MERGE (next)-[:FOLLOWS]->(log)" in SPLICE_LOG_QUERY
+
+    def test_splice_seeks_prev_by_date_range(self):
+        # 直前のログは SupportLog.date の範囲で引き（インデックスシーク）、直後はチェーンの後続をたどる
+        assert "p.date >= log.date - duration({days: $window_days}) AND p.date <= log.date" in SPLICE_LOG_QUERY
+        assert "OPTIONAL MATCH (n:SupportLog)-[:FOLLOWS]->(prev)" in SPLICE_LOG_QUERY
+        # クライアントのログの展開は範囲内に見つからなかったときだけ
+        assert "WITH log, c, near WHERE near IS NULL" in SPLICE_LOG_QUERY
+
+
+class TestRepairQuery:
+    def test_runs_in_auto_commit_batches(self):
+        query = repair_all_chains_query(10)
+        assert "IN TRANSACTIONS OF 10 ROWS" in query
+        assert _requires_auto_commit(query)
+
+    def test_rejects_empty_batch(self):
+        with pytest.raises(ValueError):
+            repair_all_chains_query(0)
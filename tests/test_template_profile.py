@@ -0,0 +1,119 @@
+"""
+template_profile モジュールのユニットテスト
+Neo4j接続なしで、テンプレートの抽出・パラメータ割り当て・プランの集計・ベースライン比較を検証する。
+"""
+
+from datetime import date
+
+from lib.template_profile import (
+    CypherTemplate,
+    ProfileResult,
+    bind_parameters,
+    collect_templates,
+    compare_to_baseline,
+    is_profilable,
+    skill_templates,
+    summarize_profile,
+)
+
+
+def _plan():
+    return {
+        "operatorType": "ProduceResults@neo4j", "rows": 3, "dbHits": 0,
+        "pageCacheHits": 1, "pageCacheMisses": 0, "args": {},
+        "children": [{
+            "operatorType": "Filter@neo4j", "rows": 3, "dbHits": 40,
+            "pageCacheHits": 5, "pageCacheMisses": 1, "args": {"Details": "c.name CONTAINS $clientName"},
+            "children": [{
+                "operatorType": "NodeByLabelScan@neo4j", "rows": 20, "dbHits": 21,
+                "pageCacheHits": 2, "pageCacheMisses": 0, "args": {"Details": "c:Client"}, "children": [],
+            }],
+        }],
+    }
+
+
+class TestExtraction:
+    def test_skill_blocks_split_into_statements(self, tmp_path):
+        skill = tmp_path / "visit-prep"
+        skill.mkdir()
+        (skill / "SKILL.md").write_text(
+            "説明\n```cypher\n// コメント\nMATCH (c:Client {name: $clientName}) RETURN c;\n"
+            "MATCH (n:NgAction) RETURN n\n```\n```json\n{}\n```\n",
+            encoding="utf-8",
+        )
+        other = tmp_path / "livelihood-support"
+        other.mkdir()
+        (other / "SKILL.md").write_text("```cypher\nMATCH (r:Recipient) RETURN r\n```", encoding="utf-8")
+
+        templates = skill_templates(tmp_path)
+        assert [t.template_id for t in templates] == ["visit-prep/SKILL.md#1", "visit-prep/SKILL.md#2"]
+        assert templates[0].parameters == ["clientName"]
+
+    def test_repository_templates_are_found(self):
+        ids = {t.template_id for t in collect_templates()}
+        assert "cypher_templates.ANALYSIS_QUERIES.ng_by_risk" in ids
+        assert "ecomap-generator/templates/emergency.cypher#1" in ids
+        assert any(i.startswith("visit-prep/SKILL.md#") for i in ids)
+
+    def test_bind_parameters(self):
+        template = CypherTemplate("t", "MATCH (c:Client {name: $clientName}) WHERE x > date($date) RETURN c LIMIT $limit // $ignored")
+        assert bind_parameters(template, "山田健太", today=date(2026, 10, 1)) == {
+            "clientName": "山田健太", "date": "2026-10-01", "limit": 10,
+        }
+
+    def test_client_templates_anchor_on_exact_name(self):
+        # c.name CONTAINS $clientName は Client の全件走査になり、別人にも部分一致する
+        offenders = [t.template_id for t in collect_templates() if "c.name CONTAINS $clientName" in t.query]
+        assert offenders == []
+
+    def test_schema_statements_are_not_profiled(self):
+        assert not is_profilable("CREATE INDEX idx IF NOT EXISTS FOR (n:Client) ON (n.kana)")
+        assert not is_profilable("SHOW INDEXES")
+        assert is_profilable("CREATE (n:SupportLog {date: date()})")
+
+
+class TestSummarize:
+    def test_totals_and_hot_label_scan(self):
+        result = summarize_profile("t", _plan(), elapsed_ms=4.2)
+        assert (result.db_hits, result.rows, result.page_cache_hits, result.page_cache_misses) == (61, 3, 8, 1)
+        assert result.scans == ["NodeByLabelScan(c:Client)"]
+
+    def test_index_seek_on_hot_label(self):
+        plan = {"operatorType": "NodeUniqueIndexSeek@neo4j", "dbHits": 2,
+                "args": {"Details": "UNIQUE c:Client(name) WHERE name = $clientName"}, "children": []}
+        result = summarize_profile("t", plan)
+        assert result.scans == []
+        assert result.seeks == ["NodeUniqueIndexSeek(UNIQUE c:Client(name) WHERE name = $clientName)"]
+
+    def test_cold_label_scan_is_ignored(self):
+        plan = {"operatorType": "NodeByLabelScan@neo4j", "args": {"Details": "h:Hospital"}, "children": []}
+        assert summarize_profile("t", plan).scans == []
+
+
+class TestCompare:
+    def test_regressions_and_scans(self):
+        results = [
+            ProfileResult("a", db_hits=1000),
+            ProfileResult("b", db_hits=150, scans=["NodeByLabelScan(c:Client)"]),
+            ProfileResult("c", db_hits=5000, scans=["AllNodesScan(n)"]),
+            ProfileResult("d", error="SyntaxError"),
+        ]
+        baseline = {
+            "a": {"db_hits": 500, "scans": []},
+            "b": {"db_hits": 100, "scans": ["NodeByLabelScan(c:Client)"]},
+            "c": {"db_hits": 5000, "scans": []},
+        }
+        report = compare_to_baseline(results, baseline)
+        assert report["regressions"] == [
+            "a: db hits 500 → 1000",
+            "c: 全件スキャンが発生 AllNodesScan(n)",
+            "d: 実行エラー SyntaxError",
+        ]
+        assert [line.split(":")[0] for line in report["scans"]] == ["b", "c"]
+
+    def test_resolved_scan_is_reported_as_improvement(self):
+        results = [ProfileResult("a", db_hits=5, seeks=["NodeUniqueIndexSeek(c:Client(name))"])]
+        baseline = {"a": {"db_hits": 61, "scans": ["NodeByLabelScan(c:Client)"]}}
+        report = compare_to_baseline(results, baseline)
+        assert report["regressions"] == []
+        assert report["improvements"] == ["a: NodeByLabelScan(c:Client) → NodeUniqueIndexSeek(c:Client(name))"]
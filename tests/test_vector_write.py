@@ -0,0 +1,53 @@
+"""
+write_vectors のユニットテスト
+Neo4j 接続なしで、UNWIND のチャンク分割・None の除外・プロパティの検証を確認する。
+"""
+
+import pytest
+
+from lib.embedding import WRITE_VECTORS_QUERY, write_vectors
+
+
+class RecordingRunner:
+    """run_query の代わり。渡された行を記録し、全件書き込めたことにする"""
+
+    def __init__(self, missing=()):
+        self.calls = []
+        self.missing = set(missing)
+
+    def __call__(self, query, params=None):
+        assert query == WRITE_VECTORS_QUERY
+        self.calls.append(list(params["rows"]))
+        return [{"written": sum(1 for row in params["rows"] if row["id"] not in self.missing)}]
+
+
+def test_rows_are_sent_in_chunks():
+    runner = RecordingRunner()
+    rows = ((f"4:x:{i}", "embedding", [float(i)]) for i in range(7))
+    assert write_vectors(rows, chunk_size=3, run_query=runner) == 7
+    assert [len(chunk) for chunk in runner.calls] == [3, 3, 1]
+    assert runner.calls[0][0] == {"id": "4:x:0", "property": "embedding", "vector": [0.0], "props": {}}
+
+
+def test_text_hash_is_written_next_to_the_vector():
+    runner = RecordingRunner()
+    write_vectors([("a", "embedding", [1.0], "v1:abc"), ("b", "summaryEmbedding", [2.0], "v1:def")], run_query=runner)
+    assert [row["props"] for row in runner.calls[0]] == [{"embeddingHash": "v1:abc"}, {"summaryEmbeddingHash": "v1:def"}]
+
+
+def test_missing_vectors_and_nodes_are_not_counted():
+    runner = RecordingRunner(missing={"b"})
+    rows = [("a", "embedding", [1.0]), ("b", "summaryEmbedding", [2.0]), ("c", "embedding", None)]
+    assert write_vectors(rows, run_query=runner) == 1
+    assert [row["id"] for row in runner.calls[0]] == ["a", "b"]
+
+
+def test_nothing_to_write_skips_the_database():
+    runner = RecordingRunner()
+    assert write_vectors([("a", "embedding", None)], run_query=runner) == 0
+    assert runner.calls == []
+
+
+def test_unindexed_property_is_rejected():
+    with pytest.raises(ValueError):
+        write_vectors([("a", "name", [1.0])], run_query=RecordingRunner())
@@ -0,0 +1,269 @@
+"""
+workload モジュールのユニットテスト
+Neo4j接続なしで、レーンの同時実行数・バッチの一時停止・バッチ飽和時の緊急照会の待ち時間を検証する。
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import lib.db_new_operations as db_new_operations
+from lib.db_runtime import PoolTimeoutError, execute_query, get_query_stats, reset_query_stats
+from lib.workload import (
+    BATCH,
+    EMERGENCY,
+    INTERACTIVE,
+    LaneConfig,
+    WorkloadGovernor,
+    current_workload,
+    lane_configs_from_env,
+    set_governor,
+    workload,
+)
+
+
+def _governor(emergency=1, interactive=2, batch=2, wait=1.0, signal_dir=None):
+    return WorkloadGovernor({
+        EMERGENCY: LaneConfig(emergency, wait, None),
+        INTERACTIVE: LaneConfig(interactive, wait, None),
+        BATCH: LaneConfig(batch, wait, None),
+    }, signal_dir=signal_dir)
+
+
+@pytest.fixture
+def governor():
+    g = _governor()
+    previous = set_governor(g)
+    yield g
+    set_governor(previous)
+
+
+class TestWorkloadContext:
+    def test_default_and_nesting(self):
+        assert current_workload() == INTERACTIVE
+        with workload(BATCH):
+            assert current_workload() == BATCH
+            with workload(EMERGENCY):
+                assert current_workload() == EMERGENCY
+            assert current_workload() == BATCH
+        assert current_workload() == INTERACTIVE
+
+    def test_unknown_class(self):
+        with pytest.raises(ValueError):
+            with workload("realtime"):
+                pass
+
+    def test_slots_fit_in_pool(self, monkeypatch):
+        monkeypatch.setenv("NEO4J_MAX_CONNECTION_POOL_SIZE", "50")
+        monkeypatch.setenv("WORKLOAD_EMERGENCY_QUERY_TIMEOUT", "5")
+        configs = lane_configs_from_env()
+        assert sum(c.slots for c in configs.values()) == 50
+        assert (configs[EMERGENCY].slots, configs[BATCH].slots) == (5, 10)
+        assert configs[EMERGENCY].query_timeout == 5.0
+        assert configs[BATCH].query_timeout is None
+
+
+class TestGovernor:
+    def test_slots_and_timeout(self):
+        g = _governor(batch=2)
+        assert g.acquire(BATCH) and g.acquire(BATCH)
+        assert not g.acquire(BATCH, timeout=0.01)
+        g.release(BATCH)
+        assert g.acquire(BATCH, timeout=0.01)
+        stats = g.stats()[BATCH]
+        assert (stats["in_flight"], stats["acquired"], stats["timeouts"]) == (2, 3, 1)
+
+    def test_batch_waits_while_emergency_in_flight(self):
+        g = _governor()
+        assert g.acquire(EMERGENCY)
+        assert not g.acquire(BATCH, timeout=0.01)
+        assert g.acquire(INTERACTIVE, timeout=0.01)
+        assert g.stats()[BATCH]["paused"]
+        g.release(EMERGENCY)
+        assert g.acquire(BATCH, timeout=0.01)
+
+    def test_pause_and_resume(self):
+        g = _governor()
+        g.pause_batch()
+        assert not g.acquire(BATCH, timeout=0.01)
+        g.resume_batch()
+        assert g.acquire(BATCH, timeout=0.01)
+
+
+# --- プロセスをまたぐ一時停止 ---
+
+# SOS の API サーバー役: 緊急照会の枠を取り、標準入力に改行が来たら返す
+_EMERGENCY_PROCESS = """
+import sys
+from lib.workload import EMERGENCY, LaneConfig, WorkloadGovernor
+g = WorkloadGovernor({EMERGENCY: LaneConfig(1, 1.0, None)}, signal_dir=sys.argv[1])
+assert g.acquire(EMERGENCY)
+print("ready", flush=True)
+sys.stdin.readline()
+g.release(EMERGENCY)
+print("released", flush=True)
+"""
+
+
+class TestCrossProcessPause:
+    def test_batch_waits_for_emergency_in_another_process(self, tmp_path):
+        root = Path(__file__).resolve().parents[1]
+        sos = subprocess.Popen(
+            [sys.executable, "-c", _EMERGENCY_PROCESS, str(tmp_path)],
+            cwd=root, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            env={**os.environ, "PYTHONPATH": str(root)},
+        )
+        try:
+            assert sos.stdout.readline().strip() == "ready"
+            batch = _governor(signal_dir=tmp_path)
+            assert not batch.acquire(BATCH, timeout=0.1)
+            assert batch.stats()[BATCH]["paused"]
+            assert batch.acquire(INTERACTIVE, timeout=0.01)
+
+            # 緊急照会が終われば、待っていたバッチが続きを始める
+            acquired = threading.Event()
+            waiter = threading.Thread(target=lambda: batch.acquire(BATCH, timeout=5.0) and acquired.set())
+            waiter.start()
+            assert not acquired.wait(0.1)
+            sos.stdin.write("\n")
+            sos.stdin.flush()
+            assert sos.stdout.readline().strip() == "released"
+            waiter.join()
+            assert acquired.is_set()
+        finally:
+            sos.kill()
+            sos.wait()
+        assert list(tmp_path.iterdir()) == []
+
+    def test_stale_signal_from_crashed_process_is_ignored(self, tmp_path):
+        stale = tmp_path / "emergency-999999"
+        stale.touch()
+        old = time.time() - 3600
+        os.utime(stale, (old, old))
+        assert _governor(signal_dir=tmp_path).acquire(BATCH, timeout=0.01)
+
+    def test_own_signal_is_cleared_after_last_emergency(self, tmp_path):
+        g = _governor(emergency=2, signal_dir=tmp_path)
+        assert g.acquire(EMERGENCY) and g.acquire(EMERGENCY)
+        assert [p.name for p in tmp_path.iterdir()] == [f"emergency-{os.getpid()}"]
+        g.release(EMERGENCY)
+        assert list(tmp_path.iterdir())
+        g.release(EMERGENCY)
+        assert list(tmp_path.iterdir()) == []
+
+
+# --- バッチ飽和時の緊急照会 ---
+
+class _Tx:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, query, params):
+        time.sleep(self.driver.query_seconds)
+        return self
+
+    def data(self):
+        return [{"ok": 1}]
+
+
+class _PooledSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        # ドライバーのコネクションプールを模擬: 空きがなければ待つ
+        self.driver.pool.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.driver.pool.release()
+        return False
+
+    def execute_read(self, work):
+        return work(_Tx(self.driver))
+
+    def execute_write(self, work):
+        return work(_Tx(self.driver))
+
+
+class PooledDriver:
+    def __init__(self, pool_size, query_seconds):
+        self.pool = threading.BoundedSemaphore(pool_size)
+        self.query_seconds = query_seconds
+
+    def session(self):
+        return _PooledSession(self)
+
+
+class TestEmergencyUnderBatchLoad:
+    def test_sos_latency_unaffected_by_saturating_batch(self, governor):
+        # プール 5 = emergency 1 + interactive 2 + batch 2。バッチは 10 スレッドで投げ続ける
+        driver = PooledDriver(pool_size=5, query_seconds=0.05)
+        stop = threading.Event()
+        batch_queries = []
+
+        def batch_worker():
+            with workload(BATCH):
+                while not stop.is_set():
+                    execute_query(driver, "MATCH (n:SupportLog) RETURN n")
+                    batch_queries.append(1)
+
+        workers = [threading.Thread(target=batch_worker) for _ in range(10)]
+        for w in workers:
+            w.start()
+        try:
+            time.sleep(0.2)
+            assert governor.stats()[BATCH]["in_flight"] == 2
+            reset_query_stats()
+            t0 = time.perf_counter()
+            with workload(EMERGENCY):
+                assert execute_query(driver, "MATCH (c:Client {name: $name}) RETURN c", {"name": "山田"}) == [{"ok": 1}]
+            elapsed = time.perf_counter() - t0
+        finally:
+            stop.set()
+            for w in workers:
+                w.join()
+
+        # 実行時間（50ms）に対して、枠待ち・接続待ちはほぼない
+        assert elapsed < 0.15
+        emergency_calls = [c for c in get_query_stats(recent=50)["recent"] if c["workload"] == EMERGENCY]
+        assert emergency_calls and emergency_calls[0]["lane_wait_ms"] < 20
+        assert len(batch_queries) > 0
+
+    def test_lane_timeout_is_pool_timeout(self):
+        g = _governor(batch=1, wait=0.01)
+        previous = set_governor(g)
+        try:
+            assert g.acquire(BATCH)
+            with workload(BATCH), pytest.raises(PoolTimeoutError):
+                execute_query(PooledDriver(5, 0), "MATCH (n) RETURN n")
+        finally:
+            set_governor(previous)
+
+    def test_batch_transaction_waits_while_emergency_in_flight(self, governor, monkeypatch):
+        # run_in_transaction も run_query と同じレーンを通る（緊急照会の間はバッチの書き込みを始めない）
+        monkeypatch.setattr(db_new_operations, "get_driver", lambda: PooledDriver(5, 0))
+        assert governor.acquire(EMERGENCY)
+        done = threading.Event()
+
+        def batch_write():
+            with workload(BATCH):
+                db_new_operations.run_in_transaction(lambda tx: tx.run("CREATE (n)", {}).data())
+            done.set()
+
+        worker = threading.Thread(target=batch_write)
+        worker.start()
+        try:
+            assert not done.wait(0.1)
+            assert governor.stats()[BATCH]["in_flight"] == 0
+        finally:
+            governor.release(EMERGENCY)
+            worker.join()
+        assert done.is_set()
+        call = get_query_stats(recent=1)["recent"][0]
+        assert (call["workload"], call["mode"]) == (BATCH, "write") and call["lane_wait_ms"] >= 90